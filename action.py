@@ -8,6 +8,7 @@ import sys
 import json
 import requests
 from github_similarity_service import SimilarityService
+from index_state import IndexSnapshot, IndexStateStore
 
 
 def get_input(name: str, default: str = "") -> str:
@@ -69,6 +70,41 @@ def post_comment(owner: str, repo: str, issue_number: int, body: str, token: str
     return response.json()
 
 
+def sync_index(service: SimilarityService, owner: str, repo: str, max_issues: int,
+               include_discussions: bool, cache_dir: str) -> dict:
+    """Index the repository, applying only the delta when a cached snapshot exists"""
+    store = IndexStateStore(cache_dir) if cache_dir else None
+    snapshot = store.load(owner, repo) if store else None
+    
+    if snapshot and snapshot.include_discussions == include_discussions:
+        print(f"Restored index snapshot for {owner}/{repo} (synced up to {snapshot.last_synced_at})")
+        # Include closed issues so state changes since the last run are picked up
+        result = service.index_repository(
+            owner, repo, max_issues, include_discussions,
+            issue_state="all", since=snapshot.last_synced_at,
+            comments_since=snapshot.comments_synced_at or None
+        )
+    else:
+        print(f"Indexing {owner}/{repo} with up to {max_issues} issues...")
+        result = service.index_repository(owner, repo, max_issues, include_discussions)
+    
+    print(f"Indexed {result['indexed']} items from {result['repository']}")
+    if 'comments' in result:
+        print(f"Indexed {result['comments']} comments")
+    
+    if store and result.get('latest_updated_at'):
+        path = store.save(IndexSnapshot(
+            owner=owner,
+            repo=repo,
+            last_synced_at=result['latest_updated_at'],
+            include_discussions=include_discussions,
+            comments_synced_at=result.get('comments_synced_at') or ""
+        ))
+        print(f"Saved index snapshot to {path}")
+    
+    return result
+
+
 def main():
     # Get GitHub context
     github_event_path = os.environ.get('GITHUB_EVENT_PATH')
@@ -105,6 +141,7 @@ def main():
     index_on_run = get_input('index-on-run', 'true').lower() == 'true'
     include_discussions = get_input('include-discussions', 'false').lower() == 'true'
     comment_template = get_input('comment-template')
+    index_cache_dir = get_input('index-cache-dir', '')
     github_token = os.environ.get('GITHUB_TOKEN')
     
     if not github_token:
@@ -117,9 +154,7 @@ def main():
         
         # Index repository if requested
         if index_on_run:
-            print(f"Indexing {repo_full_name} with up to {max_issues} issues...")
-            result = service.index_repository(owner, repo, max_issues, include_discussions)
-            print(f"Indexed {result['indexed']} items from {result['repository']}")
+            sync_index(service, owner, repo, max_issues, include_discussions, index_cache_dir)
         
         # Find similar issues
         print(f"Finding similar issues to #{issue_number}...")
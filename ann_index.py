@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Approximate Nearest Neighbour Index
+Sub-linear top-k search over a repository's embeddings, for serving
+similarity queries without the vector store. Two index types:
+- ivf: numpy inverted file. Vectors are clustered with spherical k-means
+  and stored grouped by cluster; a query scans only the `nprobe` clusters
+  whose centroids are closest to it
+- hnsw: hnswlib graph (installed with chromadb as chroma-hnswlib); a query
+  walks the graph keeping the `ef` best candidates
+
+Raising `nprobe` or `ef` trades latency for recall. Both take incremental
+adds and deletes. IVF clusters are memory-mapped on load and new vectors go
+to a small pending segment that is merged into the clusters as it grows.
+"""
+
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from local_index import LocalIndexStore
+from vector_quant import normalize_rows
+
+try:
+    import hnswlib
+except ImportError:  # pragma: no cover - shipped with chromadb
+    hnswlib = None
+
+ANN_FORMAT_VERSION = 1
+ANN_KINDS = ("ivf", "hnsw")
+
+DEFAULT_NPROBE = 8
+DEFAULT_EF = 64
+
+# Clusters per square root of the vector count (4,000 clusters at 1M vectors)
+IVF_LISTS_PER_SQRT = 4
+# Below this many vectors a single cluster (an exact scan) is as fast
+IVF_MIN_TRAIN_ROWS = 1024
+IVF_KMEANS_ITERATIONS = 10
+IVF_SAMPLE_PER_LIST = 32
+# Retrain once the index has grown this much since the clusters were trained
+IVF_RETRAIN_GROWTH = 4
+# Merge pending vectors into the clusters past this share of the index
+IVF_MERGE_FRACTION = 0.05
+IVF_MIN_MERGE_ROWS = 4096
+
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+
+
+def _write_array(path: str, array: np.ndarray):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.asarray(array))
+    os.replace(tmp_path, path)
+
+
+def spherical_kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = IVF_KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Unit-length centroids of unit-length rows, clustered by cosine similarity"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_lists(vectors, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        order = np.argsort(assignments, kind="stable")
+        sums = np.zeros_like(centroids)
+        sums[counts > 0] = np.add.reduceat(vectors[order], np.cumsum(counts)[counts > 0] - counts[counts > 0])
+        # Clusters that lost every member restart from a random row
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, block_rows: int = 16384) -> np.ndarray:
+    """Index of the closest centroid for each row"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class AnnIndex:
+    """Doc id bookkeeping shared by the index types.
+
+    Each vector gets an integer label; labels of removed documents are not
+    reused, and `compact` renumbers them once they pile up.
+    """
+
+    kind = ""
+
+    def __init__(self, dimension: int = 0):
+        self.dimension = dimension
+        self.labels: Dict[str, int] = {}  # doc id -> label
+        self.ids: List[Optional[str]] = []  # label -> doc id (None once removed)
+        self.metadatas: List[Optional[Dict]] = []
+        self.children: Dict[str, List[str]] = {}  # parent id -> "<parent>#..." ids
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def metadata(self, doc_id: str) -> Optional[Dict]:
+        label = self.labels.get(doc_id)
+        return None if label is None else self.metadatas[label]
+
+    def set_metadata(self, doc_id: str, metadata: Dict):
+        label = self.labels.get(doc_id)
+        if label is not None and self.metadatas[label] != metadata:
+            self.metadatas[label] = metadata
+            self.dirty = True
+
+    def add(self, ids: List[str], vectors, metadatas: Optional[List[Dict]] = None):
+        """Index vectors, replacing any previous versions of the same ids"""
+        if not ids:
+            return
+        vectors = normalize_rows(vectors)
+        if self.dimension and vectors.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match the index ({self.dimension})")
+        self.dimension = vectors.shape[1]
+        self.remove_many(ids, include_children=False)
+
+        labels = np.arange(len(self.ids), len(self.ids) + len(ids), dtype=np.int64)
+        for doc_id, label, metadata in zip(ids, labels, metadatas or [{}] * len(ids)):
+            self.labels[doc_id] = int(label)
+            self.ids.append(doc_id)
+            self.metadatas.append(metadata)
+            if "#" in doc_id:
+                self.children.setdefault(doc_id.split("#", 1)[0], []).append(doc_id)
+        self._add_vectors(labels, vectors)
+        self.dirty = True
+
+    def remove(self, doc_id: str) -> bool:
+        return self.remove_many([doc_id]) > 0
+
+    def remove_many(self, doc_ids: Iterable[str], include_children: bool = True) -> int:
+        """Drop ids (and, by default, their "<id>#..." chunk and comment children); returns vectors removed"""
+        doc_ids = list(doc_ids)
+        if include_children:
+            doc_ids += [child for doc_id in doc_ids for child in self.children.pop(doc_id, [])]
+        removed = []
+        for doc_id in doc_ids:
+            label = self.labels.pop(doc_id, None)
+            if label is not None:
+                self.ids[label] = None
+                self.metadatas[label] = None
+                removed.append(label)
+        if not removed:
+            return 0
+        self._delete_labels(np.asarray(removed, dtype=np.int64))
+        self.dirty = True
+        return len(removed)
+
+    def search(self, query, k: int = 10, exclude: Iterable[str] = (), **params) -> List[Tuple[str, float]]:
+        """Top `k` (doc_id, cosine similarity) pairs, best first; `params` are `nprobe` or `ef`"""
+        if not self.labels or k <= 0:
+            return []
+        exclude = {doc_id for doc_id in exclude if doc_id in self.labels}
+        query = normalize_rows(query)[0]
+        hits = self._search_labels(query, min(len(self.labels), k + len(exclude)), **params)
+        results = [(self.ids[label], similarity) for label, similarity in hits]
+        return [(doc_id, similarity) for doc_id, similarity in results if doc_id not in exclude][:k]
+
+    def compact(self):
+        """Renumber labels so removed documents stop taking up space"""
+        live = np.asarray([label for label, doc_id in enumerate(self.ids) if doc_id is not None], dtype=np.int64)
+        if len(live) == len(self.ids):
+            return
+        self._relabel(live)
+        self.ids = [self.ids[label] for label in live]
+        self.metadatas = [self.metadatas[label] for label in live]
+        self.labels = {doc_id: label for label, doc_id in enumerate(self.ids)}
+        self.dirty = True
+
+    # Index types implement these, plus `_write`/`_read` for persistence
+    def _add_vectors(self, labels: np.ndarray, vectors: np.ndarray):
+        raise NotImplementedError
+
+    def _delete_labels(self, labels: np.ndarray):
+        raise NotImplementedError
+
+    def _search_labels(self, query: np.ndarray, k: int, **params) -> List[Tuple[int, float]]:
+        raise NotImplementedError
+
+    def _relabel(self, live: np.ndarray):
+        """Label `i` becomes the vector labelled `live[i]`"""
+        raise NotImplementedError
+
+
+class IVFIndex(AnnIndex):
+    """Inverted file: vectors grouped by nearest centroid, `nprobe` groups scanned per query"""
+
+    kind = "ivf"
+
+    def __init__(self, dimension: int = 0, nprobe: int = DEFAULT_NPROBE):
+        super().__init__(dimension)
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_rows = 0
+        # Clustered segment: rows of list i are offsets[i]:offsets[i + 1]
+        self.list_vectors: Optional[np.ndarray] = None  # memory-mapped once loaded
+        self.list_labels = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        # Vectors added since the last merge, with their nearest list
+        self.pending_vectors: Optional[np.ndarray] = None
+        self.pending_labels = np.empty(0, dtype=np.int64)
+        self.pending_lists = np.empty(0, dtype=np.int32)
+        self.deleted = np.zeros(0, dtype=bool)  # by label
+        self.merged = False  # the clustered segment changed since it was saved
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.offsets) - 1
+
+    def _add_vectors(self, labels: np.ndarray, vectors: np.ndarray):
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(labels), dtype=bool)])
+        lists = assign_lists(vectors, self.centroids) if self.centroids is not None else np.zeros(len(labels), dtype=np.int32)
+        if self.pending_vectors is None:
+            self.pending_vectors = vectors
+        else:
+            self.pending_vectors = np.concatenate([self.pending_vectors, vectors])
+        self.pending_labels = np.concatenate([self.pending_labels, labels])
+        self.pending_lists = np.concatenate([self.pending_lists, lists])
+
+        untrained = self.centroids is None and len(self) >= IVF_MIN_TRAIN_ROWS
+        if untrained or len(self.pending_labels) > max(IVF_MIN_MERGE_ROWS, IVF_MERGE_FRACTION * len(self.list_labels)):
+            self.merge()
+
+    def _delete_labels(self, labels: np.ndarray):
+        self.deleted[labels] = True
+
+    def merge(self):
+        """Fold pending vectors into the clusters, dropping removed ones (and retraining after enough growth)"""
+        segments = [np.asarray(array) for array in (self.list_vectors, self.pending_vectors) if array is not None and len(array)]
+        vectors = np.concatenate(segments) if segments else np.zeros((0, self.dimension), dtype=np.float32)
+        lists = np.concatenate([np.repeat(np.arange(self.n_lists, dtype=np.int32), np.diff(self.offsets)), self.pending_lists])
+        labels = np.concatenate([self.list_labels, self.pending_labels])
+        keep = ~self.deleted[labels]
+        vectors, lists, labels = vectors[keep], lists[keep], labels[keep]
+
+        if len(labels) >= IVF_MIN_TRAIN_ROWS and (self.centroids is None or len(labels) >= IVF_RETRAIN_GROWTH * self.trained_rows):
+            n_lists = min(len(labels), max(1, int(IVF_LISTS_PER_SQRT * np.sqrt(len(labels)))))
+            sample = np.random.default_rng(0).choice(len(labels), min(len(labels), n_lists * IVF_SAMPLE_PER_LIST), replace=False)
+            self.centroids = spherical_kmeans(vectors[np.sort(sample)], n_lists)
+            self.trained_rows = len(labels)
+            lists = assign_lists(vectors, self.centroids)
+        n_lists = len(self.centroids) if self.centroids is not None else 1
+
+        order = np.argsort(lists, kind="stable")
+        self.list_vectors = vectors[order]
+        self.list_labels = labels[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=n_lists))]).astype(np.int64)
+        self.pending_vectors = None
+        self.pending_labels = np.empty(0, dtype=np.int64)
+        self.pending_lists = np.empty(0, dtype=np.int32)
+        self.merged = True
+
+    def _search_labels(self, query: np.ndarray, k: int, nprobe: Optional[int] = None, **_) -> List[Tuple[int, float]]:
+        if self.centroids is None:
+            probed = np.arange(self.n_lists)
+        else:
+            nprobe = min(nprobe or self.nprobe, self.n_lists)
+            probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        scores, labels = [], []
+        for list_id in probed:
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            if end > start:
+                scores.append(np.asarray(self.list_vectors[start:end]) @ query)
+                labels.append(self.list_labels[start:end])
+        if len(self.pending_labels):
+            # Unclustered rows are scanned when their list is probed (every row before training)
+            mask = np.isin(self.pending_lists, probed) if self.centroids is not None else slice(None)
+            scores.append(self.pending_vectors[mask] @ query)
+            labels.append(self.pending_labels[mask])
+        if not labels:
+            return []
+
+        scores, labels = np.concatenate(scores), np.concatenate(labels)
+        scores[self.deleted[labels]] = -np.inf
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(labels[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def _relabel(self, live: np.ndarray):
+        mapping = np.full(len(self.deleted), -1, dtype=np.int64)
+        mapping[live] = np.arange(len(live))
+        self.merge()
+        self.list_labels = mapping[self.list_labels]
+        self.deleted = np.zeros(len(live), dtype=bool)
+
+    def _arrays(self) -> Dict[str, Optional[np.ndarray]]:
+        return {
+            "centroids": self.centroids, "list_vectors": self.list_vectors,
+            "list_labels": self.list_labels, "offsets": self.offsets,
+        }
+
+    def _write(self, prefix: str) -> Dict:
+        # The clustered segment is only rewritten after a merge; pending rows are small
+        if self.merged or not os.path.exists(f"{prefix}.list_labels.npy"):
+            for name, array in self._arrays().items():
+                if array is not None:
+                    _write_array(f"{prefix}.{name}.npy", array)
+            if self.list_vectors is not None:
+                self.list_vectors = np.load(f"{prefix}.list_vectors.npy", mmap_mode="r")
+            self.merged = False
+        pending = self.pending_vectors if self.pending_vectors is not None else np.zeros((0, self.dimension), dtype=np.float32)
+        _write_array(f"{prefix}.pending_vectors.npy", pending)
+        _write_array(f"{prefix}.pending_labels.npy", self.pending_labels)
+        _write_array(f"{prefix}.pending_lists.npy", self.pending_lists)
+        return {"trained_rows": self.trained_rows, "has_centroids": self.centroids is not None, "has_lists": self.list_vectors is not None}
+
+    def _read(self, prefix: str, state: Dict):
+        self.trained_rows = state["trained_rows"]
+        if state["has_centroids"]:
+            self.centroids = np.load(f"{prefix}.centroids.npy")
+        if state["has_lists"]:
+            self.list_vectors = np.load(f"{prefix}.list_vectors.npy", mmap_mode="r")
+        self.list_labels = np.load(f"{prefix}.list_labels.npy")
+        self.offsets = np.load(f"{prefix}.offsets.npy")
+        pending = np.load(f"{prefix}.pending_vectors.npy")
+        self.pending_vectors = pending if len(pending) else None
+        self.pending_labels = np.load(f"{prefix}.pending_labels.npy")
+        self.pending_lists = np.load(f"{prefix}.pending_lists.npy")
+        self.deleted = np.asarray([doc_id is None for doc_id in self.ids], dtype=bool)
+
+
+class HNSWIndex(AnnIndex):
+    """hnswlib graph over inner product (cosine on unit vectors), `ef` candidates kept per query"""
+
+    kind = "hnsw"
+
+    def __init__(self, dimension: int = 0, ef: int = DEFAULT_EF):
+        if hnswlib is None:
+            raise ValueError("The hnsw index needs hnswlib (pip install chroma-hnswlib)")
+        super().__init__(dimension)
+        self.ef = ef
+        self.graph = None
+
+    def _new_graph(self, capacity: int):
+        self.graph = hnswlib.Index(space="ip", dim=self.dimension)
+        self.graph.init_index(max_elements=max(capacity, 16), M=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, allow_replace_deleted=True)
+
+    def _add_vectors(self, labels: np.ndarray, vectors: np.ndarray):
+        if self.graph is None:
+            self._new_graph(len(labels))
+        # New vectors take the slots of deleted ones first
+        deleted_slots = self.graph.element_count - (len(self) - len(labels))
+        needed = self.graph.element_count + max(0, len(labels) - deleted_slots)
+        if needed > self.graph.get_max_elements():
+            self.graph.resize_index(max(2 * self.graph.get_max_elements(), needed))
+        self.graph.add_items(vectors, labels, replace_deleted=True)
+
+    def _delete_labels(self, labels: np.ndarray):
+        for label in labels:
+            self.graph.mark_deleted(int(label))
+
+    def _search_labels(self, query: np.ndarray, k: int, ef: Optional[int] = None, **_) -> List[Tuple[int, float]]:
+        self.graph.set_ef(max(ef or self.ef, k))
+        labels, distances = self.graph.knn_query(query[None, :], k=k)
+        # "ip" distance is 1 - inner product
+        return [(int(label), float(1.0 - distance)) for label, distance in zip(labels[0], distances[0])]
+
+    def _relabel(self, live: np.ndarray):
+        vectors = np.asarray(self.graph.get_items(live.tolist()), dtype=np.float32)
+        self._new_graph(len(live))
+        if len(live):
+            self.graph.add_items(vectors, np.arange(len(live)))
+
+    def _write(self, prefix: str) -> Dict:
+        if self.graph is not None:
+            tmp_path = f"{prefix}.hnsw.bin.tmp"
+            self.graph.save_index(tmp_path)
+            os.replace(tmp_path, f"{prefix}.hnsw.bin")
+        return {"has_graph": self.graph is not None}
+
+    def _read(self, prefix: str, state: Dict):
+        if state["has_graph"]:
+            self.graph = hnswlib.Index(space="ip", dim=self.dimension)
+            self.graph.load_index(f"{prefix}.hnsw.bin", allow_replace_deleted=True)
+
+
+ANN_INDEX_CLASSES = {"ivf": IVFIndex, "hnsw": HNSWIndex}
+
+
+class AnnStore(LocalIndexStore):
+    """Per-repository ANN indexes under `<data_dir>/ann/`.
+
+    Each repository has a JSON file (ids, metadata, index type) plus the
+    index's own files next to it. An index saved with another type is
+    ignored; `build-ann` rebuilds it.
+    """
+
+    subdir = "ann"
+    format_version = ANN_FORMAT_VERSION
+
+    def __init__(self, data_dir: str, kind: str = "hnsw", ef: int = DEFAULT_EF, nprobe: int = DEFAULT_NPROBE):
+        if kind not in ANN_KINDS:
+            raise ValueError(f"Unknown ANN index '{kind}' (expected one of: {', '.join(ANN_KINDS)})")
+        super().__init__(data_dir)
+        self.kind = kind
+        self.ef = ef
+        self.nprobe = nprobe
+
+    def new_index(self) -> AnnIndex:
+        if self.kind == "ivf":
+            return IVFIndex(nprobe=self.nprobe)
+        return HNSWIndex(ef=self.ef)
+
+    def _prefix(self, owner: str, repo: str) -> str:
+        return self.path_for(owner, repo)[:-len(".json")]
+
+    def _load(self, owner: str, repo: str) -> AnnIndex:
+        path = self.path_for(owner, repo)
+        if not os.path.exists(path):
+            return self.new_index()
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get("format") != self.format_version or data.get("kind") != self.kind:
+                return self.new_index()
+            index = self.new_index()
+            index.dimension = data["dimension"]
+            index.ids = data["ids"]
+            index.metadatas = data["metadatas"]
+            index.labels = {doc_id: label for label, doc_id in enumerate(index.ids) if doc_id is not None}
+            for doc_id in index.labels:
+                if "#" in doc_id:
+                    index.children.setdefault(doc_id.split("#", 1)[0], []).append(doc_id)
+            index._read(self._prefix(owner, repo), data["state"])
+            return index
+        except (OSError, ValueError, KeyError, TypeError, RuntimeError) as e:
+            print(f"Ignoring unreadable {self.subdir} index {path}: {e}")
+            return self.new_index()
+
+    def add(self, owner: str, repo: str, ids: List[str], vectors, metadatas: List[Dict]):
+        with self._lock:
+            self.get(owner, repo).add(ids, vectors, metadatas)
+
+    def remove(self, owner: str, repo: str, ids: Iterable[str]):
+        with self._lock:
+            self.get(owner, repo).remove_many(ids)
+
+    def set_metadatas(self, owner: str, repo: str, ids: List[str], metadatas: List[Dict]):
+        with self._lock:
+            index = self.get(owner, repo)
+            for doc_id, metadata in zip(ids, metadatas):
+                index.set_metadata(doc_id, metadata)
+
+    def search(self, owner: str, repo: str, query, k: int = 10, exclude: Iterable[str] = (), **params) -> List[Tuple[str, float, Optional[Dict]]]:
+        """(doc_id, similarity, metadata) hits, read under the lock writers hold"""
+        with self._lock:
+            index = self.get(owner, repo)
+            return [(doc_id, similarity, index.metadata(doc_id)) for doc_id, similarity in index.search(query, k, exclude, **params)]
+
+    def rebuild(self, owner: str, repo: str, ids: List[str], vectors, metadatas: List[Dict]) -> Dict[str, float]:
+        """Replace the repository's index with one built from scratch; returns build stats"""
+        started = time.perf_counter()
+        index = self.new_index()
+        index.add(ids, vectors, metadatas)
+        if isinstance(index, IVFIndex) and len(index.pending_labels):
+            index.merge()
+        with self._lock:
+            self._indexes[(owner.lower(), repo.lower())] = index
+            self.save(owner, repo)
+        return {"vectors": len(index), "seconds": round(time.perf_counter() - started, 2)}
+
+    def save(self, owner: str, repo: str) -> Optional[str]:
+        """Atomically write the repository's index if it changed; returns the JSON path written"""
+        with self._lock:
+            index = self.get(owner, repo)
+            if not index.dirty:
+                return None
+            if len(index.ids) > 2 * len(index) + 1024:
+                index.compact()
+            path = self.path_for(owner, repo)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            state = index._write(self._prefix(owner, repo))
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    "format": self.format_version,
+                    "kind": index.kind,
+                    "dimension": index.dimension,
+                    "ids": index.ids,
+                    "metadatas": index.metadatas,
+                    "state": state
+                }, f)
+            os.replace(tmp_path, path)
+            index.dirty = False
+            return path
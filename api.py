@@ -1,11 +1,19 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from functools import partial
 from typing import List, Dict, Union, Optional
+import asyncio
 import uvicorn
+import json
+import os
 
 from github_similarity_service import SimilarityService
+from metadata_schema import MetadataFilter
 from discussions_metrics import DiscussionsMetricsService
+from webhooks import IndexUpdateBatcher, handle_webhook_event, verify_signature
+from query_coalescer import QueryCoalescer
 import requests
 
 
@@ -25,6 +33,15 @@ app.add_middleware(
 
 similarity_service = SimilarityService()
 discussions_service = DiscussionsMetricsService()
+webhook_batcher = IndexUpdateBatcher(
+    similarity_service,
+    max_delay=float(os.getenv("WEBHOOK_BATCH_DELAY", "2.0"))
+)
+query_coalescer = QueryCoalescer(
+    similarity_service,
+    max_wait=float(os.getenv("QUERY_BATCH_WINDOW_MS", "5")) / 1000,
+    max_batch=int(os.getenv("QUERY_BATCH_SIZE", "32"))
+)
 
 
 class IndexRequest(BaseModel):
@@ -35,12 +52,51 @@ class IndexRequest(BaseModel):
     issue_state: str = Field("open", description="Issue state to index: open, closed, or all")
 
 
-class FindSimilarRequest(BaseModel):
+class FilterFields(BaseModel):
+    state: Optional[str] = Field(None, description="Only items in this state: open or closed")
+    type: Optional[str] = Field(None, description="Only items of this type: issue, pull_request or discussion")
+    labels: List[str] = Field(default_factory=list, description="Only items carrying all of these labels", max_length=20)
+    created_after: Optional[str] = Field(None, description="Only items created on or after this ISO 8601 date")
+    created_before: Optional[str] = Field(None, description="Only items created before this ISO 8601 date")
+    updated_after: Optional[str] = Field(None, description="Only items updated on or after this ISO 8601 date")
+    updated_before: Optional[str] = Field(None, description="Only items updated before this ISO 8601 date")
+
+    def filters(self) -> Optional[MetadataFilter]:
+        """Filters pushed down into the vector search (None when none are set; raises ValueError)"""
+        filters = MetadataFilter(
+            state=self.state, item_type=self.type, labels=tuple(self.labels),
+            created_after=self.created_after, created_before=self.created_before,
+            updated_after=self.updated_after, updated_before=self.updated_before
+        )
+        return filters or None
+
+
+class FindSimilarRequest(FilterFields):
     owner: str = Field(..., description="Repository owner/organization")
     repo: str = Field(..., description="Repository name")
     issue_number: int = Field(..., description="Issue number to find similar issues for")
     top_k: int = Field(10, description="Number of similar issues to return", ge=1, le=50)
     min_similarity: float = Field(0.0, description="Minimum similarity score", ge=0.0, le=1.0)
+    repositories: List[str] = Field(default_factory=list, description="Other repositories (owner/repo) to search as well", max_length=50)
+
+
+class SearchRequest(FilterFields):
+    owner: str = Field(..., description="Repository owner/organization")
+    repo: str = Field(..., description="Repository name")
+    title: str = Field(..., description="Draft issue title or free-text query", min_length=1)
+    body: str = Field("", description="Draft issue body")
+    top_k: int = Field(10, description="Number of similar issues to return", ge=1, le=50)
+    min_similarity: float = Field(0.0, description="Minimum similarity score", ge=0.0, le=1.0)
+    repositories: List[str] = Field(default_factory=list, description="Other repositories (owner/repo) to search as well", max_length=50)
+
+
+class FindSimilarBatchRequest(BaseModel):
+    owner: str = Field(..., description="Repository owner/organization")
+    repo: str = Field(..., description="Repository name")
+    issue_numbers: List[int] = Field(default_factory=list, description="Issue numbers to find similar issues for", max_length=500)
+    queries: List[str] = Field(default_factory=list, description="Free-text queries", max_length=500)
+    top_k: int = Field(10, description="Number of similar issues to return per input", ge=1, le=50)
+    min_similarity: float = Field(0.0, description="Minimum similarity score", ge=0.0, le=1.0)
 
 
 class SuggestDiscussionsRequest(BaseModel):
@@ -50,6 +106,9 @@ class SuggestDiscussionsRequest(BaseModel):
     max_suggestions: int = Field(20, description="Maximum number of suggestions", ge=1, le=100)
     dry_run: bool = Field(True, description="Dry run mode (no actual changes)")
     add_labels: bool = Field(False, description="Add labels to suggested issues based on confidence level")
+    workers: int = Field(1, description="Worker processes for scoring large repositories", ge=1, le=32)
+    mode: str = Field("heuristic", description="Scoring mode: heuristic or embedding", pattern="^(heuristic|embedding)$")
+    label_transport: str = Field("rest", description="How labels are written: rest or graphql (batched mutations)", pattern="^(rest|graphql)$")
 
 
 class DiscussionsMetricsRequest(BaseModel):
@@ -98,13 +157,28 @@ async def index_repository(request: IndexRequest):
 @app.post("/find_similar")
 async def find_similar_issues(request: FindSimilarRequest):
     try:
-        results = similarity_service.find_similar_issues(
-            owner=request.owner,
-            repo=request.repo,
-            issue_number=request.issue_number,
-            top_k=request.top_k,
-            min_similarity=request.min_similarity
-        )
+        filters = request.filters()
+        if request.repositories or filters:
+            # Cross-repository and filtered queries run on their own instead of being coalesced,
+            # in a worker thread like the coalesced batches so they don't block the event loop
+            results = await asyncio.get_running_loop().run_in_executor(None, partial(
+                similarity_service.find_similar_issues,
+                request.owner,
+                request.repo,
+                request.issue_number,
+                request.top_k,
+                request.min_similarity,
+                repositories=request.repositories,
+                filters=filters
+            ))
+        else:
+            results = await query_coalescer.find_similar_issues(
+                owner=request.owner,
+                repo=request.repo,
+                issue_number=request.issue_number,
+                top_k=request.top_k,
+                min_similarity=request.min_similarity
+            )
         return {
             "query_issue": {
                 "number": request.issue_number,
@@ -118,10 +192,74 @@ async def find_similar_issues(request: FindSimilarRequest):
             raise HTTPException(status_code=404, detail=f"Issue #{request.issue_number} not found in {request.owner}/{request.repo}")
         else:
             raise HTTPException(status_code=500, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/search")
+async def search_similar_text(request: SearchRequest):
+    """Find indexed issues similar to arbitrary text (e.g. a draft issue) without a GitHub round trip"""
+    try:
+        filters = request.filters()
+        if request.repositories or filters:
+            results = await asyncio.get_running_loop().run_in_executor(None, partial(
+                similarity_service.search_similar_text,
+                request.owner,
+                request.repo,
+                request.title,
+                request.body,
+                request.top_k,
+                request.min_similarity,
+                repositories=request.repositories,
+                filters=filters
+            ))
+        else:
+            query_text = similarity_service._create_query_text(request.title, request.body)
+            results = await query_coalescer.query(
+                request.owner,
+                request.repo,
+                query_text,
+                top_k=request.top_k,
+                min_similarity=request.min_similarity,
+                raw_text=similarity_service._create_query_text(request.title, request.body, full=True)
+            )
+        return {
+            "query": {"title": request.title},
+            "similar_issues": results[:request.top_k],
+            "count": len(results[:request.top_k])
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/find_similar/batch")
+async def find_similar_batch(request: FindSimilarBatchRequest):
+    """Find similar issues for many inputs, streamed back as NDJSON (one line per input)"""
+    if not request.issue_numbers and not request.queries:
+        raise HTTPException(status_code=400, detail="Provide at least one issue number or query")
+    
+    def stream_results():
+        try:
+            for result in similarity_service.find_similar_batch(
+                owner=request.owner,
+                repo=request.repo,
+                issue_numbers=request.issue_numbers,
+                queries=request.queries,
+                top_k=request.top_k,
+                min_similarity=request.min_similarity
+            ):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            # Headers are already sent, so report failures in-band
+            yield json.dumps({"error": str(e)}) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
 @app.get("/stats")
 async def get_statistics():
     try:
@@ -148,7 +286,9 @@ async def suggest_discussions(request: SuggestDiscussionsRequest):
             repo=request.repo,
             min_score=request.min_score,
             max_suggestions=request.max_suggestions,
-            dry_run=request.dry_run
+            dry_run=request.dry_run,
+            workers=request.workers,
+            mode=request.mode
         )
         
         # Apply labels if requested and not in dry run
@@ -158,10 +298,7 @@ async def suggest_discussions(request: SuggestDiscussionsRequest):
                 "discussion": "0E7490",  # Teal
             }
             
-            # Ensure labels exist
-            similarity_service.ensure_labels_exist(request.owner, request.repo, labels_config)
-            
-            labeled_issues = []
+            assignments, current_labels, confidences = {}, {}, {}
             for suggestion in results.get("suggestions", []):
                 confidence = suggestion.get("confidence", "low")
                 labels_to_add = []
@@ -172,23 +309,37 @@ async def suggest_discussions(request: SuggestDiscussionsRequest):
                     labels_to_add.append("discussion")
                 
                 if labels_to_add:
-                    success = similarity_service.add_issue_labels(
-                        request.owner, 
-                        request.repo, 
-                        suggestion["number"], 
-                        labels_to_add
-                    )
-                    if success:
-                        labeled_issues.append({
-                            "number": suggestion["number"],
-                            "labels": labels_to_add,
-                            "confidence": confidence
-                        })
+                    assignments[suggestion["number"]] = labels_to_add
+                    current_labels[suggestion["number"]] = suggestion.get("labels", [])
+                    confidences[suggestion["number"]] = confidence
+            
+            # Creates missing labels, then labels all issues concurrently
+            label_results = similarity_service.apply_labels_bulk(
+                request.owner,
+                request.repo,
+                assignments,
+                current_labels=current_labels,
+                labels_config=labels_config,
+                transport=request.label_transport
+            )
             
+            labeled_issues = [
+                {
+                    "number": result["number"],
+                    "labels": assignments[result["number"]],
+                    "confidence": confidences[result["number"]]
+                }
+                for result in label_results
+                if result["status"] != "failed"
+            ]
+            
+            results["label_results"] = label_results
             results["labeled_issues"] = labeled_issues
             results["labels_applied"] = len(labeled_issues) > 0
         
         return results
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -247,6 +398,36 @@ async def get_discussions_metrics_simple(owner: str, repo: str, weeks_back: int
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/webhook", status_code=202)
+async def github_webhook(
+    request: Request,
+    x_github_event: Optional[str] = Header(None),
+    x_hub_signature_256: Optional[str] = Header(None)
+):
+    """Apply GitHub `issues` and `discussion` webhook events to the index"""
+    secret = os.getenv("GITHUB_WEBHOOK_SECRET")
+    if not secret:
+        raise HTTPException(status_code=503, detail="GITHUB_WEBHOOK_SECRET is not configured")
+    
+    body = await request.body()
+    if not verify_signature(secret, body, x_hub_signature_256):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    
+    if x_github_event == "ping":
+        return {"status": "pong"}
+    
+    try:
+        payload = json.loads(body)
+        return handle_webhook_event(webhook_batcher, x_github_event or "", payload)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed webhook payload: {e}")
+
+
+@app.on_event("shutdown")
+def flush_webhook_updates():
+    webhook_batcher.flush()
+
+
 @app.get("/")
 async def root():
     return {
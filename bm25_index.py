@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Local BM25 Index
+A per-repository inverted index over the same document text that goes into
+the vector store. It catches exact matches that embeddings blur, such as
+error codes, stack-trace frames and config keys, and answers in
+milliseconds without a network round trip.
+
+Indexes are stored per repository through LocalIndexStore and updated
+incrementally as items are upserted or deleted.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from local_index import LocalIndexStore
+
+# Bump when tokenization or the file layout changes; older files are rebuilt
+BM25_FORMAT_VERSION = 1
+
+# Words joined by . : / - stay together ("ERR_SSL_PROTOCOL", "app.config.port",
+# "src/main.py:42") and their parts are indexed as well
+TOKEN_RE = re.compile(r"[a-z0-9_]+(?:[.:/-][a-z0-9_]+)*")
+PART_RE = re.compile(r"[.:/-]")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased terms of a text, keeping compound identifiers alongside their parts"""
+    terms = []
+    for token in TOKEN_RE.findall((text or "").lower()):
+        if len(token) > 1:
+            terms.append(token)
+        if PART_RE.search(token):
+            terms.extend(part for part in PART_RE.split(token) if len(part) > 1)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over one repository's documents"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Dict] = {}  # doc_id -> {"terms": {term: tf}, "length": n, "metadata": {...}}
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {doc_id: tf}
+        self.total_length = 0
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, doc_id: str, text: str, metadata: Optional[Dict] = None):
+        """Index a document, replacing any previous version with the same id"""
+        self.remove(doc_id)
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self.docs[doc_id] = {"terms": dict(terms), "length": length, "metadata": metadata or {}}
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.total_length += length
+        self.dirty = True
+
+    def remove(self, doc_id: str) -> bool:
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        for term in doc["terms"]:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= doc["length"]
+        self.dirty = True
+        return True
+
+    def search(self, query: str, limit: int = 10, exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """Top `limit` (doc_id, score) pairs for a query, best first"""
+        if not self.docs:
+            return []
+
+        exclude = set(exclude)
+        n_docs = len(self.docs)
+        avg_length = self.total_length / n_docs or 1.0
+        scores: Dict[str, float] = {}
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.docs[doc_id]["length"] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(
+            ((doc_id, score) for doc_id, score in scores.items() if doc_id not in exclude),
+            key=lambda item: (-item[1], item[0])
+        )
+        return ranked[:limit]
+
+    def metadata(self, doc_id: str) -> Optional[Dict]:
+        doc = self.docs.get(doc_id)
+        return doc["metadata"] if doc else None
+
+    def to_dict(self) -> Dict:
+        return {"k1": self.k1, "b": self.b, "docs": self.docs}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BM25Index":
+        index = cls(k1=data.get("k1", 1.2), b=data.get("b", 0.75))
+        for doc_id, doc in data["docs"].items():
+            index.docs[doc_id] = doc
+            for term, tf in doc["terms"].items():
+                index.postings.setdefault(term, {})[doc_id] = tf
+            index.total_length += doc["length"]
+        return index
+
+
+class BM25Store(LocalIndexStore):
+    """Per-repository BM25 indexes under `<data_dir>/bm25/`"""
+
+    subdir = "bm25"
+    format_version = BM25_FORMAT_VERSION
+    index_class = BM25Index
+
+    def add(self, owner: str, repo: str, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        with self._lock:
+            index = self.get(owner, repo)
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                index.add(doc_id, document, metadata)
+
+    def search(self, owner: str, repo: str, query: str, limit: int = 10, exclude: Iterable[str] = ()) -> List[Tuple[str, float, Optional[Dict]]]:
+        """(doc_id, score, metadata) hits of the repository's index, read under the lock writers hold"""
+        with self._lock:
+            index = self.get(owner, repo)
+            return [(doc_id, score, index.metadata(doc_id)) for doc_id, score in index.search(query, limit, exclude)]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(d) = sum of 1 / (k + rank) over the lists containing d (rank from 1)"""
+    scores: Dict[str, float] = {}
+    first_seen: Dict[str, int] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+            first_seen.setdefault(doc_id, len(first_seen))
+    return sorted(scores.items(), key=lambda item: (-item[1], first_seen[item[0]]))
@@ -2,7 +2,7 @@
 import click
 from rich.console import Console
 from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
+from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, MofNCompleteColumn, TimeElapsedColumn
 from rich.panel import Panel
 from rich import print as rprint
 import sys
@@ -11,6 +11,9 @@ from datetime import datetime
 import json
 
 from github_similarity_service import SimilarityService
+from metadata_schema import ITEM_STATES, ITEM_TYPES, MetadataFilter
+from topk import TopK
+from org_indexer import RateBudget, index_repositories, list_org_repos, read_repos_file
 from discussions_metrics import DiscussionsMetricsService
 
 console = Console()
@@ -25,6 +28,89 @@ def format_similarity_score(score: float) -> str:
         return f"[red]{score:.2%}[/red]"
 
 
+def print_similar_issues_table(title: str, results) -> None:
+    table = Table(title=title, show_header=True, header_style="bold magenta")
+    cross_repo = any("repository" in issue for issue in results)
+    if cross_repo:
+        table.add_column("Repository", style="blue", no_wrap=True)
+    table.add_column("#", style="cyan", width=8)
+    table.add_column("Title", style="white")
+    table.add_column("Similarity", justify="right", width=12)
+    table.add_column("State", width=10)
+    table.add_column("Type", width=12)
+    
+    for issue in results:
+        state_style = "green" if issue["state"] == "open" else "red"
+        
+        if issue.get("is_discussion", False):
+            type_emoji = "💬"
+            type_text = "Discussion"
+        elif issue["is_pull_request"]:
+            type_emoji = "🔀"
+            type_text = "PR"
+        else:
+            type_emoji = "🐛"
+            type_text = "Issue"
+        
+        row = [
+            str(issue["number"]),
+            issue["title"][:60] + "..." if len(issue["title"]) > 60 else issue["title"],
+            format_similarity_score(issue["similarity"]),
+            f"[{state_style}]{issue['state']}[/{state_style}]",
+            f"{type_emoji} {type_text}"
+        ]
+        if cross_repo:
+            row.insert(0, issue.get("repository", ""))
+        table.add_row(*row)
+    
+    console.print(table)
+    
+    exact = [issue for issue in results if issue.get("match") == "signature"]
+    if exact:
+        numbers = ", ".join(f"#{issue['number']}" for issue in exact)
+        console.print(f"[bold yellow]Same error signature (likely duplicates):[/bold yellow] {numbers}")
+
+
+def parse_repositories(values) -> list:
+    """Flatten repeated/comma-separated --repos values into validated owner/repo names"""
+    repositories = []
+    for value in values or ():
+        for repository in value.split(","):
+            repository = repository.strip()
+            if not repository:
+                continue
+            if repository.count("/") != 1:
+                raise click.BadParameter(f"'{repository}' is not in format 'owner/repo'", param_hint="--repos")
+            repositories.append(repository)
+    return list(dict.fromkeys(repositories))
+
+
+def filter_options(command):
+    """--state/--type/--label/--created-*/--updated-* options, pushed down into the vector search"""
+    options = [
+        click.option("--state", type=click.Choice(ITEM_STATES), help="Only items in this state"),
+        click.option("--type", "item_type", type=click.Choice(ITEM_TYPES), help="Only items of this type"),
+        click.option("--label", "labels", multiple=True, help="Only items with this label (repeat to require several)"),
+        click.option("--created-after", help="Only items created on or after this date (YYYY-MM-DD or ISO)"),
+        click.option("--created-before", help="Only items created before this date (YYYY-MM-DD or ISO)"),
+        click.option("--updated-after", help="Only items updated on or after this date (YYYY-MM-DD or ISO)"),
+        click.option("--updated-before", help="Only items updated before this date (YYYY-MM-DD or ISO)"),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+
+def build_filters(state, item_type, labels, created_after, created_before, updated_after, updated_before):
+    """MetadataFilter from the filter options (None when none were given)"""
+    filters = MetadataFilter(
+        state=state, item_type=item_type, labels=tuple(labels),
+        created_after=created_after, created_before=created_before,
+        updated_after=updated_after, updated_before=updated_before
+    )
+    return filters or None
+
+
 from release_notes import ReleaseNotesGenerator, parse_date
 
 @click.group()
@@ -39,7 +125,8 @@ def cli():
 @click.option("--max-issues", "-m", default=100, help="Maximum number of issues to index")
 @click.option("--include-discussions", "-d", is_flag=True, help="Also index discussions")
 @click.option("--state", "-s", type=click.Choice(['open', 'closed', 'all']), default='open', help="Issue state to index (default: open)")
-def index(repository, max_issues, include_discussions, state):
+@click.option("--include-comments", is_flag=True, help="Also index issue comments (same as DEJA_VIEW_COMMENTS=1)")
+def index(repository, max_issues, include_discussions, state, include_comments):
     """Index issues from a GitHub repository"""
     try:
         owner, repo = repository.split("/")
@@ -48,7 +135,7 @@ def index(repository, max_issues, include_discussions, state):
         sys.exit(1)
     
     try:
-        service = SimilarityService()
+        service = SimilarityService(comments=True if include_comments else None)
         
         with Progress(
             SpinnerColumn(),
@@ -62,6 +149,8 @@ def index(repository, max_issues, include_discussions, state):
         message = f"[green]✓[/green] Successfully indexed [bold]{result['indexed']}[/bold] items from {result['repository']}"
         if include_discussions and result.get('discussions', 0) > 0:
             message += f" ({result['issues']} issues, {result['discussions']} discussions)"
+        if 'comments' in result:
+            message += f" and [bold]{result['comments']}[/bold] comments"
         
         console.print(Panel(
             message,
@@ -73,12 +162,106 @@ def index(repository, max_issues, include_discussions, state):
         sys.exit(1)
 
 
+@cli.command("index-org")
+@click.option("--org", help="Index every repository in this organization (or user)")
+@click.option("--repos-file", type=click.Path(exists=True, dir_okay=False), help="File with one OWNER/REPO per line")
+@click.option("--max-issues", "-m", default=100, help="Maximum number of issues to index per repository")
+@click.option("--include-discussions", "-d", is_flag=True, help="Also index GitHub discussions")
+@click.option("--state", type=click.Choice(["open", "closed", "all"]), default="open", help="Issue state to index")
+@click.option("--concurrency", "-c", default=4, help="Repositories indexed at the same time")
+@click.option("--include-forks", is_flag=True, help="Include forked repositories (--org only)")
+@click.option("--include-archived", is_flag=True, help="Include archived repositories (--org only)")
+def index_org(org, repos_file, max_issues, include_discussions, state, concurrency, include_forks, include_archived):
+    """Index many repositories concurrently (an organization or a list)"""
+    if bool(org) == bool(repos_file):
+        console.print("[red]Error: Provide exactly one of --org or --repos-file[/red]")
+        sys.exit(1)
+    
+    try:
+        service = SimilarityService()
+        
+        if org:
+            repositories = list_org_repos(org, service.github_token, include_forks, include_archived)
+        else:
+            repositories = read_repos_file(repos_file)
+        
+        if not repositories:
+            console.print("[yellow]No repositories to index.[/yellow]")
+            return
+        
+        console.print(f"Indexing [bold]{len(repositories)}[/bold] repositories with concurrency {concurrency}...")
+        started = datetime.now()
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeElapsedColumn(),
+            console=console,
+        ) as progress:
+            task = progress.add_task("Indexing repositories...", total=len(repositories))
+            
+            def on_complete(result):
+                status = "[red]✗[/red]" if result.error else "[green]✓[/green]"
+                progress.console.print(f"  {status} {result.repository}: {result.indexed} items in {result.seconds:.1f}s")
+                progress.advance(task)
+            
+            results = index_repositories(
+                service,
+                repositories,
+                max_issues=max_issues,
+                include_discussions=include_discussions,
+                issue_state=state,
+                concurrency=concurrency,
+                budget=RateBudget(service.github_token),
+                on_complete=on_complete
+            )
+        
+        elapsed = (datetime.now() - started).total_seconds()
+        
+        table = Table(title="Indexing Summary")
+        table.add_column("Repository", style="cyan")
+        table.add_column("Items", justify="right")
+        table.add_column("Seconds", justify="right")
+        table.add_column("Items/s", justify="right")
+        table.add_column("Status")
+        
+        for result in results:
+            table.add_row(
+                result.repository,
+                str(result.indexed),
+                f"{result.seconds:.1f}",
+                f"{result.items_per_second:.1f}",
+                f"[red]{result.error}[/red]" if result.error else "[green]ok[/green]"
+            )
+        
+        total_indexed = sum(result.indexed for result in results)
+        failed = [result for result in results if result.error]
+        table.add_row(
+            "[bold]Total",
+            f"[bold]{total_indexed}",
+            f"[bold]{elapsed:.1f}",
+            f"[bold]{total_indexed / elapsed if elapsed > 0 else 0:.1f}",
+            f"[bold]{len(results) - len(failed)}/{len(results)} ok"
+        )
+        console.print(table)
+        
+        if failed:
+            sys.exit(1)
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        sys.exit(1)
+
+
 @cli.command()
 @click.argument("issue_url", metavar="ISSUE_URL")
 @click.option("--top-k", "-k", default=10, help="Number of similar issues to return")
 @click.option("--min-similarity", "-s", default=0.0, help="Minimum similarity score (0-1)")
 @click.option("--label-duplicate", is_flag=True, help="Add 'potential-duplicate' label if high similarity found")
-def find(issue_url, top_k, min_similarity, label_duplicate):
+@click.option("--repos", multiple=True, help="Also search these repositories (owner/repo, comma-separated or repeated)")
+@filter_options
+def find(issue_url, top_k, min_similarity, label_duplicate, repos, state, item_type, labels, created_after, created_before, updated_after, updated_before):
     """Find similar issues to a specific GitHub issue or PR"""
     try:
         parts = issue_url.replace("https://github.com/", "").split("/")
@@ -92,7 +275,10 @@ def find(issue_url, top_k, min_similarity, label_duplicate):
         console.print("[red]Error: Invalid issue/PR URL. Expected format: https://github.com/owner/repo/issues/123 or https://github.com/owner/repo/pull/123[/red]")
         sys.exit(1)
     
+    repositories = parse_repositories(repos)
+    
     try:
+        filters = build_filters(state, item_type, labels, created_after, created_before, updated_after, updated_before)
         service = SimilarityService()
         
         with Progress(
@@ -101,42 +287,14 @@ def find(issue_url, top_k, min_similarity, label_duplicate):
             console=console,
         ) as progress:
             task = progress.add_task("Finding similar issues...", total=None)
-            results = service.find_similar_issues(owner, repo, issue_number, top_k, min_similarity)
+            results = service.find_similar_issues(owner, repo, issue_number, top_k, min_similarity, repositories=repositories, filters=filters)
             progress.update(task, completed=True)
         
         if not results:
             console.print("[yellow]No similar issues found.[/yellow]")
             return
         
-        table = Table(title=f"Similar Issues to #{issue_number}", show_header=True, header_style="bold magenta")
-        table.add_column("#", style="cyan", width=8)
-        table.add_column("Title", style="white")
-        table.add_column("Similarity", justify="right", width=12)
-        table.add_column("State", width=10)
-        table.add_column("Type", width=12)
-        
-        for issue in results:
-            state_style = "green" if issue["state"] == "open" else "red"
-            
-            if issue.get("is_discussion", False):
-                type_emoji = "💬"
-                type_text = "Discussion"
-            elif issue["is_pull_request"]:
-                type_emoji = "🔀"
-                type_text = "PR"
-            else:
-                type_emoji = "🐛"
-                type_text = "Issue"
-            
-            table.add_row(
-                str(issue["number"]),
-                issue["title"][:60] + "..." if len(issue["title"]) > 60 else issue["title"],
-                format_similarity_score(issue["similarity"]),
-                f"[{state_style}]{issue['state']}[/{state_style}]",
-                f"{type_emoji} {type_text}"
-            )
-        
-        console.print(table)
+        print_similar_issues_table(f"Similar Issues to #{issue_number}", results)
         console.print(f"\n[dim]View issues at: https://github.com/{owner}/{repo}/issues[/dim]")
         
         # Check for potential duplicate and label if requested
@@ -145,15 +303,18 @@ def find(issue_url, top_k, min_similarity, label_duplicate):
             if highest_similarity >= 0.9:
                 console.print(f"\n[yellow]High similarity detected ({highest_similarity:.1%})[/yellow]")
                 
-                # Ensure label exists
+                # Creates the label if missing, then labels the issue (same path as bulk labeling)
                 labels_config = {"potential-duplicate": "DC2626"}  # Red
-                service.ensure_labels_exist(owner, repo, labels_config)
+                result = service.apply_labels_bulk(
+                    owner, repo, {issue_number: ["potential-duplicate"]}, labels_config=labels_config
+                )[0]
                 
-                # Add label to the issue
-                if service.add_issue_labels(owner, repo, issue_number, ["potential-duplicate"]):
+                if result["status"] == "applied":
                     console.print(f"[green]✓[/green] Added 'potential-duplicate' label to issue #{issue_number}")
+                elif result["status"] == "skipped":
+                    console.print(f"[dim]-[/dim] Issue #{issue_number} already labeled 'potential-duplicate'")
                 else:
-                    console.print(f"[red]✗[/red] Failed to add label to issue #{issue_number}")
+                    console.print(f"[red]✗[/red] Failed to add label to issue #{issue_number}: {result.get('error', '')}")
             else:
                 console.print(f"\n[dim]Highest similarity ({highest_similarity:.1%}) below duplicate threshold (90%)[/dim]")
         
@@ -162,6 +323,49 @@ def find(issue_url, top_k, min_similarity, label_duplicate):
         sys.exit(1)
 
 
+@cli.command()
+@click.argument("repository", metavar="OWNER/REPO")
+@click.argument("query")
+@click.option("--body", "-b", default="", help="Draft issue body to include in the query")
+@click.option("--top-k", "-k", default=10, help="Number of similar issues to return")
+@click.option("--min-similarity", "-s", default=0.0, help="Minimum similarity score (0-1)")
+@click.option("--repos", multiple=True, help="Also search these repositories (owner/repo, comma-separated or repeated)")
+@filter_options
+def search(repository, query, body, top_k, min_similarity, repos, state, item_type, labels, created_after, created_before, updated_after, updated_before):
+    """Search indexed issues with free text (e.g. a draft issue title)"""
+    try:
+        owner, repo = repository.split("/")
+    except ValueError:
+        console.print("[red]Error: Repository must be in format 'owner/repo'[/red]")
+        sys.exit(1)
+    
+    repositories = parse_repositories(repos)
+    
+    try:
+        filters = build_filters(state, item_type, labels, created_after, created_before, updated_after, updated_before)
+        service = SimilarityService()
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            console=console,
+        ) as progress:
+            task = progress.add_task("Searching similar issues...", total=None)
+            results = service.search_similar_text(owner, repo, query, body, top_k, min_similarity, repositories=repositories, filters=filters)
+            progress.update(task, completed=True)
+        
+        if not results:
+            console.print("[yellow]No similar issues found.[/yellow]")
+            return
+        
+        print_similar_issues_table(f"Issues Similar to \"{query}\"", results)
+        console.print(f"\n[dim]View issues at: https://github.com/{owner}/{repo}/issues[/dim]")
+        
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        sys.exit(1)
+
+
 @cli.command()
 def stats():
     """Show statistics about indexed issues"""
@@ -170,7 +374,12 @@ def stats():
         stats = service.get_stats()
         
         panel_content = f"[bold]Total Issues:[/bold] {stats['total_issues']}\n"
-        panel_content += f"[bold]Repositories:[/bold] {len(stats['repositories'])}\n\n"
+        panel_content += f"[bold]Repositories:[/bold] {len(stats['repositories'])}\n"
+        if 'partitioning' in stats:
+            panel_content += f"[bold]Partitioning:[/bold] {stats['partitioning']} ({stats['partitions']} collections)\n"
+        if stats.get('unmigrated_items'):
+            panel_content += f"[yellow]{stats['unmigrated_items']} items still in the shared collection; run migrate-partitions[/yellow]\n"
+        panel_content += "\n"
         
         if stats['repositories']:
             panel_content += "[bold]Indexed Repositories:[/bold]\n"
@@ -200,6 +409,84 @@ def clear():
         sys.exit(1)
 
 
+@cli.command("migrate-partitions")
+@click.option("--drop-shared", is_flag=True, help="Delete the shared collection once everything is copied")
+def migrate_partitions(drop_shared):
+    """Copy the shared collection into per-repo (or per-owner) partitions"""
+    try:
+        service = SimilarityService()
+        
+        with console.status(f"[bold green]Migrating to {service.partitioning} partitions..."):
+            result = service.migrate_to_partitions(drop_shared=drop_shared)
+        
+        message = f"[green]✓[/green] Migrated [bold]{result['migrated']}[/bold] items into {result['partitions']} {result['partitioning']} partitions"
+        if result["dropped_shared"]:
+            message += " and dropped the shared collection"
+        console.print(message)
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        sys.exit(1)
+
+
+@cli.command("migrate-metadata")
+@click.argument("repository", metavar="[OWNER/REPO]", required=False)
+def migrate_metadata(repository):
+    """Convert metadata indexed before typed fields (all strings) so search filters match it"""
+    try:
+        owner, repo = repository.split("/") if repository else (None, None)
+        service = SimilarityService()
+        
+        with console.status("[bold green]Migrating metadata..."):
+            result = service.migrate_metadata(owner, repo)
+        
+        console.print(f"[green]✓[/green] Migrated [bold]{result['migrated']}[/bold] of {result['scanned']} stored items to typed metadata")
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        sys.exit(1)
+
+
+@cli.command("build-vectors")
+@click.argument("repository", metavar="OWNER/REPO")
+def build_vectors(repository):
+    """Rebuild a repository's local quantized vectors from the stored embeddings"""
+    try:
+        owner, repo = repository.split("/")
+        service = SimilarityService()
+        
+        with console.status(f"[bold green]Copying embeddings for {repository}..."):
+            result = service.build_local_vectors(owner, repo)
+        
+        resident_mb = result["resident_bytes"] / 1e6
+        float32_mb = result["float32_bytes"] / 1e6
+        console.print(
+            f"[green]✓[/green] Built [bold]{result['vectors']}[/bold] {result['quantization']} vectors for {result['repository']} "
+            f"({resident_mb:.1f} MB resident, {float32_mb:.1f} MB as float32)"
+        )
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        sys.exit(1)
+
+
+@cli.command("build-ann")
+@click.argument("repository", metavar="OWNER/REPO")
+def build_ann(repository):
+    """Rebuild a repository's local approximate nearest neighbour index"""
+    try:
+        owner, repo = repository.split("/")
+        service = SimilarityService()
+        
+        with console.status(f"[bold green]Building {service.ann.kind if service.ann else 'ANN'} index for {repository}..."):
+            result = service.build_ann_index(owner, repo)
+        
+        console.print(
+            f"[green]✓[/green] Built {result['index']} index over [bold]{result['vectors']}[/bold] vectors for {result['repository']} "
+            f"from the {result['source']} in {result['seconds']:.1f}s"
+        )
+    except Exception as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        sys.exit(1)
+
+
 @cli.command()
 @click.argument("repository", metavar="OWNER/REPO")
 @click.argument("issue_number", type=int)
@@ -271,7 +558,12 @@ def quick(repository, issue_number, index_first, max_issues, top_k):
 @click.option("--dry-run/--execute", default=True, help="Dry run mode (default) or execute changes")
 @click.option("--output", "-o", help="Output markdown file path")
 @click.option("--add-labels", is_flag=True, help="Add labels to suggested issues")
-def suggest_discussions(repository, min_score, max_suggestions, dry_run, output, add_labels):
+@click.option("--workers", "-w", default=1, help="Worker processes for scoring large repositories")
+@click.option("--mode", type=click.Choice(["heuristic", "embedding"]), default="heuristic",
+              help="Score with text heuristics or stored embeddings")
+@click.option("--label-transport", type=click.Choice(["rest", "graphql"]), default="rest",
+              help="Apply labels with concurrent REST calls or batched GraphQL mutations")
+def suggest_discussions(repository, min_score, max_suggestions, dry_run, output, add_labels, workers, mode, label_transport):
     """Suggest which issues should be GitHub discussions"""
     try:
         owner, repo = repository.split("/")
@@ -288,7 +580,7 @@ def suggest_discussions(repository, min_score, max_suggestions, dry_run, output,
             console=console,
         ) as progress:
             task = progress.add_task("Analyzing issues...", total=None)
-            result = service.suggest_discussions(owner, repo, min_score, max_suggestions, dry_run)
+            result = service.suggest_discussions(owner, repo, min_score, max_suggestions, dry_run, workers=workers, mode=mode)
             progress.update(task, completed=True)
         
         suggestions = result["suggestions"]
@@ -416,10 +708,7 @@ def suggest_discussions(repository, min_score, max_suggestions, dry_run, output,
                 "potential-duplicate": "DC2626"  # Red
             }
             
-            # Ensure labels exist
-            service.ensure_labels_exist(owner, repo, labels_config)
-            
-            labeled_count = 0
+            assignments, current_labels = {}, {}
             for suggestion in suggestions:
                 labels_to_add = []
                 
@@ -431,11 +720,25 @@ def suggest_discussions(repository, min_score, max_suggestions, dry_run, output,
                     labels_to_add.append("discussion")
                 
                 if labels_to_add:
-                    if service.add_issue_labels(owner, repo, suggestion["number"], labels_to_add):
-                        labeled_count += 1
-                        console.print(f"  [green]✓[/green] Added label to issue #{suggestion['number']}: {', '.join(labels_to_add)}")
-                    else:
-                        console.print(f"  [red]✗[/red] Failed to label issue #{suggestion['number']}")
+                    assignments[suggestion["number"]] = labels_to_add
+                    current_labels[suggestion["number"]] = suggestion.get("labels", [])
+            
+            # Creates missing labels, then labels all issues concurrently
+            label_results = service.apply_labels_bulk(
+                owner, repo, assignments, current_labels=current_labels, labels_config=labels_config,
+                transport=label_transport
+            )
+            
+            labeled_count = 0
+            for result in label_results:
+                if result["status"] == "applied":
+                    labeled_count += 1
+                    console.print(f"  [green]✓[/green] Added label to issue #{result['number']}: {', '.join(result['labels'])}")
+                elif result["status"] == "skipped":
+                    labeled_count += 1
+                    console.print(f"  [dim]-[/dim] Issue #{result['number']} already labeled")
+                else:
+                    console.print(f"  [red]✗[/red] Failed to label issue #{result['number']}: {result.get('error', '')}")
             
             console.print(f"\n[green]Successfully labeled {labeled_count} issues[/green]")
         elif add_labels and dry_run:
@@ -451,6 +754,65 @@ def suggest_discussions(repository, min_score, max_suggestions, dry_run, output,
         sys.exit(1)
 
 
+def _find_issue_duplicates(service, owner, repo, repository, issue, threshold, max_duplicates=3):
+    """Query the index for one issue's closest matches above `threshold` (None if there are none)"""
+    query_text = issue['document'] or f"{issue['title']} {issue['body']}"
+    results = service.query_similar_batch(owner, repo, [query_text], n_results=10)  # Get more results to find good matches
+    
+    similar = []
+    if results["ids"] and results["ids"][0]:
+        for i, doc_id in enumerate(results["ids"][0]):
+            metadata = results["metadatas"][0][i] if results["metadatas"] else {}
+            # Chunk matches count for their parent issue
+            doc_id = metadata.get("parent_id", doc_id)
+            
+            # Parse issue number from doc_id
+            try:
+                if '/issues/' in doc_id:
+                    doc_number = int(doc_id.split('/issues/')[-1])
+                else:
+                    doc_number = int(doc_id.split("_")[-1])
+            except:
+                continue
+            
+            # Skip self-match and further chunks of an issue already listed
+            if doc_number == issue['number'] or any(match['number'] == doc_number for match in similar):
+                continue
+            
+            distance = results["distances"][0][i] if results["distances"] else 1.0
+            similarity = 1 - (distance / 2)  # Convert distance to similarity
+            
+            # Results come back closest first, so later ones can't beat these
+            if similarity < threshold:
+                break
+            
+            similar.append({
+                'number': doc_number,
+                'title': metadata.get('title', 'Unknown'),
+                'url': metadata.get('url', f"https://github.com/{repository}/issues/{doc_number}"),
+                'state': metadata.get('state', 'unknown'),
+                'similarity': similarity
+            })
+            if len(similar) >= max_duplicates:
+                break
+    
+    if not similar:
+        return None
+    
+    return {
+        'issue': {
+            'number': issue['number'],
+            'title': issue['title'],
+            'url': issue['url'],
+            'state': issue['state'],
+            'created_at': issue['created_at'],
+            'labels': issue['labels']
+        },
+        'duplicates': similar,
+        'max_similarity': similar[0]['similarity']
+    }
+
+
 @cli.command()
 @click.argument('repository')
 @click.option('-t', '--threshold', default=0.8, help='Similarity threshold for duplicates (0-1)')
@@ -470,27 +832,30 @@ def find_duplicates(repository, threshold, output, state):
         
         owner, repo = parts
         
+        # The report lists at most 20 very-high and 30 high matches, so only those
+        # are kept (bounded heaps); everything else is just counted
+        very_high = TopK(20, key=lambda d: d['max_similarity'])
+        high = TopK(30, key=lambda d: d['max_similarity'])
+        counts = {'very_high': 0, 'high': 0, 'total': 0}
+        indexed = 0
+        analyzed = 0
+        
         with console.status(f"[bold green]Finding duplicate issues in {repository} from indexed data..."):
-            # Get documents from the collection (Chroma Cloud has a limit of 100)
-            # Note: To analyze all 986 issues, you'd need to implement pagination
-            # For now, we'll work with the limit of 100
-            all_docs = service.collection.get(
-                where={"$and": [{"owner": owner}, {"repo": repo}]}
-                # Default limit is 100 due to Chroma Cloud quota
-            )
-            
-            if not all_docs["ids"]:
-                console.print(f"[red]No indexed issues found for {repository}[/red]")
-                console.print("[yellow]Please run: cli.py index {repository}[/yellow]")
-                sys.exit(1)
+            # Stream documents page by page (Chroma Cloud caps each get at 100)
+            pages = service._iter_repo_pages(owner, repo, include=["metadatas", "documents"])
             
-            # Filter by state if needed
-            issues_to_analyze = []
-            for i, doc_id in enumerate(all_docs["ids"]):
-                metadata = all_docs["metadatas"][i] if all_docs["metadatas"] else {}
-                issue_state = metadata.get("state", "unknown")
-                
-                if state == "all" or issue_state == state:
+            for page in pages:
+                for i, doc_id in enumerate(page["ids"]):
+                    metadata = page["metadatas"][i] if page.get("metadatas") else {}
+                    # Chunk vectors of long bodies are matched through their parent
+                    if "parent_id" in metadata:
+                        continue
+                    indexed += 1
+                    issue_state = metadata.get("state", "unknown")
+                    
+                    if state != "all" and issue_state != state:
+                        continue
+                    
                     # Parse issue number from doc_id (format: owner_repo_number or full URL)
                     try:
                         if '/issues/' in doc_id:
@@ -499,8 +864,8 @@ def find_duplicates(repository, threshold, output, state):
                             issue_number = int(doc_id.split("_")[-1])
                     except:
                         continue
-                        
-                    issues_to_analyze.append({
+                    
+                    issue = {
                         'id': doc_id,
                         'number': issue_number,
                         'title': metadata.get('title', ''),
@@ -509,91 +874,49 @@ def find_duplicates(repository, threshold, output, state):
                         'url': metadata.get('url', ''),
                         'created_at': metadata.get('created_at', ''),
                         'labels': metadata.get('labels', '') if isinstance(metadata.get('labels'), str) else metadata.get('labels', []),
-                        'document': all_docs["documents"][i] if all_docs["documents"] else ''
-                    })
-            
-            console.print(f"[cyan]Analyzing {len(issues_to_analyze)} {state} issues from Chroma index...[/cyan]")
-            
-            # Find duplicates for each issue
-            duplicates_found = []
-            
-            for idx, issue in enumerate(issues_to_analyze):
-                if (idx + 1) % 50 == 0:
-                    console.print(f"[dim]Progress: {idx + 1}/{len(issues_to_analyze)} issues analyzed...[/dim]")
-                
-                # Search for similar issues
-                query_text = issue['document'] or f"{issue['title']} {issue['body']}"
-                results = service.collection.query(
-                    query_texts=[query_text],
-                    n_results=10,  # Get more results to find good matches
-                    where={"$and": [{"owner": owner}, {"repo": repo}]}
-                )
-                
-                similar = []
-                if results["ids"] and results["ids"][0]:
-                    for i, doc_id in enumerate(results["ids"][0]):
-                        # Parse issue number from doc_id
-                        try:
-                            if '/issues/' in doc_id:
-                                doc_number = int(doc_id.split('/issues/')[-1])
-                            else:
-                                doc_number = int(doc_id.split("_")[-1])
-                        except:
-                            continue
-                            
-                        # Skip self-match
-                        if doc_number == issue['number']:
-                            continue
-                        
-                        metadata = results["metadatas"][0][i] if results["metadatas"] else {}
-                        distance = results["distances"][0][i] if results["distances"] else 1.0
-                        similarity = 1 - (distance / 2)  # Convert distance to similarity
-                        
-                        if similarity >= threshold:
-                            similar.append({
-                                'number': doc_number,
-                                'title': metadata.get('title', 'Unknown'),
-                                'url': metadata.get('url', f"https://github.com/{repository}/issues/{doc_number}"),
-                                'state': metadata.get('state', 'unknown'),
-                                'similarity': similarity
-                            })
-                
-                if similar:
-                    duplicates_found.append({
-                        'issue': {
-                            'number': issue['number'],
-                            'title': issue['title'],
-                            'url': issue['url'],
-                            'state': issue['state'],
-                            'created_at': issue['created_at'],
-                            'labels': issue['labels']
-                        },
-                        'duplicates': similar[:3],  # Keep top 3 duplicates
-                        'max_similarity': max(s['similarity'] for s in similar)
-                    })
-        
-        # Sort by max similarity
-        duplicates_found.sort(key=lambda x: x['max_similarity'], reverse=True)
+                        'document': page["documents"][i] if page.get("documents") else ''
+                    }
+                    
+                    analyzed += 1
+                    if analyzed % 50 == 0:
+                        console.print(f"[dim]Progress: {analyzed} issues analyzed...[/dim]")
+                    
+                    duplicate = _find_issue_duplicates(service, owner, repo, repository, issue, threshold)
+                    if duplicate is None:
+                        continue
+                    
+                    counts['total'] += 1
+                    if duplicate['max_similarity'] >= 0.9:
+                        counts['very_high'] += 1
+                        very_high.push(duplicate)
+                    elif duplicate['max_similarity'] >= 0.8:
+                        counts['high'] += 1
+                        high.push(duplicate)
+        
+        if not indexed:
+            console.print(f"[red]No indexed issues found for {repository}[/red]")
+            console.print("[yellow]Please run: cli.py index {repository}[/yellow]")
+            sys.exit(1)
+        
+        console.print(f"[cyan]Analyzed {analyzed} {state} issues from Chroma index[/cyan]")
+        very_high = very_high.items()
+        high = high.items()
         
         # Generate markdown report
         markdown_content = f"# Duplicate Issues Report for {repository}\n\n"
         markdown_content += f"**Analysis Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        markdown_content += f"**Issues Analyzed:** {len(issues_to_analyze)} {state} issues\n"
-        markdown_content += f"**Potential Duplicates Found:** {len(duplicates_found)}\n"
+        markdown_content += f"**Issues Analyzed:** {analyzed} {state} issues\n"
+        markdown_content += f"**Potential Duplicates Found:** {counts['total']}\n"
         markdown_content += f"**Similarity Threshold:** {threshold * 100:.0f}%\n\n"
         
-        if not duplicates_found:
+        if not counts['total']:
             markdown_content += "_No potential duplicates found with the given threshold._\n"
         else:
-            # Group by similarity level
-            very_high = [d for d in duplicates_found if d['max_similarity'] >= 0.9]
-            high = [d for d in duplicates_found if 0.8 <= d['max_similarity'] < 0.9]
-            
             if very_high:
                 markdown_content += "## 🔴 Very High Similarity (≥90%)\n\n"
                 markdown_content += "These issues are very likely duplicates.\n\n"
                 
-                for dup in very_high[:20]:  # Limit to first 20
+                for dup in very_high:  # Top 20
                     issue = dup['issue']
                     markdown_content += f"### [#{issue['number']}: {issue['title']}]({issue['url']})\n"
                     markdown_content += f"**State:** {issue['state']} | "
@@ -621,7 +944,7 @@ def find_duplicates(repository, threshold, output, state):
                 markdown_content += "| Issue | Potential Duplicates | Max Similarity |\n"
                 markdown_content += "|-------|---------------------|----------------|\n"
                 
-                for dup in high[:30]:  # Limit to first 30
+                for dup in high:  # Top 30
                     issue = dup['issue']
                     issue_link = f"[#{issue['number']}]({issue['url']})"
                     
@@ -634,18 +957,17 @@ def find_duplicates(repository, threshold, output, state):
                     markdown_content += f"| {issue_link} | {', '.join(dup_links)} | {max_sim} |\n"
         
         markdown_content += "\n## Summary\n\n"
-        markdown_content += f"- **Very High Similarity (≥90%):** {len([d for d in duplicates_found if d['max_similarity'] >= 0.9])} issues\n"
-        markdown_content += f"- **High Similarity (80-89%):** {len([d for d in duplicates_found if 0.8 <= d['max_similarity'] < 0.9])} issues\n"
-        markdown_content += f"- **Total Potential Duplicates:** {len(duplicates_found)} issues\n\n"
+        markdown_content += f"- **Very High Similarity (≥90%):** {counts['very_high']} issues\n"
+        markdown_content += f"- **High Similarity (80-89%):** {counts['high']} issues\n"
+        markdown_content += f"- **Total Potential Duplicates:** {counts['total']} issues\n\n"
         
         # Add quick actions
-        if duplicates_found:
+        if counts['total']:
             markdown_content += "## Quick Actions\n\n"
             markdown_content += "### Add 'potential-duplicate' label to high-confidence duplicates:\n"
             markdown_content += "```bash\n"
-            for dup in duplicates_found[:10]:
-                if dup['max_similarity'] >= 0.9:
-                    markdown_content += f"gh issue edit {dup['issue']['number']} --add-label 'potential-duplicate' -R {repository}\n"
+            for dup in very_high[:10]:
+                markdown_content += f"gh issue edit {dup['issue']['number']} --add-label 'potential-duplicate' -R {repository}\n"
             markdown_content += "```\n\n"
         
         markdown_content += "---\n"
@@ -662,13 +984,13 @@ def find_duplicates(repository, threshold, output, state):
         table.add_column("Similarity", style="cyan")
         table.add_column("Count", justify="right")
         
-        table.add_row("≥90% (Very High)", str(len([d for d in duplicates_found if d['max_similarity'] >= 0.9])))
-        table.add_row("80-89% (High)", str(len([d for d in duplicates_found if 0.8 <= d['max_similarity'] < 0.9])))
-        table.add_row("[bold]Total", f"[bold]{len(duplicates_found)}")
+        table.add_row("≥90% (Very High)", str(counts['very_high']))
+        table.add_row("80-89% (High)", str(counts['high']))
+        table.add_row("[bold]Total", f"[bold]{counts['total']}")
         
         console.print(table)
         
-        if duplicates_found:
+        if counts['total']:
             console.print(f"\n[yellow]Tip:[/yellow] Review the report at {output} to identify and close duplicate issues")
         
     except Exception as e:
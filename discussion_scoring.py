@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Discussion Scoring
+Heuristics for deciding whether an issue would be better as a discussion.
+
+Each pattern group is compiled once into a single alternation regex, and the
+keyword lists share one lookahead automaton, so an issue is scored in a couple
+of passes over its text instead of one `re.search` per pattern.
+
+`DiscussionScorer.score_batch` scores a whole repository from columnar
+inputs: documents are joined into one corpus, each pattern group runs over
+it once, and the features are combined as numpy masks into a score array
+with reasons encoded as `DiscussionReason` bit flags. `score_shard` is the
+process-pool entry point for scoring large repositories in parallel.
+
+`CentroidClassifier` is the embedding alternative: it compares stored issue
+vectors against "discussion-like" and "bug-like" centroids, with no regex
+scanning at all.
+"""
+
+import re
+from bisect import bisect_right
+from enum import IntFlag
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from metadata_schema import read_labels
+from topk import TopK
+
+
+# Marks the start of each document when a batch is scored as one corpus.
+# Documents are joined with newlines, which `.` never crosses.
+DOC_START = "\x02"
+
+
+class DiscussionReason(IntFlag):
+    """Bit flags for the reasons behind a batch discussion score"""
+    QUESTION = 1
+    FEATURE_REQUEST = 2
+    PROPOSAL = 4
+    DISCUSSION_LANGUAGE = 8
+    DISCUSSION_LABEL = 16
+    DISCUSSION_KEYWORDS = 32
+    BUG_KEYWORD = 64
+    NON_BUG_TITLE = 128
+    TITLE_FORMAT = 256
+
+
+@dataclass
+class BatchScores:
+    """Columnar result of DiscussionScorer.score_batch"""
+    scores: np.ndarray
+    flags: np.ndarray
+    matched_labels: List[Optional[str]]
+    bug_keyword_index: np.ndarray
+    indicator_index: np.ndarray
+    scorer: "DiscussionScorer"
+
+    def reasons(self, i: int) -> List[str]:
+        """Decode the reason flags for row i into the same strings as DiscussionScorer.score"""
+        flags = DiscussionReason(int(self.flags[i]))
+        scorer = self.scorer
+        reasons = []
+        if DiscussionReason.QUESTION in flags:
+            reasons.append("Contains question pattern")
+        if DiscussionReason.FEATURE_REQUEST in flags:
+            reasons.append("Feature request pattern")
+        if DiscussionReason.PROPOSAL in flags:
+            reasons.append("RFC/Proposal pattern")
+        if DiscussionReason.DISCUSSION_LANGUAGE in flags:
+            reasons.append("Discussion-oriented language")
+        if DiscussionReason.DISCUSSION_LABEL in flags:
+            reasons.append(f"Has '{self.matched_labels[i]}' label")
+        if DiscussionReason.DISCUSSION_KEYWORDS in flags:
+            reasons.append("Contains discussion keywords")
+        if DiscussionReason.BUG_KEYWORD in flags:
+            reasons.append(f"Possible bug report: '{scorer.bug_keywords[self.bug_keyword_index[i]]}'")
+        if DiscussionReason.NON_BUG_TITLE in flags:
+            reasons.append(f"Non-bug indicator in title: '{scorer.non_bug_indicators[self.indicator_index[i]]}'")
+        if DiscussionReason.TITLE_FORMAT in flags:
+            reasons.append("Title suggests discussion format")
+        return reasons
+
+
+def _combine_patterns(patterns: List[str], flags: int = re.IGNORECASE) -> "re.Pattern":
+    """One regex that matches if any of the patterns matches"""
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), flags)
+
+
+def _combine_corpus_patterns(patterns: List[str]) -> "re.Pattern":
+    """Like _combine_patterns, for a joined corpus of lowercased documents.
+
+    `^` anchors to the start of each document, and matching is case-sensitive
+    since the corpus is already lowercased (IGNORECASE roughly doubles the cost).
+    """
+    rewritten = [DOC_START + p[1:] if p.startswith("^") else p for p in patterns]
+    return _combine_patterns(rewritten, flags=0)
+
+
+def _keyword_automaton(keywords: Iterable[str]) -> Tuple["re.Pattern", Dict[str, List[str]]]:
+    """Zero-width lookahead regex reporting every keyword occurrence (substring semantics).
+
+    Longer keywords are tried first; shorter keywords that are prefixes of a
+    match are recovered from the returned prefix map.
+    """
+    unique = sorted(set(keywords), key=len, reverse=True)
+    regex = re.compile("(?=(" + "|".join(re.escape(k) for k in unique) + "))")
+    prefixes = {k: [p for p in unique if p != k and k.startswith(p)] for k in unique}
+    return regex, prefixes
+
+
+class DiscussionScorer:
+    """Scores issues for how likely they should be discussions"""
+
+    # Discussion suggestion patterns - more aggressive matching
+    question_patterns = [
+        r'^(how|what|why|when|where|which|who|can|could|should|would|will|is|are|do|does|did)\b',
+        r'\?',
+        r'\b(help|guidance|advice|opinion|thoughts|suggestions?|input|feedback)\b',
+        r'\b(best practices?|recommendations?|approach|strategy|way)\b',
+        r'\b(anyone|somebody|someone)\b.*\b(know|tried|experience|success)\b',
+        r'\b(how to|how do|how can|how should)\b',
+        r'\b(what.*think|thoughts on|opinions on)\b'
+    ]
+
+    feature_patterns = [
+        r'\b(feature request|enhancement|suggestion|proposal|idea|rfc)\b',
+        r'\b(would like|wish|hope|want|need|desire)\b.*\b(feature|functionality|capability|ability|option)\b',
+        r'\b(add|implement|support|include|introduce|create)\b.*\b(feature|option|ability|functionality|support|capability)\b',
+        r'\b(it would be|would be nice|would be great|would be helpful)\b',
+        r'\b(request|requesting)\b.*\b(feature|enhancement|addition)\b',
+        r'\b(can we|could we|should we)\b.*\b(add|implement|support|have)\b',
+        r'\b(feature|functionality|capability)\b.*\b(request|suggestion|proposal)\b'
+    ]
+
+    discussion_labels = [
+        'question', 'help wanted', 'discussion', 'feature request',
+        'enhancement', 'idea', 'proposal', 'feedback', 'opinions',
+        'rfc', 'design', 'brainstorming', 'suggestion'
+    ]
+
+    # RFC/Proposal patterns
+    proposal_patterns = [
+        r'\b(rfc|proposal|design doc|spec|specification)\b',
+        r'\b(propose|proposing|suggest|suggesting)\b',
+        r'\b(approach|solution|design|architecture)\b.*\b(discussion|feedback|thoughts)\b'
+    ]
+
+    # Discussion-oriented phrases
+    discussion_phrases = [
+        r'\b(open to|looking for|seeking)\b.*\b(feedback|input|thoughts|suggestions)\b',
+        r'\b(brainstorm|discuss|explore|consider)\b',
+        r'\b(community|everyone|folks|people)\b.*\b(think|opinion|experience)\b',
+        r'\b(share.*experience|lessons learned|what.*worked)\b'
+    ]
+
+    # Discussion-worthy keywords (substring matches, counted once each)
+    discussion_keywords = [
+        'opinion', 'thoughts', 'feedback', 'advice', 'best practice',
+        'recommendation', 'approach', 'strategy', 'philosophy', 'design decision',
+        'brainstorm', 'explore', 'consider', 'community', 'input', 'guidance',
+        'experience', 'lessons', 'workflow', 'process', 'methodology'
+    ]
+
+    bug_keywords = ['crash', 'exception', 'traceback', 'stacktrace', 'segfault']
+
+    non_bug_indicators = ['feature', 'enhancement', 'suggestion', 'idea', 'proposal', 'rfc', 'discussion']
+
+    # Title patterns that suggest discussion
+    title_discussion_patterns = [
+        r'^(rfc|proposal|idea|suggestion|enhancement|feature)[:.]',
+        r'\[(rfc|proposal|idea|suggestion|enhancement|feature)\]',
+        r'\b(thoughts|feedback|opinions)\b.*\?'
+    ]
+
+    def __init__(self):
+        self.question_re = _combine_patterns(self.question_patterns)
+        self.feature_re = _combine_patterns(self.feature_patterns)
+        self.proposal_re = _combine_patterns(self.proposal_patterns)
+        self.discussion_phrase_re = _combine_patterns(self.discussion_phrases)
+        self.title_discussion_re = _combine_patterns(self.title_discussion_patterns)
+
+        self._corpus_question_re = _combine_corpus_patterns(self.question_patterns)
+        self._corpus_feature_re = _combine_corpus_patterns(self.feature_patterns)
+        self._corpus_proposal_re = _combine_corpus_patterns(self.proposal_patterns)
+        self._corpus_discussion_phrase_re = _combine_corpus_patterns(self.discussion_phrases)
+        self._corpus_title_discussion_re = _combine_corpus_patterns(self.title_discussion_patterns)
+
+        self.discussion_label_set = {label.lower() for label in self.discussion_labels}
+        self._discussion_keyword_set = set(self.discussion_keywords)
+        self._body_keyword_re, self._body_keyword_prefixes = _keyword_automaton(
+            self.discussion_keywords + self.bug_keywords
+        )
+        self._title_indicator_re, self._title_indicator_prefixes = _keyword_automaton(
+            self.non_bug_indicators
+        )
+
+    @staticmethod
+    def _find_keywords(regex: "re.Pattern", prefixes: Dict[str, List[str]], text: str) -> Set[str]:
+        found = set()
+        for match in regex.finditer(text):
+            keyword = match.group(1)
+            found.add(keyword)
+            found.update(prefixes[keyword])
+        return found
+
+    def score(self, title: str, body: Optional[str], labels: List[str], state: str) -> Tuple[float, List[str]]:
+        """Calculate how likely an issue should be a discussion - more aggressive scoring"""
+        score = 0.0
+        reasons = []
+
+        title_lower = title.lower()
+        body_lower = (body or "").lower()
+        combined_text = f"{title_lower} {body_lower}"
+
+        # Check question patterns (increased weight)
+        if self.question_re.search(combined_text):
+            score += 0.4
+            reasons.append("Contains question pattern")
+
+        # Check feature request patterns (increased weight)
+        if self.feature_re.search(combined_text):
+            score += 0.35
+            reasons.append("Feature request pattern")
+
+        # Check RFC/Proposal patterns
+        if self.proposal_re.search(combined_text):
+            score += 0.45
+            reasons.append("RFC/Proposal pattern")
+
+        # Check discussion-oriented phrases
+        if self.discussion_phrase_re.search(combined_text):
+            score += 0.3
+            reasons.append("Discussion-oriented language")
+
+        # Check labels (increased weight)
+        for label in labels:
+            if label.lower() in self.discussion_label_set:
+                score += 0.5
+                reasons.append(f"Has '{label}' label")
+                break
+
+        # One pass finds both discussion and bug keywords
+        found = self._find_keywords(self._body_keyword_re, self._body_keyword_prefixes, combined_text)
+
+        # Scale score based on number of keywords found
+        keyword_count = len(found & self._discussion_keyword_set)
+        if keyword_count > 0:
+            reasons.append("Contains discussion keywords")
+            score += min(0.3, keyword_count * 0.1)
+
+        # Reduced penalty for bug-related keywords (they might still be feature requests)
+        for keyword in self.bug_keywords:
+            if keyword in found:
+                score -= 0.15
+                reasons.append(f"Possible bug report: '{keyword}'")
+                break
+
+        # Check if issue title suggests it's not a bug
+        indicators = self._find_keywords(self._title_indicator_re, self._title_indicator_prefixes, title_lower)
+        for indicator in self.non_bug_indicators:
+            if indicator in indicators:
+                score += 0.2
+                reasons.append(f"Non-bug indicator in title: '{indicator}'")
+                break
+
+        # Bonus for open issues (closed issues less likely to be converted)
+        if state == 'open':
+            score += 0.15
+
+        # Additional scoring for title patterns that suggest discussion
+        if self.title_discussion_re.search(title_lower):
+            score += 0.25
+            reasons.append("Title suggests discussion format")
+
+        return max(0.0, min(1.0, score)), reasons
+
+    @staticmethod
+    def _build_corpus(texts: Sequence[str]) -> Tuple[str, np.ndarray]:
+        """Join documents into one string and return it with each document's start offset"""
+        parts = [DOC_START + text.replace(DOC_START, " ") for text in texts]
+        lengths = np.fromiter((len(part) + 1 for part in parts), dtype=np.int64, count=len(parts))
+        offsets = np.zeros(len(parts), dtype=np.int64)
+        if len(parts) > 1:
+            offsets[1:] = np.cumsum(lengths[:-1])
+        return "\n".join(parts), offsets
+
+    @staticmethod
+    def _match_mask(regex: "re.Pattern", corpus: str, offsets: np.ndarray) -> np.ndarray:
+        """Boolean mask of documents with at least one match"""
+        mask = np.zeros(len(offsets), dtype=bool)
+        search = regex.search
+        starts = offsets.tolist()
+        ends = starts[1:] + [len(corpus)]
+        pos = 0
+        # Only the first match per document matters, so resume at the next document
+        while True:
+            match = search(corpus, pos)
+            if match is None:
+                break
+            doc = bisect_right(starts, match.start()) - 1
+            mask[doc] = True
+            pos = ends[doc]
+        return mask
+
+    @staticmethod
+    def _keyword_hits(
+        regex: "re.Pattern",
+        prefixes: Dict[str, List[str]],
+        keyword_ids: Dict[str, int],
+        corpus: str,
+        offsets: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(document index, keyword id) for every keyword occurrence in the corpus"""
+        positions, ids = [], []
+        for match in regex.finditer(corpus):
+            keyword = match.group(1)
+            for hit in [keyword] + prefixes[keyword]:
+                positions.append(match.start())
+                ids.append(keyword_ids[hit])
+        docs = np.searchsorted(offsets, np.asarray(positions, dtype=np.int64), side="right") - 1
+        return docs, np.asarray(ids, dtype=np.int64)
+
+    def score_batch(
+        self,
+        titles: Sequence[str],
+        bodies: Sequence[Optional[str]],
+        labels: Sequence[List[str]],
+        states: Sequence[str]
+    ) -> BatchScores:
+        """Score many issues at once from columnar inputs.
+
+        Gives the same scores and reasons as calling `score` per issue, but runs
+        each pattern group once over the joined corpus and computes all
+        features as numpy masks.
+        """
+        n = len(titles)
+        titles_lower = [title.lower() for title in titles]
+        combined = [f"{title} {(body or '').lower()}" for title, body in zip(titles_lower, bodies)]
+
+        corpus, offsets = self._build_corpus(combined)
+        title_corpus, title_offsets = self._build_corpus(titles_lower)
+
+        scores = np.zeros(n, dtype=np.float64)
+        flags = np.zeros(n, dtype=np.uint16)
+
+        # Pattern groups, in the same order and weights as score()
+        for regex, weight, flag in (
+            (self._corpus_question_re, 0.4, DiscussionReason.QUESTION),
+            (self._corpus_feature_re, 0.35, DiscussionReason.FEATURE_REQUEST),
+            (self._corpus_proposal_re, 0.45, DiscussionReason.PROPOSAL),
+            (self._corpus_discussion_phrase_re, 0.3, DiscussionReason.DISCUSSION_LANGUAGE),
+        ):
+            mask = self._match_mask(regex, corpus, offsets)
+            scores += np.where(mask, weight, 0.0)
+            flags[mask] |= flag
+
+        # Labels: first label (in issue order) that is a discussion label
+        flat_labels = [label for row in labels for label in row]
+        label_docs = np.repeat(np.arange(n), [len(row) for row in labels])
+        label_hits = np.fromiter(
+            (label.lower() in self.discussion_label_set for label in flat_labels), dtype=bool, count=len(flat_labels)
+        )
+        first_label = np.full(n, len(flat_labels), dtype=np.int64)
+        np.minimum.at(first_label, label_docs[label_hits], np.flatnonzero(label_hits))
+        has_label = first_label < len(flat_labels)
+        scores += np.where(has_label, 0.5, 0.0)
+        flags[has_label] |= DiscussionReason.DISCUSSION_LABEL
+        matched_labels = [flat_labels[i] if has else None for i, has in zip(first_label, has_label)]
+
+        # Discussion and bug keywords share one automaton pass
+        keyword_list = self.discussion_keywords + self.bug_keywords
+        keyword_ids = {keyword: i for i, keyword in enumerate(keyword_list)}
+        docs, ids = self._keyword_hits(self._body_keyword_re, self._body_keyword_prefixes, keyword_ids, corpus, offsets)
+        n_discussion = len(self.discussion_keywords)
+
+        is_discussion_hit = ids < n_discussion
+        pairs = np.unique(docs[is_discussion_hit] * len(keyword_list) + ids[is_discussion_hit])
+        keyword_counts = np.bincount(pairs // len(keyword_list), minlength=n)
+        has_keywords = keyword_counts > 0
+        scores += np.where(has_keywords, np.minimum(0.3, keyword_counts * 0.1), 0.0)
+        flags[has_keywords] |= DiscussionReason.DISCUSSION_KEYWORDS
+
+        bug_keyword_index = np.full(n, len(self.bug_keywords), dtype=np.int64)
+        np.minimum.at(bug_keyword_index, docs[~is_discussion_hit], ids[~is_discussion_hit] - n_discussion)
+        has_bug = bug_keyword_index < len(self.bug_keywords)
+        scores -= np.where(has_bug, 0.15, 0.0)
+        flags[has_bug] |= DiscussionReason.BUG_KEYWORD
+        bug_keyword_index[~has_bug] = -1
+
+        # Title-only checks
+        indicator_ids = {indicator: i for i, indicator in enumerate(self.non_bug_indicators)}
+        docs, ids = self._keyword_hits(
+            self._title_indicator_re, self._title_indicator_prefixes, indicator_ids, title_corpus, title_offsets
+        )
+        indicator_index = np.full(n, len(self.non_bug_indicators), dtype=np.int64)
+        np.minimum.at(indicator_index, docs, ids)
+        has_indicator = indicator_index < len(self.non_bug_indicators)
+        scores += np.where(has_indicator, 0.2, 0.0)
+        flags[has_indicator] |= DiscussionReason.NON_BUG_TITLE
+        indicator_index[~has_indicator] = -1
+
+        scores += np.where(np.asarray(states, dtype=object) == 'open', 0.15, 0.0)
+
+        title_mask = self._match_mask(self._corpus_title_discussion_re, title_corpus, title_offsets)
+        scores += np.where(title_mask, 0.25, 0.0)
+        flags[title_mask] |= DiscussionReason.TITLE_FORMAT
+
+        return BatchScores(
+            scores=np.clip(scores, 0.0, 1.0),
+            flags=flags,
+            matched_labels=matched_labels,
+            bug_keyword_index=bug_keyword_index,
+            indicator_index=indicator_index,
+            scorer=self
+        )
+
+
+class CentroidClassifier:
+    """Scores embeddings by how much closer they are to discussions than to bug reports.
+
+    Centroids are seeded from the repository itself: existing discussions and
+    issues carrying a discussion label are discussion-like, issues labeled as
+    bugs are bug-like. The score is sigmoid(sharpness * (sim_discussion - sim_bug)).
+    """
+
+    def __init__(self, discussion_labels: Iterable[str] = DiscussionScorer.discussion_labels, sharpness: float = 10.0):
+        self.discussion_label_set = {label.lower() for label in discussion_labels}
+        self.sharpness = sharpness
+        self.centroids: Optional[np.ndarray] = None
+
+    def seed_masks(self, metadatas: Sequence[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """(discussion-like, bug-like) masks over stored metadata rows"""
+        discussion_like = np.zeros(len(metadatas), dtype=bool)
+        bug_like = np.zeros(len(metadatas), dtype=bool)
+        for i, metadata in enumerate(metadatas):
+            labels = {label.lower() for label in read_labels(metadata) if label}
+            if metadata.get("type") == "discussion" or labels & self.discussion_label_set:
+                discussion_like[i] = True
+            elif any("bug" in label for label in labels):
+                bug_like[i] = True
+        return discussion_like, bug_like
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def fit(self, embeddings: np.ndarray, discussion_like: np.ndarray, bug_like: np.ndarray) -> "CentroidClassifier":
+        if not discussion_like.any() or not bug_like.any():
+            raise ValueError(
+                "Embedding mode needs at least one discussion (or discussion-labeled issue) "
+                "and one bug-labeled issue to seed its centroids"
+            )
+
+        embeddings = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        self.centroids = self._normalize(np.stack([
+            embeddings[discussion_like].mean(axis=0),
+            embeddings[bug_like].mean(axis=0)
+        ]))
+        return self
+
+    def similarities(self, embeddings: np.ndarray) -> np.ndarray:
+        """(n, 2) cosine similarities to the discussion and bug centroids"""
+        if self.centroids is None:
+            raise ValueError("CentroidClassifier must be fit before scoring")
+        return self._normalize(np.asarray(embeddings, dtype=np.float32)) @ self.centroids.T
+
+    def score(self, embeddings: np.ndarray) -> np.ndarray:
+        similarities = self.similarities(embeddings)
+        margin = similarities[:, 0] - similarities[:, 1]
+        return 1.0 / (1.0 + np.exp(-self.sharpness * margin))
+
+
+# Scorer reused by every shard a pool worker process handles
+_shard_scorer: Optional[DiscussionScorer] = None
+
+
+def score_shard(
+    titles: Sequence[str],
+    bodies: Sequence[Optional[str]],
+    labels: Sequence[List[str]],
+    states: Sequence[str],
+    min_score: float,
+    limit: int,
+    scorer: Optional[DiscussionScorer] = None
+) -> List[Tuple[float, int, List[str]]]:
+    """Score one shard of issues and keep its top `limit` candidates.
+
+    Returns (score, row index within the shard, reasons), ordered by rounded
+    score and then row index, so that merging shard results in row order
+    gives the same order as a stable sort over the whole repository.
+    """
+    global _shard_scorer
+    if scorer is None:
+        if _shard_scorer is None:
+            _shard_scorer = DiscussionScorer()
+        scorer = _shard_scorer
+
+    batch = scorer.score_batch(titles, bodies, labels, states)
+    top = TopK(limit, key=lambda candidate: round(candidate[0], 3))
+    for i in np.flatnonzero(batch.scores >= min_score):
+        top.push((float(batch.scores[i]), int(i)))
+    # Reasons are only decoded for the rows that made the cut
+    return [(score, i, batch.reasons(i)) for score, i in top.items()]
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Error Signatures
+Extracts normalized fingerprints from stack traces and error messages so
+issues reporting the same failure can be matched with a hash lookup:
+- trace: exception type plus the innermost frames (file and function, no
+  line numbers or directories) from Python, JavaScript and Java traces
+- exception: exception type plus its message with numbers, quoted values,
+  hex addresses and paths replaced by placeholders
+- code: specific error codes such as ERR_SSL_PROTOCOL, TS2345 or ORA-00942
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from local_index import LocalIndexStore
+
+SIGNATURE_FORMAT_VERSION = 1
+
+# How much a shared signature counts when ranking matches; a single shared
+# error code is too weak to call two issues duplicates on its own
+SIGNATURE_WEIGHTS = {"trace": 3, "exception": 2, "code": 1}
+MIN_DUPLICATE_WEIGHT = 2
+
+PYTHON_FRAME_RE = re.compile(r'File "([^"]+)", line \d+, in (\S+)')
+JAVA_FRAME_RE = re.compile(r"^\s*at\s+([\w$.<>]+)\(([\w$.-]+):\d+\)", re.MULTILINE)
+JS_FRAME_RE = re.compile(r"^\s*at\s+(?:(?:async\s+)?([\w$.<>\[\] ]+?)\s+\()?([^\s()]+?):\d+:\d+\)?\s*$", re.MULTILINE)
+EXCEPTION_RE = re.compile(
+    r'^\s*(?:Uncaught\s+|Exception in thread "[^"]*"\s+)?'
+    r"([A-Za-z_][\w$]*(?:\.[A-Za-z_][\w$]*)*(?:Error|Exception|Fault|Panic))\b:?[ \t]*(.*)$",
+    re.MULTILINE
+)
+CODE_RE = re.compile(r"\b(ERR_[A-Z0-9_]{3,}|[A-Z]{1,5}-?\d{3,6})\b")
+
+QUOTED_RE = re.compile(r"'[^']*'|\"[^\"]*\"|`[^`]*`")
+HEX_RE = re.compile(r"\b0x[0-9a-f]+\b")
+PATH_RE = re.compile(r"\S*[/\\]\S*")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)*\b")
+
+
+@dataclass(frozen=True)
+class ErrorSignature:
+    """One normalized fingerprint (`kind` is a key of SIGNATURE_WEIGHTS)"""
+    kind: str
+    value: str
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha1(f"{self.kind}:{self.value}".encode()).hexdigest()[:16]
+
+
+def _basename(path: str) -> str:
+    return re.split(r"[/\\]", path.split("?")[0])[-1]
+
+
+def normalize_message(message: str) -> str:
+    """Error message with run-specific values replaced by placeholders"""
+    message = QUOTED_RE.sub("<str>", message.strip().lower())
+    message = HEX_RE.sub("<hex>", message)
+    message = PATH_RE.sub("<path>", message)
+    message = NUMBER_RE.sub("<n>", message)
+    return " ".join(message.split())[:200]
+
+
+def _frames(text: str) -> List[str]:
+    """file:function frames, innermost first"""
+    # Python prints the innermost frame last
+    frames = [f"{_basename(path)}:{function}" for path, function in PYTHON_FRAME_RE.findall(text)][::-1]
+    frames += [
+        f"{_basename(path)}:{'.'.join(function.split('.')[-2:])}"
+        for function, path in JAVA_FRAME_RE.findall(text)
+    ]
+    frames += [
+        f"{_basename(path)}:{(function or '<anonymous>').strip()}"
+        for function, path in JS_FRAME_RE.findall(text)
+    ]
+    return frames
+
+
+def extract_signatures(text: Optional[str], max_frames: int = 3) -> List[ErrorSignature]:
+    """Error signatures found in an issue's text (deduplicated, in a stable order)"""
+    if not text:
+        return []
+
+    signatures = []
+    exception = EXCEPTION_RE.search(text)
+    exception_type = exception.group(1) if exception else ""
+
+    frames = _frames(text)[:max_frames]
+    if frames:
+        signatures.append(ErrorSignature("trace", "|".join([exception_type, *frames])))
+
+    # A bare exception type ("KeyError") is too common to identify a failure
+    if exception and exception.group(2).strip():
+        signatures.append(ErrorSignature("exception", f"{exception_type}: {normalize_message(exception.group(2))}"))
+
+    for code in dict.fromkeys(CODE_RE.findall(text)):
+        signatures.append(ErrorSignature("code", code))
+
+    return list(dict.fromkeys(signatures))
+
+
+class SignatureIndex:
+    """Hash index from signature digest to the documents carrying it"""
+
+    def __init__(self):
+        self.by_digest: Dict[str, List[str]] = {}
+        self.by_doc: Dict[str, List[Tuple[str, str]]] = {}  # doc_id -> [(kind, digest)]
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.by_doc)
+
+    def add(self, doc_id: str, text: str):
+        """Index a document's signatures, replacing any previous version"""
+        self.remove(doc_id)
+        signatures = [(signature.kind, signature.digest) for signature in extract_signatures(text)]
+        if not signatures:
+            return
+        self.by_doc[doc_id] = signatures
+        for _, digest in signatures:
+            self.by_digest.setdefault(digest, []).append(doc_id)
+        self.dirty = True
+
+    def remove(self, doc_id: str) -> bool:
+        signatures = self.by_doc.pop(doc_id, None)
+        if signatures is None:
+            return False
+        for _, digest in signatures:
+            doc_ids = self.by_digest.get(digest)
+            if doc_ids is not None:
+                doc_ids.remove(doc_id)
+                if not doc_ids:
+                    del self.by_digest[digest]
+        self.dirty = True
+        return True
+
+    def lookup(self, text: str, exclude: Iterable[str] = (), min_weight: int = 1) -> List[Tuple[str, int, List[str]]]:
+        """(doc_id, weight, shared signature kinds) for documents sharing signatures with `text`
+        worth at least `min_weight`, best first"""
+        exclude = set(exclude)
+        matches: Dict[str, Tuple[int, List[str]]] = {}
+        for signature in extract_signatures(text):
+            for doc_id in self.by_digest.get(signature.digest, ()):
+                if doc_id in exclude:
+                    continue
+                weight, kinds = matches.get(doc_id, (0, []))
+                matches[doc_id] = (weight + SIGNATURE_WEIGHTS[signature.kind], kinds + [signature.kind])
+
+        # Stable sort: ties keep the order their signatures were matched in
+        return sorted(
+            ((doc_id, weight, kinds) for doc_id, (weight, kinds) in matches.items() if weight >= min_weight),
+            key=lambda match: -match[1]
+        )
+
+    def to_dict(self) -> Dict:
+        return {"docs": {doc_id: [list(pair) for pair in pairs] for doc_id, pairs in self.by_doc.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SignatureIndex":
+        index = cls()
+        for doc_id, pairs in data["docs"].items():
+            index.by_doc[doc_id] = [tuple(pair) for pair in pairs]
+            for _, digest in pairs:
+                index.by_digest.setdefault(digest, []).append(doc_id)
+        return index
+
+
+class SignatureStore(LocalIndexStore):
+    """Per-repository signature indexes under `<data_dir>/signatures/`"""
+
+    subdir = "signatures"
+    format_version = SIGNATURE_FORMAT_VERSION
+    index_class = SignatureIndex
+
+    def add(self, owner: str, repo: str, ids: List[str], documents: List[str]):
+        with self._lock:
+            index = self.get(owner, repo)
+            for doc_id, document in zip(ids, documents):
+                index.add(doc_id, document)
+
+    def lookup(self, owner: str, repo: str, text: str, exclude: Iterable[str] = (), min_weight: int = 1) -> List[Tuple[str, int, List[str]]]:
+        """SignatureIndex.lookup on the repository's index, read under the lock writers hold"""
+        with self._lock:
+            return self.get(owner, repo).lookup(text, exclude, min_weight)
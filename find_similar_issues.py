@@ -9,22 +9,31 @@ import sys
 import json
 import argparse
 from datetime import datetime
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from github import Github
 from github_similarity_service import SimilarityService
-import chromadb
+from metadata_schema import MetadataFilter
+from topk import TopK
 
 def find_issues_with_similar(
     repo_name: str,
     similarity_threshold: float = 0.7,
     max_similar: int = 3,
     max_issues: int = 100,
-    include_closed: bool = False
+    include_closed: bool = False,
+    max_results: Optional[int] = None
 ) -> List[Dict]:
-    """Find open issues that have similar issues."""
+    """Find open issues that have similar issues.
+    
+    Issues are streamed from GitHub page by page and ranked in a bounded heap,
+    so only the top `max_results` (default: all) are kept in memory. Each one
+    is searched like `cli.py search`, so partitioned collections, local-only
+    mode and the local indexes all apply.
+    """
     
     # Initialize service
     service = SimilarityService()
+    owner, name = repo_name.split("/", 1)
     
     # Get GitHub client
     github_token = os.environ.get('GITHUB_TOKEN')
@@ -34,111 +43,59 @@ def find_issues_with_similar(
     g = Github(github_token)
     repo = g.get_repo(repo_name)
     
-    # Get Chroma client
-    chroma_api_key = os.environ.get('CHROMA_API_KEY') or os.environ.get('CHROMA_CLOUD_API_KEY')
-    if not chroma_api_key:
-        raise ValueError("CHROMA_API_KEY or CHROMA_CLOUD_API_KEY environment variable is required")
-    
-    chroma_tenant = os.environ.get('CHROMA_TENANT')
-    if not chroma_tenant:
-        raise ValueError("CHROMA_TENANT environment variable is required")
-    
-    chroma_database = os.environ.get('CHROMA_DATABASE', 'default-database')
-    
-    client = chromadb.CloudClient(
-        tenant=chroma_tenant,
-        database=chroma_database,
-        api_key=chroma_api_key
-    )
-    
-    collection_name = "github_issues"  # Use the same collection as the main service
-    
-    try:
-        collection = client.get_collection(collection_name)
-    except:
-        print(f"Collection {collection_name} not found. Please index the repository first.")
-        return []
-    
-    # Get open issues
-    print(f"Fetching all open issues from {repo_name}...")
-    issues_list = list(repo.get_issues(state='open', sort='created', direction='desc'))
-    
-    # Filter out pull requests
-    issues_list = [issue for issue in issues_list if not issue.pull_request]
+    filters = None if include_closed else MetadataFilter(state="open")
     
-    total_issues = len(issues_list)
-    print(f"Found {total_issues} open issues to analyze")
+    # Stream open issues (PyGithub fetches pages lazily)
+    print(f"Fetching open issues from {repo_name}...")
+    issues_iter = repo.get_issues(state='open', sort='created', direction='desc')
     
-    issues_with_similar = []
+    top = TopK(max_results, key=lambda data: data['max_similarity'])
     analyzed_count = 0
     
-    for issue in issues_list:
+    for issue in issues_iter:
+        # Filter out pull requests
+        if issue.pull_request:
+            continue
+        
         if max_issues and analyzed_count >= max_issues:
             break
             
         analyzed_count += 1
         
         if analyzed_count % 25 == 0:
-            print(f"Processed {analyzed_count}/{total_issues} issues ({analyzed_count*100/total_issues:.1f}%)...")
+            print(f"Processed {analyzed_count} issues...")
         
-        # Search for similar issues
-        issue_text = f"{issue.title} {issue.body or ''}"
+        # Search for similar issues (the repository's collection and scope, excluding the issue itself)
+        body = issue.body or ''
         
         try:
-            results = collection.query(
-                query_texts=[issue_text],
-                n_results=max_similar + 1,  # +1 to exclude self
-                where={"state": "all"} if include_closed else None
+            similar_issues = service._search_repository(
+                owner, name, service._create_query_text(issue.title, body), max_similar, similarity_threshold,
+                exclude_number=issue.number, filters=filters,
+                raw_text=service._create_query_text(issue.title, body, full=True)
             )
             
-            if results and results['documents'] and len(results['documents'][0]) > 0:
-                similar_issues = []
-                
-                for i, (doc, meta, distance) in enumerate(zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0]
-                )):
-                    # Skip self - check both as int and string
-                    issue_num = meta.get('number')
-                    if issue_num and (str(issue_num) == str(issue.number) or int(issue_num) == issue.number):
-                        continue
-                    
-                    # Calculate similarity score (1 - normalized distance)
-                    similarity = 1 - (distance / 2)  # Normalize to 0-1 range
-                    
-                    if similarity >= similarity_threshold:
-                        similar_issues.append({
-                            'number': meta.get('number'),
-                            'title': meta.get('title'),
-                            'url': meta.get('url'),
-                            'state': meta.get('state', 'unknown'),
-                            'similarity': similarity,
-                            'created_at': meta.get('created_at'),
-                            'labels': meta.get('labels', [])
-                        })
+            if similar_issues:
+                top.push({
+                    'issue': {
+                        'number': issue.number,
+                        'title': issue.title,
+                        'url': issue.html_url,
+                        'created_at': issue.created_at.isoformat(),
+                        'labels': [label.name for label in issue.labels]
+                    },
+                    'similar_issues': similar_issues[:max_similar],
+                    'max_similarity': max(s['similarity'] for s in similar_issues)
+                })
                 
-                if similar_issues:
-                    issues_with_similar.append({
-                        'issue': {
-                            'number': issue.number,
-                            'title': issue.title,
-                            'url': issue.html_url,
-                            'created_at': issue.created_at.isoformat(),
-                            'labels': [label.name for label in issue.labels]
-                        },
-                        'similar_issues': similar_issues[:max_similar],
-                        'max_similarity': max(s['similarity'] for s in similar_issues)
-                    })
-                    
         except Exception as e:
             print(f"Error processing issue #{issue.number}: {e}")
             continue
     
-    # Sort by max similarity score
-    issues_with_similar.sort(key=lambda x: x['max_similarity'], reverse=True)
+    print(f"Analyzed {analyzed_count} open issues")
     
-    return issues_with_similar
+    # Highest max similarity first
+    return top.items()
 
 def generate_markdown_report(
     issues_data: List[Dict],
@@ -263,6 +220,12 @@ def main():
         default=None,
         help='Maximum number of open issues to analyze (default: all)'
     )
+    parser.add_argument(
+        '--max-results',
+        type=int,
+        default=None,
+        help='Keep only the N issues with the highest similarity in the report (default: all)'
+    )
     parser.add_argument(
         '--include-closed',
         action='store_true',
@@ -286,10 +249,6 @@ def main():
         print("Error: GITHUB_TOKEN environment variable is required")
         sys.exit(1)
     
-    if not (os.environ.get('CHROMA_API_KEY') or os.environ.get('CHROMA_CLOUD_API_KEY')):
-        print("Error: CHROMA_API_KEY or CHROMA_CLOUD_API_KEY environment variable is required")
-        sys.exit(1)
-    
     print(f"Finding open issues with similar issues in {args.repo}...")
     print(f"Similarity threshold: {args.threshold * 100:.0f}%")
     if args.max_issues:
@@ -304,7 +263,8 @@ def main():
             similarity_threshold=args.threshold,
             max_similar=args.max_similar,
             max_issues=args.max_issues,
-            include_closed=args.include_closed
+            include_closed=args.include_closed,
+            max_results=args.max_results
         )
         
         print(f"Found {len(issues_data)} open issues with similar issues")
@@ -1,15 +1,91 @@
+import hashlib
+import heapq
+import itertools
 import os
-from typing import List, Dict, Optional, Union
-from datetime import datetime
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 import chromadb
-from chromadb.config import Settings
+import numpy as np
 from dotenv import load_dotenv
 import requests
-import re
 from pydantic import BaseModel, Field
 
+from ann_index import ANN_KINDS, DEFAULT_EF, DEFAULT_NPROBE, AnnStore
+from bm25_index import BM25Store, reciprocal_rank_fusion
+from error_signatures import MIN_DUPLICATE_WEIGHT, SignatureStore
+from discussion_scoring import CentroidClassifier, DiscussionScorer, score_shard
+from graphql_writer import GraphQLBatchWriter
+from label_engine import LabelApplier
+from metadata_schema import (
+    METADATA_SCHEMA_VERSION,
+    MetadataFilter,
+    cleared_labels,
+    read_flag,
+    read_labels,
+    read_number,
+    typed_fields,
+    upgrade_metadata,
+)
+from text_normalization import content_hash, normalize_text, parse_steps
+from topk import TopK
+from vector_quant import QUANTIZATION_MODES, VectorStore
+
 load_dotenv()
 
+# Bump when the stored document text or metadata layout changes so that
+# cached index snapshots from older versions are rebuilt from scratch.
+INDEX_VERSION = 3
+
+# Rows per shard sent to a worker process when scoring discussions
+MIN_DISCUSSION_SHARD = 5000
+
+# Storage layouts: one shared collection, one collection per repository, or
+# one per owner (tenant). Partition collection names start with the prefix.
+PARTITIONING_MODES = ("shared", "repo", "owner")
+PARTITION_PREFIX = "github_issues__"
+
+# Widening factor for filtered searches over local indexes, which cannot
+# apply metadata filters while searching
+LOCAL_FILTER_FANOUT = 4
+
+# Reciprocal rank fusion constant for hybrid (BM25 + vector) search
+RRF_K = 60
+
+# Chroma's per-request record limit
+CHROMA_MAX_BATCH = 300
+
+# With chunking enabled, bodies longer than CHUNK_CHARS also get overlapping
+# chunk vectors (at most MAX_CHUNKS_PER_ITEM per item), and queries fetch
+# CHUNK_FANOUT matches per requested result before pooling chunks into items
+CHUNK_CHARS = 2000
+CHUNK_OVERLAP = 200
+MAX_CHUNKS_PER_ITEM = 8
+CHUNK_FANOUT = 3
+CHUNK_POOLING_MODES = ("max", "sum")
+# Types of the child vectors stored next to an item (see _refresh_children)
+CHILD_TYPES = ("chunk", "comment")
+
+# Comments fetched per sync when indexing comments; a capped run resumes
+# from its watermark next time since comments are fetched oldest first
+MAX_COMMENTS_PER_SYNC = 1000
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP, max_chunks: int = MAX_CHUNKS_PER_ITEM) -> List[str]:
+    """Overlapping windows covering `text`; beyond `max_chunks`, the head and tail windows are kept"""
+    if not text:
+        return []
+    starts = [0]
+    while starts[-1] + size < len(text):
+        starts.append(starts[-1] + size - overlap)
+    if len(starts) > max_chunks:
+        # Descriptions come first and logs last, so keep both ends
+        head = max_chunks // 2
+        starts = starts[:head] + starts[len(starts) - (max_chunks - head):]
+    return [text[start:start + size] for start in starts]
+
 
 class Issue(BaseModel):
     number: int
@@ -35,69 +111,129 @@ class Discussion(BaseModel):
     labels: List[str] = Field(default_factory=list)
 
 
+class Comment(BaseModel):
+    id: int
+    issue_number: int
+    body: str = ""
+    author: str = ""
+    is_bot: bool = False
+    created_at: str
+    updated_at: str
+    url: str
+
+
+def similar_result(metadata: Dict, similarity: float) -> Dict[str, Union[str, float, int]]:
+    """API/CLI result for one stored item (metadata as written by _build_metadata)"""
+    return {
+        "number": read_number(metadata),
+        "title": metadata["title"],
+        "similarity": round(similarity, 4),
+        "state": metadata.get("state", "open"),
+        "url": metadata["url"],
+        "type": metadata.get("parent_type", metadata.get("type", "issue")),
+        "is_pull_request": read_flag(metadata, "is_pull_request"),
+        "is_discussion": read_flag(metadata, "is_discussion"),
+        "labels": read_labels(metadata)
+    }
+
+
 class SimilarityService:
-    def __init__(self):
+    def __init__(
+        self,
+        partitioning: Optional[str] = None,
+        chunking: Optional[bool] = None,
+        chunk_pooling: Optional[str] = None,
+        comments: Optional[bool] = None,
+        normalization: Optional[str] = None,
+        quantization: Optional[str] = None,
+        ann_index: Optional[str] = None
+    ):
         self.api_key = os.getenv("CHROMA_API_KEY")
         self.tenant = os.getenv("CHROMA_TENANT")
         self.database = os.getenv("CHROMA_DATABASE", "default-database")
         self.github_token = os.getenv("GITHUB_TOKEN")
+        data_dir = os.getenv("DEJA_VIEW_DATA_DIR")
+        # Without Chroma Cloud credentials, a data directory holds an embedded store instead
+        self.local_only = not self.api_key and bool(data_dir)
         
-        if not self.api_key:
-            raise ValueError("CHROMA_API_KEY environment variable is required")
+        if not self.api_key and not self.local_only:
+            raise ValueError("CHROMA_API_KEY environment variable is required (or DEJA_VIEW_DATA_DIR for a local-only index)")
         
-        if not self.tenant:
+        if not self.tenant and not self.local_only:
             raise ValueError("CHROMA_TENANT environment variable is required")
         
-        self.client = chromadb.CloudClient(
-            tenant=self.tenant,
-            database=self.database,
-            api_key=self.api_key
-        )
+        self.partitioning = (partitioning or os.getenv("CHROMA_PARTITIONING") or "shared").lower()
+        if self.partitioning not in PARTITIONING_MODES:
+            raise ValueError(f"Unknown CHROMA_PARTITIONING '{self.partitioning}' (expected one of: {', '.join(PARTITIONING_MODES)})")
+        
+        if self.local_only:
+            self.client = chromadb.PersistentClient(path=os.path.join(data_dir, "chroma"))
+        else:
+            self.client = chromadb.CloudClient(
+                tenant=self.tenant,
+                database=self.database,
+                api_key=self.api_key
+            )
+        
+        if chunking is None:
+            chunking = os.getenv("DEJA_VIEW_CHUNKING", "").lower() in ("1", "true", "yes")
+        self.chunking = chunking
+        self.chunk_pooling = (chunk_pooling or os.getenv("DEJA_VIEW_CHUNK_POOLING") or "max").lower()
+        if self.chunk_pooling not in CHUNK_POOLING_MODES:
+            raise ValueError(f"Unknown DEJA_VIEW_CHUNK_POOLING '{self.chunk_pooling}' (expected one of: {', '.join(CHUNK_POOLING_MODES)})")
+        if comments is None:
+            comments = os.getenv("DEJA_VIEW_COMMENTS", "").lower() in ("1", "true", "yes")
+        self.comments = comments
+        # Body cleanup steps applied before embedding (see text_normalization)
+        self.normalization = parse_steps(normalization if normalization is not None else os.getenv("DEJA_VIEW_NORMALIZE"))
         
+        # The shared collection is also the migration source for partitioned modes
         self.collection_name = "github_issues"
         self._init_collection()
+        self._partitions: Dict[str, object] = {}
+        self._partitions_lock = threading.Lock()
+        self._embedding_function = None
         
-        # Discussion suggestion patterns - more aggressive matching
-        self.question_patterns = [
-            r'^(how|what|why|when|where|which|who|can|could|should|would|will|is|are|do|does|did)\b',
-            r'\?',
-            r'\b(help|guidance|advice|opinion|thoughts|suggestions?|input|feedback)\b',
-            r'\b(best practices?|recommendations?|approach|strategy|way)\b',
-            r'\b(anyone|somebody|someone)\b.*\b(know|tried|experience|success)\b',
-            r'\b(how to|how do|how can|how should)\b',
-            r'\b(what.*think|thoughts on|opinions on)\b'
-        ]
-        
-        self.feature_patterns = [
-            r'\b(feature request|enhancement|suggestion|proposal|idea|rfc)\b',
-            r'\b(would like|wish|hope|want|need|desire)\b.*\b(feature|functionality|capability|ability|option)\b',
-            r'\b(add|implement|support|include|introduce|create)\b.*\b(feature|option|ability|functionality|support|capability)\b',
-            r'\b(it would be|would be nice|would be great|would be helpful)\b',
-            r'\b(request|requesting)\b.*\b(feature|enhancement|addition)\b',
-            r'\b(can we|could we|should we)\b.*\b(add|implement|support|have)\b',
-            r'\b(feature|functionality|capability)\b.*\b(request|suggestion|proposal)\b'
-        ]
+        # Optional local indexes kept next to the vector store: BM25 for hybrid
+        # search and error signatures for exact-duplicate lookups
+        self.lexical = BM25Store(data_dir) if data_dir else None
+        self.signatures = SignatureStore(data_dir) if data_dir else None
         
-        self.discussion_labels = [
-            'question', 'help wanted', 'discussion', 'feature request',
-            'enhancement', 'idea', 'proposal', 'feedback', 'opinions',
-            'rfc', 'design', 'brainstorming', 'suggestion'
-        ]
+        # Optional local copy of the embeddings (float32, int8 or binary) that
+        # similarity queries are answered from instead of the vector store
+        quantization = (quantization or os.getenv("DEJA_VIEW_VECTOR_QUANTIZATION") or "").lower()
+        if quantization in ("", "none", "off"):
+            self.vectors = None
+        elif quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown DEJA_VIEW_VECTOR_QUANTIZATION '{quantization}' (expected one of: {', '.join(QUANTIZATION_MODES)})")
+        elif not data_dir:
+            raise ValueError("DEJA_VIEW_VECTOR_QUANTIZATION requires DEJA_VIEW_DATA_DIR")
+        else:
+            self.vectors = VectorStore(data_dir, quantization)
         
-        # RFC/Proposal patterns
-        self.proposal_patterns = [
-            r'\b(rfc|proposal|design doc|spec|specification)\b',
-            r'\b(propose|proposing|suggest|suggesting)\b',
-            r'\b(approach|solution|design|architecture)\b.*\b(discussion|feedback|thoughts)\b'
-        ]
+        # Optional approximate nearest neighbour index (ivf or hnsw) for
+        # serving similarity queries locally at large scale
+        ann_index = (ann_index or os.getenv("DEJA_VIEW_ANN_INDEX") or "").lower()
+        if ann_index in ("", "none", "off"):
+            self.ann = None
+        elif ann_index not in ANN_KINDS:
+            raise ValueError(f"Unknown DEJA_VIEW_ANN_INDEX '{ann_index}' (expected one of: {', '.join(ANN_KINDS)})")
+        elif not data_dir:
+            raise ValueError("DEJA_VIEW_ANN_INDEX requires DEJA_VIEW_DATA_DIR")
+        else:
+            self.ann = AnnStore(
+                data_dir, ann_index,
+                ef=int(os.getenv("DEJA_VIEW_ANN_EF", DEFAULT_EF)),
+                nprobe=int(os.getenv("DEJA_VIEW_ANN_NPROBE", DEFAULT_NPROBE))
+            )
         
-        # Discussion-oriented phrases
-        self.discussion_phrases = [
-            r'\b(open to|looking for|seeking)\b.*\b(feedback|input|thoughts|suggestions)\b',
-            r'\b(brainstorm|discuss|explore|consider)\b',
-            r'\b(community|everyone|folks|people)\b.*\b(think|opinion|experience)\b',
-            r'\b(share.*experience|lessons learned|what.*worked)\b'
-        ]
+        # Pattern groups are compiled once here and reused for every issue
+        self.discussion_scorer = DiscussionScorer()
+        self.question_patterns = self.discussion_scorer.question_patterns
+        self.feature_patterns = self.discussion_scorer.feature_patterns
+        self.discussion_labels = self.discussion_scorer.discussion_labels
+        self.proposal_patterns = self.discussion_scorer.proposal_patterns
+        self.discussion_phrases = self.discussion_scorer.discussion_phrases
     
     def _init_collection(self):
         try:
@@ -108,6 +244,55 @@ class SimilarityService:
                 metadata={"hnsw:space": "cosine"}
             )
     
+    def _partition_name(self, owner: str, repo: str) -> str:
+        """Collection name for a repository's partition (valid Chroma name, unique per owner/repo)"""
+        # GitHub names are case-insensitive; the hash keeps e.g. "a.b" and "a-b" apart
+        key = owner.lower() if self.partitioning == "owner" else f"{owner}/{repo}".lower()
+        slug = re.sub(r"[^a-z0-9_-]", "-", key.replace("/", "__"))[:39]
+        digest = hashlib.sha1(key.encode()).hexdigest()[:8]  # prefix + slug + digest stays within 63 chars
+        return f"{PARTITION_PREFIX}{slug}-{digest}"
+    
+    def _collection_for(self, owner: str, repo: str):
+        """Collection holding a repository's vectors, created on first use"""
+        if self.partitioning == "shared":
+            return self.collection
+        
+        name = self._partition_name(owner, repo)
+        with self._partitions_lock:
+            collection = self._partitions.get(name)
+            if collection is None:
+                metadata = {"hnsw:space": "cosine", "owner": owner.lower()}
+                if self.partitioning == "repo":
+                    metadata["repo"] = repo.lower()
+                collection = self.client.get_or_create_collection(name=name, metadata=metadata)
+                self._partitions[name] = collection
+            return collection
+    
+    def _repo_where(self, owner: str, repo: str, *clauses: Dict) -> Optional[Dict]:
+        """Metadata filter for one repository, minus whatever its partition already implies"""
+        if self.partitioning == "repo":
+            scope = []
+        elif self.partitioning == "owner":
+            scope = [{"repo": repo}]
+        else:
+            scope = [{"owner": owner}, {"repo": repo}]
+        
+        conditions = scope + list(clauses)
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+    
+    def _partition_collections(self) -> List:
+        """Every existing partition collection (empty in shared mode)"""
+        if self.partitioning == "shared":
+            return []
+        collections = []
+        for collection in self.client.list_collections():
+            name = getattr(collection, "name", collection)
+            if name.startswith(PARTITION_PREFIX):
+                collections.append(collection if hasattr(collection, "get") else self.client.get_collection(name))
+        return collections
+    
     def _get_github_headers(self) -> Dict[str, str]:
         headers = {"Accept": "application/vnd.github.v3+json"}
         if self.github_token:
@@ -120,7 +305,7 @@ class SimilarityService:
             headers["Authorization"] = f"Bearer {self.github_token}"
         return headers
     
-    def _fetch_issues(self, owner: str, repo: str, max_issues: int = 100, state: str = "open") -> List[Issue]:
+    def _fetch_issues(self, owner: str, repo: str, max_issues: int = 100, state: str = "open", since: Optional[str] = None) -> List[Issue]:
         issues = []
         page = 1
         per_page = min(100, max_issues)
@@ -134,6 +319,11 @@ class SimilarityService:
                 "sort": "updated",
                 "direction": "desc"
             }
+            if since:
+                # Only issues updated at or after this ISO 8601 timestamp, oldest first so a
+                # capped delta keeps the changes right after the watermark
+                params["since"] = since
+                params["direction"] = "asc"
             
             response = requests.get(url, headers=self._get_github_headers(), params=params)
             response.raise_for_status()
@@ -143,19 +333,7 @@ class SimilarityService:
                 break
             
             for item in batch:
-                issue = Issue(
-                    number=item["number"],
-                    title=item["title"],
-                    body=item.get("body", ""),
-                    state=item["state"],
-                    created_at=item["created_at"],
-                    updated_at=item["updated_at"],
-                    url=item["html_url"],
-                    labels=[label["name"] for label in item.get("labels", [])],
-                    is_pull_request="pull_request" in item,
-                    is_discussion=False
-                )
-                issues.append(issue)
+                issues.append(self._issue_from_api(item))
                 
                 if len(issues) >= max_issues:
                     break
@@ -164,16 +342,51 @@ class SimilarityService:
         
         return issues[:max_issues]
     
+    def _fetch_comments(self, owner: str, repo: str, since: Optional[str] = None, max_comments: int = MAX_COMMENTS_PER_SYNC) -> List[Comment]:
+        """Fetch issue and PR comments repo-wide, oldest update first, optionally only those updated since a timestamp"""
+        comments = []
+        url = f"https://api.github.com/repos/{owner}/{repo}/issues/comments"
+        params = {"per_page": 100, "sort": "updated", "direction": "asc"}
+        if since:
+            params["since"] = since
+        
+        while url and len(comments) < max_comments:
+            response = requests.get(url, headers=self._get_github_headers(), params=params)
+            response.raise_for_status()
+            comments.extend(self._comment_from_api(item) for item in response.json())
+            # The next link already carries the query parameters
+            url = response.links.get("next", {}).get("url")
+            params = None
+        
+        return comments[:max_comments]
+    
+    def _comment_from_api(self, item: Dict) -> Comment:
+        """Build a Comment from a REST API (or webhook) issue comment payload"""
+        user = item.get("user") or {}
+        return Comment(
+            id=item["id"],
+            issue_number=int(item["issue_url"].rsplit("/", 1)[1]),
+            body=item.get("body") or "",
+            author=user.get("login", ""),
+            is_bot=user.get("type") == "Bot",
+            created_at=item["created_at"],
+            updated_at=item["updated_at"],
+            url=item["html_url"]
+        )
+    
     def _fetch_single_issue(self, owner: str, repo: str, issue_number: int) -> Issue:
         url = f"https://api.github.com/repos/{owner}/{repo}/issues/{issue_number}"
         response = requests.get(url, headers=self._get_github_headers())
         response.raise_for_status()
         
-        item = response.json()
+        return self._issue_from_api(response.json())
+    
+    def _issue_from_api(self, item: Dict) -> Issue:
+        """Build an Issue from a REST API (or webhook) issue payload"""
         return Issue(
             number=item["number"],
             title=item["title"],
-            body=item.get("body", ""),
+            body=item.get("body") or "",
             state=item["state"],
             created_at=item["created_at"],
             updated_at=item["updated_at"],
@@ -183,7 +396,114 @@ class SimilarityService:
             is_discussion=False
         )
     
-    def _create_document_text(self, item: Union[Issue, Discussion]) -> str:
+    def _discussion_from_webhook(self, item: Dict) -> Discussion:
+        """Build a Discussion from a `discussion` webhook payload"""
+        return Discussion(
+            number=item["number"],
+            title=item["title"],
+            body=item.get("body") or "",
+            category=(item.get("category") or {}).get("name", ""),
+            created_at=item["created_at"],
+            updated_at=item["updated_at"],
+            url=item["html_url"],
+            labels=[label["name"] for label in item.get("labels") or []]
+        )
+    
+    def _fetch_issues_by_number(self, owner: str, repo: str, issue_numbers: List[int], chunk_size: int = 50) -> Dict[int, Issue]:
+        """Fetch many issues/PRs by number using aliased GraphQL queries (chunk_size per request).
+        
+        Numbers that don't exist are omitted from the result. Without a token
+        (GraphQL requires authentication) this falls back to one REST call each.
+        """
+        issues = {}
+        numbers = list(dict.fromkeys(issue_numbers))
+        
+        if not self.github_token:
+            for number in numbers:
+                try:
+                    issues[number] = self._fetch_single_issue(owner, repo, number)
+                except requests.exceptions.HTTPError as e:
+                    if e.response is None or e.response.status_code != 404:
+                        raise
+            return issues
+        
+        fields = """
+            number
+            title
+            body
+            state
+            createdAt
+            updatedAt
+            url
+            labels(first: 20) {
+                nodes {
+                    name
+                }
+            }
+        """
+        
+        for start_idx in range(0, len(numbers), chunk_size):
+            chunk = numbers[start_idx:start_idx + chunk_size]
+            aliases = "\n".join(
+                f"i{number}: issueOrPullRequest(number: {number}) {{ __typename ... on Issue {{ {fields} }} ... on PullRequest {{ {fields} }} }}"
+                for number in chunk
+            )
+            query = f"""
+            query($owner: String!, $repo: String!) {{
+                repository(owner: $owner, name: $repo) {{
+                    {aliases}
+                }}
+            }}
+            """
+            
+            response = requests.post(
+                "https://api.github.com/graphql",
+                headers=self._get_github_graphql_headers(),
+                json={"query": query, "variables": {"owner": owner, "repo": repo}}
+            )
+            response.raise_for_status()
+            
+            # Missing numbers come back as null with NOT_FOUND errors; keep the rest
+            repo_data = (response.json().get("data") or {}).get("repository") or {}
+            for number in chunk:
+                item = repo_data.get(f"i{number}")
+                if not item:
+                    continue
+                issues[number] = Issue(
+                    number=item["number"],
+                    title=item["title"],
+                    body=item.get("body") or "",
+                    state="open" if item["state"] == "OPEN" else "closed",
+                    created_at=item["createdAt"],
+                    updated_at=item["updatedAt"],
+                    url=item["url"],
+                    labels=[label["name"] for label in (item.get("labels") or {}).get("nodes", [])],
+                    is_pull_request=item["__typename"] == "PullRequest",
+                    is_discussion=False
+                )
+        
+        return issues
+    
+    def _create_query_text(self, title: str, body: str = "", full: bool = False) -> str:
+        """Document text for free-form query text, in the same shape as indexed issues
+        (`full`: as the local indexes read it, see _create_index_text)"""
+        draft = Issue(
+            number=0,
+            title=title,
+            body=body,
+            state="open",
+            created_at="",
+            updated_at="",
+            url=""
+        )
+        return self._create_index_text(draft) if full else self._create_document_text(draft)
+    
+    def _document_body(self, item: Union[Issue, Discussion]) -> str:
+        """The item's body after the configured normalization steps"""
+        return normalize_text(item.body, self.normalization) if self.normalization else (item.body or "")
+    
+    def _create_document_text(self, item: Union[Issue, Discussion], max_body_length: Optional[int] = 10000, normalize: bool = True) -> str:
+        """Text embedded for an item; the (normalized) body is cut at `max_body_length` (None keeps all of it)"""
         if isinstance(item, Discussion):
             text_parts = [
                 f"Title: {item.title}",
@@ -200,18 +520,23 @@ class SimilarityService:
         if item.labels:
             text_parts.append(f"Labels: {', '.join(item.labels)}")
         
-        if item.body:
-            # Truncate body to stay under 16KB limit (leaving room for other fields)
-            max_body_length = 10000  # ~10KB for body, leaving room for other fields
-            body = item.body[:max_body_length]
-            if len(item.body) > max_body_length:
+        full_body = self._document_body(item) if normalize else item.body
+        if full_body:
+            # The default ~10KB cut keeps documents under Chroma's 16KB limit
+            body = full_body if max_body_length is None else full_body[:max_body_length]
+            if len(body) < len(full_body):
                 body += "... [truncated]"
             text_parts.append(f"Body: {body}")
         
         return "\n\n".join(text_parts)
     
-    def _fetch_discussions(self, owner: str, repo: str, max_discussions: int = 100) -> List[Discussion]:
-        """Fetch discussions using GitHub GraphQL API"""
+    def _create_index_text(self, item: Union[Issue, Discussion]) -> str:
+        """Text the keyword and signature indexes read: local indexes have no size
+        limit and match exact strings, so they see the whole raw body (e.g. logs at the end)"""
+        return self._create_document_text(item, max_body_length=None, normalize=False)
+    
+    def _fetch_discussions(self, owner: str, repo: str, max_discussions: int = 100, since: Optional[str] = None) -> List[Discussion]:
+        """Fetch discussions using GitHub GraphQL API, optionally only those updated since a timestamp"""
         if not self.github_token:
             return []  # GraphQL API requires authentication
         
@@ -273,8 +598,14 @@ class SimilarityService:
                 break
                 
             discussions_data = repo_data["discussions"]
+            reached_since = False
             
             for item in discussions_data["nodes"]:
+                # Results are ordered by UPDATED_AT desc, so everything after this is older
+                if since and item["updatedAt"] < since:
+                    reached_since = True
+                    break
+                
                 discussion = Discussion(
                     number=item["number"],
                     title=item["title"],
@@ -290,28 +621,38 @@ class SimilarityService:
                 if len(discussions) >= max_discussions:
                     break
             
-            if not discussions_data["pageInfo"]["hasNextPage"]:
+            if reached_since or not discussions_data["pageInfo"]["hasNextPage"]:
                 break
                 
             cursor = discussions_data["pageInfo"]["endCursor"]
         
         return discussions[:max_discussions]
     
-    def index_repository(self, owner: str, repo: str, max_issues: int = 100, include_discussions: bool = False, issue_state: str = "open", batch_size: int = 300) -> Dict[str, Union[int, str]]:
-        """Index repository with automatic batching for large datasets"""
-        issues = self._fetch_issues(owner, repo, max_issues, state=issue_state)
+    def index_repository(self, owner: str, repo: str, max_issues: int = 100, include_discussions: bool = False, issue_state: str = "open", batch_size: int = 300, since: Optional[str] = None, comments_since: Optional[str] = None) -> Dict[str, Union[int, str]]:
+        """Index repository with automatic batching for large datasets.
+        
+        When `since` is given only items updated at or after that ISO 8601
+        timestamp are fetched and upserted (delta sync). With comment
+        indexing enabled, comments updated since `comments_since` are synced
+        afterwards (see index_comments) and "comments_synced_at" is returned.
+        """
+        issues = self._fetch_issues(owner, repo, max_issues, state=issue_state, since=since)
         discussions = []
         
         if include_discussions:
-            discussions = self._fetch_discussions(owner, repo, max_issues)
+            discussions = self._fetch_discussions(owner, repo, max_issues, since=since)
         
         all_items = issues + discussions
         
         if not all_items:
-            return {"indexed": 0, "repository": f"{owner}/{repo}"}
+            result = {"indexed": 0, "repository": f"{owner}/{repo}", "latest_updated_at": since}
+            if self.comments:
+                result.update(self._comment_sync_result(owner, repo, comments_since))
+            return result
         
         # Process in batches to respect Chroma's 300 record limit
         total_indexed = 0
+        total_embedded = 0
         total_batches = (len(all_items) + batch_size - 1) // batch_size
         
         for batch_num in range(total_batches):
@@ -319,69 +660,344 @@ class SimilarityService:
             end_idx = min(start_idx + batch_size, len(all_items))
             batch_items = all_items[start_idx:end_idx]
             
-            documents = []
-            metadatas = []
-            ids = []
-            
-            for item in batch_items:
-                if isinstance(item, Discussion):
-                    doc_id = f"{owner}/{repo}/discussions/{item.number}"
-                    metadata = {
-                        "owner": owner,
-                        "repo": repo,
-                        "number": str(item.number),
-                        "title": item.title,
-                        "type": "discussion",
-                        "category": item.category,
-                        "url": item.url,
-                        "created_at": item.created_at,
-                        "updated_at": item.updated_at,
-                        "is_pull_request": "False",
-                        "is_discussion": "True",
-                        "labels": ",".join(item.labels) if item.labels else ""
-                    }
-                else:
-                    doc_id = f"{owner}/{repo}/issues/{item.number}"
-                    metadata = {
-                        "owner": owner,
-                        "repo": repo,
-                        "number": str(item.number),
-                        "title": item.title,
-                        "type": "pull_request" if item.is_pull_request else "issue",
-                        "state": item.state,
-                        "url": item.url,
-                        "created_at": item.created_at,
-                        "updated_at": item.updated_at,
-                        "is_pull_request": str(item.is_pull_request),
-                        "is_discussion": str(item.is_discussion),
-                        "labels": ",".join(item.labels) if item.labels else ""
-                    }
-                
-                documents.append(self._create_document_text(item))
-                metadatas.append(metadata)
-                ids.append(doc_id)
-            
-            # Upsert this batch
-            self.collection.upsert(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            
+            total_embedded += self._upsert_batch(owner, repo, batch_items)
             total_indexed += len(batch_items)
             
             # Print progress if processing multiple batches
             if total_batches > 1:
                 print(f"  Batch {batch_num + 1}/{total_batches}: Indexed {len(batch_items)} items ({total_indexed}/{len(all_items)} total)")
         
-        return {
+        self._save_local_indexes(owner, repo)
+        
+        latest_updated_at = max(item.updated_at for item in all_items)
+        if since:
+            # A capped delta must not move the watermark past changes it did not fetch.
+            # Issues come oldest first, so the newest fetched one is safe; discussions
+            # come newest first, so a capped page leaves a gap after `since`.
+            if len(issues) >= max_issues:
+                latest_updated_at = min(latest_updated_at, max(issue.updated_at for issue in issues))
+            if len(discussions) >= max_issues:
+                latest_updated_at = since
+        
+        result = {
             "indexed": len(all_items),
+            "embedded": total_embedded,
             "issues": len(issues),
             "discussions": len(discussions),
             "repository": f"{owner}/{repo}",
             "batches": total_batches,
+            "latest_updated_at": latest_updated_at,
             "message": f"Successfully indexed {len(issues)} issues" + (f" and {len(discussions)} discussions" if discussions else "") + (f" in {total_batches} batches" if total_batches > 1 else "")
         }
+        if self.comments:
+            result.update(self._comment_sync_result(owner, repo, comments_since))
+        return result
+    
+    def _comment_sync_result(self, owner: str, repo: str, since: Optional[str]) -> Dict[str, Union[int, str]]:
+        synced = self.index_comments(owner, repo, since=since)
+        return {"comments": synced["indexed"], "comments_synced_at": synced["latest_updated_at"]}
+    
+    def index_comments(self, owner: str, repo: str, since: Optional[str] = None, max_comments: int = MAX_COMMENTS_PER_SYNC) -> Dict[str, Union[int, str]]:
+        """Index issue comments as child vectors of their issue or PR.
+        
+        Comments come from the repository-wide comments endpoint in pages of
+        100 rather than one request per issue, and only those updated since
+        `since` when given. Each comment is stored as "<parent id>#comment<id>"
+        with its parent's metadata, so matches on comment text are pooled into
+        the parent like chunk matches. Bot, empty and unindexed-parent
+        comments are skipped. "latest_updated_at" is the watermark for the
+        next sync.
+        """
+        fetched = self._fetch_comments(owner, repo, since, max_comments)
+        latest = max((comment.updated_at for comment in fetched), default=since)
+        comments = [comment for comment in fetched if comment.body.strip() and not comment.is_bot]
+        
+        # Comments on issues and PRs share one endpoint; parents are looked up by id
+        collection = self._collection_for(owner, repo)
+        parent_ids = list(dict.fromkeys(f"{owner}/{repo}/issues/{comment.issue_number}" for comment in comments))
+        parents: Dict[str, Dict] = {}
+        for start in range(0, len(parent_ids), 100):
+            stored = collection.get(ids=parent_ids[start:start + 100], include=["metadatas"])
+            parents.update(zip(stored["ids"], stored["metadatas"]))
+        
+        ids, documents, metadatas = [], [], []
+        for comment in comments:
+            parent_id = f"{owner}/{repo}/issues/{comment.issue_number}"
+            parent = parents.get(parent_id)
+            if parent is None:
+                continue
+            ids.append(f"{parent_id}#comment{comment.id}")
+            documents.append(self._create_comment_text(parent["title"], comment))
+            metadatas.append({
+                **{key: value for key, value in parent.items() if key != "chunk_count"},
+                "type": "comment",
+                "parent_type": parent["type"],
+                "parent_id": parent_id,
+                "comment_id": comment.id,
+                "comment_url": comment.url,
+                "comment_updated_at": comment.updated_at
+            })
+        
+        self._upsert_records(owner, repo, collection, ids, documents, metadatas)
+        if ids:
+            for store in self._vector_stores():
+                store.save(owner, repo)
+        
+        return {
+            "indexed": len(ids),
+            "fetched": len(fetched),
+            "skipped": len(fetched) - len(ids),
+            "repository": f"{owner}/{repo}",
+            "latest_updated_at": latest
+        }
+    
+    def _create_comment_text(self, title: str, comment: Comment) -> str:
+        """Text embedded for a comment: its parent's title plus the (normalized) comment, cut like bodies"""
+        full_body = normalize_text(comment.body, self.normalization) if self.normalization else comment.body
+        body = full_body[:10000]
+        if len(body) < len(full_body):
+            body += "... [truncated]"
+        return f"Title: {title}\n\nComment: {body}"
+    
+    def _doc_id(self, owner: str, repo: str, item: Union[Issue, Discussion]) -> str:
+        kind = "discussions" if isinstance(item, Discussion) else "issues"
+        return f"{owner}/{repo}/{kind}/{item.number}"
+    
+    def _build_metadata(self, owner: str, repo: str, item: Union[Issue, Discussion]) -> Dict[str, Union[str, int, bool]]:
+        """Typed metadata (see metadata_schema) that search filters are pushed down on"""
+        if isinstance(item, Discussion):
+            return {
+                "owner": owner,
+                "repo": repo,
+                "number": item.number,
+                "title": item.title,
+                "type": "discussion",
+                "category": item.category,
+                "url": item.url,
+                "created_at": item.created_at,
+                "updated_at": item.updated_at,
+                "is_pull_request": False,
+                "is_discussion": True,
+                **typed_fields(item.labels, item.created_at, item.updated_at)
+            }
+        
+        return {
+            "owner": owner,
+            "repo": repo,
+            "number": item.number,
+            "title": item.title,
+            "type": "pull_request" if item.is_pull_request else "issue",
+            "state": item.state,
+            "url": item.url,
+            "created_at": item.created_at,
+            "updated_at": item.updated_at,
+            "is_pull_request": item.is_pull_request,
+            "is_discussion": item.is_discussion,
+            **typed_fields(item.labels, item.created_at, item.updated_at)
+        }
+    
+    def _upsert_batch(self, owner: str, repo: str, items: List[Union[Issue, Discussion]]) -> int:
+        """Upsert one batch of items (at most Chroma's 300 record limit; chunk vectors are sent in further requests).
+        
+        Items whose document text hashes the same as the stored copy are not
+        re-embedded; only changed metadata (e.g. updated_at after a new
+        comment) is written. Returns the number of items embedded.
+        """
+        batch_ids = [self._doc_id(owner, repo, item) for item in items]
+        batch_documents = [self._create_document_text(item) for item in items]
+        batch_metadatas = [self._build_metadata(owner, repo, item) for item in items]
+        for document, metadata in zip(batch_documents, batch_metadatas):
+            metadata["content_hash"] = content_hash(document)
+        collection = self._collection_for(owner, repo)
+        
+        stored = self._stored_metadatas(collection, batch_ids)
+        changed, refreshed = [], []
+        for i, (item, doc_id, metadata) in enumerate(zip(items, batch_ids, batch_metadatas)):
+            previous = stored.get(doc_id)
+            if previous is not None:
+                # Upserts and updates merge metadata, so removed labels must be overwritten
+                metadata.update(cleared_labels(previous, metadata))
+            if (
+                previous is None
+                or previous.get("content_hash") != metadata["content_hash"]
+                or self._missing_chunks(item, previous)
+                or self._missing_local_vector(owner, repo, doc_id)
+            ):
+                changed.append(i)
+                continue
+            if "chunk_count" in previous:
+                metadata["chunk_count"] = previous["chunk_count"]
+            if previous != metadata:
+                refreshed.append(i)
+        
+        if refreshed:
+            refreshed_ids = [batch_ids[i] for i in refreshed]
+            refreshed_metadatas = [batch_metadatas[i] for i in refreshed]
+            collection.update(ids=refreshed_ids, metadatas=refreshed_metadatas)
+            for store in self._vector_stores():
+                store.set_metadatas(owner, repo, refreshed_ids, refreshed_metadatas)
+            self._refresh_children(owner, repo, collection, dict(zip(refreshed_ids, refreshed_metadatas)))
+        
+        if self.lexical is not None or self.signatures is not None:
+            full_documents = [self._create_index_text(item) for item in items]
+            if self.lexical is not None:
+                self.lexical.add(owner, repo, batch_ids, full_documents, batch_metadatas)
+            if self.signatures is not None:
+                self.signatures.add(owner, repo, batch_ids, full_documents)
+        
+        if not changed:
+            return 0
+        items = [items[i] for i in changed]
+        ids = [batch_ids[i] for i in changed]
+        documents = [batch_documents[i] for i in changed]
+        metadatas = [batch_metadatas[i] for i in changed]
+        
+        if self.chunking:
+            chunk_ids, chunk_documents, chunk_metadatas = self._chunk_records(items, ids, metadatas)
+            # Drop previous chunks first: an edited body may now have fewer
+            collection.delete(where={"$and": [{"parent_id": {"$in": ids}}, {"type": "chunk"}]})
+            for store in self._vector_stores():
+                store.remove(owner, repo, [f"{doc_id}#chunk{i}" for doc_id in ids for i in range(MAX_CHUNKS_PER_ITEM)])
+            self._upsert_records(owner, repo, collection, ids + chunk_ids, documents + chunk_documents, metadatas + chunk_metadatas)
+        else:
+            self._upsert_records(owner, repo, collection, ids, documents, metadatas)
+        
+        replaced = {doc_id: metadata for doc_id, metadata in zip(ids, metadatas) if doc_id in stored}
+        if replaced:
+            self._refresh_children(owner, repo, collection, replaced)
+        return len(changed)
+    
+    def _refresh_children(self, owner: str, repo: str, collection, updates: Dict[str, Dict]):
+        """Pass new item metadata ({doc_id: metadata}) on to the items' chunk and
+        comment vectors, which carry a copy of it for filters.
+        
+        Children keep their own keys (type, parent_*, chunk_*, comment_*).
+        """
+        doc_ids = list(updates)
+        child_ids, child_metadatas = [], []
+        for start in range(0, len(doc_ids), 100):
+            pages = self._iter_pages({"parent_id": {"$in": doc_ids[start:start + 100]}}, ["metadatas"], collection=collection)
+            for page in pages:
+                for child_id, child in zip(page["ids"], page["metadatas"]):
+                    if child.get("parent_id") not in updates:
+                        continue
+                    metadata = updates[child["parent_id"]]
+                    refreshed = {**child, **{key: value for key, value in metadata.items() if key not in ("type", "chunk_count")}}
+                    if refreshed != child:
+                        child_ids.append(child_id)
+                        child_metadatas.append(refreshed)
+        
+        for start in range(0, len(child_ids), CHROMA_MAX_BATCH):
+            end = start + CHROMA_MAX_BATCH
+            collection.update(ids=child_ids[start:end], metadatas=child_metadatas[start:end])
+        if child_ids:
+            for store in self._vector_stores():
+                store.set_metadatas(owner, repo, child_ids, child_metadatas)
+    
+    def _upsert_records(self, owner: str, repo: str, collection, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        """Upsert records in requests of at most Chroma's record limit, mirroring them into the local vectors"""
+        for start in range(0, len(ids), CHROMA_MAX_BATCH):
+            end = start + CHROMA_MAX_BATCH
+            records = {"documents": documents[start:end], "metadatas": metadatas[start:end], "ids": ids[start:end]}
+            if self._vector_stores():
+                # Embedded once here so every copy holds the same vectors
+                records["embeddings"] = self._embed(records["documents"])
+                for store in self._vector_stores():
+                    store.add(owner, repo, records["ids"], records["embeddings"], records["metadatas"])
+            collection.upsert(**records)
+    
+    def _missing_local_vector(self, owner: str, repo: str, doc_id: str) -> bool:
+        return any(store.get(owner, repo).metadata(doc_id) is None for store in self._vector_stores())
+    
+    def _vector_stores(self) -> List:
+        """Local copies of the embeddings (quantized vectors, ANN index)"""
+        return [store for store in (self.vectors, self.ann) if store is not None]
+    
+    def _stored_metadatas(self, collection, ids: List[str]) -> Dict[str, Dict]:
+        """Stored metadata by id for those of `ids` already indexed (gets of 100 ids)"""
+        stored = {}
+        for start in range(0, len(ids), 100):
+            page = collection.get(ids=ids[start:start + 100], include=["metadatas"])
+            stored.update(zip(page["ids"], page["metadatas"]))
+        return stored
+    
+    def _missing_chunks(self, item: Union[Issue, Discussion], stored_metadata: Dict) -> bool:
+        """Whether chunking is on and a long item was indexed without chunks"""
+        return self.chunking and "chunk_count" not in stored_metadata and len(self._document_body(item)) > CHUNK_CHARS
+    
+    def _chunk_records(self, items: List[Union[Issue, Discussion]], ids: List[str], metadatas: List[Dict]) -> tuple:
+        """(ids, documents, metadatas) of the chunk vectors for items with long bodies.
+        
+        Chunks inherit their parent's metadata plus parent_id, parent_type and
+        chunk_index; their type is "chunk" so type-filtered reads skip them.
+        The parent's metadata records chunk_count.
+        """
+        chunk_ids, chunk_documents, chunk_metadatas = [], [], []
+        for item, doc_id, metadata in zip(items, ids, metadatas):
+            body = self._document_body(item)
+            if len(body) <= CHUNK_CHARS:
+                continue
+            chunks = chunk_text(body)
+            metadata["chunk_count"] = len(chunks)
+            for i, chunk in enumerate(chunks):
+                chunk_ids.append(f"{doc_id}#chunk{i}")
+                chunk_documents.append(f"Title: {item.title}\n\nBody (part {i + 1}/{len(chunks)}): {chunk}")
+                chunk_metadatas.append({
+                    **metadata,
+                    "type": "chunk",
+                    "parent_type": metadata["type"],
+                    "parent_id": doc_id,
+                    "chunk_index": i
+                })
+        return chunk_ids, chunk_documents, chunk_metadatas
+    
+    def _local_indexes(self) -> List:
+        return [store for store in (self.lexical, self.signatures, self.vectors, self.ann) if store is not None]
+    
+    def _save_local_indexes(self, owner: str, repo: str):
+        for store in self._local_indexes():
+            store.save(owner, repo)
+    
+    def upsert_items(self, owner: str, repo: str, items: List[Union[Issue, Discussion]], batch_size: int = 300) -> int:
+        """Upsert already-fetched issues/discussions without re-syncing the repository"""
+        for start_idx in range(0, len(items), batch_size):
+            self._upsert_batch(owner, repo, items[start_idx:start_idx + batch_size])
+        if items:
+            self._save_local_indexes(owner, repo)
+        return len(items)
+    
+    def delete_items(self, doc_ids: List[str]) -> int:
+        """Remove documents from the index by id"""
+        if not doc_ids:
+            return 0
+        
+        if self._local_indexes():
+            by_repo: Dict[tuple, List[str]] = {}
+            for doc_id in doc_ids:
+                by_repo.setdefault(tuple(doc_id.split("/")[:2]), []).append(doc_id)
+            for (owner, repo), ids in by_repo.items():
+                for store in self._local_indexes():
+                    store.remove(owner, repo, ids)
+                self._save_local_indexes(owner, repo)
+        
+        if self.partitioning == "shared":
+            self._delete_from(self.collection, doc_ids)
+            return len(doc_ids)
+        
+        # Ids are "owner/repo/kind/number", which names the partition
+        by_partition: Dict[str, List[str]] = {}
+        for doc_id in doc_ids:
+            owner, repo = doc_id.split("/")[:2]
+            by_partition.setdefault(self._partition_name(owner, repo), []).append(doc_id)
+        for ids in by_partition.values():
+            owner, repo = ids[0].split("/")[:2]
+            self._delete_from(self._collection_for(owner, repo), ids)
+        return len(doc_ids)
+    
+    def _delete_from(self, collection, doc_ids: List[str]):
+        """Delete documents and their child (chunk and comment) vectors"""
+        collection.delete(ids=doc_ids)
+        collection.delete(where={"parent_id": {"$in": doc_ids}})
     
     def find_similar_issues(
         self, 
@@ -389,162 +1005,731 @@ class SimilarityService:
         repo: str, 
         issue_number: int, 
         top_k: int = 10,
-        min_similarity: float = 0.0
+        min_similarity: float = 0.0,
+        repositories: Optional[List[str]] = None,
+        filters: Optional[MetadataFilter] = None
     ) -> List[Dict[str, Union[str, float, int]]]:
+        """Indexed issues similar to an existing one; `repositories` ("owner/repo")
+        are searched alongside the issue's own repository. `filters` (state,
+        type, labels, date range) are pushed down into the vector store query."""
         target_issue = self._fetch_single_issue(owner, repo, issue_number)
         query_text = self._create_document_text(target_issue)
         
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=top_k + 1,
-            where={"$and": [{"owner": owner}, {"repo": repo}]}
+        if repositories:
+            return self.search_repositories(
+                [f"{owner}/{repo}", *repositories], query_text, top_k, min_similarity,
+                exclude_id=self._doc_id(owner, repo, target_issue), filters=filters
+            )
+        
+        return self._search_repository(
+            owner, repo, query_text, top_k, min_similarity,
+            exclude_id=self._doc_id(owner, repo, target_issue), exclude_number=issue_number, filters=filters,
+            raw_text=self._create_index_text(target_issue)
+        )
+    
+    def search_similar_text(
+        self,
+        owner: str,
+        repo: str,
+        title: str,
+        body: str = "",
+        top_k: int = 10,
+        min_similarity: float = 0.0,
+        repositories: Optional[List[str]] = None,
+        filters: Optional[MetadataFilter] = None
+    ) -> List[Dict[str, Union[str, float, int]]]:
+        """Find indexed issues similar to draft text, without fetching anything from GitHub"""
+        query_text = self._create_query_text(title, body)
+        if repositories:
+            return self.search_repositories([f"{owner}/{repo}", *repositories], query_text, top_k, min_similarity, filters=filters)
+        return self._search_repository(
+            owner, repo, query_text, top_k, min_similarity, filters=filters, raw_text=self._create_query_text(title, body, full=True)
+        )
+    
+    def query_similar_batch(
+        self,
+        owner: str,
+        repo: str,
+        query_texts: List[str],
+        n_results: int,
+        filters: Optional[MetadataFilter] = None
+    ) -> Dict:
+        """Embed and query many texts against one repository in a single call (locally when the repository has local vectors)"""
+        if self._has_local_vectors(owner, repo):
+            return self._query_local_vectors(owner, repo, self._embed(query_texts), n_results, filters)
+        return self._collection_for(owner, repo).query(
+            query_texts=query_texts,
+            n_results=n_results,
+            where=self._repo_where(owner, repo, *self._filter_clauses(filters))
         )
+    
+    @staticmethod
+    def _filter_clauses(filters: Optional[MetadataFilter]) -> List[Dict]:
+        return filters.clauses() if filters else []
+    
+    def _n_results(self, n: int) -> int:
+        """Raw matches to request for `n` results (chunk and comment matches are pooled into items)"""
+        return n * CHUNK_FANOUT if self.chunking or self.comments else n
+    
+    def _search_repository(
+        self,
+        owner: str,
+        repo: str,
+        query_text: str,
+        top_k: int,
+        min_similarity: float,
+        exclude_id: Optional[str] = None,
+        exclude_number: Optional[int] = None,
+        filters: Optional[MetadataFilter] = None,
+        raw_text: Optional[str] = None
+    ) -> List[Dict[str, Union[str, float, int]]]:
+        """Single-repository search: signature matches first, then hybrid or vector results"""
+        return self.search_repository_batch(
+            owner, repo, [(query_text, top_k, min_similarity, exclude_number)], filters, exclude_ids=[exclude_id], raw_texts=[raw_text]
+        )[0]
+    
+    def search_repository_batch(
+        self,
+        owner: str,
+        repo: str,
+        searches: List[Tuple[str, int, float, Optional[int]]],
+        filters: Optional[MetadataFilter] = None,
+        exclude_ids: Optional[List[Optional[str]]] = None,
+        raw_texts: Optional[List[Optional[str]]] = None
+    ) -> List[List[Dict[str, Union[str, float, int]]]]:
+        """Results for many (query text, top_k, min_similarity, issue number to exclude) searches of one repository.
         
-        similar_issues = []
-        if results["ids"] and results["ids"][0]:
-            for i, doc_id in enumerate(results["ids"][0]):
-                if results["metadatas"][0][i]["number"] == str(issue_number):
-                    continue
-                
-                distance = results["distances"][0][i] if results["distances"] else 0
-                similarity = 1 - distance
-                
-                if similarity >= min_similarity:
-                    metadata = results["metadatas"][0][i]
-                    similar_issues.append({
-                        "number": int(metadata["number"]),
-                        "title": metadata["title"],
-                        "similarity": round(similarity, 4),
-                        "state": metadata.get("state", "open"),
-                        "url": metadata["url"],
-                        "type": metadata.get("type", "issue"),
-                        "is_pull_request": metadata["is_pull_request"] == "True",
-                        "is_discussion": metadata.get("is_discussion", "False") == "True",
-                        "labels": metadata["labels"].split(",") if metadata["labels"] else []
-                    })
+        Each search gets signature matches first. With a keyword index the
+        rest is a hybrid search per query, since BM25 rankings are per query;
+        otherwise all searches share one embedding call and vector query.
+        `exclude_ids` overrides the document id excluded for each search
+        (by default the issue with the excluded number). `raw_texts` are the
+        untruncated, unnormalized texts (see _create_index_text) that
+        signatures and keywords are matched on, as when indexing; by default
+        the query text.
+        """
+        answers: List[List[Dict]] = [[] for _ in searches]
+        pending: Dict[int, List[Dict]] = {}  # search index -> its signature matches
+        hybrid = self._has_lexical_index(owner, repo)
+        for i, (query_text, top_k, min_similarity, exclude_number) in enumerate(searches):
+            exclude_id = exclude_ids[i] if exclude_ids else None
+            if exclude_id is None and exclude_number is not None:
+                exclude_id = f"{owner}/{repo}/issues/{exclude_number}"
+            raw_text = (raw_texts[i] if raw_texts else None) or query_text
+            exact = self.find_signature_duplicates(owner, repo, raw_text, top_k, exclude_id, filters=filters)
+            if len(exact) >= top_k:
+                answers[i] = exact
+            elif hybrid:
+                similar = self._hybrid_search(
+                    owner, repo, query_text, top_k, min_similarity, exclude_id=exclude_id, filters=filters, lexical_text=raw_text
+                )
+                answers[i] = self._merge_exact(exact, similar, top_k)
+            else:
+                pending[i] = exact
+        
+        if pending:
+            # Excluding the query issue may need one extra match
+            wanted = {i: searches[i][1] + (searches[i][3] is not None) for i in pending}
+            # Identical texts (e.g. the same issue requested twice) are embedded once
+            positions: Dict[str, int] = {}
+            for i in pending:
+                positions.setdefault(searches[i][0], len(positions))
+            results = self.query_similar_batch(owner, repo, list(positions), self._n_results(max(wanted.values())), filters)
+            for i, exact in pending.items():
+                query_text, top_k, min_similarity, exclude_number = searches[i]
+                # Only the matches a single query would see, so batching never changes an answer
+                similar = self._parse_similar_results(
+                    results, positions[query_text], exclude_number, min_similarity, self._n_results(wanted[i]), max_results=top_k
+                )
+                answers[i] = self._merge_exact(exact, similar, top_k)
+        return answers
+    
+    @staticmethod
+    def _merge_exact(exact: List[Dict], similar: List[Dict], top_k: int) -> List[Dict]:
+        """Signature matches followed by the other results, without repeating an item"""
+        if not exact:
+            return similar
+        seen = {result["url"] for result in exact}
+        return (exact + [result for result in similar if result["url"] not in seen])[:top_k]
+    
+    def find_signature_duplicates(
+        self,
+        owner: str,
+        repo: str,
+        text: str,
+        limit: int = 10,
+        exclude_id: Optional[str] = None,
+        filters: Optional[MetadataFilter] = None
+    ) -> List[Dict[str, Union[str, float, int]]]:
+        """Indexed items sharing an error signature (trace, exception or codes) with `text`.
+        
+        A hash lookup in the local signature index plus one get by id; no
+        vector search. Matches are reported with similarity 1.0, "match":
+        "signature" and the shared signature kinds.
+        """
+        if self.signatures is None:
+            return []
+        
+        matches = self.signatures.lookup(
+            owner, repo, text, exclude=[exclude_id] if exclude_id else [], min_weight=MIN_DUPLICATE_WEIGHT
+        )[:limit]
+        if not matches:
+            return []
+        
+        stored = self._collection_for(owner, repo).get(ids=[doc_id for doc_id, _, _ in matches], include=["metadatas"])
+        metadata_by_id = dict(zip(stored["ids"], stored["metadatas"]))
+        
+        duplicates = []
+        for doc_id, _, kinds in matches:
+            # Skip signatures of items deleted from the vector store since
+            if doc_id not in metadata_by_id:
+                continue
+            if filters and not filters.matches(metadata_by_id[doc_id]):
+                continue
+            result = similar_result(metadata_by_id[doc_id], 1.0)
+            result["match"] = "signature"
+            result["signatures"] = kinds
+            duplicates.append(result)
+        return duplicates
+    
+    def _has_lexical_index(self, owner: str, repo: str) -> bool:
+        return self.lexical is not None and len(self.lexical.get(owner, repo)) > 0
+    
+    def _local_vector_store(self, owner: str, repo: str):
+        """The ANN store, else the quantized vector store, whichever holds the repository"""
+        for store in (self.ann, self.vectors):
+            if store is not None and len(store.get(owner, repo)) > 0:
+                return store
+        return None
+    
+    def _has_local_vectors(self, owner: str, repo: str) -> bool:
+        return self._local_vector_store(owner, repo) is not None
+    
+    def _query_local_vectors(
+        self,
+        owner: str,
+        repo: str,
+        query_embeddings: List,
+        n_results: int,
+        filters: Optional[MetadataFilter] = None
+    ) -> Dict:
+        """Search the repository's local vectors, returning results shaped like Collection.query.
+        
+        Local indexes cannot filter while searching, so with `filters` the
+        search widens until enough matching items are found.
+        """
+        store = self._local_vector_store(owner, repo)
+        results = {"ids": [], "distances": [], "metadatas": []}
+        for embedding in query_embeddings:
+            fetch = n_results
+            while True:
+                hits = store.search(owner, repo, embedding, fetch)
+                if filters:
+                    hits = [hit for hit in hits if filters.matches(hit[2])]
+                if not filters or len(hits) >= n_results or fetch >= len(store.get(owner, repo)):
+                    break
+                fetch *= LOCAL_FILTER_FANOUT
+            hits = hits[:n_results]
+            results["ids"].append([doc_id for doc_id, _, _ in hits])
+            results["distances"].append([1 - similarity for _, similarity, _ in hits])
+            results["metadatas"].append([metadata for _, _, metadata in hits])
+        return results
+    
+    def build_local_vectors(self, owner: str, repo: str) -> Dict[str, Union[int, str]]:
+        """Rebuild a repository's local vectors from the embeddings already in the vector store (nothing is re-embedded)"""
+        if self.vectors is None:
+            raise ValueError("Local vectors are disabled; set DEJA_VIEW_DATA_DIR and DEJA_VIEW_VECTOR_QUANTIZATION")
+        
+        ids, embeddings, metadatas = self._stored_embeddings(owner, repo)
+        return {"repository": f"{owner}/{repo}", **self.vectors.rebuild(owner, repo, ids, embeddings, metadatas)}
+    
+    def build_ann_index(self, owner: str, repo: str) -> Dict[str, Union[int, float, str]]:
+        """Rebuild a repository's ANN index from its local vectors, or else from the embeddings in the vector store"""
+        if self.ann is None:
+            raise ValueError("The ANN index is disabled; set DEJA_VIEW_DATA_DIR and DEJA_VIEW_ANN_INDEX")
+        
+        local = self.vectors.contents(owner, repo) if self.vectors is not None else None
+        if local is not None and local[0]:
+            (ids, embeddings, metadatas), source = local, "local vectors"
+        else:
+            ids, embeddings, metadatas = self._stored_embeddings(owner, repo)
+            source = "vector store"
+        
+        stats = self.ann.rebuild(owner, repo, ids, embeddings, metadatas)
+        return {"repository": f"{owner}/{repo}", "index": self.ann.kind, "source": source, **stats}
+    
+    def _stored_embeddings(self, owner: str, repo: str) -> tuple:
+        """(ids, float32 embeddings, metadatas) of every item of a repository in the vector store"""
+        ids, embeddings, metadatas = [], [], []
+        for page in self._iter_repo_pages(owner, repo, include=["metadatas", "embeddings"]):
+            ids.extend(page["ids"])
+            embeddings.extend(page["embeddings"])
+            metadatas.extend(page["metadatas"])
+        return ids, np.asarray(embeddings, dtype=np.float32), metadatas
+    
+    def _hybrid_search(
+        self,
+        owner: str,
+        repo: str,
+        query_text: str,
+        top_k: int = 10,
+        min_similarity: float = 0.0,
+        exclude_id: Optional[str] = None,
+        filters: Optional[MetadataFilter] = None,
+        lexical_text: Optional[str] = None
+    ) -> List[Dict[str, Union[str, float, int]]]:
+        """Fuse BM25 and vector rankings with reciprocal rank fusion, best first.
+        
+        Both sides only need top_k candidates since exact-term matches are
+        recovered by the lexical side. Results keep their cosine similarity
+        (fetched from the stored embedding for lexical-only hits), which
+        `min_similarity` applies to, plus "rrf_score" and "match"
+        ("semantic", "lexical" or "both"). Chunk matches rank as their
+        parent item at its best chunk's position. `lexical_text` (default
+        `query_text`) is the text the keyword side searches with.
+        """
+        exclude = [exclude_id] if exclude_id else []
+        lexical_text = lexical_text or query_text
+        if filters:
+            # The keyword index has no filter support: over-fetch, then keep matching items
+            hits = self.lexical.search(owner, repo, lexical_text, top_k * LOCAL_FILTER_FANOUT, exclude=exclude)
+            hits = [hit for hit in hits if hit[2] is None or filters.matches(hit[2])]
+        else:
+            hits = self.lexical.search(owner, repo, lexical_text, top_k, exclude=exclude)
+        lexical = [doc_id for doc_id, _, _ in hits[:top_k]]
+        
+        collection = self._collection_for(owner, repo)
+        query_embedding = self._embed([query_text])
+        if self._has_local_vectors(owner, repo):
+            results = self._query_local_vectors(owner, repo, query_embedding, self._n_results(top_k + len(exclude)), filters)
+        else:
+            results = collection.query(
+                query_embeddings=query_embedding,
+                n_results=self._n_results(top_k + len(exclude)),
+                where=self._repo_where(owner, repo, *self._filter_clauses(filters))
+            )
+        similarities: Dict[str, float] = {}
+        metadatas: Dict[str, Dict] = {}
+        for i, doc_id in enumerate(results["ids"][0] if results["ids"] else []):
+            metadata = results["metadatas"][0][i]
+            doc_id = metadata.get("parent_id", doc_id)
+            # Matches come back closest first, so the first hit per item is its best
+            if doc_id in exclude or doc_id in similarities:
+                continue
+            similarities[doc_id] = 1 - results["distances"][0][i]
+            metadatas[doc_id] = metadata
+        semantic = list(similarities)
         
+        fused = reciprocal_rank_fusion([semantic, lexical], k=RRF_K)[:top_k]
+        
+        missing = [doc_id for doc_id, _ in fused if doc_id not in similarities]
+        if missing:
+            stored = collection.get(ids=missing, include=["embeddings", "metadatas"])
+            query_vector = np.asarray(query_embedding[0], dtype=np.float32)
+            for doc_id, embedding, metadata in zip(stored["ids"], stored["embeddings"], stored["metadatas"]):
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = float(np.linalg.norm(vector) * np.linalg.norm(query_vector))
+                similarities[doc_id] = float(vector @ query_vector) / norm if norm else 0.0
+                metadatas[doc_id] = metadata
+        
+        semantic_ids, lexical_ids = set(semantic), set(lexical)
+        similar_issues = []
+        for doc_id, score in fused:
+            # A lexical hit may have been deleted from the vector store since
+            if doc_id not in similarities or similarities[doc_id] < min_similarity:
+                continue
+            if filters and not filters.matches(metadatas[doc_id]):
+                continue
+            result = similar_result(metadatas[doc_id], similarities[doc_id])
+            result["rrf_score"] = round(score, 6)
+            result["match"] = "both" if doc_id in semantic_ids and doc_id in lexical_ids else ("semantic" if doc_id in semantic_ids else "lexical")
+            similar_issues.append(result)
         return similar_issues
     
+    def _embed(self, texts: List[str]) -> List:
+        """Embed texts with the collections' default embedding function (loaded on first use)"""
+        if self._embedding_function is None:
+            from chromadb.utils import embedding_functions
+            self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        return self._embedding_function(texts)
+    
+    def _repository_groups(self, repositories: List[str]) -> List[tuple]:
+        """(collection, where) per collection that must be queried to cover `repositories`"""
+        pairs = []
+        for repository in dict.fromkeys(repositories):
+            owner, _, repo = repository.partition("/")
+            if not owner or not repo or "/" in repo:
+                raise ValueError(f"Repository must be in format 'owner/repo' (got '{repository}')")
+            pairs.append((owner, repo))
+        
+        if self.partitioning == "shared":
+            scopes = [self._repo_where(owner, repo) for owner, repo in pairs]
+            return [(self.collection, scopes[0] if len(scopes) == 1 else {"$or": scopes})]
+        
+        if self.partitioning == "repo":
+            return [(self._collection_for(owner, repo), None) for owner, repo in pairs]
+        
+        by_owner: Dict[str, List[tuple]] = {}
+        for owner, repo in pairs:
+            by_owner.setdefault(self._partition_name(owner, repo), []).append((owner, repo))
+        groups = []
+        for members in by_owner.values():
+            repos = [repo for _, repo in members]
+            where = {"repo": repos[0]} if len(repos) == 1 else {"repo": {"$in": repos}}
+            groups.append((self._collection_for(*members[0]), where))
+        return groups
+    
+    def search_repositories(
+        self,
+        repositories: List[str],
+        query_text: str,
+        top_k: int = 10,
+        min_similarity: float = 0.0,
+        exclude_id: Optional[str] = None,
+        max_workers: int = 8,
+        filters: Optional[MetadataFilter] = None
+    ) -> List[Dict[str, Union[str, float, int]]]:
+        """Most similar items across several repositories ("owner/repo"), best first.
+        
+        Each collection covering the set is queried in parallel with a single
+        query embedding, and the per-collection rankings are k-way merged on
+        similarity (or "pooled_score" with sum pooling). Results carry a
+        "repository" field. `filters` are AND-ed into each collection's query.
+        
+        Only the vector store is searched. The per-repository local vectors,
+        ANN, keyword and signature indexes are not consulted.
+        """
+        groups = self._repository_groups(repositories)
+        n_results = self._n_results(top_k + (1 if exclude_id else 0))
+        # Embed once instead of once per collection
+        query = {"query_texts": [query_text]} if len(groups) == 1 else {"query_embeddings": self._embed([query_text])}
+        
+        def run(group):
+            collection, where = group
+            conditions = ([where] if where else []) + self._filter_clauses(filters)
+            where = None if not conditions else (conditions[0] if len(conditions) == 1 else {"$and": conditions})
+            results = collection.query(n_results=n_results, where=where, **query)
+            return self._parse_similar_results(
+                results, 0, None, min_similarity, n_results,
+                include_repository=True, exclude_id=exclude_id, max_results=top_k
+            )
+        
+        if len(groups) == 1:
+            rankings = [run(groups[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as executor:
+                rankings = list(executor.map(run, groups))
+        
+        merged = heapq.merge(*rankings, key=lambda result: -result.get("pooled_score", result["similarity"]))
+        return list(itertools.islice(merged, top_k))
+    
+    def find_similar_batch(
+        self,
+        owner: str,
+        repo: str,
+        issue_numbers: Optional[List[int]] = None,
+        queries: Optional[List[str]] = None,
+        top_k: int = 10,
+        min_similarity: float = 0.0,
+        query_batch_size: int = 50
+    ) -> Iterator[Dict]:
+        """Resolve many issue numbers and/or free-text queries, yielding one result per input.
+        
+        Issues are fetched with batched GraphQL requests and each group of
+        `query_batch_size` inputs is resolved by search_repository_batch
+        (signature matches first, then one vector query for the group, or
+        hybrid search per input), so results can be streamed while later
+        groups are still running.
+        """
+        issue_numbers = issue_numbers or []
+        queries = queries or []
+        issues = self._fetch_issues_by_number(owner, repo, issue_numbers) if issue_numbers else {}
+        
+        # (result key, query text, raw text for the local indexes, number to exclude)
+        pending = []
+        for number in issue_numbers:
+            if number not in issues:
+                yield {"issue_number": number, "error": f"Issue #{number} not found in {owner}/{repo}"}
+                continue
+            issue = issues[number]
+            pending.append(({"issue_number": number}, self._create_document_text(issue), self._create_index_text(issue), number))
+        for text in queries:
+            pending.append(({"query": text}, self._create_query_text(text), self._create_query_text(text, full=True), None))
+        
+        for start_idx in range(0, len(pending), query_batch_size):
+            chunk = pending[start_idx:start_idx + query_batch_size]
+            answers = self.search_repository_batch(
+                owner, repo, [(text, top_k, min_similarity, exclude_number) for _, text, _, exclude_number in chunk],
+                raw_texts=[raw_text for _, _, raw_text, _ in chunk]
+            )
+            for (key, _, _, _), similar_issues in zip(chunk, answers):
+                yield {**key, "similar_issues": similar_issues, "count": len(similar_issues)}
+    
+    def _parse_similar_results(
+        self,
+        results: Dict,
+        query_index: int,
+        exclude_number: Optional[int],
+        min_similarity: float,
+        limit: int,
+        include_repository: bool = False,
+        exclude_id: Optional[str] = None,
+        max_results: Optional[int] = None
+    ) -> List[Dict[str, Union[str, float, int]]]:
+        """Turn the raw matches for one query into similarity results.
+        
+        Only the first `limit` matches are considered, so batched queries
+        with a larger n_results give the same answer as a single query.
+        Chunk matches are pooled into their parent item, which keeps its
+        best chunk's similarity; with sum pooling items are ranked by the
+        summed similarity of their matches, reported as "pooled_score".
+        At most `max_results` items (default `limit`) are returned.
+        """
+        if not results["ids"] or not results["ids"][query_index]:
+            return []
+        
+        # parent id -> [metadata, best similarity, summed similarity]
+        pooled: Dict[str, list] = {}
+        for i, doc_id in enumerate(results["ids"][query_index][:limit]):
+            metadata = results["metadatas"][query_index][i]
+            if exclude_number is not None and read_number(metadata) == exclude_number:
+                continue
+            parent_id = metadata.get("parent_id", doc_id)
+            if exclude_id is not None and parent_id == exclude_id:
+                continue
+            
+            distance = results["distances"][query_index][i] if results["distances"] else 0
+            similarity = 1 - distance
+            
+            entry = pooled.get(parent_id)
+            if entry is None:
+                pooled[parent_id] = [metadata, similarity, similarity]
+            else:
+                entry[1] = max(entry[1], similarity)
+                entry[2] += similarity
+        
+        entries = list(pooled.values())
+        if self.chunk_pooling == "sum":
+            entries.sort(key=lambda entry: -entry[2])
+        
+        similar_issues = []
+        for metadata, similarity, total in entries:
+            if similarity < min_similarity:
+                continue
+            result = similar_result(metadata, similarity)
+            if include_repository:
+                result["repository"] = f"{metadata['owner']}/{metadata['repo']}"
+            if self.chunk_pooling == "sum":
+                result["pooled_score"] = round(total, 4)
+            similar_issues.append(result)
+        
+        return similar_issues[:max_results or limit]
+    
+    def _get_all(self, where: Optional[Dict] = None, include: Optional[List[str]] = None, page_size: int = 100, collection=None) -> Dict[str, List]:
+        """Collection.get over every matching item, fetched in pages of `page_size`"""
+        result = {"ids": [], "metadatas": [], "documents": [], "embeddings": []}
+        for page in self._iter_pages(where, include, page_size, collection=collection):
+            for key in ("metadatas", "documents", "embeddings"):
+                values = page.get(key)
+                result[key].extend(values if values is not None else [None] * len(page["ids"]))
+            result["ids"].extend(page["ids"])
+        return result
+    
+    def _iter_pages(self, where: Optional[Dict] = None, include: Optional[List[str]] = None, page_size: int = 100, collection=None) -> Iterator[Dict]:
+        """Yield collection.get pages (Chroma Cloud caps each get at a small quota)"""
+        collection = collection if collection is not None else self.collection
+        kwargs = {"include": include or ["metadatas"]}
+        if where:
+            kwargs["where"] = where
+        
+        offset = 0
+        while True:
+            page = collection.get(limit=page_size, offset=offset, **kwargs)
+            if page["ids"]:
+                yield page
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+    
+    def _iter_repo_pages(self, owner: str, repo: str, include: Optional[List[str]] = None, where: Optional[List[Dict]] = None) -> Iterator[Dict]:
+        """Pages of one repository's items (extra `where` clauses are AND-ed), read from its partition"""
+        return self._iter_pages(
+            self._repo_where(owner, repo, *(where or [])),
+            include,
+            collection=self._collection_for(owner, repo)
+        )
+    
+    def _get_repo_items(self, owner: str, repo: str, include: Optional[List[str]] = None, where: Optional[List[Dict]] = None) -> Dict[str, List]:
+        """All of one repository's items (see _iter_repo_pages)"""
+        return self._get_all(
+            self._repo_where(owner, repo, *(where or [])),
+            include,
+            collection=self._collection_for(owner, repo)
+        )
+    
+    @staticmethod
+    def _body_from_document(document: Optional[str]) -> str:
+        """Recover the issue body from stored document text (see _create_document_text)"""
+        if not document:
+            return ""
+        marker = document.find("\n\nBody: ")
+        return document[marker + len("\n\nBody: "):] if marker != -1 else ""
+    
     def get_stats(self) -> Dict[str, Union[int, List[str]]]:
+        if self.partitioning != "shared":
+            return self._partitioned_stats()
+        
         all_items = self.collection.get()
         
         if not all_items["ids"]:
             return {"total_issues": 0, "repositories": []}
         
         repos = set()
+        total = 0
         for metadata in all_items["metadatas"]:
+            if "parent_id" in metadata:
+                continue
+            total += 1
             repos.add(f"{metadata['owner']}/{metadata['repo']}")
         
         return {
-            "total_issues": len(all_items["ids"]),
+            "total_issues": total,
             "repositories": sorted(list(repos))
         }
     
+    def _parent_count(self, collection) -> int:
+        """Items in a collection, not counting their chunk and comment vectors (as shared-mode get_stats)"""
+        count = collection.count()
+        if count:
+            for page in self._iter_pages({"type": {"$in": list(CHILD_TYPES)}}, collection=collection):
+                count -= len(page["ids"])
+        return count
+    
+    def _partitioned_stats(self) -> Dict[str, Union[int, List[str], str]]:
+        total = 0
+        repos = set()
+        partitions = self._partition_collections()
+        for collection in partitions:
+            count = self._parent_count(collection)
+            total += count
+            if not count:
+                continue
+            # Repo partitions record their repository; owner partitions are scanned
+            metadata = collection.metadata or {}
+            if metadata.get("repo"):
+                repos.add(f"{metadata['owner']}/{metadata['repo']}")
+            else:
+                for page in self._iter_pages(collection=collection):
+                    repos.update(f"{m['owner']}/{m['repo']}" for m in page["metadatas"] if "parent_id" not in m)
+        
+        stats = {
+            "total_issues": total,
+            "repositories": sorted(repos),
+            "partitioning": self.partitioning,
+            "partitions": len(partitions)
+        }
+        unmigrated = self._parent_count(self.collection)
+        if unmigrated:
+            stats["unmigrated_items"] = unmigrated
+        return stats
+    
     def clear_all(self) -> Dict[str, str]:
         try:
+            for collection in self._partition_collections():
+                self.client.delete_collection(getattr(collection, "name", collection))
+            with self._partitions_lock:
+                self._partitions.clear()
             self.client.delete_collection(self.collection_name)
             self._init_collection()
+            for store in self._local_indexes():
+                store.clear()
             return {"message": "All issues cleared successfully"}
         except Exception as e:
             return {"error": str(e)}
     
-    def _calculate_discussion_score(self, issue: Issue) -> tuple[float, List[str]]:
-        """Calculate how likely an issue should be a discussion - more aggressive scoring"""
-        score = 0.0
-        reasons = []
-        
-        title_lower = issue.title.lower()
-        body_lower = (issue.body or "").lower()
-        combined_text = f"{title_lower} {body_lower}"
-        
-        # Check question patterns (increased weight)
-        for pattern in self.question_patterns:
-            if re.search(pattern, combined_text, re.IGNORECASE):
-                score += 0.4
-                reasons.append("Contains question pattern")
-                break
-        
-        # Check feature request patterns (increased weight)
-        for pattern in self.feature_patterns:
-            if re.search(pattern, combined_text, re.IGNORECASE):
-                score += 0.35
-                reasons.append("Feature request pattern")
-                break
+    def migrate_to_partitions(self, drop_shared: bool = False, page_size: int = 100) -> Dict[str, Union[int, str]]:
+        """Copy every item of the shared collection into its partition.
         
-        # Check RFC/Proposal patterns
-        for pattern in self.proposal_patterns:
-            if re.search(pattern, combined_text, re.IGNORECASE):
-                score += 0.45
-                reasons.append("RFC/Proposal pattern")
-                break
-        
-        # Check discussion-oriented phrases
-        for pattern in self.discussion_phrases:
-            if re.search(pattern, combined_text, re.IGNORECASE):
-                score += 0.3
-                reasons.append("Discussion-oriented language")
-                break
+        Stored embeddings are copied as-is, so nothing is re-embedded. The
+        shared collection is only deleted (with `drop_shared`) after every
+        page has been copied; rerunning a partial migration is safe since
+        writes are upserts.
+        """
+        if self.partitioning == "shared":
+            raise ValueError("Set CHROMA_PARTITIONING to 'repo' or 'owner' before migrating")
         
-        # Check labels (increased weight)
-        for label in issue.labels:
-            if label.lower() in [dl.lower() for dl in self.discussion_labels]:
-                score += 0.5
-                reasons.append(f"Has '{label}' label")
-                break
-        
-        # Check for discussion-worthy keywords (expanded list)
-        discussion_keywords = [
-            'opinion', 'thoughts', 'feedback', 'advice', 'best practice',
-            'recommendation', 'approach', 'strategy', 'philosophy', 'design decision',
-            'brainstorm', 'explore', 'consider', 'community', 'input', 'guidance',
-            'experience', 'lessons', 'workflow', 'process', 'methodology'
-        ]
-        
-        keyword_count = 0
-        for keyword in discussion_keywords:
-            if keyword in combined_text:
-                keyword_count += 1
-                if keyword_count == 1:  # Only add reason once
-                    reasons.append(f"Contains discussion keywords")
-        
-        # Scale score based on number of keywords found
-        if keyword_count > 0:
-            score += min(0.3, keyword_count * 0.1)
-        
-        # Reduced penalty for bug-related keywords (they might still be feature requests)
-        bug_keywords = ['crash', 'exception', 'traceback', 'stacktrace', 'segfault']
-        for keyword in bug_keywords:
-            if keyword in combined_text:
-                score -= 0.15  # Reduced from 0.3
-                reasons.append(f"Possible bug report: '{keyword}'")
-                break
+        migrated = 0
+        partitions = set()
+        for page in self._iter_pages(include=["metadatas", "documents", "embeddings"], page_size=page_size):
+            groups: Dict[tuple, List[int]] = {}
+            for i, metadata in enumerate(page["metadatas"]):
+                groups.setdefault((metadata["owner"], metadata["repo"]), []).append(i)
+            
+            for (owner, repo), rows in groups.items():
+                self._collection_for(owner, repo).upsert(
+                    ids=[page["ids"][i] for i in rows],
+                    embeddings=[page["embeddings"][i] for i in rows],
+                    documents=[page["documents"][i] for i in rows],
+                    metadatas=[page["metadatas"][i] for i in rows]
+                )
+                partitions.add(self._partition_name(owner, repo))
+            migrated += len(page["ids"])
         
-        # Check if issue title suggests it's not a bug
-        non_bug_indicators = ['feature', 'enhancement', 'suggestion', 'idea', 'proposal', 'rfc', 'discussion']
-        for indicator in non_bug_indicators:
-            if indicator in title_lower:
-                score += 0.2
-                reasons.append(f"Non-bug indicator in title: '{indicator}'")
-                break
+        if drop_shared and migrated:
+            self.client.delete_collection(self.collection_name)
+            self._init_collection()
         
-        # Bonus for open issues (closed issues less likely to be converted)
-        if issue.state == 'open':
-            score += 0.15  # Increased from 0.1
+        return {
+            "migrated": migrated,
+            "partitions": len(partitions),
+            "partitioning": self.partitioning,
+            "dropped_shared": drop_shared and migrated > 0
+        }
+    
+    def migrate_metadata(self, owner: Optional[str] = None, repo: Optional[str] = None, page_size: int = 100) -> Dict[str, int]:
+        """Rewrite metadata stored before the typed schema (all strings) with typed fields.
         
-        # Additional scoring for title patterns that suggest discussion
-        title_discussion_patterns = [
-            r'^(rfc|proposal|idea|suggestion|enhancement|feature)[:.]',
-            r'\[(rfc|proposal|idea|suggestion|enhancement|feature)\]',
-            r'\b(thoughts|feedback|opinions)\b.*\?'
-        ]
+        Covers one repository, or every collection when none is given. Only
+        metadata is updated, so nothing is re-embedded; local vector copies
+        get the same records. Rerunning is safe since typed records are
+        skipped.
+        """
+        if owner and repo:
+            sources = [(self._collection_for(owner, repo), self._repo_where(owner, repo))]
+        else:
+            sources = [(collection, None) for collection in [self.collection, *self._partition_collections()]]
         
-        for pattern in title_discussion_patterns:
-            if re.search(pattern, title_lower, re.IGNORECASE):
-                score += 0.25
-                reasons.append("Title suggests discussion format")
-                break
+        scanned = migrated = 0
+        touched = set()
+        for collection, where in sources:
+            for page in self._iter_pages(where, ["metadatas"], page_size, collection=collection):
+                scanned += len(page["ids"])
+                legacy = [
+                    (doc_id, upgrade_metadata(metadata))
+                    for doc_id, metadata in zip(page["ids"], page["metadatas"])
+                    if metadata.get("schema") != METADATA_SCHEMA_VERSION
+                ]
+                if not legacy:
+                    continue
+                collection.update(ids=[doc_id for doc_id, _ in legacy], metadatas=[metadata for _, metadata in legacy])
+                migrated += len(legacy)
+                
+                by_repo: Dict[tuple, List[tuple]] = {}
+                for doc_id, metadata in legacy:
+                    by_repo.setdefault((metadata["owner"], metadata["repo"]), []).append((doc_id, metadata))
+                for (item_owner, item_repo), rows in by_repo.items():
+                    for store in self._vector_stores():
+                        store.set_metadatas(item_owner, item_repo, [doc_id for doc_id, _ in rows], [metadata for _, metadata in rows])
+                    touched.add((item_owner, item_repo))
         
-        return max(0.0, min(1.0, score)), reasons
+        for item_owner, item_repo in touched:
+            for store in self._vector_stores():
+                store.save(item_owner, item_repo)
+        return {"scanned": scanned, "migrated": migrated}
+    
+    def _calculate_discussion_score(self, issue: Issue) -> tuple[float, List[str]]:
+        """Calculate how likely an issue should be a discussion - more aggressive scoring"""
+        return self.discussion_scorer.score(issue.title, issue.body, issue.labels, issue.state)
     
     def suggest_discussions(
         self, 
@@ -552,20 +1737,38 @@ class SimilarityService:
         repo: str, 
         min_score: float = 0.3,
         max_suggestions: int = 20,
-        dry_run: bool = True
+        dry_run: bool = True,
+        workers: int = 1,
+        mode: str = "heuristic"
     ) -> Dict[str, Union[List[Dict], int, str]]:
-        """Suggest which issues should be converted to discussions"""
-        
-        # Get all issues from the repository
-        all_issues = self.collection.get(
-            where={"$and": [
-                {"owner": owner}, 
-                {"repo": repo},
-                {"type": "issue"}  # Only analyze issues, not PRs or existing discussions
-            ]}
-        )
+        """Suggest which issues should be converted to discussions.
         
-        if not all_issues["ids"]:
+        mode="heuristic" scores issue text with DiscussionScorer; with workers > 1,
+        large repositories are split into shards scored in parallel worker
+        processes. mode="embedding" classifies the stored vectors against
+        discussion-like and bug-like centroids seeded from the repository.
+        """
+        if mode not in ("heuristic", "embedding"):
+            raise ValueError(f"Unknown discussion scoring mode '{mode}' (expected 'heuristic' or 'embedding')")
+        
+        if mode == "heuristic":
+            # Only analyze issues, not PRs or existing discussions; pages are
+            # streamed into a bounded heap so memory stays O(max_suggestions)
+            pages = self._iter_repo_pages(owner, repo, include=["metadatas", "documents"], where=[{"type": "issue"}])
+            total_analyzed, candidates = self._heuristic_discussion_candidates(
+                pages, min_score, max_suggestions, workers
+            )
+        else:
+            # Existing discussions seed the discussion-like centroid
+            all_items = self._get_repo_items(
+                owner, repo,
+                include=["metadatas", "embeddings"],
+                where=[{"type": {"$in": ["issue", "discussion"]}}]
+            )
+            total_analyzed = len([m for m in all_items["metadatas"] if m.get("type") == "issue"])
+            candidates = self._embedding_discussion_candidates(all_items, min_score, max_suggestions) if total_analyzed else []
+        
+        if not total_analyzed:
             return {
                 "suggestions": [],
                 "total_analyzed": 0,
@@ -576,59 +1779,35 @@ class SimilarityService:
         
         suggestions = []
         
-        for i, metadata in enumerate(all_issues["metadatas"]):
-            # Reconstruct issue from metadata
-            issue = Issue(
-                number=int(metadata["number"]),
-                title=metadata["title"],
-                body="",  # We don't store full body in metadata, would need to fetch
-                state=metadata.get("state", "open"),
-                created_at=metadata["created_at"],
-                updated_at=metadata["updated_at"],
-                url=metadata["url"],
-                labels=metadata["labels"].split(",") if metadata["labels"] else [],
-                is_pull_request=metadata["is_pull_request"] == "True",
-                is_discussion=metadata.get("is_discussion", "False") == "True"
-            )
-            
-            # Skip pull requests
-            if issue.is_pull_request:
-                continue
+        for score, metadata, reasons in candidates:
+            # Calculate confidence level
+            if score >= 0.7:
+                confidence = "high"
+            elif score >= 0.5:
+                confidence = "medium"
+            else:
+                confidence = "low"
             
-            score, reasons = self._calculate_discussion_score(issue)
-            
-            if score >= min_score:
-                # Calculate confidence level
-                if score >= 0.7:
-                    confidence = "high"
-                elif score >= 0.5:
-                    confidence = "medium"
-                else:
-                    confidence = "low"
-                
-                suggestions.append({
-                    "number": issue.number,
-                    "title": issue.title,
-                    "url": issue.url,
-                    "score": round(score, 3),
-                    "confidence": confidence,
-                    "reasons": reasons,
-                    "state": issue.state,
-                    "labels": issue.labels,
-                    "created_at": issue.created_at
-                })
-        
-        # Sort by score (highest first)
-        suggestions.sort(key=lambda x: x["score"], reverse=True)
-        suggestions = suggestions[:max_suggestions]
+            suggestions.append({
+                "number": read_number(metadata),
+                "title": metadata["title"],
+                "url": metadata["url"],
+                "score": round(score, 3),
+                "confidence": confidence,
+                "reasons": reasons,
+                "state": metadata.get("state", "open"),
+                "labels": read_labels(metadata),
+                "created_at": metadata["created_at"]
+            })
         
         result = {
             "suggestions": suggestions,
-            "total_analyzed": len([m for m in all_issues["metadatas"] if m.get("type") == "issue"]),
+            "total_analyzed": total_analyzed,
             "total_suggestions": len(suggestions),
             "repository": f"{owner}/{repo}",
             "dry_run": dry_run,
-            "min_score": min_score
+            "min_score": min_score,
+            "mode": mode
         }
         
         if dry_run:
@@ -638,64 +1817,163 @@ class SimilarityService:
         
         return result
 
+    def _heuristic_discussion_candidates(
+        self,
+        pages: Iterator[Dict],
+        min_score: float,
+        limit: int,
+        workers: int = 1
+    ) -> tuple:
+        """(issues analyzed, top `limit` (score, metadata, reasons) candidates, best first).
+        
+        Serially each page is scored as one batch. With workers > 1, rows are
+        grouped into shards of MIN_DISCUSSION_SHARD and scored in worker
+        processes while later pages are still being read.
+        """
+        top = TopK(limit, key=lambda candidate: round(candidate[0], 3))
+        shard_size = MIN_DISCUSSION_SHARD if workers > 1 else None
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        in_flight = deque()
+        analyzed = 0
+        rows, bodies = [], []
+        
+        def collect(shard_rows, shard):
+            # score_shard already orders each shard's own top `limit`
+            for score, i, reasons in shard:
+                top.push((score, shard_rows[i], reasons))
+        
+        def submit(shard_rows, shard_bodies):
+            columns = (
+                [m["title"] for m in shard_rows],
+                shard_bodies,
+                [read_labels(m) for m in shard_rows],
+                [m.get("state", "open") for m in shard_rows]
+            )
+            if executor is None:
+                collect(shard_rows, score_shard(*columns, min_score, limit, scorer=self.discussion_scorer))
+                return
+            
+            in_flight.append((shard_rows, executor.submit(score_shard, *columns, min_score, limit)))
+            # Results are merged in row order, which keeps ties stable
+            while len(in_flight) > 2 * workers:
+                done_rows, future = in_flight.popleft()
+                collect(done_rows, future.result())
+        
+        try:
+            for page in pages:
+                for metadata, document in zip(page["metadatas"], page.get("documents") or [None] * len(page["ids"])):
+                    analyzed += 1
+                    if read_flag(metadata, "is_pull_request"):
+                        continue
+                    rows.append(metadata)
+                    bodies.append(self._body_from_document(document))
+                    
+                    if shard_size and len(rows) >= shard_size:
+                        submit(rows, bodies)
+                        rows, bodies = [], []
+                
+                if not shard_size and rows:
+                    submit(rows, bodies)
+                    rows, bodies = [], []
+            
+            if rows:
+                submit(rows, bodies)
+            while in_flight:
+                done_rows, future = in_flight.popleft()
+                collect(done_rows, future.result())
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        
+        return analyzed, top.items()
+    
+    def _embedding_discussion_candidates(self, items: Dict[str, List], min_score: float, limit: int) -> List[tuple]:
+        """Top `limit` (score, metadata, reasons) candidates from stored embeddings via CentroidClassifier"""
+        metadatas = items["metadatas"]
+        embeddings = np.asarray(items["embeddings"], dtype=np.float32)
+        
+        classifier = CentroidClassifier(self.discussion_scorer.discussion_labels)
+        discussion_like, bug_like = classifier.seed_masks(metadatas)
+        classifier.fit(embeddings, discussion_like, bug_like)
+        
+        issue_rows = [i for i, m in enumerate(metadatas) if m.get("type") == "issue" and not read_flag(m, "is_pull_request")]
+        if not issue_rows:
+            return []
+        
+        similarities = classifier.similarities(embeddings[issue_rows])
+        scores = classifier.score(embeddings[issue_rows])
+        
+        top = TopK(limit, key=lambda candidate: round(candidate[0], 3))
+        for i in np.flatnonzero(scores >= min_score):
+            top.push((float(scores[i]), int(i)))
+        
+        return [
+            (score, metadatas[issue_rows[i]], [
+                f"Embedding closer to discussions ({similarities[i, 0]:.2f}) "
+                f"than bug reports ({similarities[i, 1]:.2f})"
+            ])
+            for score, i in top.items()
+        ]
+    
     def add_issue_labels(self, owner: str, repo: str, issue_number: int, labels: List[str]) -> bool:
-        """Add labels to a GitHub issue"""
+        """Add labels to a GitHub issue (see apply_labels_bulk for many issues)"""
         if not self.github_token:
             raise ValueError("GITHUB_TOKEN required for label management")
         
-        url = f"https://api.github.com/repos/{owner}/{repo}/issues/{issue_number}/labels"
-        headers = {
-            "Authorization": f"token {self.github_token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        
-        try:
-            response = requests.post(url, json=labels, headers=headers)
-            response.raise_for_status()
-            return True
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to add labels to issue #{issue_number}: {e}")
+        result = self.apply_labels_bulk(owner, repo, {issue_number: labels})[0]
+        if result["status"] == "failed":
+            print(f"Failed to add labels to issue #{issue_number}: {result.get('error', '')}")
             return False
+        return True
     
     def ensure_labels_exist(self, owner: str, repo: str, labels_config: Dict[str, str]) -> bool:
         """Ensure labels exist in the repository, create them if not"""
-        if not self.github_token:
-            raise ValueError("GITHUB_TOKEN required for label management")
+        applier = LabelApplier(self.github_token)
         
-        headers = {
-            "Authorization": f"token {self.github_token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-        
-        # Get existing labels
-        existing_labels = {}
-        url = f"https://api.github.com/repos/{owner}/{repo}/labels"
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            for label in response.json():
-                existing_labels[label["name"].lower()] = label
+            applier.ensure_labels(owner, repo, labels_config)
         except requests.exceptions.RequestException as e:
             print(f"Failed to fetch existing labels: {e}")
             return False
         
-        # Create missing labels
-        for label_name, label_color in labels_config.items():
-            if label_name.lower() not in existing_labels:
-                try:
-                    create_url = f"https://api.github.com/repos/{owner}/{repo}/labels"
-                    response = requests.post(
-                        create_url,
-                        json={"name": label_name, "color": label_color},
-                        headers=headers
-                    )
-                    response.raise_for_status()
-                    print(f"Created label: {label_name}")
-                except requests.exceptions.RequestException as e:
-                    print(f"Failed to create label {label_name}: {e}")
-        
         return True
-
+    
+    def apply_labels_bulk(
+        self,
+        owner: str,
+        repo: str,
+        assignments: Dict[int, List[str]],
+        current_labels: Optional[Dict[int, List[str]]] = None,
+        labels_config: Optional[Dict[str, str]] = None,
+        max_workers: int = 4,
+        transport: str = "rest"
+    ) -> List[Dict]:
+        """Add labels to many issues and report a result per issue.
+        
+        Labels in `labels_config` ({name: color}) are created first if missing,
+        and labels listed in `current_labels` for an issue are not re-sent.
+        transport="rest" sends one request per issue over a shared session with
+        bounded concurrency; transport="graphql" packs aliased mutations into a
+        few GraphQL requests. Returns one {"number", "status", "labels"[, "error"]}
+        dict per issue.
+        """
+        if transport not in ("rest", "graphql"):
+            raise ValueError(f"Unknown label transport '{transport}' (expected 'rest' or 'graphql')")
+        
+        applier = LabelApplier(self.github_token, max_workers=max_workers)
+        
+        if labels_config:
+            try:
+                applier.ensure_labels(owner, repo, labels_config)
+            except requests.exceptions.RequestException as e:
+                print(f"Failed to fetch existing labels: {e}")
+        
+        if transport == "graphql":
+            results = GraphQLBatchWriter(self.github_token).add_labels(owner, repo, assignments, current_labels)
+        else:
+            results = applier.apply(owner, repo, assignments, current_labels)
+        
+        return [result.to_dict() for result in results]
 
 if __name__ == "__main__":
     pass
\ No newline at end of file
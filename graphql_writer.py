@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+GraphQL Batch Writer
+Packs many aliased `addLabelsToLabelable` / `addComment` mutations into each
+GitHub GraphQL request, so mass triage costs a handful of HTTP calls instead
+of one REST call per issue. Requests are split by mutation count, by an
+estimated rate-limit cost and by payload size.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+
+from label_engine import GitHubSession, LabelResult
+
+
+# GitHub charges mutations more than reads against its secondary rate limit
+MUTATION_COST = 5
+
+
+@dataclass
+class Mutation:
+    """One aliased mutation field plus the variables it declares"""
+    key: int
+    selection: str
+    variables: Dict[str, Tuple[str, object]] = field(default_factory=dict)  # name -> (GraphQL type, value)
+    cost: int = MUTATION_COST
+
+    def size(self) -> int:
+        return len(self.selection) + sum(len(json.dumps(value)) for _, value in self.variables.values())
+
+
+class GraphQLBatchWriter:
+    """Batched label and comment writes through the GitHub GraphQL API"""
+
+    graphql_url = "https://api.github.com/graphql"
+
+    def __init__(
+        self,
+        token: str,
+        max_mutations: int = 50,
+        max_cost: int = 250,
+        max_payload_bytes: int = 512 * 1024,
+        lookup_chunk_size: int = 100,
+        **session_options
+    ):
+        self.max_mutations = max_mutations
+        self.max_cost = max_cost
+        self.max_payload_bytes = max_payload_bytes
+        self.lookup_chunk_size = lookup_chunk_size
+        self.client = GitHubSession(token, pool_size=1, auth_scheme="Bearer", **session_options)
+        self.requests_sent = 0
+
+    def _post(self, query: str, variables: Optional[Dict] = None) -> Dict:
+        self.requests_sent += 1
+        response = self.client.request("POST", self.graphql_url, json={"query": query, "variables": variables or {}})
+        return response.json()
+
+    def resolve_issues(self, owner: str, repo: str, numbers: Iterable[int]) -> Dict[int, Dict]:
+        """{number: {"id", "labels"}} for existing issues/PRs, looked up with aliased queries"""
+        numbers = list(dict.fromkeys(numbers))
+        fields = "id labels(first: 100) { nodes { name } }"
+        found = {}
+
+        for start in range(0, len(numbers), self.lookup_chunk_size):
+            chunk = numbers[start:start + self.lookup_chunk_size]
+            aliases = "\n".join(
+                f"i{number}: issueOrPullRequest(number: {number}) {{ ... on Issue {{ {fields} }} ... on PullRequest {{ {fields} }} }}"
+                for number in chunk
+            )
+            query = f"""
+            query($owner: String!, $repo: String!) {{
+                repository(owner: $owner, name: $repo) {{
+                    {aliases}
+                }}
+            }}
+            """
+            # Unknown numbers come back as null with a NOT_FOUND error, which is fine here
+            data = self._post(query, {"owner": owner, "repo": repo}).get("data") or {}
+            repository = data.get("repository") or {}
+            for number in chunk:
+                node = repository.get(f"i{number}")
+                if node and node.get("id"):
+                    found[number] = {
+                        "id": node["id"],
+                        "labels": [label["name"] for label in (node.get("labels") or {}).get("nodes", [])]
+                    }
+
+        return found
+
+    def resolve_label_ids(self, owner: str, repo: str) -> Dict[str, str]:
+        """{lowercased label name: node id} for every label in the repository"""
+        query = """
+        query($owner: String!, $repo: String!, $cursor: String) {
+            repository(owner: $owner, name: $repo) {
+                labels(first: 100, after: $cursor) {
+                    nodes { id name }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        }
+        """
+        label_ids = {}
+        cursor = None
+        while True:
+            result = self._post(query, {"owner": owner, "repo": repo, "cursor": cursor})
+            labels = ((result.get("data") or {}).get("repository") or {}).get("labels")
+            if not labels:
+                break
+            for node in labels["nodes"]:
+                label_ids[node["name"].lower()] = node["id"]
+            if not labels["pageInfo"]["hasNextPage"]:
+                break
+            cursor = labels["pageInfo"]["endCursor"]
+        return label_ids
+
+    def _chunks(self, mutations: List[Mutation]) -> Iterator[List[Mutation]]:
+        """Split mutations by count, estimated cost and payload size"""
+        chunk, cost, size = [], 0, 0
+        for mutation in mutations:
+            mutation_size = mutation.size()
+            if chunk and (
+                len(chunk) >= self.max_mutations
+                or cost + mutation.cost > self.max_cost
+                or size + mutation_size > self.max_payload_bytes
+            ):
+                yield chunk
+                chunk, cost, size = [], 0, 0
+            chunk.append(mutation)
+            cost += mutation.cost
+            size += mutation_size
+        if chunk:
+            yield chunk
+
+    def _execute(self, mutations: List[Mutation]) -> Dict[int, Optional[str]]:
+        """Run mutations in batched requests; returns {key: error message or None}"""
+        outcome = {}
+        for chunk in self._chunks(mutations):
+            declarations = ", ".join(
+                f"${name}: {type_}" for mutation in chunk for name, (type_, _) in mutation.variables.items()
+            )
+            variables = {name: value for mutation in chunk for name, (_, value) in mutation.variables.items()}
+            query = "mutation{}{{\n{}\n}}".format(
+                f"({declarations})" if declarations else "",
+                "\n".join(f"m{mutation.key}: {mutation.selection}" for mutation in chunk)
+            )
+
+            try:
+                result = self._post(query, variables)
+            except requests.exceptions.RequestException as e:
+                outcome.update({mutation.key: str(e) for mutation in chunk})
+                continue
+
+            errors_by_alias: Dict[str, str] = {}
+            request_error = None
+            for error in result.get("errors") or []:
+                path = error.get("path") or []
+                if path:
+                    errors_by_alias.setdefault(str(path[0]), error.get("message", "GraphQL error"))
+                else:
+                    request_error = error.get("message", "GraphQL error")
+
+            data = result.get("data") or {}
+            for mutation in chunk:
+                alias = f"m{mutation.key}"
+                if alias in errors_by_alias:
+                    outcome[mutation.key] = errors_by_alias[alias]
+                elif data.get(alias) is None:
+                    outcome[mutation.key] = request_error or "Mutation returned no data"
+                else:
+                    outcome[mutation.key] = None
+        return outcome
+
+    def add_labels(
+        self,
+        owner: str,
+        repo: str,
+        assignments: Dict[int, List[str]],
+        current_labels: Optional[Dict[int, Iterable[str]]] = None
+    ) -> List[LabelResult]:
+        """Add labels to many issues; labels already on an issue (per GitHub or `current_labels`) are skipped.
+
+        Labels must already exist in the repository. Results come back in the
+        order of `assignments`.
+        """
+        if not assignments:
+            return []
+
+        current_labels = current_labels or {}
+        issues = self.resolve_issues(owner, repo, assignments)
+        label_ids = self.resolve_label_ids(owner, repo)
+
+        results: Dict[int, LabelResult] = {}
+        mutations = []
+        for number, labels in assignments.items():
+            issue = issues.get(number)
+            if issue is None:
+                results[number] = LabelResult(number, "failed", list(labels), f"Issue #{number} not found")
+                continue
+
+            present = {label.lower() for label in list(issue["labels"]) + list(current_labels.get(number, [])) if label}
+            missing = [label for label in dict.fromkeys(labels) if label.lower() not in present]
+            if not missing:
+                results[number] = LabelResult(number, "skipped")
+                continue
+
+            unknown = [label for label in missing if label.lower() not in label_ids]
+            if unknown:
+                results[number] = LabelResult(number, "failed", missing, f"Unknown labels: {', '.join(unknown)}")
+                continue
+
+            ids = json.dumps([label_ids[label.lower()] for label in missing])
+            mutations.append(Mutation(
+                key=number,
+                selection=f"addLabelsToLabelable(input: {{labelableId: {json.dumps(issue['id'])}, labelIds: {ids}}}) {{ clientMutationId }}"
+            ))
+            results[number] = LabelResult(number, "applied", missing)
+
+        for number, error in self._execute(mutations).items():
+            if error:
+                results[number].status = "failed"
+                results[number].error = error
+
+        return [results[number] for number in assignments]
+
+    def add_comments(self, owner: str, repo: str, comments: Dict[int, str]) -> List[Dict]:
+        """Post one comment per issue ({number: body}); returns {"number", "status"[, "error"]} per issue"""
+        if not comments:
+            return []
+
+        issues = self.resolve_issues(owner, repo, comments)
+        results: Dict[int, Dict] = {}
+        mutations = []
+        for number, body in comments.items():
+            issue = issues.get(number)
+            if issue is None:
+                results[number] = {"number": number, "status": "failed", "error": f"Issue #{number} not found"}
+                continue
+            mutations.append(Mutation(
+                key=number,
+                selection=f"addComment(input: {{subjectId: {json.dumps(issue['id'])}, body: $body{number}}}) {{ clientMutationId }}",
+                variables={f"body{number}": ("String!", body)}
+            ))
+            results[number] = {"number": number, "status": "posted"}
+
+        for number, error in self._execute(mutations).items():
+            if error:
+                results[number] = {"number": number, "status": "failed", "error": error}
+
+        return [results[number] for number in comments]
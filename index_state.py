@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Index State Snapshots
+Records what has already been synced into the vector store for a repository
+so later runs (e.g. the GitHub Action) only need to index the delta.
+
+Snapshots are small JSON files keyed by repository and index version, which
+makes the directory suitable for `actions/cache`.
+"""
+
+import os
+import json
+from typing import Optional
+from datetime import datetime, timezone
+from dataclasses import dataclass, asdict
+
+from github_similarity_service import INDEX_VERSION
+
+
+@dataclass
+class IndexSnapshot:
+    """Sync watermark for a single repository"""
+    owner: str
+    repo: str
+    last_synced_at: str
+    include_discussions: bool = False
+    comments_synced_at: str = ""
+    index_version: int = INDEX_VERSION
+    saved_at: str = ""
+
+
+class IndexStateStore:
+    """Loads and saves index snapshots from a local cache directory"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def path_for(self, owner: str, repo: str) -> str:
+        """Snapshot path, keyed by repository and index version"""
+        filename = f"{owner}__{repo}.v{INDEX_VERSION}.json"
+        return os.path.join(self.cache_dir, filename)
+
+    def load(self, owner: str, repo: str) -> Optional[IndexSnapshot]:
+        """Return the snapshot for a repository, or None if missing or stale"""
+        path = self.path_for(owner, repo)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            snapshot = IndexSnapshot(**data)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Ignoring unreadable index snapshot {path}: {e}")
+            return None
+
+        if snapshot.index_version != INDEX_VERSION or not snapshot.last_synced_at:
+            return None
+
+        return snapshot
+
+    def save(self, snapshot: IndexSnapshot) -> str:
+        """Atomically write a snapshot and return its path"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        snapshot.index_version = INDEX_VERSION
+        snapshot.saved_at = datetime.now(timezone.utc).isoformat()
+
+        path = self.path_for(snapshot.owner, snapshot.repo)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(asdict(snapshot), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
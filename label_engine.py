@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Label Application Engine
+Applies labels to many issues at once over a shared HTTP session:
+- Repository labels are paginated once and missing ones created up front
+- Labels an issue already has are skipped without a request
+- Writes run with bounded concurrency and back off on GitHub rate limits
+- Every issue gets its own result (applied / skipped / failed)
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+@dataclass
+class LabelResult:
+    """Outcome of labeling one issue"""
+    number: int
+    status: str  # "applied", "skipped" or "failed"
+    labels: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        result = {"number": self.number, "status": self.status, "labels": self.labels}
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+class GitHubSession:
+    """Pooled session for the GitHub API that backs off on rate limits (safe to share across threads)"""
+
+    def __init__(
+        self,
+        token: str,
+        pool_size: int = 4,
+        max_retries: int = 3,
+        min_remaining: int = 20,
+        max_wait: float = 60.0,
+        timeout: float = 30.0,
+        auth_scheme: str = "token"
+    ):
+        if not token:
+            raise ValueError("GITHUB_TOKEN required for label management")
+
+        self.max_retries = max_retries
+        self.min_remaining = min_remaining
+        self.max_wait = max_wait
+        self.timeout = timeout
+
+        # One keep-alive connection pool shared by all worker threads
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"{auth_scheme} {token}",
+            "Accept": "application/vnd.github.v3+json"
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._remaining: Optional[int] = None
+        self._reset_at: Optional[float] = None
+
+    def _record_rate_limit(self, response: requests.Response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None:
+            return
+        with self._lock:
+            self._remaining = int(remaining)
+            self._reset_at = float(reset) if reset else None
+
+    def _wait_for_budget(self):
+        """Pause all workers once the primary rate limit is nearly spent"""
+        with self._lock:
+            remaining, reset_at = self._remaining, self._reset_at
+        if remaining is None or remaining >= self.min_remaining or reset_at is None:
+            return
+        delay = reset_at - time.time()
+        if delay > 0:
+            time.sleep(min(delay, self.max_wait))
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying a rate-limited response (None if it isn't one)"""
+        if response.status_code not in (403, 429):
+            return None
+
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            return min(float(retry_after), self.max_wait)
+
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = float(response.headers.get("X-RateLimit-Reset", time.time()))
+            return min(max(reset - time.time(), 1.0), self.max_wait)
+
+        if "rate limit" in response.text.lower():
+            # Secondary rate limit without a Retry-After hint
+            return min(2.0 ** (attempt + 1), self.max_wait)
+
+        return None
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_budget()
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            self._record_rate_limit(response)
+
+            delay = self._retry_delay(response, attempt)
+            if delay is not None and attempt < self.max_retries:
+                time.sleep(delay)
+                continue
+
+            response.raise_for_status()
+            return response
+
+
+class LabelApplier:
+    """Bulk label writes against the GitHub REST API"""
+
+    api_url = "https://api.github.com"
+
+    def __init__(self, token: str, max_workers: int = 4, **session_options):
+        self.max_workers = max_workers
+        self.client = GitHubSession(token, pool_size=max_workers, **session_options)
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.client.request(method, url, **kwargs)
+
+    def fetch_repo_labels(self, owner: str, repo: str) -> Dict[str, Dict]:
+        """All repository labels keyed by lowercased name (follows pagination)"""
+        labels = {}
+        url = f"{self.api_url}/repos/{owner}/{repo}/labels"
+        params = {"per_page": 100}
+        while url:
+            response = self._request("GET", url, params=params)
+            for label in response.json():
+                labels[label["name"].lower()] = label
+            url = response.links.get("next", {}).get("url")
+            params = None  # The next link already carries the query
+        return labels
+
+    def ensure_labels(self, owner: str, repo: str, labels_config: Dict[str, str]) -> Dict[str, Dict]:
+        """Create any labels from {name: color} that don't exist yet; returns all repository labels"""
+        existing = self.fetch_repo_labels(owner, repo)
+        for label_name, label_color in labels_config.items():
+            if label_name.lower() in existing:
+                continue
+            try:
+                response = self._request(
+                    "POST",
+                    f"{self.api_url}/repos/{owner}/{repo}/labels",
+                    json={"name": label_name, "color": label_color}
+                )
+                existing[label_name.lower()] = response.json()
+                print(f"Created label: {label_name}")
+            except requests.exceptions.RequestException as e:
+                print(f"Failed to create label {label_name}: {e}")
+        return existing
+
+    def _apply_one(self, owner: str, repo: str, number: int, labels: List[str], current: Iterable[str]) -> LabelResult:
+        current_lower = {label.lower() for label in current if label}
+        missing = [label for label in dict.fromkeys(labels) if label.lower() not in current_lower]
+        if not missing:
+            return LabelResult(number, "skipped")
+
+        try:
+            self._request(
+                "POST",
+                f"{self.api_url}/repos/{owner}/{repo}/issues/{number}/labels",
+                json={"labels": missing}
+            )
+            return LabelResult(number, "applied", missing)
+        except requests.exceptions.RequestException as e:
+            return LabelResult(number, "failed", missing, str(e))
+
+    def apply(
+        self,
+        owner: str,
+        repo: str,
+        assignments: Dict[int, List[str]],
+        current_labels: Optional[Dict[int, Iterable[str]]] = None
+    ) -> List[LabelResult]:
+        """Add labels to many issues; `current_labels` lets already-present labels be skipped.
+
+        Results come back in the order of `assignments`.
+        """
+        current_labels = current_labels or {}
+        numbers = list(assignments)
+        if not numbers:
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(
+                lambda number: self._apply_one(owner, repo, number, assignments[number], current_labels.get(number, [])),
+                numbers
+            ))
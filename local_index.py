@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Local Index Files
+Shared persistence for the per-repository indexes kept next to the vector
+store (BM25, error signatures): one JSON file per repository under
+`<data_dir>/<subdir>/`, loaded lazily, cached in memory and written
+atomically only when changed.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class LocalIndexStore:
+    """Loads, caches and saves one index per repository (thread-safe).
+
+    Subclasses set `subdir`, `format_version` and `index_class`; index
+    classes provide `to_dict`, `from_dict`, `__len__` and a `dirty` flag.
+    """
+
+    subdir = "index"
+    format_version = 1
+    index_class = None
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self._indexes: Dict[Tuple[str, str], object] = {}
+        self._lock = threading.RLock()
+
+    def path_for(self, owner: str, repo: str) -> str:
+        filename = f"{owner.lower()}__{repo.lower()}.v{self.format_version}.json"
+        return os.path.join(self.data_dir, self.subdir, filename)
+
+    def get(self, owner: str, repo: str):
+        """The repository's index, loaded from disk on first use (empty if missing or unreadable)"""
+        key = (owner.lower(), repo.lower())
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._load(owner, repo)
+                self._indexes[key] = index
+            return index
+
+    def _load(self, owner: str, repo: str):
+        path = self.path_for(owner, repo)
+        if not os.path.exists(path):
+            return self.index_class()
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get("format") != self.format_version:
+                return self.index_class()
+            return self.index_class.from_dict(data)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable {self.subdir} index {path}: {e}")
+            return self.index_class()
+
+    def remove(self, owner: str, repo: str, ids: Iterable[str]):
+        with self._lock:
+            index = self.get(owner, repo)
+            for doc_id in ids:
+                index.remove(doc_id)
+
+    def save(self, owner: str, repo: str) -> Optional[str]:
+        """Atomically write the repository's index if it changed; returns the path written"""
+        with self._lock:
+            index = self.get(owner, repo)
+            if not index.dirty:
+                return None
+            path = self.path_for(owner, repo)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"format": self.format_version, **index.to_dict()}, f)
+            os.replace(tmp_path, path)
+            index.dirty = False
+            return path
+
+    def clear(self):
+        """Delete every stored index"""
+        with self._lock:
+            self._indexes.clear()
+            directory = os.path.join(self.data_dir, self.subdir)
+            if os.path.isdir(directory):
+                for filename in os.listdir(directory):
+                    os.remove(os.path.join(directory, filename))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Metadata Schema
+Typed metadata stored with every vector, so filters can be pushed down to
+the vector store instead of being applied after over-fetching:
+- number: int, and chunk_count / chunk_index / comment_id on chunk and
+  comment vectors
+- is_pull_request, is_discussion: bool
+- created_ts, updated_ts: epoch seconds, next to the ISO created_at and
+  updated_at strings
+- labels: comma-joined for display, plus a `label:<name>` = True key per
+  label (lowercased), since Chroma metadata values cannot be lists. Updates
+  merge keys and cannot delete them, so a removed label is kept as False
+
+Items indexed with schema 1 stored all of these as strings. The read_*
+helpers accept both forms and `upgrade_metadata` converts a legacy record.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Union
+
+METADATA_SCHEMA_VERSION = 2
+LABEL_KEY_PREFIX = "label:"
+ITEM_TYPES = ("issue", "pull_request", "discussion")
+ITEM_STATES = ("open", "closed")
+
+MetadataValue = Union[str, int, float, bool]
+
+
+def label_key(label: str) -> str:
+    return f"{LABEL_KEY_PREFIX}{label.strip().lower()}"
+
+
+def to_timestamp(value: Optional[str]) -> Optional[int]:
+    """Epoch seconds for an ISO 8601 date or datetime (UTC unless it has an offset); None if empty"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def _timestamp_or_none(value: Optional[str]) -> Optional[int]:
+    try:
+        return to_timestamp(value)
+    except ValueError:
+        return None
+
+
+def read_number(metadata: Dict) -> int:
+    return int(metadata["number"])
+
+
+def read_flag(metadata: Dict, key: str) -> bool:
+    value = metadata.get(key, False)
+    return value == "True" if isinstance(value, str) else bool(value)
+
+
+def read_labels(metadata: Dict) -> List[str]:
+    labels = metadata.get("labels") or ""
+    return labels.split(",") if isinstance(labels, str) and labels else list(labels)
+
+
+def typed_fields(labels: List[str], created_at: Optional[str], updated_at: Optional[str]) -> Dict[str, MetadataValue]:
+    """Label and timestamp fields of a metadata record (timestamps left out when unparseable)"""
+    fields: Dict[str, MetadataValue] = {"labels": ",".join(labels), "schema": METADATA_SCHEMA_VERSION}
+    for label in labels:
+        fields[label_key(label)] = True
+    for key, value in (("created_ts", created_at), ("updated_ts", updated_at)):
+        timestamp = _timestamp_or_none(value)
+        if timestamp is not None:
+            fields[key] = timestamp
+    return fields
+
+
+def upgrade_metadata(metadata: Dict) -> Dict:
+    """A schema 1 (all strings) record converted to typed fields; current records come back unchanged"""
+    if metadata.get("schema") == METADATA_SCHEMA_VERSION:
+        return metadata
+    upgraded = dict(metadata)
+    for key in ("number", "chunk_count", "chunk_index", "comment_id"):
+        if key in upgraded:
+            upgraded[key] = int(upgraded[key])
+    for key in ("is_pull_request", "is_discussion"):
+        if key in upgraded:
+            upgraded[key] = read_flag(upgraded, key)
+    upgraded.update(typed_fields(read_labels(metadata), metadata.get("created_at"), metadata.get("updated_at")))
+    return upgraded
+
+
+def cleared_labels(previous: Dict, metadata: Dict) -> Dict[str, bool]:
+    """`label:<name>` = False for each label key the stored `previous` record has and `metadata` lacks"""
+    return {key: False for key in previous if key.startswith(LABEL_KEY_PREFIX) and key not in metadata}
+
+
+@dataclass(frozen=True)
+class MetadataFilter:
+    """Filters on stored items, as vector store `where` clauses or a Python predicate.
+
+    `labels` must all be present. Dates are ISO 8601; `*_after` is
+    inclusive and `*_before` exclusive.
+    """
+    state: Optional[str] = None
+    item_type: Optional[str] = None
+    labels: Tuple[str, ...] = ()
+    created_after: Optional[str] = None
+    created_before: Optional[str] = None
+    updated_after: Optional[str] = None
+    updated_before: Optional[str] = None
+
+    def __post_init__(self):
+        if self.state is not None and self.state not in ITEM_STATES:
+            raise ValueError(f"Unknown state '{self.state}' (expected one of: {', '.join(ITEM_STATES)})")
+        if self.item_type is not None and self.item_type not in ITEM_TYPES:
+            raise ValueError(f"Unknown type '{self.item_type}' (expected one of: {', '.join(ITEM_TYPES)})")
+        object.__setattr__(self, "labels", tuple(label for label in self.labels if label.strip()))
+        for value in (self.created_after, self.created_before, self.updated_after, self.updated_before):
+            try:
+                to_timestamp(value)
+            except ValueError:
+                raise ValueError(f"Invalid date '{value}' (expected ISO 8601, e.g. 2024-01-31)")
+
+    def __bool__(self) -> bool:
+        return bool(self.clauses())
+
+    def _ranges(self) -> List[Tuple[str, str, int]]:
+        ranges = []
+        for key, operator, value in (
+            ("created_ts", "$gte", self.created_after), ("created_ts", "$lt", self.created_before),
+            ("updated_ts", "$gte", self.updated_after), ("updated_ts", "$lt", self.updated_before),
+        ):
+            if value:
+                ranges.append((key, operator, to_timestamp(value)))
+        return ranges
+
+    def clauses(self) -> List[Dict]:
+        """Vector store `where` clauses (to be AND-ed)"""
+        clauses: List[Dict] = []
+        if self.state:
+            clauses.append({"state": self.state})
+        # Types are matched on the flags, which chunk and comment vectors inherit
+        if self.item_type == "issue":
+            clauses += [{"is_pull_request": False}, {"is_discussion": False}]
+        elif self.item_type == "pull_request":
+            clauses.append({"is_pull_request": True})
+        elif self.item_type == "discussion":
+            clauses.append({"is_discussion": True})
+        clauses += [{label_key(label): True} for label in self.labels]
+        clauses += [{key: {operator: timestamp}} for key, operator, timestamp in self._ranges()]
+        return clauses
+
+    def matches(self, metadata: Dict) -> bool:
+        """Same test as `clauses`, for local indexes (accepts schema 1 records)"""
+        metadata = upgrade_metadata(metadata)
+        if self.state and metadata.get("state") != self.state:
+            return False
+        if self.item_type is not None:
+            item_type = "pull_request" if metadata.get("is_pull_request") else ("discussion" if metadata.get("is_discussion") else "issue")
+            if item_type != self.item_type:
+                return False
+        if any(not metadata.get(label_key(label)) for label in self.labels):
+            return False
+        for key, operator, timestamp in self._ranges():
+            value = metadata.get(key)
+            if value is None or (value < timestamp if operator == "$gte" else value >= timestamp):
+                return False
+        return True
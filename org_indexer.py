@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Multi-Repository Indexing
+Indexes many repositories concurrently (e.g. a whole organization) with a
+bounded worker pool and a shared GitHub rate-limit budget, and records
+per-repository throughput.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import requests
+
+from github_similarity_service import SimilarityService
+
+
+def _github_headers(token: Optional[str]) -> dict:
+    headers = {"Accept": "application/vnd.github.v3+json"}
+    if token:
+        headers["Authorization"] = f"token {token}"
+    return headers
+
+
+def list_org_repos(org: str, token: Optional[str] = None, include_forks: bool = False, include_archived: bool = False) -> List[str]:
+    """All `owner/repo` names for an organization (or user), following pagination"""
+    repos = []
+    url = f"https://api.github.com/orgs/{org}/repos"
+    params = {"per_page": 100, "type": "all"}
+
+    response = requests.get(url, headers=_github_headers(token), params=params)
+    if response.status_code == 404:
+        # Not an organization; list the user's own repositories instead
+        url = f"https://api.github.com/users/{org}/repos"
+        params = {"per_page": 100, "type": "owner"}
+        response = requests.get(url, headers=_github_headers(token), params=params)
+
+    while True:
+        response.raise_for_status()
+        for item in response.json():
+            if item.get("fork") and not include_forks:
+                continue
+            if item.get("archived") and not include_archived:
+                continue
+            if not item.get("has_issues", True):
+                continue
+            repos.append(item["full_name"])
+
+        next_url = response.links.get("next", {}).get("url")
+        if not next_url:
+            break
+        response = requests.get(next_url, headers=_github_headers(token))
+
+    return repos
+
+
+def read_repos_file(path: str) -> List[str]:
+    """`owner/repo` names from a file, one per line (blank lines and # comments ignored)"""
+    repos = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.count("/") != 1:
+                raise ValueError(f"Invalid repository '{line}' in {path} (expected owner/repo)")
+            repos.append(line)
+    return list(dict.fromkeys(repos))
+
+
+class RateBudget:
+    """Shared GitHub rate-limit gate: workers wait before starting a repository
+    while the remaining core (or GraphQL) budget is below `min_remaining`."""
+
+    def __init__(self, token: Optional[str], min_remaining: int = 200, max_wait: float = 900.0):
+        self.token = token
+        self.min_remaining = min_remaining
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+
+    def _status(self) -> Optional[dict]:
+        # /rate_limit itself does not count against the limit
+        try:
+            response = requests.get("https://api.github.com/rate_limit", headers=_github_headers(self.token))
+            response.raise_for_status()
+            return response.json().get("resources", {})
+        except requests.exceptions.RequestException:
+            return None
+
+    def acquire(self) -> float:
+        """Block until there is budget for another repository; returns seconds waited"""
+        with self._lock:
+            resources = self._status()
+            if not resources:
+                return 0.0
+
+            reset_at = 0.0
+            for name in ("core", "graphql"):
+                resource = resources.get(name)
+                if resource and resource.get("remaining", self.min_remaining) < self.min_remaining:
+                    reset_at = max(reset_at, float(resource.get("reset", 0)))
+
+            delay = min(max(reset_at - time.time(), 0.0), self.max_wait)
+            if delay > 0:
+                print(f"GitHub rate limit nearly exhausted; waiting {delay:.0f}s for reset")
+                time.sleep(delay)
+            return delay
+
+
+@dataclass
+class RepoIndexResult:
+    """Outcome and throughput of indexing one repository"""
+    repository: str
+    indexed: int = 0
+    issues: int = 0
+    discussions: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def items_per_second(self) -> float:
+        return self.indexed / self.seconds if self.seconds > 0 else 0.0
+
+
+def index_repositories(
+    service: SimilarityService,
+    repositories: List[str],
+    max_issues: int = 100,
+    include_discussions: bool = False,
+    issue_state: str = "open",
+    concurrency: int = 4,
+    budget: Optional[RateBudget] = None,
+    on_complete: Optional[Callable[[RepoIndexResult], None]] = None
+) -> List[RepoIndexResult]:
+    """Index repositories with at most `concurrency` in flight; results keep input order.
+
+    A failing repository is recorded with its error and does not stop the others.
+    """
+    def index_one(repository: str) -> RepoIndexResult:
+        owner, repo = repository.split("/")
+        if budget is not None:
+            budget.acquire()
+
+        started = time.perf_counter()
+        try:
+            result = service.index_repository(owner, repo, max_issues, include_discussions, issue_state=issue_state)
+            return RepoIndexResult(
+                repository=repository,
+                indexed=result.get("indexed", 0),
+                issues=result.get("issues", 0),
+                discussions=result.get("discussions", 0),
+                seconds=time.perf_counter() - started
+            )
+        except Exception as e:
+            return RepoIndexResult(repository=repository, seconds=time.perf_counter() - started, error=str(e))
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(index_one, repository): repository for repository in repositories}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            if on_complete is not None:
+                on_complete(result)
+
+    return [results[repository] for repository in repositories]
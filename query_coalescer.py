@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Query Coalescer
+Gathers concurrent similarity queries for a short window and resolves them
+together per repository (signature lookups, then one batched embedding +
+vector query, or hybrid search where a keyword index exists), then fans the
+results back out to the waiting requests.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from github_similarity_service import SimilarityService
+
+
+@dataclass
+class PendingQuery:
+    """A query waiting for the next batch"""
+    owner: str
+    repo: str
+    query_text: str
+    top_k: int
+    min_similarity: float
+    exclude_number: Optional[int]
+    future: asyncio.Future
+    raw_text: Optional[str] = None
+
+
+class QueryCoalescer:
+    """Micro-batches concurrent queries (flushes after `max_wait` seconds or `max_batch` queries)"""
+
+    def __init__(self, service: SimilarityService, max_wait: float = 0.005, max_batch: int = 32):
+        self.service = service
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self._pending: List[PendingQuery] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batches_sent = 0
+        self.queries_received = 0
+
+    async def find_similar_issues(
+        self,
+        owner: str,
+        repo: str,
+        issue_number: int,
+        top_k: int = 10,
+        min_similarity: float = 0.0
+    ) -> List[Dict]:
+        """Coalesced equivalent of SimilarityService.find_similar_issues"""
+        loop = asyncio.get_running_loop()
+        target_issue = await loop.run_in_executor(
+            None, self.service._fetch_single_issue, owner, repo, issue_number
+        )
+        query_text = self.service._create_document_text(target_issue)
+        return await self.query(
+            owner, repo, query_text, top_k, min_similarity, exclude_number=issue_number,
+            raw_text=self.service._create_index_text(target_issue)
+        )
+
+    async def query(
+        self,
+        owner: str,
+        repo: str,
+        query_text: str,
+        top_k: int = 10,
+        min_similarity: float = 0.0,
+        exclude_number: Optional[int] = None,
+        raw_text: Optional[str] = None
+    ) -> List[Dict]:
+        """Queue a query text and wait for its results (`raw_text`: see search_repository_batch)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(PendingQuery(
+            owner, repo, query_text, top_k, min_similarity, exclude_number, future, raw_text
+        ))
+        self.queries_received += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        groups: Dict[Tuple[str, str], List[PendingQuery]] = {}
+        for pending in batch:
+            groups.setdefault((pending.owner, pending.repo), []).append(pending)
+
+        for (owner, repo), queries in groups.items():
+            asyncio.ensure_future(self._run_group(owner, repo, queries))
+
+    async def _run_group(self, owner: str, repo: str, queries: List[PendingQuery]):
+        searches = [
+            (pending.query_text, pending.top_k, pending.min_similarity, pending.exclude_number)
+            for pending in queries
+        ]
+        loop = asyncio.get_running_loop()
+        self.batches_sent += 1
+
+        try:
+            answers = await loop.run_in_executor(None, partial(
+                self.service.search_repository_batch, owner, repo, searches,
+                raw_texts=[pending.raw_text for pending in queries]
+            ))
+        except Exception as e:
+            for pending in queries:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        for pending, answer in zip(queries, answers):
+            if not pending.future.done():
+                pending.future.set_result(answer)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import threading
+
+import numpy as np
+import pytest
+
+from ann_index import AnnStore, HNSWIndex, IVFIndex, spherical_kmeans
+from vector_quant import normalize_rows
+
+
+def _clustered_vectors(n=4000, dim=32, clusters=40, seed=3):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    points = centres[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim))
+    return normalize_rows(points), rng
+
+
+def _recall_at_k(index, vectors, queries, k=10, **params):
+    exact = np.argsort(-(vectors @ queries.T), axis=0)[:k].T
+    found = 0
+    for query, expected in zip(queries, exact):
+        ids = {doc_id for doc_id, _ in index.search(query, k, **params)}
+        found += len(ids & {f"doc{i}" for i in expected})
+    return found / (len(queries) * k)
+
+
+def _index(kind):
+    return IVFIndex() if kind == "ivf" else HNSWIndex()
+
+
+class TestRecall:
+    def test_ivf_nprobe_trades_latency_for_recall(self):
+        vectors, rng = _clustered_vectors()
+        index = IVFIndex(nprobe=1)
+        index.add([f"doc{i}" for i in range(len(vectors))], vectors)
+        queries = normalize_rows(vectors[:40] + 0.3 / np.sqrt(vectors.shape[1]) * rng.normal(size=vectors[:40].shape))
+
+        assert index.n_lists > 100
+        low = _recall_at_k(index, vectors, queries)
+        assert _recall_at_k(index, vectors, queries, nprobe=16) >= max(low, 0.95)
+        # Probing every list is an exact search
+        assert _recall_at_k(index, vectors, queries, nprobe=index.n_lists) == 1.0
+
+    def test_hnsw_recall(self):
+        vectors, rng = _clustered_vectors(n=2000)
+        index = HNSWIndex(ef=64)
+        index.add([f"doc{i}" for i in range(len(vectors))], vectors)
+        queries = normalize_rows(vectors[:40] + 0.3 / np.sqrt(vectors.shape[1]) * rng.normal(size=vectors[:40].shape))
+
+        assert _recall_at_k(index, vectors, queries) >= 0.95
+
+    def test_kmeans_centroids_are_unit_length(self):
+        vectors, _ = _clustered_vectors(n=500)
+        centroids = spherical_kmeans(vectors, 8)
+
+        assert centroids.shape == (8, vectors.shape[1])
+        assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0, atol=1e-5)
+
+
+@pytest.mark.parametrize("kind", ["ivf", "hnsw"])
+class TestIncrementalUpdates:
+    def test_similarities_are_cosines(self, kind):
+        index = _index(kind)
+        index.add(["a", "b", "c"], [[1.0, 0.0], [0.6, 0.8], [0.0, -1.0]])
+
+        assert index.search([2.0, 0.0], k=2) == [("a", pytest.approx(1.0)), ("b", pytest.approx(0.6))]
+        assert [doc_id for doc_id, _ in index.search([1.0, 0.0], k=2, exclude=["a"])] == ["b", "c"]
+
+    def test_replace_and_remove_with_children(self, kind):
+        index = _index(kind)
+        index.add(["o/r/issues/1", "o/r/issues/1#chunk0", "o/r/issues/2"], [[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]], [{"n": 1}, {"n": 1}, {"n": 2}])
+        index.add(["o/r/issues/2"], [[1.0, 0.0]], [{"n": 2, "edited": True}])
+
+        assert len(index) == 3
+        assert index.metadata("o/r/issues/2") == {"n": 2, "edited": True}
+        assert index.remove_many(["o/r/issues/1"]) == 2
+        assert index.search([1.0, 0.0], k=5) == [("o/r/issues/2", pytest.approx(1.0))]
+
+    def test_compact_renumbers_labels(self, kind):
+        vectors, _ = _clustered_vectors(n=1500, dim=8)
+        index = _index(kind)
+        index.add([f"doc{i}" for i in range(len(vectors))], vectors)
+        index.remove_many([f"doc{i}" for i in range(0, 1500, 2)])
+
+        index.compact()
+
+        assert len(index.ids) == len(index) == 750
+        assert index.search(vectors[1], k=1)[0][0] == "doc1"
+        assert all(doc_id != "doc0" for doc_id, _ in index.search(vectors[0], k=20))
+
+    def test_dimension_mismatch_rejected(self, kind):
+        index = _index(kind)
+        index.add(["a"], [[1.0, 0.0]])
+        with pytest.raises(ValueError):
+            index.add(["b"], [[1.0, 0.0, 0.0]])
+
+
+class TestIVFSegments:
+    def test_pending_vectors_searchable_before_merge(self):
+        vectors, _ = _clustered_vectors(n=2000)
+        index = IVFIndex()
+        index.add([f"doc{i}" for i in range(1900)], vectors[:1900])
+        index.add([f"doc{i}" for i in range(1900, 2000)], vectors[1900:])
+
+        assert len(index.pending_labels) == 100
+        assert index.search(vectors[1950], k=1, nprobe=index.n_lists)[0][0] == "doc1950"
+
+        index.merge()
+
+        assert len(index.pending_labels) == 0
+        assert len(index.list_labels) == 2000
+        assert index.search(vectors[1950], k=1, nprobe=index.n_lists)[0][0] == "doc1950"
+
+    def test_small_index_is_an_exact_scan(self):
+        vectors, _ = _clustered_vectors(n=200)
+        index = IVFIndex()
+        index.add([f"doc{i}" for i in range(200)], vectors)
+
+        assert index.centroids is None
+        assert _recall_at_k(index, vectors, vectors[:10]) == 1.0
+
+
+class TestAnnStore:
+    @pytest.mark.parametrize("kind", ["ivf", "hnsw"])
+    def test_save_and_load(self, tmp_path, kind):
+        vectors, _ = _clustered_vectors(n=1500, dim=16)
+        store = AnnStore(str(tmp_path), kind)
+        store.add("Acme", "API", [f"doc{i}" for i in range(1500)], vectors, [{"n": str(i)} for i in range(1500)])
+        store.remove("acme", "api", ["doc3"])
+        store.save("acme", "api")
+
+        loaded = AnnStore(str(tmp_path), kind).get("acme", "api")
+
+        assert len(loaded) == 1499
+        assert loaded.metadata("doc7") == {"n": "7"}
+        assert loaded.search(vectors[7], k=1)[0][0] == "doc7"
+        assert all(doc_id != "doc3" for doc_id, _ in loaded.search(vectors[3], k=10))
+        if kind == "ivf":
+            assert isinstance(loaded.list_vectors, np.memmap)
+
+    def test_incremental_saves_keep_pending_rows(self, tmp_path):
+        vectors, _ = _clustered_vectors(n=1100, dim=16)
+        store = AnnStore(str(tmp_path), "ivf")
+        store.add("acme", "api", [f"doc{i}" for i in range(1050)], vectors[:1050], [{}] * 1050)
+        store.save("acme", "api")
+        store.add("acme", "api", [f"doc{i}" for i in range(1050, 1100)], vectors[1050:], [{}] * 50)
+        store.save("acme", "api")
+
+        loaded = AnnStore(str(tmp_path), "ivf").get("acme", "api")
+
+        assert len(loaded.pending_labels) == 50
+        assert loaded.search(vectors[1075], k=1, nprobe=loaded.n_lists)[0][0] == "doc1075"
+
+    def test_rebuild_and_kind_change(self, tmp_path):
+        store = AnnStore(str(tmp_path), "hnsw")
+        stats = store.rebuild("acme", "api", ["a", "b"], [[1.0, 0.0], [0.0, 1.0]], [{}, {}])
+
+        assert stats["vectors"] == 2
+        assert AnnStore(str(tmp_path), "hnsw").get("acme", "api").search([0.0, 1.0], k=1)[0][0] == "b"
+        # An index of another type is not reused
+        assert len(AnnStore(str(tmp_path), "ivf").get("acme", "api")) == 0
+
+    @pytest.mark.parametrize("kind", ["ivf", "hnsw"])
+    def test_search_is_safe_during_concurrent_adds(self, tmp_path, kind):
+        vectors, _ = _clustered_vectors(n=1501, dim=16)
+        store = AnnStore(str(tmp_path), kind)
+        store.add("acme", "api", ["doc0"], vectors[:1], [{"n": 0}])
+        errors = []
+        
+        def write():
+            for start in range(1, 1500, 10):
+                store.add("acme", "api", [f"doc{i}" for i in range(start, start + 10)], vectors[start:start + 10], [{"n": i} for i in range(start, start + 10)])
+        
+        writer = threading.Thread(target=write)
+        writer.start()
+        while writer.is_alive():
+            try:
+                hits = store.search("acme", "api", vectors[0], k=5)
+            except (ValueError, IndexError, RuntimeError) as e:
+                errors.append(e)
+                break
+            assert all(metadata is not None for _, _, metadata in hits)
+        writer.join()
+        
+        assert errors == []
+        assert len(store.get("acme", "api")) == 1501
+    
+    def test_unknown_kind_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            AnnStore(str(tmp_path), "lsh")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
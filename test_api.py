@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import importlib
+import json
+import os
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, patch
+
+from metadata_schema import to_timestamp
+
+
+def _metadata(number, title):
+    return {
+        "owner": "acme", "repo": "api", "number": number, "title": title, "state": "open",
+        "url": f"https://github.com/acme/api/issues/{number}", "type": "issue",
+        "is_pull_request": False, "is_discussion": False, "labels": ""
+    }
+
+
+def _load_api(**env):
+    env = {'CHROMA_API_KEY': 'test-key', 'CHROMA_TENANT': 'test-tenant', 'GITHUB_TOKEN': 'test-token', **env}
+    with patch.dict(os.environ, env), patch('github_similarity_service.chromadb.CloudClient'):
+        import api
+        return importlib.reload(api)
+
+
+class TestFilteredRequests:
+    def setup_method(self, method):
+        self.api = _load_api()
+        self.api.similarity_service = Mock()
+        self.client = TestClient(self.api.app)
+
+    def test_filters_reach_the_service(self):
+        self.api.similarity_service.search_similar_text.return_value = []
+
+        response = self.client.post("/search", json={"owner": "acme", "repo": "api", "title": "Crash", "state": "closed", "labels": ["bug"]})
+
+        assert response.status_code == 200
+        filters = self.api.similarity_service.search_similar_text.call_args.kwargs["filters"]
+        assert (filters.state, filters.labels) == ("closed", ("bug",))
+
+    def test_updated_range_reaches_the_service(self):
+        self.api.similarity_service.find_similar_issues.return_value = []
+
+        response = self.client.post("/find_similar", json={
+            "owner": "acme", "repo": "api", "issue_number": 1, "updated_after": "2024-01-01", "updated_before": "2024-02-01"
+        })
+
+        assert response.status_code == 200
+        filters = self.api.similarity_service.find_similar_issues.call_args.kwargs["filters"]
+        assert filters.clauses() == [
+            {"updated_ts": {"$gte": to_timestamp("2024-01-01")}}, {"updated_ts": {"$lt": to_timestamp("2024-02-01")}}
+        ]
+
+    def test_invalid_filter_is_a_bad_request(self):
+        response = self.client.post("/find_similar", json={"owner": "acme", "repo": "api", "issue_number": 1, "created_after": "last week"})
+
+        assert response.status_code == 400
+        assert "Invalid date" in response.json()["detail"]
+        self.api.similarity_service.find_similar_issues.assert_not_called()
+
+
+class TestLocalIndexes:
+    """The default (coalesced) endpoints with DEJA_VIEW_DATA_DIR set"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.api = _load_api(DEJA_VIEW_DATA_DIR=str(tmp_path))
+        self.service = self.api.similarity_service
+        self.service.collection = Mock()
+        self.service._embedding_function = Mock(return_value=[[1.0, 0.0]])
+        self.client = TestClient(self.api.app)
+
+    def _index(self, documents):
+        ids = [f"acme/api/issues/{number}" for number in documents]
+        texts = list(documents.values())
+        metadatas = [_metadata(number, title) for number, title in documents.items()]
+        self.service.lexical.add("acme", "api", ids, texts, metadatas)
+        self.service.signatures.add("acme", "api", ids, texts)
+        stored = dict(zip(ids, metadatas))
+        self.service.collection.get.side_effect = lambda ids, include: {
+            "ids": [doc_id for doc_id in ids if doc_id in stored],
+            "metadatas": [stored[doc_id] for doc_id in ids if doc_id in stored],
+            "embeddings": [[0.6, 0.8] for doc_id in ids if doc_id in stored]
+        }
+
+    def test_search_fuses_keyword_matches(self):
+        self._index({1: "TLS handshake fails with ERR_SSL_PROTOCOL", 2: "Dark mode colours"})
+        self.service.collection.query.return_value = {
+            "ids": [["acme/api/issues/2"]], "distances": [[0.1]], "metadatas": [[_metadata(2, "Dark mode colours")]]
+        }
+
+        response = self.client.post("/search", json={"owner": "acme", "repo": "api", "title": "ERR_SSL_PROTOCOL on connect", "top_k": 2})
+
+        assert response.status_code == 200
+        results = response.json()["similar_issues"]
+        assert {result["number"]: result["match"] for result in results} == {1: "lexical", 2: "semantic"}
+        assert results[1]["similarity"] == pytest.approx(0.6)
+
+    TRACE = 'Traceback (most recent call last):\n  File "/app/io.py", line 4, in load\nKeyError: missing config key "port"\n'
+
+    def test_signature_matches_skip_vector_search(self):
+        self._index({1: f"Crash on load\n{self.TRACE}", 2: "Dark mode colours"})
+
+        search = self.client.post("/search", json={"owner": "acme", "repo": "api", "title": "Startup crash", "body": self.TRACE, "top_k": 1})
+        batch = self.client.post("/find_similar/batch", json={"owner": "acme", "repo": "api", "queries": [self.TRACE], "top_k": 1})
+
+        assert [(r["number"], r["match"]) for r in search.json()["similar_issues"]] == [(1, "signature")]
+        line = json.loads(batch.text.splitlines()[0])
+        assert [(r["number"], r["match"]) for r in line["similar_issues"]] == [(1, "signature")]
+        self.service.collection.query.assert_not_called()
+        self.service._embedding_function.assert_not_called()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import json
+import threading
+
+import pytest
+
+from bm25_index import BM25_FORMAT_VERSION, BM25Index, BM25Store, reciprocal_rank_fusion, tokenize
+
+
+class TestTokenize:
+    def test_keeps_compound_identifiers_and_parts(self):
+        terms = tokenize("ERR_SSL_PROTOCOL in app.config.port at src/main.py:42")
+        
+        assert "err_ssl_protocol" in terms
+        assert "app.config.port" in terms
+        assert {"app", "config", "port"} <= set(terms)
+        assert "src/main.py:42" in terms
+        assert "main" in terms
+    
+    def test_drops_single_characters(self):
+        assert tokenize("a b cd") == ["cd"]
+
+
+class TestBM25Index:
+    def setup_method(self):
+        self.index = BM25Index()
+        self.index.add("r/issues/1", "Crash with ERR_SSL_PROTOCOL when connecting", {"number": "1"})
+        self.index.add("r/issues/2", "Connection slow when connecting through a proxy", {"number": "2"})
+        self.index.add("r/issues/3", "Docs typo in the proxy section", {"number": "3"})
+    
+    def test_exact_error_code_ranks_first(self):
+        results = self.index.search("getting err_ssl_protocol on startup")
+        
+        assert results[0][0] == "r/issues/1"
+        assert len(results) == 1
+    
+    def test_limit_and_exclude(self):
+        results = self.index.search("proxy connecting", limit=5, exclude=["r/issues/2"])
+        
+        # Equal idf and tf, so the shorter document ranks first
+        assert [doc_id for doc_id, _ in results] == ["r/issues/1", "r/issues/3"]
+    
+    def test_add_replaces_and_remove_cleans_postings(self):
+        self.index.add("r/issues/1", "Totally different text", {"number": "1"})
+        
+        assert self.index.search("err_ssl_protocol") == []
+        assert self.index.remove("r/issues/1")
+        assert not self.index.remove("r/issues/1")
+        assert "totally" not in self.index.postings
+        assert len(self.index) == 2
+        assert self.index.total_length == sum(doc["length"] for doc in self.index.docs.values())
+    
+    def test_empty_index(self):
+        assert BM25Index().search("anything") == []
+
+
+class TestBM25Store:
+    def test_save_and_reload(self, tmp_path):
+        store = BM25Store(str(tmp_path))
+        store.add("Owner", "Repo", ["o/r/issues/1"], ["Timeout in worker.pool"], [{"number": "1"}])
+        
+        path = store.save("Owner", "Repo")
+        assert path is not None
+        assert store.save("Owner", "Repo") is None  # nothing changed since
+        
+        reloaded = BM25Store(str(tmp_path)).get("owner", "repo")
+        assert reloaded.search("worker.pool")[0][0] == "o/r/issues/1"
+        assert reloaded.metadata("o/r/issues/1") == {"number": "1"}
+    
+    def test_other_format_versions_are_ignored(self, tmp_path):
+        store = BM25Store(str(tmp_path))
+        path = store.path_for("o", "r")
+        (tmp_path / "bm25").mkdir()
+        with open(path, "w") as f:
+            json.dump({"format": BM25_FORMAT_VERSION + 1, "docs": {"x": {}}}, f)
+        
+        assert len(store.get("o", "r")) == 0
+    
+    def test_clear_removes_files(self, tmp_path):
+        store = BM25Store(str(tmp_path))
+        store.add("o", "r", ["o/r/issues/1"], ["text here"], [{}])
+        store.save("o", "r")
+        
+        store.clear()
+        
+        assert list((tmp_path / "bm25").iterdir()) == []
+        assert len(store.get("o", "r")) == 0
+    
+    def test_search_is_safe_during_concurrent_adds(self, tmp_path):
+        store = BM25Store(str(tmp_path))
+        store.add("o", "r", ["o/r/issues/0"], ["timeout in worker"], [{"number": 0}])
+        errors = []
+        
+        def write():
+            for n in range(1, 2000):
+                store.add("o", "r", [f"o/r/issues/{n}"], [f"timeout in worker term{n}"], [{"number": n}])
+        
+        writer = threading.Thread(target=write)
+        writer.start()
+        while writer.is_alive():
+            try:
+                hits = store.search("o", "r", "timeout worker", limit=3)
+            except RuntimeError as e:
+                errors.append(e)
+                break
+            assert all(metadata is not None for _, _, metadata in hits)
+        writer.join()
+        
+        assert errors == []
+        assert store.search("o", "r", "term1999")[0][:1] == ("o/r/issues/1999",)
+
+
+class TestReciprocalRankFusion:
+    def test_items_in_both_lists_win(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+        
+        assert fused[0][0] == "c"
+        assert fused[0][1] == pytest.approx(1 / 63 + 1 / 61)
+        assert [doc_id for doc_id, _ in fused[1:]] == ["a", "b", "d"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -57,6 +57,8 @@ class TestUtilityFunctions:
         # Mock service with no external deps
         service = Mock(spec=SimilarityService)
         service._create_document_text = SimilarityService._create_document_text.__get__(service)
+        service._document_body = SimilarityService._document_body.__get__(service)
+        service.normalization = ()
         
         issue = Issue(
             number=1,
@@ -3,6 +3,7 @@ import pytest
 from click.testing import CliRunner
 from unittest.mock import Mock, patch, MagicMock
 from cli import cli, format_similarity_score
+from metadata_schema import MetadataFilter
 
 
 class TestFormatSimilarityScore:
@@ -41,6 +42,19 @@ class TestCLICommands:
         assert "50" in result.output
         self.mock_service.index_repository.assert_called_once_with('owner', 'repo', 50, True, issue_state='open')
     
+    @patch('cli.SimilarityService')
+    def test_index_command_include_comments(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.index_repository.return_value = {
+            'indexed': 5, 'issues': 5, 'discussions': 0, 'comments': 12, 'repository': 'owner/repo'
+        }
+        
+        result = self.runner.invoke(cli, ['index', 'owner/repo', '--include-comments'])
+        
+        assert result.exit_code == 0
+        assert "12 comments" in result.output
+        mock_service_class.assert_called_once_with(comments=True)
+    
     @patch('cli.SimilarityService')
     def test_index_command_invalid_repo_format(self, mock_service_class):
         result = self.runner.invoke(cli, ['index', 'invalid-format'])
@@ -69,7 +83,26 @@ class TestCLICommands:
         assert result.exit_code == 0
         assert "Test Issue" in result.output
         assert "85" in result.output
-        self.mock_service.find_similar_issues.assert_called_once_with('owner', 'repo', 456, 10, 0.0)
+        self.mock_service.find_similar_issues.assert_called_once_with('owner', 'repo', 456, 10, 0.0, repositories=[], filters=None)
+    
+    @patch('cli.SimilarityService')
+    def test_find_command_labels_duplicate(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.find_similar_issues.return_value = [{
+            'number': 123, 'title': 'Test Issue', 'similarity': 0.95, 'state': 'open',
+            'url': 'https://github.com/owner/repo/issues/123', 'is_pull_request': False, 'is_discussion': False
+        }]
+        self.mock_service.apply_labels_bulk.return_value = [
+            {'number': 456, 'status': 'applied', 'labels': ['potential-duplicate']}
+        ]
+        
+        result = self.runner.invoke(cli, ['find', 'https://github.com/owner/repo/issues/456', '--label-duplicate'])
+        
+        assert result.exit_code == 0
+        assert "Added 'potential-duplicate' label to issue #456" in result.output
+        self.mock_service.apply_labels_bulk.assert_called_once_with(
+            'owner', 'repo', {456: ['potential-duplicate']}, labels_config={'potential-duplicate': 'DC2626'}
+        )
     
     @patch('cli.SimilarityService')
     def test_find_command_invalid_url(self, mock_service_class):
@@ -89,6 +122,74 @@ class TestCLICommands:
         assert result.exit_code == 0
         assert "No similar issues found" in result.output
     
+    @patch('cli.SimilarityService')
+    def test_search_command(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.search_similar_text.return_value = [
+            {
+                'number': 42,
+                'title': 'Editor freezes when saving',
+                'similarity': 0.82,
+                'state': 'open',
+                'url': 'https://github.com/owner/repo/issues/42',
+                'is_pull_request': False,
+                'is_discussion': False
+            }
+        ]
+        
+        result = self.runner.invoke(cli, ['search', 'owner/repo', 'editor freeze on save', '--body', 'Happens every time', '-k', '5'])
+        
+        assert result.exit_code == 0
+        assert "Editor freezes" in result.output
+        self.mock_service.search_similar_text.assert_called_once_with('owner', 'repo', 'editor freeze on save', 'Happens every time', 5, 0.0, repositories=[], filters=None)
+    
+    @patch('cli.SimilarityService')
+    def test_find_duplicates_streams_pages(self, mock_service_class, tmp_path):
+        mock_service_class.return_value = self.mock_service
+        page = {
+            "ids": [f"owner/repo/issues/{n}" for n in (1, 2, 3)],
+            "metadatas": [{"title": f"Issue {n}", "state": "open", "url": f"u{n}"} for n in (1, 2, 3)],
+            "documents": ["doc 1", "doc 2", "doc 3"]
+        }
+        self.mock_service._iter_repo_pages.return_value = iter([page])
+        distances = {"doc 1": 0.9, "doc 2": 0.1, "doc 3": 0.3}
+        self.mock_service.query_similar_batch.side_effect = lambda owner, repo, query_texts, **kwargs: {
+            "ids": [["owner/repo/issues/9"]],
+            "metadatas": [[{"title": "Other", "state": "closed"}]],
+            "distances": [[distances[query_texts[0]]]]
+        }
+        output = tmp_path / "report.md"
+        
+        result = self.runner.invoke(cli, ['find-duplicates', 'owner/repo', '-o', str(output)])
+        
+        assert result.exit_code == 0
+        report = output.read_text()
+        assert "**Issues Analyzed:** 3 all issues" in report
+        # Similarities: #1 0.55 (below threshold), #2 0.95 (very high), #3 0.85 (high)
+        assert "**Potential Duplicates Found:** 2" in report
+        assert "- **Very High Similarity (≥90%):** 1 issues" in report
+        assert "- **High Similarity (80-89%):** 1 issues" in report
+        assert "gh issue edit 2 --add-label" in report
+        assert "gh issue edit 3 --add-label" not in report
+    
+    @patch('cli.SimilarityService')
+    def test_find_duplicates_without_index(self, mock_service_class, tmp_path):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service._iter_repo_pages.return_value = iter([])
+        
+        result = self.runner.invoke(cli, ['find-duplicates', 'owner/repo', '-o', str(tmp_path / "r.md")])
+        
+        assert result.exit_code == 1
+        assert "No indexed issues found" in result.output
+    
+    @patch('cli.SimilarityService')
+    def test_search_command_invalid_repo_format(self, mock_service_class):
+        result = self.runner.invoke(cli, ['search', 'invalid-format', 'query'])
+        
+        assert result.exit_code == 1
+        assert "Repository must be in format 'owner/repo'" in result.output
+        mock_service_class.assert_not_called()
+    
     @patch('cli.SimilarityService')
     def test_stats_command(self, mock_service_class):
         mock_service_class.return_value = self.mock_service
@@ -168,7 +269,7 @@ class TestCLICommands:
         # Check for title content (may be wrapped in table)
         assert "How to use" in result.output
         assert "0.75" in result.output
-        self.mock_service.suggest_discussions.assert_called_once_with('owner', 'repo', 0.5, 100, True)
+        self.mock_service.suggest_discussions.assert_called_once_with('owner', 'repo', 0.5, 100, True, workers=1, mode='heuristic')
     
     @patch('cli.SimilarityService')
     def test_suggest_discussions_execute(self, mock_service_class):
@@ -182,7 +283,7 @@ class TestCLICommands:
         
         assert result.exit_code == 0
         assert "No issues found that should be discussions" in result.output
-        self.mock_service.suggest_discussions.assert_called_once_with('owner', 'repo', 0.5, 100, False)
+        self.mock_service.suggest_discussions.assert_called_once_with('owner', 'repo', 0.5, 100, False, workers=1, mode='heuristic')
     
     @patch('cli.SimilarityService')
     def test_error_handling(self, mock_service_class):
@@ -195,5 +296,145 @@ class TestCLICommands:
         assert "Error: API Error" in result.output
 
 
+    @patch('cli.RateBudget')
+    @patch('cli.list_org_repos')
+    @patch('cli.SimilarityService')
+    def test_index_org_command(self, mock_service_class, mock_list_repos, mock_budget):
+        mock_service_class.return_value = self.mock_service
+        mock_list_repos.return_value = ['acme/api', 'acme/web']
+        self.mock_service.index_repository.return_value = {'indexed': 12, 'issues': 12, 'discussions': 0}
+        
+        result = self.runner.invoke(cli, ['index-org', '--org', 'acme', '--concurrency', '2', '--max-issues', '20'])
+        
+        assert result.exit_code == 0
+        assert "acme/api" in result.output
+        assert "acme/web" in result.output
+        assert "2/2 ok" in result.output
+        self.mock_service.index_repository.assert_any_call('acme', 'api', 20, False, issue_state='open')
+    
+    @patch('cli.SimilarityService')
+    def test_index_org_requires_one_source(self, mock_service_class):
+        result = self.runner.invoke(cli, ['index-org'])
+        
+        assert result.exit_code == 1
+        assert "exactly one of --org or --repos-file" in result.output
+        mock_service_class.assert_not_called()
+    
+
+
+    @patch('cli.SimilarityService')
+    def test_migrate_partitions_command(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.partitioning = "repo"
+        self.mock_service.migrate_to_partitions.return_value = {
+            "migrated": 120, "partitions": 3, "partitioning": "repo", "dropped_shared": True
+        }
+        
+        result = self.runner.invoke(cli, ['migrate-partitions', '--drop-shared'])
+        
+        assert result.exit_code == 0
+        assert "Migrated 120 items into 3 repo partitions" in result.output
+        self.mock_service.migrate_to_partitions.assert_called_once_with(drop_shared=True)
+    
+
+
+    @patch('cli.SimilarityService')
+    def test_build_vectors_command(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.build_local_vectors.return_value = {
+            "repository": "acme/api", "vectors": 5000, "dimension": 384, "quantization": "int8",
+            "resident_bytes": 1940000, "float32_bytes": 7680000
+        }
+        
+        result = self.runner.invoke(cli, ['build-vectors', 'acme/api'])
+        
+        assert result.exit_code == 0
+        assert "Built 5000 int8 vectors for acme/api (1.9 MB resident, 7.7 MB as float32)" in result.output
+        self.mock_service.build_local_vectors.assert_called_once_with("acme", "api")
+    
+
+
+    @patch('cli.SimilarityService')
+    def test_build_ann_command(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.build_ann_index.return_value = {
+            "repository": "acme/api", "index": "hnsw", "source": "vector store", "vectors": 5000, "seconds": 2.04
+        }
+        
+        result = self.runner.invoke(cli, ['build-ann', 'acme/api'])
+        
+        assert result.exit_code == 0
+        assert "Built hnsw index over 5000 vectors for acme/api from the vector store in 2.0s" in result.output
+        self.mock_service.build_ann_index.assert_called_once_with("acme", "api")
+    
+
+
+    @patch('cli.SimilarityService')
+    def test_find_command_with_filters(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.find_similar_issues.return_value = []
+        
+        result = self.runner.invoke(cli, [
+            'find', 'https://github.com/acme/api/issues/7', '--state', 'open', '--type', 'issue',
+            '--label', 'bug', '--label', 'crash', '--created-after', '2024-01-01'
+        ])
+        
+        assert result.exit_code == 0
+        filters = self.mock_service.find_similar_issues.call_args.kwargs["filters"]
+        assert filters == MetadataFilter(state="open", item_type="issue", labels=("bug", "crash"), created_after="2024-01-01")
+
+    @patch('cli.SimilarityService')
+    def test_search_command_with_updated_range(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.search_similar_text.return_value = []
+
+        result = self.runner.invoke(cli, [
+            'search', 'acme/api', 'crash', '--updated-after', '2024-01-01', '--updated-before', '2024-02-01'
+        ])
+
+        assert result.exit_code == 0
+        filters = self.mock_service.search_similar_text.call_args.kwargs["filters"]
+        assert filters == MetadataFilter(updated_after="2024-01-01", updated_before="2024-02-01")
+    
+    @patch('cli.SimilarityService')
+    def test_find_command_rejects_invalid_date(self, mock_service_class):
+        result = self.runner.invoke(cli, ['find', 'https://github.com/acme/api/issues/7', '--created-after', 'last week'])
+        
+        assert result.exit_code == 1
+        assert "Invalid date 'last week'" in result.output
+        mock_service_class.assert_not_called()
+    
+    @patch('cli.SimilarityService')
+    def test_migrate_metadata_command(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.migrate_metadata.return_value = {"scanned": 250, "migrated": 240}
+        
+        result = self.runner.invoke(cli, ['migrate-metadata', 'acme/api'])
+        
+        assert result.exit_code == 0
+        assert "Migrated 240 of 250 stored items" in result.output
+        self.mock_service.migrate_metadata.assert_called_once_with("acme", "api")
+    
+
+
+    @patch('cli.SimilarityService')
+    def test_search_command_across_repos(self, mock_service_class):
+        mock_service_class.return_value = self.mock_service
+        self.mock_service.search_similar_text.return_value = [{
+            'number': 12, 'title': 'Plugin crash', 'similarity': 0.8, 'state': 'open',
+            'url': 'https://github.com/acme/plugins/issues/12', 'is_pull_request': False,
+            'is_discussion': False, 'repository': 'acme/plugins'
+        }]
+        
+        result = self.runner.invoke(cli, ['search', 'acme/api', 'crash', '--repos', 'acme/plugins,acme/web', '--repos', 'acme/web'])
+        
+        assert result.exit_code == 0
+        assert "acme/plugins" in result.output
+        self.mock_service.search_similar_text.assert_called_once_with(
+            'acme', 'api', 'crash', '', 10, 0.0, repositories=['acme/plugins', 'acme/web'], filters=None
+        )
+    
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
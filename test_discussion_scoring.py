@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import numpy as np
+import pytest
+
+from discussion_scoring import CentroidClassifier, DiscussionScorer, _keyword_automaton
+
+
+class TestDiscussionScorer:
+    def setup_method(self):
+        self.scorer = DiscussionScorer()
+    
+    def test_question_with_label(self):
+        score, reasons = self.scorer.score(
+            "How do I configure the model?",
+            "I need help understanding how to set up the configuration",
+            ["Question"],
+            "open"
+        )
+        
+        assert score > 0.5
+        assert "Contains question pattern" in reasons
+        assert "Has 'Question' label" in reasons
+    
+    def test_keywords_counted_once_each_and_capped(self):
+        _, reasons = self.scorer.score("Workflow", "workflow workflow", [], "closed")
+        score_many, _ = self.scorer.score("x", "feedback advice strategy workflow process", [], "closed")
+        
+        assert reasons.count("Contains discussion keywords") == 1
+        # Several patterns fire too; keyword contribution alone is capped at 0.3
+        assert score_many <= 1.0
+    
+    def test_bug_keyword_reported_in_list_order(self):
+        score, reasons = self.scorer.score("Segfault then crash", "", [], "closed")
+        
+        assert "Possible bug report: 'crash'" in reasons
+        assert score == 0.0
+    
+    def test_title_patterns_only_match_title(self):
+        _, title_reasons = self.scorer.score("[RFC] New plugin API", "", [], "open")
+        _, body_reasons = self.scorer.score("New plugin API", "[rfc]", [], "open")
+        
+        assert "Title suggests discussion format" in title_reasons
+        assert "Title suggests discussion format" not in body_reasons
+
+
+class TestKeywordAutomaton:
+    def test_overlapping_and_prefix_keywords(self):
+        regex, prefixes = _keyword_automaton(["test", "testing", "sting"])
+        found = set()
+        for match in regex.finditer("a testing run"):
+            found.add(match.group(1))
+            found.update(prefixes[match.group(1)])
+        
+        assert found == {"test", "testing", "sting"}
+
+
+class TestScoreBatch:
+    def setup_method(self):
+        self.scorer = DiscussionScorer()
+    
+    def test_matches_per_issue_scoring(self):
+        rows = [
+            ("How do I configure the model?", "I need help", ["Question"], "open"),
+            ("[RFC] New plugin API", "Looking for feedback and thoughts", ["enhancement", "design"], "open"),
+            ("Segfault then crash", "traceback attached", ["bug"], "closed"),
+            ("Feature: dark mode", None, [], "open"),
+            ("what", "anyone\ntried this? someone know", [], "closed"),
+            ("Plain title", "how do we add support", [], "open"),
+            ("", "", [], "closed"),
+        ]
+        titles, bodies, labels, states = map(list, zip(*rows))
+        
+        batch = self.scorer.score_batch(titles, bodies, labels, states)
+        
+        for i, row in enumerate(rows):
+            score, reasons = self.scorer.score(*row)
+            assert batch.scores[i] == score
+            assert batch.reasons(i) == reasons
+    
+    def test_start_anchor_applies_per_document(self):
+        # "how" starts the second document but not the first one
+        batch = self.scorer.score_batch(["fix it how", "how now"], ["", ""], [[], []], ["closed", "closed"])
+        
+        assert "Contains question pattern" not in batch.reasons(0)
+        assert "Contains question pattern" in batch.reasons(1)
+    
+    def test_empty_batch(self):
+        batch = self.scorer.score_batch([], [], [], [])
+        
+        assert len(batch.scores) == 0
+
+
+class TestCentroidClassifier:
+    def test_scores_follow_nearest_centroid(self):
+        embeddings = np.array([
+            [1.0, 0.0], [0.9, 0.1],   # discussion-like seeds
+            [0.0, 1.0], [0.1, 0.9],   # bug-like seeds
+            [0.8, 0.2], [0.2, 0.8],   # unlabeled
+        ])
+        metadatas = [
+            {"type": "discussion", "labels": ""},
+            {"type": "issue", "labels": "Question"},
+            {"type": "issue", "labels": "bug"},
+            {"type": "issue", "labels": "type: bug,p1"},
+            {"type": "issue", "labels": ""},
+            {"type": "issue", "labels": ""},
+        ]
+        classifier = CentroidClassifier()
+        discussion_like, bug_like = classifier.seed_masks(metadatas)
+        
+        assert discussion_like.tolist() == [True, True, False, False, False, False]
+        assert bug_like.tolist() == [False, False, True, True, False, False]
+        
+        scores = classifier.fit(embeddings, discussion_like, bug_like).score(embeddings[4:])
+        assert scores[0] > 0.5 > scores[1]
+    
+    def test_requires_both_seed_groups(self):
+        with pytest.raises(ValueError):
+            CentroidClassifier().fit(np.eye(2), np.array([True, False]), np.array([False, False]))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import pytest
+
+from error_signatures import ErrorSignature, SignatureIndex, SignatureStore, extract_signatures, normalize_message
+
+PYTHON_TRACE = '''Traceback (most recent call last):
+  File "/home/alice/venv/lib/site-packages/app/core.py", line 120, in save
+    self._write()
+  File "/home/alice/app/io.py", line 44, in _write
+    raise ValueError("bad path")
+ValueError: cannot open /tmp/run-1234/x.json at 0xdeadbeef
+'''
+
+# Same failure on another machine: other paths, line numbers and values
+PYTHON_TRACE_ELSEWHERE = '''Traceback (most recent call last):
+  File "C:\\\\Users\\\\bob\\\\app\\\\core.py", line 118, in save
+    self._write()
+  File "C:\\\\Users\\\\bob\\\\app\\\\io.py", line 40, in _write
+    raise ValueError("bad path")
+ValueError: cannot open C:\\\\tmp\\\\y.json at 0x1f00
+'''
+
+
+class TestExtractSignatures:
+    def test_python_trace_ignores_paths_and_line_numbers(self):
+        signatures = extract_signatures(PYTHON_TRACE)
+        
+        assert ErrorSignature("trace", "ValueError|io.py:_write|core.py:save") in signatures
+        assert ErrorSignature("exception", "ValueError: cannot open <path> at <hex>") in signatures
+        assert signatures == extract_signatures(PYTHON_TRACE_ELSEWHERE)
+    
+    def test_javascript_and_java_frames(self):
+        js = "TypeError: x is undefined\n    at Object.render (/app/lib/view.js:10:5)\n    at /app/main.js:1:1\n"
+        java = 'Exception in thread "main" java.lang.IllegalStateException: closed\n\tat com.acme.Pool.get(Pool.java:42)\n'
+        
+        assert ErrorSignature("trace", "TypeError|view.js:Object.render|main.js:<anonymous>") in extract_signatures(js)
+        assert ErrorSignature("trace", "java.lang.IllegalStateException|Pool.java:Pool.get") in extract_signatures(java)
+    
+    def test_error_codes(self):
+        kinds = {(s.kind, s.value) for s in extract_signatures("Fails with ORA-00942, then ERR_SSL_PROTOCOL")}
+        
+        assert kinds == {("code", "ORA-00942"), ("code", "ERR_SSL_PROTOCOL")}
+    
+    def test_bare_exception_type_and_prose_have_no_signature(self):
+        assert extract_signatures("KeyError") == []
+        assert extract_signatures("Please add a dark mode") == []
+    
+    def test_normalize_message(self):
+        assert normalize_message("Port 8080 in use by 'nginx'") == "port <n> in use by <str>"
+
+
+class TestSignatureIndex:
+    def setup_method(self):
+        self.index = SignatureIndex()
+        self.index.add("r/issues/1", PYTHON_TRACE)
+        self.index.add("r/issues/2", "ValueError: cannot open /tmp/a.json at 0x1")
+        self.index.add("r/issues/3", "Got ORA-00942 again")
+        self.index.add("r/issues/4", "No errors here")
+    
+    def test_lookup_ranks_by_shared_signature_weight(self):
+        matches = self.index.lookup(PYTHON_TRACE_ELSEWHERE)
+        
+        assert [(doc_id, weight) for doc_id, weight, _ in matches] == [("r/issues/1", 5), ("r/issues/2", 2)]
+        assert matches[0][2] == ["trace", "exception"]
+    
+    def test_min_weight_drops_weak_matches(self):
+        assert self.index.lookup("ORA-00942") == [("r/issues/3", 1, ["code"])]
+        assert self.index.lookup("ORA-00942", min_weight=2) == []
+    
+    def test_exclude_and_remove(self):
+        assert self.index.lookup(PYTHON_TRACE, exclude=["r/issues/1"])[0][0] == "r/issues/2"
+        
+        self.index.remove("r/issues/2")
+        self.index.add("r/issues/1", "rewritten without errors")
+        
+        assert self.index.lookup(PYTHON_TRACE) == []
+        assert self.index.by_digest.keys() == {s.digest for s in extract_signatures("ORA-00942")}
+        assert len(self.index) == 1
+    
+    def test_store_round_trip(self, tmp_path):
+        store = SignatureStore(str(tmp_path))
+        store.add("o", "r", ["o/r/issues/1"], [PYTHON_TRACE])
+        store.save("o", "r")
+        
+        reloaded = SignatureStore(str(tmp_path)).get("o", "r")
+        
+        assert reloaded.lookup(PYTHON_TRACE_ELSEWHERE)[0][0] == "o/r/issues/1"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
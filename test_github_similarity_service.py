@@ -1,9 +1,18 @@
 #!/usr/bin/env python3
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, call
 import os
+import uuid
+import chromadb
 import requests
-from github_similarity_service import SimilarityService, Issue, Discussion
+from ann_index import AnnStore
+from bm25_index import BM25Store
+from error_signatures import SignatureStore
+from github_similarity_service import SimilarityService, Issue, Discussion, chunk_text
+from label_engine import LabelResult
+from metadata_schema import MetadataFilter, to_timestamp, upgrade_metadata
+from text_normalization import content_hash
+from vector_quant import VectorStore
 
 
 class TestModels:
@@ -74,6 +83,27 @@ class TestSimilarityService:
         with pytest.raises(ValueError, match="CHROMA_TENANT environment variable is required"):
             SimilarityService()
     
+    def test_local_only_mode(self, tmp_path):
+        with patch.dict(os.environ, {'DEJA_VIEW_DATA_DIR': str(tmp_path), 'DEJA_VIEW_VECTOR_QUANTIZATION': 'float32'}, clear=True):
+            with patch('github_similarity_service.chromadb.CloudClient') as cloud_client:
+                service = SimilarityService()
+        cloud_client.assert_not_called()
+        service._embedding_function = lambda texts: [[1.0, 0.0, 0.0] if "Crash" in text else [0.0, 1.0, 0.0] for text in texts]
+        issues = [
+            Issue(number=number, title=title, body="", state="open", created_at="2024-01-01T00:00:00Z",
+                  updated_at="2024-01-01T00:00:00Z", url=f"https://github.com/acme/api/issues/{number}")
+            for number, title in ((1, "Crash on start"), (2, "Dark mode"))
+        ]
+        
+        assert service.local_only
+        assert service._upsert_batch("acme", "api", issues) == 2
+        
+        # Stored in the embedded Chroma under the data dir
+        assert (tmp_path / "chroma").is_dir()
+        assert service.collection.count() == 2
+        results = service.search_similar_text("acme", "api", "Crash", "", top_k=1)
+        assert [result["number"] for result in results] == [1]
+    
     @patch.dict(os.environ, {
         'CHROMA_API_KEY': 'test-key',
         'CHROMA_TENANT': 'test-tenant'
@@ -106,6 +136,14 @@ class TestGitHubAPIInteractions:
         self.service = SimilarityService()
         self.service.collection = mock_collection
     
+    @patch('github_similarity_service.LabelApplier')
+    def test_add_issue_labels_uses_the_label_applier(self, mock_applier_class):
+        applier = mock_applier_class.return_value
+        applier.apply.return_value = [LabelResult(7, "failed", ["bug"], "403 Forbidden")]
+        
+        assert self.service.add_issue_labels("owner", "repo", 7, ["bug"]) is False
+        applier.apply.assert_called_once_with("owner", "repo", {7: ["bug"]}, None)
+    
     @patch('github_similarity_service.requests.get')
     def test_fetch_issues_success(self, mock_get):
         mock_response = Mock()
@@ -256,6 +294,8 @@ class TestIndexingAndSearch:
     @patch('github_similarity_service.chromadb.CloudClient')
     def setup_method(self, method, mock_chroma_client):
         mock_collection = Mock()
+        # Nothing indexed yet, so every upserted item is new
+        mock_collection.get.return_value = {"ids": [], "metadatas": []}
         mock_chroma_client.return_value.get_collection.return_value = mock_collection
         self.service = SimilarityService()
         self.service.collection = mock_collection
@@ -282,7 +322,7 @@ class TestIndexingAndSearch:
         assert result["indexed"] == 1
         assert result["issues"] == 1
         assert result["discussions"] == 0
-        mock_fetch_issues.assert_called_once_with("owner", "repo", 1, state='open')
+        mock_fetch_issues.assert_called_once_with("owner", "repo", 1, state='open', since=None)
         mock_fetch_discussions.assert_not_called()
         self.service.collection.upsert.assert_called_once()
     
@@ -319,7 +359,7 @@ class TestIndexingAndSearch:
         assert result["indexed"] == 2
         assert result["issues"] == 1
         assert result["discussions"] == 1
-        mock_fetch_discussions.assert_called_once_with("owner", "repo", 1)
+        mock_fetch_discussions.assert_called_once_with("owner", "repo", 1, since=None)
     
     @patch.object(SimilarityService, '_fetch_single_issue')
     def test_find_similar_issues(self, mock_fetch_issue):
@@ -513,6 +553,1131 @@ class TestDiscussionSuggestions:
         assert result["suggestions"][0]["score"] > 0.3
         assert result["dry_run"] is True
         assert result["total_analyzed"] == 2
+    
+    def test_suggest_discussions_scores_stored_bodies(self):
+        metadata = {
+            "number": "7",
+            "title": "Caching layer",
+            "type": "issue",
+            "state": "closed",
+            "url": "https://github.com/owner/repo/issues/7",
+            "created_at": "2023-01-01T00:00:00Z",
+            "is_pull_request": "False",
+            "labels": ""
+        }
+        self.service.collection.get.return_value = {
+            "ids": ["owner/repo/issues/7"],
+            "metadatas": [metadata],
+            "documents": ["Title: Caching layer\n\nType: Issue\n\nState: closed\n\nBody: Looking for feedback on the approach"]
+        }
+        
+        result = self.service.suggest_discussions("owner", "repo", min_score=0.3)
+        
+        assert result["suggestions"][0]["number"] == 7
+        assert "Discussion-oriented language" in result["suggestions"][0]["reasons"]
+        _, kwargs = self.service.collection.get.call_args
+        assert kwargs["include"] == ["metadatas", "documents"]
+    
+    def test_suggest_discussions_embedding_mode(self):
+        def meta(number, type_, labels):
+            return {
+                "number": str(number), "title": f"Item {number}", "type": type_, "state": "open",
+                "url": f"https://github.com/owner/repo/issues/{number}", "created_at": "2023-01-01T00:00:00Z",
+                "is_pull_request": "False", "labels": labels
+            }
+        self.service.collection.get.return_value = {
+            "ids": ["d1", "i2", "i3", "i4"],
+            "metadatas": [meta(1, "discussion", ""), meta(2, "issue", "bug"), meta(3, "issue", ""), meta(4, "issue", "")],
+            "embeddings": [[1.0, 0.0], [0.0, 1.0], [0.95, 0.05], [0.1, 0.9]]
+        }
+        
+        result = self.service.suggest_discussions("owner", "repo", min_score=0.5, mode="embedding")
+        
+        assert [s["number"] for s in result["suggestions"]] == [3]
+        assert result["mode"] == "embedding"
+        assert result["total_analyzed"] == 3
+        _, kwargs = self.service.collection.get.call_args
+        assert kwargs["include"] == ["metadatas", "embeddings"]
+    
+    def test_suggest_discussions_embedding_mode_needs_seeds(self):
+        self.service.collection.get.return_value = {
+            "ids": ["i1"],
+            "metadatas": [{"number": "1", "title": "x", "type": "issue", "is_pull_request": "False", "labels": ""}],
+            "embeddings": [[1.0, 0.0]]
+        }
+        
+        with pytest.raises(ValueError):
+            self.service.suggest_discussions("owner", "repo", mode="embedding")
+    
+    def test_get_all_paginates(self):
+        pages = [
+            {"ids": ["a", "b"], "metadatas": [{"n": 1}, {"n": 2}], "documents": ["A", "B"]},
+            {"ids": ["c"], "metadatas": [{"n": 3}], "documents": ["C"]},
+        ]
+        self.service.collection.get.side_effect = pages
+        
+        result = self.service._get_all(where={"owner": "o"}, include=["metadatas", "documents"], page_size=2)
+        
+        assert result["ids"] == ["a", "b", "c"]
+        assert result["documents"] == ["A", "B", "C"]
+        offsets = [call.kwargs["offset"] for call in self.service.collection.get.call_args_list]
+        assert offsets == [0, 2]
+    
+    def test_suggest_discussions_parallel_matches_serial(self):
+        titles = ["How to use feature X?", "Bug: app crashes", "[RFC] plugins", "Thoughts on caching?", "Typo"]
+        metadatas = [
+            {
+                "number": str(i),
+                "title": titles[i % len(titles)],
+                "type": "issue",
+                "state": "open" if i % 3 else "closed",
+                "url": f"https://github.com/owner/repo/issues/{i}",
+                "created_at": "2023-01-01T00:00:00Z",
+                "is_pull_request": "False",
+                "labels": "question" if i % 4 == 0 else ""
+            }
+            for i in range(40)
+        ]
+        self.service.collection.get.return_value = {"ids": [str(i) for i in range(40)], "metadatas": metadatas}
+        
+        serial = self.service.suggest_discussions("owner", "repo", min_score=0.3, max_suggestions=7)
+        with patch('github_similarity_service.MIN_DISCUSSION_SHARD', 10):
+            parallel = self.service.suggest_discussions("owner", "repo", min_score=0.3, max_suggestions=7, workers=3)
+        
+        assert len(serial["suggestions"]) == 7
+        assert parallel["suggestions"] == serial["suggestions"]
+        scores = [s["score"] for s in serial["suggestions"]]
+        assert scores == sorted(scores, reverse=True)
+
+
+class TestDeltaIndexing:
+    @patch.dict(os.environ, {
+        'CHROMA_API_KEY': 'test-key',
+        'CHROMA_TENANT': 'test-tenant',
+        'GITHUB_TOKEN': 'test-token'
+    })
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        # Nothing indexed yet, so every upserted item is new
+        mock_collection.get.return_value = {"ids": [], "metadatas": []}
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        self.service = SimilarityService()
+        self.service.collection = mock_collection
+    
+    @patch('github_similarity_service.requests.get')
+    def test_fetch_issues_passes_since(self, mock_get):
+        mock_response = Mock()
+        mock_response.json.return_value = []
+        mock_get.return_value = mock_response
+        
+        self.service._fetch_issues("owner", "repo", max_issues=10, state="all", since="2024-01-01T00:00:00Z")
+        
+        params = mock_get.call_args.kwargs["params"]
+        assert params["since"] == "2024-01-01T00:00:00Z"
+        assert params["state"] == "all"
+        assert params["direction"] == "asc"
+    
+    @patch.object(SimilarityService, '_fetch_issues')
+    def test_capped_delta_keeps_watermark_at_last_fetched_change(self, mock_fetch_issues):
+        mock_fetch_issues.return_value = [
+            Issue(number=n, title=f"Issue {n}", state="open", created_at="2024-01-01T00:00:00Z",
+                  updated_at=f"2024-01-0{n}T00:00:00Z", url=f"https://github.com/owner/repo/issues/{n}")
+            for n in (2, 3)
+        ]
+        self.service._fetch_discussions = Mock(return_value=[
+            Discussion(number=9, title="Idea", category="Ideas", created_at="2024-01-01T00:00:00Z",
+                       updated_at="2024-01-09T00:00:00Z", url="https://github.com/owner/repo/discussions/9")
+        ])
+        
+        result = self.service.index_repository("owner", "repo", max_issues=2, include_discussions=True, since="2024-01-01T00:00:00Z")
+        assert result["latest_updated_at"] == "2024-01-03T00:00:00Z"
+        
+        # Discussions arrive newest first, so a capped page cannot advance the watermark
+        result = self.service.index_repository("owner", "repo", max_issues=1, include_discussions=True, since="2024-01-01T00:00:00Z")
+        assert result["latest_updated_at"] == "2024-01-01T00:00:00Z"
+    
+    @patch.object(SimilarityService, '_fetch_issues')
+    def test_index_repository_reports_latest_updated_at(self, mock_fetch_issues):
+        mock_fetch_issues.return_value = [
+            Issue(
+                number=n,
+                title=f"Issue {n}",
+                state="open",
+                created_at="2024-01-01T00:00:00Z",
+                updated_at=f"2024-01-0{n}T00:00:00Z",
+                url=f"https://github.com/owner/repo/issues/{n}"
+            )
+            for n in (1, 3, 2)
+        ]
+        
+        result = self.service.index_repository("owner", "repo", since="2024-01-01T00:00:00Z")
+        
+        assert result["latest_updated_at"] == "2024-01-03T00:00:00Z"
+        mock_fetch_issues.assert_called_once_with("owner", "repo", 100, state='open', since="2024-01-01T00:00:00Z")
+    
+    def test_snapshot_round_trip(self, tmp_path):
+        from index_state import IndexSnapshot, IndexStateStore
+        
+        store = IndexStateStore(str(tmp_path))
+        assert store.load("owner", "repo") is None
+        
+        store.save(IndexSnapshot(owner="owner", repo="repo", last_synced_at="2024-01-03T00:00:00Z", comments_synced_at="2024-01-02T00:00:00Z"))
+        snapshot = store.load("owner", "repo")
+        
+        assert snapshot.last_synced_at == "2024-01-03T00:00:00Z"
+        assert snapshot.comments_synced_at == "2024-01-02T00:00:00Z"
+        assert store.load("owner", "other") is None
+
+
+class TestBatchFindSimilar:
+    @patch.dict(os.environ, {
+        'CHROMA_API_KEY': 'test-key',
+        'CHROMA_TENANT': 'test-tenant',
+        'GITHUB_TOKEN': 'test-token'
+    })
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        self.service = SimilarityService()
+        self.service.collection = mock_collection
+    
+    @patch('github_similarity_service.requests.post')
+    def test_fetch_issues_by_number_uses_aliases(self, mock_post):
+        mock_response = Mock()
+        mock_response.json.return_value = {
+            "data": {
+                "repository": {
+                    "i1": {
+                        "__typename": "Issue",
+                        "number": 1,
+                        "title": "Issue 1",
+                        "body": "Body 1",
+                        "state": "OPEN",
+                        "createdAt": "2023-01-01T00:00:00Z",
+                        "updatedAt": "2023-01-01T00:00:00Z",
+                        "url": "https://github.com/owner/repo/issues/1",
+                        "labels": {"nodes": [{"name": "bug"}]}
+                    },
+                    "i2": {
+                        "__typename": "PullRequest",
+                        "number": 2,
+                        "title": "PR 2",
+                        "body": None,
+                        "state": "MERGED",
+                        "createdAt": "2023-01-01T00:00:00Z",
+                        "updatedAt": "2023-01-01T00:00:00Z",
+                        "url": "https://github.com/owner/repo/pull/2",
+                        "labels": {"nodes": []}
+                    },
+                    "i404": None
+                }
+            }
+        }
+        mock_post.return_value = mock_response
+        
+        issues = self.service._fetch_issues_by_number("owner", "repo", [1, 2, 404])
+        
+        mock_post.assert_called_once()
+        query = mock_post.call_args.kwargs["json"]["query"]
+        assert "i1: issueOrPullRequest(number: 1)" in query
+        assert "i404: issueOrPullRequest(number: 404)" in query
+        assert sorted(issues) == [1, 2]
+        assert issues[1].labels == ["bug"]
+        assert issues[2].is_pull_request
+        assert issues[2].state == "closed"
+    
+    @patch.object(SimilarityService, '_fetch_issues_by_number')
+    def test_find_similar_batch_uses_one_vector_query(self, mock_fetch):
+        mock_fetch.return_value = {
+            5: Issue(
+                number=5,
+                title="Crash on save",
+                state="open",
+                created_at="2023-01-01T00:00:00Z",
+                updated_at="2023-01-01T00:00:00Z",
+                url="https://github.com/owner/repo/issues/5"
+            )
+        }
+        metadata = {
+            "number": "5", "title": "Crash on save", "state": "open",
+            "url": "https://github.com/owner/repo/issues/5", "type": "issue",
+            "is_pull_request": "False", "is_discussion": "False", "labels": ""
+        }
+        self.service.collection.query.return_value = {
+            "ids": [["owner/repo/issues/5"], ["owner/repo/issues/5"]],
+            "distances": [[0.0], [0.2]],
+            "metadatas": [[metadata], [metadata]]
+        }
+        
+        results = list(self.service.find_similar_batch("owner", "repo", issue_numbers=[5, 6], queries=["saving crashes"], top_k=3))
+        
+        assert results[0] == {"issue_number": 6, "error": "Issue #6 not found in owner/repo"}
+        assert results[1]["issue_number"] == 5
+        assert results[1]["count"] == 0  # only matched itself
+        assert results[2]["query"] == "saving crashes"
+        assert results[2]["similar_issues"][0]["number"] == 5
+        self.service.collection.query.assert_called_once()
+        assert len(self.service.collection.query.call_args.kwargs["query_texts"]) == 2
+    
+    def test_find_similar_batch_returns_at_most_top_k(self):
+        rows = [(n, n / 10) for n in range(1, 6)]
+        self.service.collection.query.return_value = _query_results("owner", "repo", rows)
+        
+        batch = list(self.service.find_similar_batch("owner", "repo", queries=["saving crashes"], top_k=3))
+        single = self.service.search_similar_text("owner", "repo", "saving crashes", top_k=3)
+        
+        assert batch[0]["count"] == 3
+        assert batch[0]["similar_issues"] == single
+
+
+class TestFreeTextSearch:
+    @patch.dict(os.environ, {
+        'CHROMA_API_KEY': 'test-key',
+        'CHROMA_TENANT': 'test-tenant'
+    })
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        self.service = SimilarityService()
+        self.service.collection = mock_collection
+    
+    @patch('github_similarity_service.requests.get')
+    def test_search_similar_text_skips_github(self, mock_get):
+        self.service.collection.query.return_value = {
+            "ids": [["owner/repo/issues/7"]],
+            "distances": [[0.25]],
+            "metadatas": [[{
+                "number": "7", "title": "Editor freezes", "state": "open",
+                "url": "https://github.com/owner/repo/issues/7", "type": "issue",
+                "is_pull_request": "False", "is_discussion": "False", "labels": "bug"
+            }]]
+        }
+        
+        results = self.service.search_similar_text("owner", "repo", "Editor freeze", "On save", top_k=3)
+        
+        mock_get.assert_not_called()
+        query_text = self.service.collection.query.call_args.kwargs["query_texts"][0]
+        assert "Title: Editor freeze" in query_text
+        assert "Body: On save" in query_text
+        assert results[0]["number"] == 7
+        assert results[0]["similarity"] == 0.75
+
+
+class TestPartitioning:
+    @patch.dict(os.environ, {
+        'CHROMA_API_KEY': 'test-key',
+        'CHROMA_TENANT': 'test-tenant',
+        'GITHUB_TOKEN': 'test-token'
+    })
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        self.shared = Mock()
+        self.partitions = {}
+        
+        def get_or_create_collection(name, metadata=None):
+            collection = Mock()
+            collection.name = name
+            collection.metadata = metadata
+            collection.get.return_value = {"ids": [], "metadatas": []}
+            self.partitions[name] = collection
+            return collection
+        
+        client = mock_chroma_client.return_value
+        client.get_collection.return_value = self.shared
+        client.get_or_create_collection.side_effect = get_or_create_collection
+        self.service = SimilarityService(partitioning="repo")
+    
+    def test_unknown_mode_rejected(self):
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'k', 'CHROMA_TENANT': 't'}), \
+                patch('github_similarity_service.chromadb.CloudClient'):
+            with pytest.raises(ValueError):
+                SimilarityService(partitioning="sharded")
+    
+    def test_partition_names_are_valid_and_distinct(self):
+        names = {self.service._partition_name("Acme", repo) for repo in ("a.b", "a-b", "x" * 100)}
+        
+        assert len(names) == 3
+        for name in names:
+            assert 3 <= len(name) <= 63
+            assert name.startswith("github_issues__")
+        assert self.service._partition_name("ACME", "Api") == self.service._partition_name("acme", "api")
+    
+    def test_queries_route_to_repo_collection_without_scope_filter(self):
+        self.service.query_similar_batch("acme", "api", ["text"], n_results=5)
+        self.service.query_similar_batch("acme", "api", ["text"], n_results=5)
+        
+        assert len(self.partitions) == 1
+        collection = next(iter(self.partitions.values()))
+        assert collection.metadata == {"hnsw:space": "cosine", "owner": "acme", "repo": "api"}
+        collection.query.assert_called_with(query_texts=["text"], n_results=5, where=None)
+        self.shared.query.assert_not_called()
+    
+    def test_owner_mode_keeps_repo_filter(self):
+        self.service.partitioning = "owner"
+        
+        assert self.service._repo_where("acme", "api", {"type": "issue"}) == {"$and": [{"repo": "api"}, {"type": "issue"}]}
+        assert self.service._partition_name("acme", "api") == self.service._partition_name("acme", "web")
+    
+    def test_upsert_and_delete_route_by_repository(self):
+        issue = Issue(number=1, title="t", state="open", created_at="c", updated_at="u", url="url")
+        self.service.upsert_items("acme", "api", [issue])
+        self.service.upsert_items("acme", "web", [issue])
+        
+        self.service.delete_items(["acme/api/issues/1", "acme/web/issues/1", "acme/api/issues/2"])
+        
+        api = self.partitions[self.service._partition_name("acme", "api")]
+        web = self.partitions[self.service._partition_name("acme", "web")]
+        api_ids = ["acme/api/issues/1", "acme/api/issues/2"]
+        assert api.delete.call_args_list == [call(ids=api_ids), call(where={"parent_id": {"$in": api_ids}})]
+        assert web.delete.call_args_list == [
+            call(ids=["acme/web/issues/1"]), call(where={"parent_id": {"$in": ["acme/web/issues/1"]}})
+        ]
+        self.shared.upsert.assert_not_called()
+    
+    def test_migrate_copies_embeddings_into_partitions(self):
+        self.shared.get.side_effect = [
+            {
+                "ids": ["acme/api/issues/1", "acme/web/issues/2", "acme/api/issues/3"],
+                "metadatas": [{"owner": "acme", "repo": "api"}, {"owner": "acme", "repo": "web"}, {"owner": "acme", "repo": "api"}],
+                "documents": ["d1", "d2", "d3"],
+                "embeddings": [[0.1], [0.2], [0.3]]
+            },
+            {"ids": [], "metadatas": [], "documents": [], "embeddings": []}
+        ]
+        
+        result = self.service.migrate_to_partitions(page_size=3, drop_shared=True)
+        
+        assert result["migrated"] == 3
+        assert result["partitions"] == 2
+        api = self.partitions[self.service._partition_name("acme", "api")]
+        api.upsert.assert_called_once_with(
+            ids=["acme/api/issues/1", "acme/api/issues/3"],
+            embeddings=[[0.1], [0.3]],
+            documents=["d1", "d3"],
+            metadatas=[{"owner": "acme", "repo": "api"}, {"owner": "acme", "repo": "api"}]
+        )
+        self.service.client.delete_collection.assert_called_once_with("github_issues")
+    
+    def test_migrate_requires_partitioned_mode(self):
+        self.service.partitioning = "shared"
+        
+        with pytest.raises(ValueError):
+            self.service.migrate_to_partitions()
+    
+    def test_stats_sum_partitions(self):
+        api = Mock(metadata={"owner": "acme", "repo": "api"})
+        api.name = self.service._partition_name("acme", "api")
+        api.count.return_value = 4
+        # One of the four rows is a chunk of another item
+        api.get.return_value = {"ids": ["acme/api/issues/1#chunk1"], "metadatas": [{"type": "chunk", "parent_id": "acme/api/issues/1"}]}
+        other = Mock()
+        other.name = "unrelated"
+        self.service.client.list_collections.return_value = [api, other]
+        self.shared.count.return_value = 2
+        self.shared.get.return_value = {"ids": [], "metadatas": []}
+        
+        stats = self.service.get_stats()
+        
+        assert api.get.call_args.kwargs["where"] == {"type": {"$in": ["chunk", "comment"]}}
+        assert stats == {
+            "total_issues": 3,
+            "repositories": ["acme/api"],
+            "partitioning": "repo",
+            "partitions": 1,
+            "unmigrated_items": 2
+        }
+
+
+def _query_results(owner, repo, rows):
+    """Collection.query response for (number, distance) rows of one repository"""
+    return {
+        "ids": [[f"{owner}/{repo}/issues/{number}" for number, _ in rows]],
+        "distances": [[distance for _, distance in rows]],
+        "metadatas": [[{
+            "owner": owner, "repo": repo, "number": str(number), "title": f"{repo} #{number}",
+            "state": "open", "url": f"https://github.com/{owner}/{repo}/issues/{number}",
+            "type": "issue", "is_pull_request": "False", "is_discussion": "False", "labels": ""
+        } for number, _ in rows]]
+    }
+
+
+class TestCrossRepoSearch:
+    @patch.dict(os.environ, {
+        'CHROMA_API_KEY': 'test-key',
+        'CHROMA_TENANT': 'test-tenant'
+    })
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        self.service = SimilarityService()
+        self.service.collection = mock_collection
+    
+    def test_shared_mode_uses_one_filtered_query(self):
+        self.service.collection.query.return_value = _query_results("acme", "web", [(1, 0.1), (2, 0.3)])
+        
+        results = self.service.search_repositories(["acme/api", "acme/web", "acme/api"], "text", top_k=5)
+        
+        self.service.collection.query.assert_called_once_with(
+            n_results=5,
+            where={"$or": [
+                {"$and": [{"owner": "acme"}, {"repo": "api"}]},
+                {"$and": [{"owner": "acme"}, {"repo": "web"}]}
+            ]},
+            query_texts=["text"]
+        )
+        assert [r["repository"] for r in results] == ["acme/web", "acme/web"]
+    
+    def test_partitions_queried_in_parallel_and_merged(self):
+        self.service.partitioning = "repo"
+        partitions = {
+            "acme/api": Mock(**{"query.return_value": _query_results("acme", "api", [(1, 0.05), (2, 0.4), (3, 0.6)])}),
+            "acme/web": Mock(**{"query.return_value": _query_results("acme", "web", [(7, 0.1), (8, 0.2)])}),
+        }
+        self.service._collection_for = lambda owner, repo: partitions[f"{owner}/{repo}"]
+        self.service._embedding_function = Mock(return_value=[[0.5, 0.5]])
+        
+        results = self.service.search_repositories(
+            ["acme/api", "acme/web"], "text", top_k=3, min_similarity=0.5, exclude_id="acme/api/issues/1"
+        )
+        
+        # Embedded once and shared by both partition queries
+        self.service._embedding_function.assert_called_once_with(["text"])
+        for collection in partitions.values():
+            collection.query.assert_called_once_with(n_results=4, where=None, query_embeddings=[[0.5, 0.5]])
+        assert [(r["repository"], r["number"]) for r in results] == [("acme/web", 7), ("acme/web", 8), ("acme/api", 2)]
+    
+    def test_invalid_repository_rejected(self):
+        with pytest.raises(ValueError):
+            self.service.search_repositories(["acme"], "text")
+    
+    def test_find_similar_issues_excludes_query_issue(self):
+        issue = Issue(number=1, title="Crash", state="open", created_at="c", updated_at="u", url="url")
+        self.service._fetch_single_issue = Mock(return_value=issue)
+        self.service.collection.query.return_value = _query_results("acme", "api", [(1, 0.0), (4, 0.2)])
+        
+        results = self.service.find_similar_issues("acme", "api", 1, top_k=2, repositories=["acme/plugins"])
+        
+        assert [(r["repository"], r["number"]) for r in results] == [("acme/api", 4)]
+        assert self.service.collection.query.call_args.kwargs["n_results"] == 3
+
+
+class TestHybridSearch:
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'test-key', 'CHROMA_TENANT': 'test-tenant'}):
+            self.service = SimilarityService()
+        self.service.collection = mock_collection
+    
+    def _enable_lexical(self, tmp_path):
+        self.service.lexical = BM25Store(str(tmp_path))
+    
+    def test_lexical_index_disabled_without_data_dir(self):
+        assert self.service.lexical is None
+    
+    def test_index_repository_persists_lexical_index(self, tmp_path):
+        self._enable_lexical(tmp_path)
+        issue = Issue(number=5, title="Fails with E1234", body="stack at worker.run", state="open",
+                      created_at="c", updated_at="u", url="https://github.com/acme/api/issues/5")
+        self.service._fetch_issues = Mock(return_value=[issue])
+        self.service.collection.get.return_value = {"ids": [], "metadatas": []}
+        
+        self.service.index_repository("acme", "api")
+        
+        assert (tmp_path / "bm25").exists()
+        assert BM25Store(str(tmp_path)).get("acme", "api").search("e1234")[0][0] == "acme/api/issues/5"
+        
+        self.service.delete_items(["acme/api/issues/5"])
+        assert len(BM25Store(str(tmp_path)).get("acme", "api")) == 0
+    
+    def test_search_fuses_lexical_and_semantic(self, tmp_path):
+        self._enable_lexical(tmp_path)
+        self.service.lexical.add(
+            "acme", "api",
+            ["acme/api/issues/1", "acme/api/issues/2"],
+            ["Title: Crash E1234", "Title: Unrelated"],
+            [{}, {}]
+        )
+        self.service._embedding_function = Mock(return_value=[[1.0, 0.0]])
+        self.service.collection.query.return_value = _query_results("acme", "api", [(3, 0.2), (1, 0.3)])
+        stored = _query_results("acme", "api", [(2, 0.0)])
+        self.service.collection.get.return_value = {
+            "ids": ["acme/api/issues/2"], "embeddings": [[0.6, 0.8]], "metadatas": stored["metadatas"][0]
+        }
+        
+        results = self.service.search_similar_text("acme", "api", "E1234 crash", top_k=3)
+        
+        self.service.collection.query.assert_called_once_with(
+            query_embeddings=[[1.0, 0.0]], n_results=3, where={"$and": [{"owner": "acme"}, {"repo": "api"}]}
+        )
+        assert [(r["number"], r["match"]) for r in results] == [(1, "both"), (3, "semantic"), (2, "lexical")]
+        # Lexical-only hits get their cosine similarity from the stored embedding
+        assert results[2]["similarity"] == 0.6
+        assert results[0]["rrf_score"] == round(1 / 62 + 1 / 61, 6)
+    
+    def test_min_similarity_applies_to_fused_results(self, tmp_path):
+        self._enable_lexical(tmp_path)
+        self.service.lexical.add("acme", "api", ["acme/api/issues/2"], ["Title: Crash E1234"], [{}])
+        self.service._embedding_function = Mock(return_value=[[1.0, 0.0]])
+        self.service.collection.query.return_value = _query_results("acme", "api", [(3, 0.2)])
+        stored = _query_results("acme", "api", [(2, 0.0)])
+        self.service.collection.get.return_value = {
+            "ids": ["acme/api/issues/2"], "embeddings": [[0.0, 1.0]], "metadatas": stored["metadatas"][0]
+        }
+        
+        results = self.service.search_similar_text("acme", "api", "E1234", top_k=3, min_similarity=0.5)
+        
+        assert [r["number"] for r in results] == [3]
+
+
+class TestSignatureDuplicates:
+    TRACE = 'Traceback (most recent call last):\n  File "/app/io.py", line 4, in load\nKeyError: missing config key "port"\n'
+    
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'test-key', 'CHROMA_TENANT': 'test-tenant'}):
+            self.service = SimilarityService()
+        self.service.collection = mock_collection
+    
+    def _index_signatures(self, tmp_path, documents):
+        self.service.signatures = SignatureStore(str(tmp_path))
+        self.service.signatures.add("acme", "api", list(documents), list(documents.values()))
+        stored = _query_results("acme", "api", [(int(doc_id.rsplit("/", 1)[1]), 0.0) for doc_id in documents])
+        self.service.collection.get.return_value = {"ids": stored["ids"][0], "metadatas": stored["metadatas"][0]}
+    
+    def test_signature_hits_skip_vector_search(self, tmp_path):
+        self._index_signatures(tmp_path, {"acme/api/issues/3": self.TRACE})
+        
+        results = self.service.search_similar_text("acme", "api", "Crash", self.TRACE, top_k=1)
+        
+        self.service.collection.query.assert_not_called()
+        assert [(r["number"], r["similarity"], r["match"]) for r in results] == [(3, 1.0, "signature")]
+        assert results[0]["signatures"] == ["trace", "exception"]
+    
+    def test_signature_hits_come_first_then_vector_results(self, tmp_path):
+        self._index_signatures(tmp_path, {"acme/api/issues/3": self.TRACE})
+        self.service.collection.query.return_value = _query_results("acme", "api", [(3, 0.1), (8, 0.2)])
+        issue = Issue(number=9, title="Crash", body=self.TRACE, state="open", created_at="c", updated_at="u", url="url")
+        self.service._fetch_single_issue = Mock(return_value=issue)
+        
+        results = self.service.find_similar_issues("acme", "api", 9, top_k=3)
+        
+        assert [(r["number"], r.get("match")) for r in results] == [(3, "signature"), (8, None)]
+    
+    @pytest.mark.parametrize("body", [
+        "The editor freezes when saving large files. " * 300 + "\n" + TRACE,  # past the 10k embedded characters
+        # In the middle of a long code fence, which is collapsed before embedding
+        "```\n" + "".join(f"loading {letter * 3}\n" for letter in "abcdefghijklmnop") + TRACE
+        + "".join(f"closing {letter * 3}\n" for letter in "abcdefghijklmnop") + "```",
+    ])
+    def test_queries_match_signatures_in_the_raw_body(self, tmp_path, body):
+        self._index_signatures(tmp_path, {"acme/api/issues/3": self.TRACE})
+        
+        results = self.service.search_similar_text("acme", "api", "Crash", body, top_k=1)
+        
+        assert [(r["number"], r["match"]) for r in results] == [(3, "signature")]
+    
+    def test_without_signature_index(self):
+        assert self.service.signatures is None
+        assert self.service.find_signature_duplicates("acme", "api", self.TRACE) == []
+
+
+def _chunk_rows(results, parent_number, chunk_index):
+    """Turn a _query_results row into a chunk of another item, as stored when chunking"""
+    metadata = results["metadatas"][0][0]
+    parent_id = f"{metadata['owner']}/{metadata['repo']}/issues/{parent_number}"
+    results["ids"][0][0] = f"{parent_id}#chunk{chunk_index}"
+    results["metadatas"][0][0] = {
+        **metadata, "number": str(parent_number), "type": "chunk", "parent_type": "issue",
+        "parent_id": parent_id, "chunk_index": chunk_index
+    }
+    return results
+
+
+class TestChunking:
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        # Nothing indexed yet, so every upserted item is new
+        mock_collection.get.return_value = {"ids": [], "metadatas": []}
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'test-key', 'CHROMA_TENANT': 'test-tenant'}):
+            self.service = SimilarityService(chunking=True)
+        self.service.collection = mock_collection
+    
+    def _results(self, rows):
+        """Query results where each row is (number, distance, chunk index or None)"""
+        merged = {"ids": [[]], "distances": [[]], "metadatas": [[]]}
+        for number, distance, chunk_index in rows:
+            row = _query_results("acme", "api", [(number, distance)])
+            if chunk_index is not None:
+                row = _chunk_rows(row, number, chunk_index)
+            for key in merged:
+                merged[key][0].extend(row[key][0])
+        return merged
+    
+    def test_chunk_text_overlaps_and_caps(self):
+        text = "".join(str(i % 10) for i in range(5000))
+        chunks = chunk_text(text, size=2000, overlap=200)
+        assert [len(chunk) for chunk in chunks] == [2000, 2000, 1400]
+        assert chunks[1][:200] == chunks[0][-200:]
+        assert chunk_text("x" * 2100, size=2000, overlap=200)[-1] == "x" * 300
+        
+        capped = chunk_text(text * 10, size=2000, overlap=200, max_chunks=4)
+        assert len(capped) == 4
+        assert capped[0] == (text * 10)[:2000]
+        assert (text * 10).endswith(capped[-1])
+    
+    def test_invalid_pooling_rejected(self):
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'k', 'CHROMA_TENANT': 't'}):
+            with patch('github_similarity_service.chromadb.CloudClient'):
+                with pytest.raises(ValueError, match="DEJA_VIEW_CHUNK_POOLING"):
+                    SimilarityService(chunk_pooling="mean")
+    
+    def test_long_bodies_get_chunk_vectors(self):
+        long_issue = Issue(number=1, title="Crash", body="a" * 5000, state="open",
+                           created_at="c", updated_at="u", url="https://github.com/acme/api/issues/1")
+        short_issue = Issue(number=2, title="Typo", body="short", state="open",
+                            created_at="c", updated_at="u", url="https://github.com/acme/api/issues/2")
+        
+        self.service._upsert_batch("acme", "api", [long_issue, short_issue])
+        
+        # Only chunks are replaced; comment vectors of the same items stay
+        self.service.collection.delete.assert_called_once_with(where={"$and": [
+            {"parent_id": {"$in": ["acme/api/issues/1", "acme/api/issues/2"]}}, {"type": "chunk"}
+        ]})
+        upsert = self.service.collection.upsert.call_args.kwargs
+        assert upsert["ids"] == [
+            "acme/api/issues/1", "acme/api/issues/2",
+            "acme/api/issues/1#chunk0", "acme/api/issues/1#chunk1", "acme/api/issues/1#chunk2"
+        ]
+        assert upsert["metadatas"][0]["chunk_count"] == 3
+        assert "chunk_count" not in upsert["metadatas"][1]
+        assert upsert["metadatas"][3]["type"] == "chunk"
+        assert upsert["metadatas"][3]["parent_id"] == "acme/api/issues/1"
+        assert upsert["metadatas"][3]["chunk_index"] == 1
+        assert upsert["documents"][3].startswith("Title: Crash\n\nBody (part 2/3): ")
+    
+    def test_chunk_hits_pool_into_parent_with_max(self):
+        self.service.collection.query.return_value = self._results([(1, 0.1, 2), (2, 0.2, None), (1, 0.3, None), (3, 0.4, None)])
+        
+        results = self.service.search_similar_text("acme", "api", "crash", top_k=2)
+        
+        assert self.service.collection.query.call_args.kwargs["n_results"] == 6
+        assert [(r["number"], r["similarity"], r["type"]) for r in results] == [(1, 0.9, "issue"), (2, 0.8, "issue")]
+    
+    def test_sum_pooling_ranks_items_with_many_matching_chunks(self):
+        self.service.chunk_pooling = "sum"
+        self.service.collection.query.return_value = self._results([(2, 0.1, None), (1, 0.2, 0), (1, 0.3, 1)])
+        
+        results = self.service.search_similar_text("acme", "api", "crash", top_k=2)
+        
+        assert [(r["number"], r["similarity"], r["pooled_score"]) for r in results] == [(1, 0.8, 1.5), (2, 0.9, 0.9)]
+    
+    def test_delete_removes_chunks(self):
+        self.service.delete_items(["acme/api/issues/1"])
+        
+        self.service.collection.delete.assert_any_call(ids=["acme/api/issues/1"])
+        self.service.collection.delete.assert_any_call(where={"parent_id": {"$in": ["acme/api/issues/1"]}})
+
+
+
+
+def _comment_payload(comment_id, issue_number, updated_at, body="Same crash here", user_type="User"):
+    return {
+        "id": comment_id,
+        "issue_url": f"https://api.github.com/repos/acme/api/issues/{issue_number}",
+        "html_url": f"https://github.com/acme/api/issues/{issue_number}#issuecomment-{comment_id}",
+        "body": body,
+        "user": {"login": "octocat", "type": user_type},
+        "created_at": updated_at,
+        "updated_at": updated_at
+    }
+
+
+class TestCommentIndexing:
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'test-key', 'CHROMA_TENANT': 'test-tenant'}):
+            self.service = SimilarityService(comments=True)
+        self.service.collection = mock_collection
+    
+    @patch('github_similarity_service.requests.get')
+    def test_fetch_comments_pages_repo_wide(self, mock_get):
+        first = Mock(links={"next": {"url": "https://api.github.com/next"}})
+        first.json.return_value = [_comment_payload(1, 5, "2024-01-01T00:00:00Z")]
+        second = Mock(links={})
+        second.json.return_value = [_comment_payload(2, 6, "2024-01-02T00:00:00Z")]
+        mock_get.side_effect = [first, second]
+        
+        comments = self.service._fetch_comments("acme", "api", since="2024-01-01T00:00:00Z")
+        
+        assert [(c.id, c.issue_number) for c in comments] == [(1, 5), (2, 6)]
+        assert mock_get.call_args_list[0].args[0] == "https://api.github.com/repos/acme/api/issues/comments"
+        assert mock_get.call_args_list[0].kwargs["params"] == {
+            "per_page": 100, "sort": "updated", "direction": "asc", "since": "2024-01-01T00:00:00Z"
+        }
+        assert mock_get.call_args_list[1].args[0] == "https://api.github.com/next"
+        assert mock_get.call_args_list[1].kwargs["params"] is None
+    
+    def test_comments_become_child_vectors_of_indexed_parents(self):
+        self.service._fetch_comments = Mock(return_value=[
+            self.service._comment_from_api(_comment_payload(11, 1, "2024-01-02T00:00:00Z")),
+            self.service._comment_from_api(_comment_payload(12, 1, "2024-01-03T00:00:00Z", user_type="Bot")),
+            self.service._comment_from_api(_comment_payload(13, 2, "2024-01-04T00:00:00Z")),
+        ])
+        parent = _query_results("acme", "api", [(1, 0.0)])
+        self.service.collection.get.return_value = {"ids": parent["ids"][0], "metadatas": parent["metadatas"][0]}
+        
+        result = self.service.index_comments("acme", "api", since="2024-01-01T00:00:00Z")
+        
+        self.service.collection.get.assert_called_once_with(
+            ids=["acme/api/issues/1", "acme/api/issues/2"], include=["metadatas"]
+        )
+        upsert = self.service.collection.upsert.call_args.kwargs
+        assert upsert["ids"] == ["acme/api/issues/1#comment11"]
+        assert upsert["documents"] == ["Title: api #1\n\nComment: Same crash here"]
+        metadata = upsert["metadatas"][0]
+        assert (metadata["type"], metadata["parent_type"], metadata["parent_id"]) == ("comment", "issue", "acme/api/issues/1")
+        assert metadata["comment_id"] == 11
+        assert result["indexed"] == 1
+        assert result["skipped"] == 2
+        # The watermark covers skipped comments too
+        assert result["latest_updated_at"] == "2024-01-04T00:00:00Z"
+    
+    def test_comment_matches_pool_into_parent(self):
+        results = _query_results("acme", "api", [(1, 0.1), (1, 0.3)])
+        results["ids"][0][0] = "acme/api/issues/1#comment11"
+        results["metadatas"][0][0] = {
+            **results["metadatas"][0][0], "type": "comment", "parent_type": "issue", "parent_id": "acme/api/issues/1"
+        }
+        self.service.collection.query.return_value = results
+        
+        similar = self.service.search_similar_text("acme", "api", "crash", top_k=2)
+        
+        assert [(r["number"], r["similarity"], r["type"]) for r in similar] == [(1, 0.9, "issue")]
+    
+    def test_index_repository_syncs_comments_from_their_own_watermark(self):
+        self.service._fetch_issues = Mock(return_value=[])
+        self.service.index_comments = Mock(return_value={"indexed": 4, "latest_updated_at": "2024-02-01T00:00:00Z"})
+        
+        result = self.service.index_repository("acme", "api", since="2024-01-05T00:00:00Z", comments_since="2024-01-01T00:00:00Z")
+        
+        self.service.index_comments.assert_called_once_with("acme", "api", since="2024-01-01T00:00:00Z")
+        assert result["comments"] == 4
+        assert result["comments_synced_at"] == "2024-02-01T00:00:00Z"
+
+
+
+
+class TestChangeDetection:
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'test-key', 'CHROMA_TENANT': 'test-tenant'}):
+            self.service = SimilarityService()
+        self.service.collection = mock_collection
+    
+    def _issue(self, number, body="Crash on start", updated_at="2024-01-01T00:00:00Z"):
+        return Issue(number=number, title="Crash", body=body, state="open", created_at="c",
+                     updated_at=updated_at, url=f"https://github.com/acme/api/issues/{number}")
+    
+    def _store(self, *issues):
+        ids = [self.service._doc_id("acme", "api", issue) for issue in issues]
+        metadatas = []
+        for issue in issues:
+            metadata = self.service._build_metadata("acme", "api", issue)
+            metadata["content_hash"] = content_hash(self.service._create_document_text(issue))
+            metadatas.append(metadata)
+        self.service.collection.get.return_value = {"ids": ids, "metadatas": metadatas}
+    
+    def test_documents_are_normalized_and_hashed(self):
+        self.service.collection.get.return_value = {"ids": [], "metadatas": []}
+        issue = self._issue(1, body="<!-- template -->\n### Describe the bug\n\nCrash on start\n\n- [ ] I searched")
+        
+        assert self.service.upsert_items("acme", "api", [issue]) == 1
+        
+        upsert = self.service.collection.upsert.call_args.kwargs
+        assert upsert["documents"][0].endswith("Body: Crash on start")
+        assert upsert["metadatas"][0]["content_hash"] == content_hash(upsert["documents"][0])
+    
+    def test_unchanged_items_are_not_re_embedded(self):
+        self._store(self._issue(1), self._issue(2))
+        
+        embedded = self.service._upsert_batch("acme", "api", [
+            self._issue(1),
+            self._issue(2, updated_at="2024-02-01T00:00:00Z"),
+            self._issue(3)
+        ])
+        
+        assert embedded == 1
+        self.service.collection.upsert.assert_called_once()
+        assert self.service.collection.upsert.call_args.kwargs["ids"] == ["acme/api/issues/3"]
+        # Only the timestamp moved (e.g. a new comment): metadata is updated in place
+        update = self.service.collection.update.call_args.kwargs
+        assert update["ids"] == ["acme/api/issues/2"]
+        assert update["metadatas"][0]["updated_at"] == "2024-02-01T00:00:00Z"
+    
+    def test_edited_body_is_re_embedded(self):
+        self._store(self._issue(1))
+        
+        assert self.service._upsert_batch("acme", "api", [self._issue(1, body="Crash on exit")]) == 1
+        self.service.collection.update.assert_not_called()
+    
+    def test_refreshed_metadata_clears_removed_keys(self):
+        self._store(self._issue(1))
+        self.service.collection.get.return_value["metadatas"][0]["label:wontfix"] = True
+        
+        assert self.service._upsert_batch("acme", "api", [self._issue(1, updated_at="2024-02-01T00:00:00Z")]) == 0
+        
+        update = self.service.collection.update.call_args.kwargs
+        assert update["metadatas"][0]["label:wontfix"] is False
+        assert update["metadatas"][0]["updated_at"] == "2024-02-01T00:00:00Z"
+    
+    def test_relabeled_item_metadata_reaches_comment_vectors(self):
+        labeled = self._issue(1).model_copy(update={"labels": ["bug"]})
+        self._store(labeled)
+        parent = self.service.collection.get.return_value["metadatas"][0]
+        comment = {
+            **parent, "type": "comment", "parent_type": "issue", "parent_id": "acme/api/issues/1",
+            "comment_id": 11, "comment_url": "u", "comment_updated_at": "2024-01-02T00:00:00Z"
+        }
+        stored = self.service.collection.get.return_value
+        self.service.collection.get.side_effect = lambda **kwargs: (
+            {"ids": ["acme/api/issues/1#comment11"], "metadatas": [comment]} if "where" in kwargs else stored
+        )
+        
+        # Labels are part of the document, so the item is re-embedded
+        closed = labeled.model_copy(update={"state": "closed", "labels": ["ui"], "updated_at": "2024-02-01T00:00:00Z"})
+        assert self.service._upsert_batch("acme", "api", [closed]) == 1
+        
+        self.service.collection.get.assert_called_with(
+            limit=100, offset=0, include=["metadatas"], where={"parent_id": {"$in": ["acme/api/issues/1"]}}
+        )
+        # Upserts merge metadata, so the removed label is overwritten with False
+        assert self.service.collection.upsert.call_args.kwargs["metadatas"][0]["label:bug"] is False
+        child_update = self.service.collection.update.call_args.kwargs
+        assert child_update["ids"] == ["acme/api/issues/1#comment11"]
+        metadata = child_update["metadatas"][0]
+        assert (metadata["state"], metadata["label:ui"], metadata["label:bug"]) == ("closed", True, False)
+        assert metadata["updated_ts"] == self.service.collection.upsert.call_args.kwargs["metadatas"][0]["updated_ts"]
+        assert (metadata["type"], metadata["comment_id"]) == ("comment", 11)
+    
+    def test_removed_label_is_cleared_in_chroma(self, tmp_path):
+        # Chroma rejects None metadata values, so this runs against a real collection
+        self.service.collection = chromadb.EphemeralClient().create_collection(f"test-{uuid.uuid4().hex}", metadata={"hnsw:space": "cosine"})
+        self.service.vectors = VectorStore(str(tmp_path), "float32")
+        self.service._embedding_function = lambda texts: [[1.0, 0.0] for _ in texts]
+        labeled = self._issue(1).model_copy(update={"labels": ["bug"]})
+        self.service._upsert_batch("acme", "api", [labeled])
+        parent = self.service.collection.get(ids=["acme/api/issues/1"])["metadatas"][0]
+        self.service.collection.add(
+            ids=["acme/api/issues/1#comment11"], embeddings=[[1.0, 0.0]], documents=["Same here"],
+            metadatas=[{**parent, "type": "comment", "parent_type": "issue", "parent_id": "acme/api/issues/1", "comment_id": 11}]
+        )
+        
+        unlabeled = labeled.model_copy(update={"labels": []})
+        assert self.service._upsert_batch("acme", "api", [unlabeled]) == 1
+        commented = unlabeled.model_copy(update={"updated_at": "2024-02-01T00:00:00Z"})
+        assert self.service._upsert_batch("acme", "api", [commented]) == 0
+        
+        assert self.service.collection.get(where={"label:bug": True})["ids"] == []
+        stored = self.service.collection.get(where={"updated_ts": to_timestamp("2024-02-01T00:00:00Z")})
+        assert sorted(stored["ids"]) == ["acme/api/issues/1", "acme/api/issues/1#comment11"]
+        assert all(metadata["label:bug"] is False for metadata in stored["metadatas"])
+        # Nothing changed since, so nothing is rewritten
+        with patch.object(type(self.service.collection), "update") as update:
+            assert self.service._upsert_batch("acme", "api", [commented]) == 0
+        update.assert_not_called()
+    
+    def test_invalid_normalization_rejected(self):
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'k', 'CHROMA_TENANT': 't', 'DEJA_VIEW_NORMALIZE': 'images,emoji'}):
+            with patch('github_similarity_service.chromadb.CloudClient'):
+                with pytest.raises(ValueError, match="emoji"):
+                    SimilarityService()
+
+
+class TestLocalVectors:
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'test-key', 'CHROMA_TENANT': 'test-tenant'}):
+            self.service = SimilarityService()
+        self.service.collection = mock_collection
+        self.service.collection.get.return_value = {"ids": [], "metadatas": []}
+    
+    def _enable_vectors(self, tmp_path, mode="int8"):
+        self.service.vectors = VectorStore(str(tmp_path), mode)
+    
+    def _issue(self, number, title="Crash"):
+        return Issue(number=number, title=title, body="", state="open", created_at="c",
+                     updated_at="u", url=f"https://github.com/acme/api/issues/{number}")
+    
+    def test_disabled_by_default(self):
+        assert self.service.vectors is None
+    
+    def test_upsert_mirrors_embeddings_locally(self, tmp_path):
+        self._enable_vectors(tmp_path)
+        self.service._embedding_function = Mock(return_value=[[1.0, 0.0], [0.0, 1.0]])
+        
+        self.service.upsert_items("acme", "api", [self._issue(1), self._issue(2)])
+        
+        upsert = self.service.collection.upsert.call_args.kwargs
+        assert upsert["embeddings"] == [[1.0, 0.0], [0.0, 1.0]]
+        stored = VectorStore(str(tmp_path), "int8").get("acme", "api")
+        assert stored.ids == ["acme/api/issues/1", "acme/api/issues/2"]
+        assert stored.metadata("acme/api/issues/2")["number"] == 2
+    
+    def test_queries_answered_from_local_vectors(self, tmp_path):
+        self._enable_vectors(tmp_path)
+        metadatas = _query_results("acme", "api", [(1, 0.0), (2, 0.0)])["metadatas"][0]
+        self.service.vectors.add("acme", "api", ["acme/api/issues/1", "acme/api/issues/2"], [[1.0, 0.0], [0.6, 0.8]], metadatas)
+        self.service._embedding_function = Mock(return_value=[[0.0, 1.0]])
+        
+        results = self.service.search_similar_text("acme", "api", "Crash", top_k=2)
+        
+        self.service.collection.query.assert_not_called()
+        assert [r["number"] for r in results] == [2, 1]
+        assert results[0]["similarity"] == pytest.approx(0.8, abs=0.001)
+    
+    def test_build_copies_stored_embeddings(self, tmp_path):
+        self._enable_vectors(tmp_path, "binary")
+        metadatas = _query_results("acme", "api", [(1, 0.0), (2, 0.0)])["metadatas"][0]
+        self.service._iter_repo_pages = Mock(return_value=iter([{
+            "ids": ["acme/api/issues/1", "acme/api/issues/2"],
+            "embeddings": [[1.0, 0.0], [0.0, 1.0]],
+            "metadatas": metadatas
+        }]))
+        self.service._embedding_function = Mock()
+        
+        stats = self.service.build_local_vectors("acme", "api")
+        
+        assert stats["vectors"] == 2
+        assert stats["quantization"] == "binary"
+        assert stats["float32_bytes"] == 16
+        self.service._embedding_function.assert_not_called()
+        assert len(VectorStore(str(tmp_path), "binary").get("acme", "api")) == 2
+    
+    def test_ann_index_serves_queries_and_tracks_upserts(self, tmp_path):
+        self._enable_vectors(tmp_path)
+        self.service.ann = AnnStore(str(tmp_path), "hnsw")
+        self.service._embedding_function = Mock(return_value=[[1.0, 0.0], [0.0, 1.0]])
+        self.service.upsert_items("acme", "api", [self._issue(1), self._issue(2)])
+        
+        self.service._embedding_function = Mock(return_value=[[0.1, 1.0]])
+        self.service.vectors = Mock()
+        results = self.service.query_similar_batch("acme", "api", ["Crash"], n_results=1)
+        
+        assert results["ids"] == [["acme/api/issues/2"]]
+        self.service.vectors.get.assert_not_called()
+        self.service.collection.query.assert_not_called()
+        assert len(AnnStore(str(tmp_path), "hnsw").get("acme", "api")) == 2
+    
+    def test_build_ann_index_from_local_vectors(self, tmp_path):
+        self._enable_vectors(tmp_path)
+        self.service.ann = AnnStore(str(tmp_path), "ivf")
+        self.service.vectors.add("acme", "api", ["acme/api/issues/1", "acme/api/issues/2"], [[1.0, 0.0], [0.0, 1.0]], [{}, {}])
+        self.service._iter_repo_pages = Mock()
+        
+        stats = self.service.build_ann_index("acme", "api")
+        
+        assert (stats["index"], stats["source"], stats["vectors"]) == ("ivf", "local vectors", 2)
+        self.service._iter_repo_pages.assert_not_called()
+        assert AnnStore(str(tmp_path), "ivf").get("acme", "api").search([0.0, 1.0], k=1)[0][0] == "acme/api/issues/2"
+    
+    def test_invalid_ann_configuration_rejected(self, tmp_path):
+        with patch('github_similarity_service.chromadb.CloudClient'):
+            env = {'CHROMA_API_KEY': 'k', 'CHROMA_TENANT': 't', 'DEJA_VIEW_DATA_DIR': str(tmp_path), 'DEJA_VIEW_ANN_INDEX': 'lsh'}
+            with patch.dict(os.environ, env):
+                with pytest.raises(ValueError, match="lsh"):
+                    SimilarityService()
+            with patch.dict(os.environ, {'CHROMA_API_KEY': 'k', 'CHROMA_TENANT': 't', 'DEJA_VIEW_ANN_INDEX': 'ivf'}):
+                with pytest.raises(ValueError, match="DEJA_VIEW_DATA_DIR"):
+                    SimilarityService()
+    
+    def test_invalid_configuration_rejected(self, tmp_path):
+        with patch('github_similarity_service.chromadb.CloudClient'):
+            env = {'CHROMA_API_KEY': 'k', 'CHROMA_TENANT': 't', 'DEJA_VIEW_DATA_DIR': str(tmp_path), 'DEJA_VIEW_VECTOR_QUANTIZATION': 'int4'}
+            with patch.dict(os.environ, env):
+                with pytest.raises(ValueError, match="int4"):
+                    SimilarityService()
+            with patch.dict(os.environ, {'CHROMA_API_KEY': 'k', 'CHROMA_TENANT': 't', 'DEJA_VIEW_VECTOR_QUANTIZATION': 'int8'}):
+                with pytest.raises(ValueError, match="DEJA_VIEW_DATA_DIR"):
+                    SimilarityService()
+
+
+class TestTypedMetadata:
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        mock_collection = Mock()
+        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        with patch.dict(os.environ, {'CHROMA_API_KEY': 'test-key', 'CHROMA_TENANT': 'test-tenant'}):
+            self.service = SimilarityService()
+        self.service.collection = mock_collection
+    
+    def test_build_metadata_is_typed(self):
+        issue = Issue(number=5, title="Crash", body="", state="open", labels=["bug", "Needs Triage"],
+                      created_at="2024-01-02T00:00:00Z", updated_at="2024-01-03T00:00:00Z",
+                      url="https://github.com/acme/api/issues/5")
+        
+        metadata = self.service._build_metadata("acme", "api", issue)
+        
+        assert metadata["number"] == 5
+        assert metadata["is_pull_request"] is False
+        assert metadata["labels"] == "bug,Needs Triage"
+        assert metadata["label:bug"] is True and metadata["label:needs triage"] is True
+        assert metadata["created_ts"] == to_timestamp("2024-01-02")
+    
+    def test_filters_pushed_down_to_vector_query(self):
+        self.service.collection.query.return_value = _query_results("acme", "api", [(3, 0.1)])
+        filters = MetadataFilter(state="open", labels=("bug",))
+        
+        results = self.service.search_similar_text("acme", "api", "Crash", top_k=3, filters=filters)
+        
+        where = self.service.collection.query.call_args.kwargs["where"]
+        assert where == {"$and": [{"owner": "acme"}, {"repo": "api"}, {"state": "open"}, {"label:bug": True}]}
+        assert [r["number"] for r in results] == [3]
+    
+    def test_local_vector_search_widens_until_filters_match(self, tmp_path):
+        self.service.vectors = VectorStore(str(tmp_path), "float32")
+        metadatas = _query_results("acme", "api", [(n, 0.0) for n in range(1, 11)])["metadatas"][0]
+        metadatas[-1]["state"] = "closed"
+        vectors = [[1.0, n / 10] for n in range(10)]
+        self.service.vectors.add("acme", "api", [f"acme/api/issues/{n}" for n in range(1, 11)], vectors, metadatas)
+        self.service._embedding_function = Mock(return_value=[[1.0, 0.0]])
+        
+        results = self.service.search_similar_text("acme", "api", "Crash", top_k=1, filters=MetadataFilter(state="closed"))
+        
+        self.service.collection.query.assert_not_called()
+        assert [r["number"] for r in results] == [10]
+    
+    def test_migrate_metadata_updates_only_legacy_rows(self, tmp_path):
+        self.service.vectors = VectorStore(str(tmp_path), "float32")
+        legacy = _query_results("acme", "api", [(1, 0.0)])["metadatas"][0]
+        self.service.vectors.add("acme", "api", ["acme/api/issues/1"], [[1.0, 0.0]], legacy)
+        typed = upgrade_metadata(_query_results("acme", "api", [(2, 0.0)])["metadatas"][0][0])
+        self.service._iter_pages = Mock(return_value=iter([{
+            "ids": ["acme/api/issues/1", "acme/api/issues/2"],
+            "metadatas": [legacy[0], typed]
+        }]))
+        
+        assert self.service.migrate_metadata("acme", "api") == {"scanned": 2, "migrated": 1}
+        
+        update = self.service.collection.update.call_args.kwargs
+        assert update["ids"] == ["acme/api/issues/1"]
+        assert update["metadatas"][0]["number"] == 1
+        assert VectorStore(str(tmp_path), "float32").get("acme", "api").metadata("acme/api/issues/1")["number"] == 1
 
 
 if __name__ == "__main__":
@@ -42,6 +42,8 @@ class TestDataProcessing:
         """Test document creation from issue"""
         service = Mock(spec=SimilarityService)
         service._create_document_text = SimilarityService._create_document_text.__get__(service)
+        service._document_body = SimilarityService._document_body.__get__(service)
+        service.normalization = ()
         
         issue = Issue(
             number=1,
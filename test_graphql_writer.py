@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+import pytest
+from unittest.mock import Mock
+
+from graphql_writer import GraphQLBatchWriter, Mutation
+
+
+def graphql_response(payload):
+    response = Mock()
+    response.status_code = 200
+    response.headers = {}
+    response.json.return_value = payload
+    response.raise_for_status.return_value = None
+    return response
+
+
+class TestGraphQLBatchWriter:
+    def setup_method(self):
+        self.writer = GraphQLBatchWriter("test-token", max_mutations=2)
+        self.writer.client.session = Mock()
+        self.sent = []
+    
+    def respond_with(self, handler):
+        def request(method, url, json=None, **kwargs):
+            self.sent.append(json)
+            return graphql_response(handler(json["query"], json["variables"]))
+        self.writer.client.session.request.side_effect = request
+    
+    def test_chunks_by_count_and_cost(self):
+        writer = GraphQLBatchWriter("test-token", max_mutations=3, max_cost=10)
+        mutations = [Mutation(key=i, selection="x") for i in range(5)]
+        
+        chunks = list(writer._chunks(mutations))
+        
+        # Cost 5 each with a budget of 10 limits chunks to two mutations
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    
+    def test_chunks_by_payload_size(self):
+        writer = GraphQLBatchWriter("test-token", max_payload_bytes=100)
+        mutations = [Mutation(key=i, selection="x", variables={f"b{i}": ("String!", "y" * 60)}) for i in range(3)]
+        
+        assert [len(chunk) for chunk in writer._chunks(mutations)] == [1, 1, 1]
+    
+    def test_add_labels_batches_mutations_and_reports_per_issue(self):
+        def handler(query, variables):
+            if "issueOrPullRequest" in query:
+                return {"data": {"repository": {
+                    "i1": {"id": "I_1", "labels": {"nodes": []}},
+                    "i2": {"id": "I_2", "labels": {"nodes": [{"name": "Discussion"}]}},
+                    "i3": {"id": "I_3", "labels": {"nodes": []}},
+                    "i4": {"id": "I_4", "labels": {"nodes": []}},
+                    "i5": None,
+                }}}
+            if "labels(first: 100, after: $cursor)" in query:
+                return {"data": {"repository": {"labels": {
+                    "nodes": [{"id": "L_D", "name": "discussion"}],
+                    "pageInfo": {"hasNextPage": False, "endCursor": None}
+                }}}}
+            # Mutation request: every alias succeeds except issue 3's
+            data = {f"m{n}": {"clientMutationId": None} for n in (1, 4) if f"m{n}:" in query}
+            if "m3:" in query:
+                data["m3"] = None
+                return {"data": data, "errors": [{"path": ["m3"], "message": "Could not resolve"}]}
+            return {"data": data}
+        self.respond_with(handler)
+        
+        results = self.writer.add_labels("owner", "repo", {n: ["discussion"] for n in (1, 2, 3, 4, 5)})
+        
+        assert [r.status for r in results] == ["applied", "skipped", "failed", "applied", "failed"]
+        assert results[2].error == "Could not resolve"
+        assert "not found" in results[4].error
+        mutation_queries = [payload["query"] for payload in self.sent if payload["query"].startswith("mutation")]
+        # Three label writes with max_mutations=2 -> two requests
+        assert len(mutation_queries) == 2
+        assert 'labelIds: ["L_D"]' in mutation_queries[0]
+    
+    def test_add_labels_unknown_label(self):
+        self.respond_with(lambda query, variables: (
+            {"data": {"repository": {"i1": {"id": "I_1", "labels": {"nodes": []}}}}}
+            if "issueOrPullRequest" in query else
+            {"data": {"repository": {"labels": {"nodes": [], "pageInfo": {"hasNextPage": False, "endCursor": None}}}}}
+        ))
+        
+        results = self.writer.add_labels("owner", "repo", {1: ["missing"]})
+        
+        assert results[0].status == "failed"
+        assert "Unknown labels: missing" in results[0].error
+    
+    def test_add_comments_passes_bodies_as_variables(self):
+        def handler(query, variables):
+            if "issueOrPullRequest" in query:
+                return {"data": {"repository": {"i7": {"id": "I_7", "labels": {"nodes": []}}}}}
+            return {"data": {"m7": {"clientMutationId": None}}}
+        self.respond_with(handler)
+        
+        results = self.writer.add_comments("owner", "repo", {7: 'Looks like a "duplicate"'})
+        
+        assert results == [{"number": 7, "status": "posted"}]
+        mutation = self.sent[-1]
+        assert "$body7: String!" in mutation["query"]
+        assert mutation["variables"] == {"body7": 'Looks like a "duplicate"'}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import pytest
+import requests
+from unittest.mock import Mock, patch
+
+from label_engine import LabelApplier, LabelResult
+
+
+def make_response(status_code=200, json_data=None, headers=None, links=None, text=""):
+    response = Mock()
+    response.status_code = status_code
+    response.json.return_value = json_data if json_data is not None else {}
+    response.headers = headers or {}
+    response.links = links or {}
+    response.text = text
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(f"{status_code} Error", response=response)
+    else:
+        response.raise_for_status.return_value = None
+    return response
+
+
+class TestLabelApplier:
+    def setup_method(self):
+        self.applier = LabelApplier("test-token", max_workers=2)
+        self.applier.client.session = Mock()
+    
+    def test_requires_token(self):
+        with pytest.raises(ValueError):
+            LabelApplier(None)
+    
+    def test_fetch_repo_labels_follows_pagination(self):
+        self.applier.client.session.request.side_effect = [
+            make_response(json_data=[{"name": "Bug"}], links={"next": {"url": "https://api.github.com/next"}}),
+            make_response(json_data=[{"name": "discussion"}]),
+        ]
+        
+        labels = self.applier.fetch_repo_labels("owner", "repo")
+        
+        assert set(labels) == {"bug", "discussion"}
+        second_call = self.applier.client.session.request.call_args_list[1]
+        assert second_call.args == ("GET", "https://api.github.com/next")
+    
+    def test_ensure_labels_creates_only_missing(self):
+        self.applier.client.session.request.side_effect = [
+            make_response(json_data=[{"name": "Discussion"}]),
+            make_response(status_code=201, json_data={"name": "should-be-discussion"}),
+        ]
+        
+        self.applier.ensure_labels("owner", "repo", {"discussion": "0E7490", "should-be-discussion": "8B5CF6"})
+        
+        create_call = self.applier.client.session.request.call_args_list[1]
+        assert create_call.args[0] == "POST"
+        assert create_call.kwargs["json"] == {"name": "should-be-discussion", "color": "8B5CF6"}
+        assert self.applier.client.session.request.call_count == 2
+    
+    def test_apply_dedupes_and_reports_per_issue(self):
+        def respond(method, url, **kwargs):
+            if "/issues/3/" in url:
+                return make_response(status_code=404)
+            return make_response(json_data=[])
+        self.applier.client.session.request.side_effect = respond
+        
+        results = self.applier.apply(
+            "owner", "repo",
+            {1: ["discussion"], 2: ["discussion"], 3: ["discussion"]},
+            current_labels={2: ["Discussion", "bug"]}
+        )
+        
+        assert [r.status for r in results] == ["applied", "skipped", "failed"]
+        assert results[0] == LabelResult(1, "applied", ["discussion"])
+        assert "404" in results[2].error
+        # The already-labeled issue is never sent
+        urls = [call.args[1] for call in self.applier.client.session.request.call_args_list]
+        assert not any("/issues/2/" in url for url in urls)
+    
+    @patch('label_engine.time.sleep')
+    def test_retries_after_rate_limit(self, mock_sleep):
+        self.applier.client.session.request.side_effect = [
+            make_response(status_code=429, headers={"Retry-After": "3"}),
+            make_response(json_data=[]),
+        ]
+        
+        results = self.applier.apply("owner", "repo", {1: ["discussion"]})
+        
+        assert results[0].status == "applied"
+        mock_sleep.assert_called_once_with(3.0)
+    
+    @patch('label_engine.time.sleep')
+    def test_forbidden_without_rate_limit_is_not_retried(self, mock_sleep):
+        self.applier.client.session.request.return_value = make_response(status_code=403, text="Resource not accessible")
+        
+        results = self.applier.apply("owner", "repo", {1: ["discussion"]})
+        
+        assert results[0].status == "failed"
+        assert self.applier.client.session.request.call_count == 1
+        mock_sleep.assert_not_called()
+    
+    @patch('label_engine.time.sleep')
+    @patch('label_engine.time.time', return_value=1000.0)
+    def test_pauses_when_budget_nearly_spent(self, mock_time, mock_sleep):
+        self.applier.client.session.request.return_value = make_response(
+            json_data=[], headers={"X-RateLimit-Remaining": "5", "X-RateLimit-Reset": "1010"}
+        )
+        
+        self.applier.apply("owner", "repo", {1: ["a"], 2: ["b"]})
+        
+        mock_sleep.assert_called_with(10.0)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import pytest
+
+from metadata_schema import (
+    METADATA_SCHEMA_VERSION,
+    MetadataFilter,
+    read_flag,
+    cleared_labels,
+    read_labels,
+    read_number,
+    to_timestamp,
+    typed_fields,
+    upgrade_metadata,
+)
+
+LEGACY = {
+    "number": "12",
+    "title": "Crash on start",
+    "state": "closed",
+    "labels": "bug,UI",
+    "created_at": "2024-03-01T10:00:00Z",
+    "updated_at": "2024-03-05T10:00:00Z",
+    "is_pull_request": "False",
+    "is_discussion": "False",
+}
+
+
+class TestTypedFields:
+    def test_to_timestamp(self):
+        assert to_timestamp("1970-01-02") == 86400
+        assert to_timestamp("1970-01-01T01:00:00Z") == 3600
+        assert to_timestamp("1970-01-01T02:00:00+01:00") == 3600
+        assert to_timestamp("") is None
+        with pytest.raises(ValueError):
+            to_timestamp("last tuesday")
+
+    def test_readers_accept_legacy_and_typed_values(self):
+        typed = upgrade_metadata(LEGACY)
+
+        for metadata in (LEGACY, typed):
+            assert read_number(metadata) == 12
+            assert read_flag(metadata, "is_pull_request") is False
+            assert read_labels(metadata) == ["bug", "UI"]
+        assert read_flag({"is_discussion": "True"}, "is_discussion") is True
+        assert read_labels({"labels": ""}) == []
+
+    def test_upgrade_metadata(self):
+        upgraded = upgrade_metadata(LEGACY)
+
+        assert upgraded["number"] == 12
+        assert upgraded["is_pull_request"] is False
+        assert upgraded["label:bug"] is True and upgraded["label:ui"] is True
+        assert upgraded["created_ts"] == to_timestamp("2024-03-01T10:00:00Z")
+        assert upgraded["schema"] == METADATA_SCHEMA_VERSION
+        chunk = upgrade_metadata({**LEGACY, "type": "chunk", "chunk_count": "3", "chunk_index": "1"})
+        assert (chunk["chunk_count"], chunk["chunk_index"]) == (3, 1)
+        assert upgrade_metadata(upgraded) is upgraded
+        # The legacy record itself is left alone
+        assert LEGACY["number"] == "12"
+
+    def test_cleared_labels(self):
+        previous = {"state": "open", "label:bug": True, "label:ui": True, "updated_ts": 1}
+
+        assert cleared_labels(previous, {"state": "closed", "label:ui": True}) == {"label:bug": False}
+
+    def test_unparseable_dates_are_left_out(self):
+        fields = typed_fields(["Needs Triage"], "not a date", None)
+
+        assert fields["label:needs triage"] is True
+        assert "created_ts" not in fields and "updated_ts" not in fields
+
+
+class TestMetadataFilter:
+    def test_clauses(self):
+        filters = MetadataFilter(state="open", item_type="issue", labels=("Bug",), created_after="2024-01-01", created_before="2024-02-01")
+
+        assert filters.clauses() == [
+            {"state": "open"},
+            {"is_pull_request": False},
+            {"is_discussion": False},
+            {"label:bug": True},
+            {"created_ts": {"$gte": to_timestamp("2024-01-01")}},
+            {"created_ts": {"$lt": to_timestamp("2024-02-01")}},
+        ]
+        assert MetadataFilter(item_type="discussion").clauses() == [{"is_discussion": True}]
+
+    def test_empty_filter_is_falsy(self):
+        assert not MetadataFilter()
+        assert not MetadataFilter(labels=(" ",))
+        assert MetadataFilter(state="closed")
+
+    @pytest.mark.parametrize("filters,expected", [
+        (MetadataFilter(state="closed"), True),
+        (MetadataFilter(state="open"), False),
+        (MetadataFilter(item_type="issue"), True),
+        (MetadataFilter(item_type="pull_request"), False),
+        (MetadataFilter(labels=("ui", "bug")), True),
+        (MetadataFilter(labels=("bug", "docs")), False),
+        (MetadataFilter(created_after="2024-03-01"), True),
+        (MetadataFilter(created_before="2024-03-01"), False),
+        (MetadataFilter(updated_after="2024-03-06"), False),
+    ])
+    def test_matches_legacy_records(self, filters, expected):
+        assert filters.matches(LEGACY) is expected
+        assert filters.matches(upgrade_metadata(LEGACY)) is expected
+
+    def test_missing_timestamp_does_not_match_a_date_range(self):
+        assert not MetadataFilter(created_after="2024-01-01").matches({"number": 1})
+
+    @pytest.mark.parametrize("kwargs,message", [
+        ({"state": "merged"}, "Unknown state"),
+        ({"item_type": "commit"}, "Unknown type"),
+        ({"created_after": "yesterday"}, "Invalid date 'yesterday'"),
+    ])
+    def test_validation(self, kwargs, message):
+        with pytest.raises(ValueError, match=message):
+            MetadataFilter(**kwargs)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from org_indexer import RateBudget, RepoIndexResult, index_repositories, list_org_repos, read_repos_file
+
+
+def _response(status_code=200, json_data=None, next_url=None):
+    response = Mock()
+    response.status_code = status_code
+    response.json.return_value = json_data or []
+    response.links = {"next": {"url": next_url}} if next_url else {}
+    return response
+
+
+class TestListOrgRepos:
+    @patch('org_indexer.requests.get')
+    def test_follows_pagination_and_filters(self, mock_get):
+        mock_get.side_effect = [
+            _response(json_data=[
+                {"full_name": "acme/api"},
+                {"full_name": "acme/fork", "fork": True},
+                {"full_name": "acme/old", "archived": True},
+            ], next_url="https://api.github.com/orgs/acme/repos?page=2"),
+            _response(json_data=[
+                {"full_name": "acme/web"},
+                {"full_name": "acme/no-issues", "has_issues": False},
+            ]),
+        ]
+        
+        repos = list_org_repos("acme", "token")
+        
+        assert repos == ["acme/api", "acme/web"]
+        assert mock_get.call_args_list[1][0][0] == "https://api.github.com/orgs/acme/repos?page=2"
+    
+    @patch('org_indexer.requests.get')
+    def test_falls_back_to_user_repos(self, mock_get):
+        mock_get.side_effect = [
+            _response(status_code=404),
+            _response(json_data=[{"full_name": "someone/tool", "fork": True}]),
+        ]
+        
+        repos = list_org_repos("someone", include_forks=True)
+        
+        assert repos == ["someone/tool"]
+        assert mock_get.call_args_list[1][0][0] == "https://api.github.com/users/someone/repos"
+
+
+class TestReadReposFile:
+    def test_ignores_comments_and_duplicates(self, tmp_path):
+        path = tmp_path / "repos.txt"
+        path.write_text("# platform repos\nacme/api\n\nacme/web  # frontend\nacme/api\n")
+        
+        assert read_repos_file(str(path)) == ["acme/api", "acme/web"]
+    
+    def test_rejects_invalid_lines(self, tmp_path):
+        path = tmp_path / "repos.txt"
+        path.write_text("acme\n")
+        
+        with pytest.raises(ValueError):
+            read_repos_file(str(path))
+
+
+class TestIndexRepositories:
+    def test_results_keep_input_order_and_record_errors(self):
+        service = Mock()
+        
+        def index_repository(owner, repo, max_issues, include_discussions, issue_state):
+            if repo == "broken":
+                raise Exception("Not Found")
+            return {"indexed": 5, "issues": 4, "discussions": 1, "repository": f"{owner}/{repo}"}
+        
+        service.index_repository.side_effect = index_repository
+        completed = []
+        
+        results = index_repositories(
+            service,
+            ["acme/api", "acme/broken", "acme/web"],
+            max_issues=50,
+            issue_state="all",
+            concurrency=2,
+            on_complete=completed.append
+        )
+        
+        assert [result.repository for result in results] == ["acme/api", "acme/broken", "acme/web"]
+        assert results[0].indexed == 5 and results[0].discussions == 1
+        assert results[1].error == "Not Found"
+        assert results[2].error is None
+        assert len(completed) == 3
+        service.index_repository.assert_any_call("acme", "web", 50, False, issue_state="all")
+    
+    def test_concurrency_is_bounded(self):
+        service = Mock()
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+        
+        def index_repository(*args, **kwargs):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            threading.Event().wait(0.01)
+            with lock:
+                state["active"] -= 1
+            return {"indexed": 1}
+        
+        service.index_repository.side_effect = index_repository
+        
+        index_repositories(service, [f"acme/repo{i}" for i in range(8)], concurrency=3)
+        
+        assert state["peak"] <= 3
+    
+    def test_budget_acquired_per_repository(self):
+        service = Mock()
+        service.index_repository.return_value = {"indexed": 0}
+        budget = Mock()
+        
+        index_repositories(service, ["acme/api", "acme/web"], budget=budget)
+        
+        assert budget.acquire.call_count == 2
+    
+    def test_items_per_second(self):
+        assert RepoIndexResult("acme/api", indexed=10, seconds=2.0).items_per_second == 5.0
+        assert RepoIndexResult("acme/api").items_per_second == 0.0
+
+
+class TestRateBudget:
+    @patch('org_indexer.time.sleep')
+    @patch('org_indexer.time.time', return_value=1000.0)
+    @patch('org_indexer.requests.get')
+    def test_waits_for_reset_when_low(self, mock_get, mock_time, mock_sleep):
+        mock_get.return_value = _response(json_data={"resources": {
+            "core": {"remaining": 50, "reset": 1030},
+            "graphql": {"remaining": 4000, "reset": 1100},
+        }})
+        
+        waited = RateBudget("token", min_remaining=200).acquire()
+        
+        assert waited == 30.0
+        mock_sleep.assert_called_once_with(30.0)
+    
+    @patch('org_indexer.time.sleep')
+    @patch('org_indexer.requests.get')
+    def test_no_wait_with_budget_left(self, mock_get, mock_sleep):
+        mock_get.return_value = _response(json_data={"resources": {"core": {"remaining": 4000, "reset": 0}}})
+        
+        assert RateBudget("token").acquire() == 0.0
+        mock_sleep.assert_not_called()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import asyncio
+import pytest
+from unittest.mock import Mock
+
+from github_similarity_service import SimilarityService
+from query_coalescer import QueryCoalescer
+
+
+def make_results(query_texts):
+    """Fake Chroma response: every query matches issues #1 and #2"""
+    metadata = lambda n: {
+        "number": str(n),
+        "title": f"Issue {n}",
+        "state": "open",
+        "url": f"https://github.com/owner/repo/issues/{n}",
+        "type": "issue",
+        "is_pull_request": "False",
+        "is_discussion": "False",
+        "labels": ""
+    }
+    return {
+        "ids": [["owner/repo/issues/1", "owner/repo/issues/2"] for _ in query_texts],
+        "distances": [[0.1, 0.4] for _ in query_texts],
+        "metadatas": [[metadata(1), metadata(2)] for _ in query_texts]
+    }
+
+
+class TestQueryCoalescer:
+    def setup_method(self):
+        self.service = Mock()
+        self.service.search_repository_batch = SimilarityService.search_repository_batch.__get__(self.service)
+        self.service._parse_similar_results = SimilarityService._parse_similar_results.__get__(self.service)
+        self.service._merge_exact = SimilarityService._merge_exact
+        self.service._n_results = lambda n: n
+        self.service.chunk_pooling = "max"
+        self.service._has_lexical_index.return_value = False
+        self.service.find_signature_duplicates.return_value = []
+        self.service.query_similar_batch.side_effect = lambda owner, repo, texts, n, filters=None: make_results(texts)
+    
+    def test_concurrent_queries_share_one_batch(self):
+        coalescer = QueryCoalescer(self.service, max_wait=0.01, max_batch=32)
+        
+        async def run():
+            return await asyncio.gather(
+                coalescer.query("owner", "repo", "text a", top_k=5),
+                coalescer.query("owner", "repo", "text b", top_k=5, min_similarity=0.8),
+                coalescer.query("owner", "repo", "text a", top_k=5, exclude_number=1)
+            )
+        
+        first, second, third = asyncio.run(run())
+        
+        self.service.query_similar_batch.assert_called_once_with("owner", "repo", ["text a", "text b"], 6, None)
+        assert [r["number"] for r in first] == [1, 2]
+        assert [r["number"] for r in second] == [1]
+        assert [r["number"] for r in third] == [2]
+    
+    def test_batches_split_by_repository_and_size(self):
+        coalescer = QueryCoalescer(self.service, max_wait=0.01, max_batch=2)
+        
+        async def run():
+            return await asyncio.gather(
+                coalescer.query("owner", "repo", "a"),
+                coalescer.query("owner", "other", "b"),
+                coalescer.query("owner", "repo", "c")
+            )
+        
+        asyncio.run(run())
+        
+        assert self.service.query_similar_batch.call_count == 3
+        assert coalescer.queries_received == 3
+    
+    def test_errors_propagate_to_every_waiter(self):
+        self.service.query_similar_batch.side_effect = RuntimeError("chroma down")
+        coalescer = QueryCoalescer(self.service, max_wait=0.001)
+        
+        async def run():
+            return await asyncio.gather(
+                coalescer.query("owner", "repo", "a"),
+                coalescer.query("owner", "repo", "b"),
+                return_exceptions=True
+            )
+        
+        results = asyncio.run(run())
+        
+        assert all(isinstance(r, RuntimeError) for r in results)
+    
+    def test_signature_matches_and_hybrid_search_apply(self):
+        signature_hit = {"number": 9, "url": "https://github.com/owner/repo/issues/9", "similarity": 1.0, "match": "signature"}
+        self.service.find_signature_duplicates.side_effect = lambda owner, repo, text, limit, exclude_id, filters=None: [signature_hit] if text == "trace" else []
+        self.service._has_lexical_index.return_value = True
+        self.service._hybrid_search.return_value = []
+        coalescer = QueryCoalescer(self.service, max_wait=0.01)
+        
+        async def run():
+            return await asyncio.gather(
+                # Signatures and keywords are matched on the raw text
+                coalescer.query("owner", "repo", "truncated trace", top_k=1, raw_text="trace"),
+                coalescer.query("owner", "repo", "text a", top_k=5, exclude_number=3, raw_text="raw text a")
+            )
+        
+        first, second = asyncio.run(run())
+        
+        assert first == [signature_hit]
+        assert second == []
+        # Keyword rankings are per query, so the remaining query is fused on its own
+        self.service._hybrid_search.assert_called_once_with(
+            "owner", "repo", "text a", 5, 0.0, exclude_id="owner/repo/issues/3", filters=None, lexical_text="raw text a"
+        )
+        self.service.query_similar_batch.assert_not_called()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
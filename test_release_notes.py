@@ -2,6 +2,7 @@
 """Test script for release notes generation."""
 
 import os
+import tempfile
 from datetime import datetime, timedelta, timezone
 from unittest.mock import MagicMock, patch
 from release_notes import ReleaseNotesGenerator
@@ -70,7 +71,7 @@ def test_release_notes():
         MockGithub.return_value = mock_github
         
         # Test with mocked token
-        with patch.dict(os.environ, {'GITHUB_TOKEN': 'test-token'}):
+        with patch.dict(os.environ, {'GITHUB_TOKEN': 'test-token'}), tempfile.TemporaryDirectory() as output_dir:
             generator = ReleaseNotesGenerator()
             
             # Generate release notes for the last 7 days
@@ -80,7 +81,7 @@ def test_release_notes():
                 repo_name="test/repo",
                 since_date=since_date,
                 version="v0.1.0-test",
-                output_file="test-release-notes.md"
+                output_file=os.path.join(output_dir, "test-release-notes.md")
             )
             
             # Debug: Print the release notes to see what's happening
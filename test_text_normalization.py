@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import pytest
+
+from text_normalization import (
+    DEFAULT_STEPS,
+    collapse_code_fences,
+    content_hash,
+    dedupe_log_lines,
+    normalize_text,
+    parse_steps,
+    strip_template,
+)
+
+
+class TestSteps:
+    def test_template_sections_and_checklists_removed(self):
+        body = "### Describe the bug\n\nCrash on start\n\n### Additional context\n\n_No response_\n\n- [x] I searched existing issues\n## Crash on ARM\n\ndetails"
+
+        assert strip_template(body) == "\nCrash on start\n\n## Crash on ARM\n\ndetails"
+
+    def test_long_fences_keep_head_and_tail(self):
+        lines = [f"frame {i}" for i in range(40)]
+        text = "before\n```\n" + "\n".join(lines) + "\n```\nafter"
+
+        collapsed = collapse_code_fences(text, max_lines=30, head=2, tail=3).split("\n")
+
+        assert collapsed == ["before", "```", "frame 0", "frame 1", "... 35 lines omitted ...", "frame 37", "frame 38", "frame 39", "```", "after"]
+
+    def test_short_and_unclosed_fences_untouched(self):
+        text = "```\none\ntwo\n```\n```\n" + "\n".join(["x"] * 50)
+        assert collapse_code_fences(text) == text
+
+    def test_log_lines_differing_in_numbers_collapse(self):
+        text = "\n".join(f"10:00:{i:02d} retry connection 0x{i:x}" for i in range(5)) + "\nconnected"
+
+        assert dedupe_log_lines(text) == "10:00:00 retry connection 0x0\n... repeated 4 more times\nconnected"
+
+    def test_pipeline(self):
+        body = "<!-- Please describe -->\n### Describe the bug\r\nBroken ![shot](http://x/y.png) <img src='a.png'>\r\n\r\n\r\n\r\nSee log"
+
+        assert normalize_text(body) == "Broken\n\nSee log"
+        assert normalize_text(body, ()) == body.replace("\r\n", "\n")
+        assert normalize_text(None) == ""
+
+
+class TestConfiguration:
+    def test_parse_steps(self):
+        assert parse_steps(None) == DEFAULT_STEPS
+        assert parse_steps("none") == ()
+        # Pipeline order regardless of the order given
+        assert parse_steps("whitespace, images") == ("images", "whitespace")
+
+    def test_unknown_step_rejected(self):
+        with pytest.raises(ValueError, match="emoji"):
+            parse_steps("images,emoji")
+
+    def test_content_hash_is_stable(self):
+        assert content_hash("Title: a") == content_hash("Title: a")
+        assert content_hash("Title: a") != content_hash("Title: b")
+        assert len(content_hash("x")) == 16
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
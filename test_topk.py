@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+import pytest
+
+from topk import TopK
+
+
+class TestTopK:
+    def test_keeps_highest_k(self):
+        top = TopK(3).extend([5, 1, 9, 3, 7, 2])
+        
+        assert top.items() == [9, 7, 5]
+        assert top.seen == 6
+        assert top.threshold() == 5
+    
+    def test_ties_keep_insertion_order(self):
+        rows = [("a", 1), ("b", 2), ("c", 1), ("d", 2), ("e", 2)]
+        top = TopK(3, key=lambda row: row[1]).extend(rows)
+        
+        assert top.items() == sorted(rows, key=lambda row: row[1], reverse=True)[:3]
+    
+    def test_unbounded_keeps_everything_sorted(self):
+        top = TopK(None).extend([2, 3, 1])
+        
+        assert top.items() == [3, 2, 1]
+        assert top.threshold() is None
+    
+    def test_zero_k(self):
+        top = TopK(0)
+        
+        assert top.push(1) is False
+        assert top.items() == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
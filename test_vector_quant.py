@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+import threading
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from vector_quant import (
+    MIN_MERGE_ROWS,
+    QuantizedVectorIndex,
+    VectorStore,
+    hamming_distances,
+    normalize_rows,
+    quantize_binary,
+    quantize_int8,
+)
+
+
+def _clustered_vectors(n=3000, dim=64, clusters=60, seed=7):
+    """Embedding-like data: points scattered around cluster centres"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    points = centres[rng.integers(0, clusters, n)] + 0.6 * rng.normal(size=(n, dim))
+    return normalize_rows(points), rng
+
+
+def _recall_at_k(index, vectors, queries, k=10):
+    exact = np.argsort(-(vectors @ queries.T), axis=0)[:k].T
+    found = 0
+    for query, expected in zip(queries, exact):
+        ids = {doc_id for doc_id, _ in index.search(query, k)}
+        found += len(ids & {f"doc{i}" for i in expected})
+    return found / (len(queries) * k)
+
+
+class TestQuantization:
+    def test_int8_round_trip(self):
+        vectors = normalize_rows(np.random.default_rng(1).normal(size=(20, 32)))
+        codes, scales = quantize_int8(vectors)
+
+        assert codes.dtype == np.int8
+        assert np.abs(codes.astype(np.float32) * scales[:, None] - vectors).max() < 0.01
+
+    def test_binary_hamming(self):
+        vectors = np.array([[1.0, -1.0, 1.0, -1.0], [1.0, 1.0, 1.0, 1.0], [-1.0, 1.0, -1.0, 1.0]])
+        codes = quantize_binary(vectors)
+
+        assert codes.shape == (3, 1)
+        assert list(hamming_distances(codes[0], codes)) == [0, 2, 4]
+
+
+class TestQuantizedVectorIndex:
+    @pytest.mark.parametrize("mode,min_recall,ratio", [("float32", 1.0, 1), ("int8", 0.97, 4), ("binary", 0.9, 32)])
+    def test_recall_and_memory(self, mode, min_recall, ratio):
+        vectors, rng = _clustered_vectors()
+        index = QuantizedVectorIndex(mode)
+        index.add([f"doc{i}" for i in range(len(vectors))], vectors)
+        queries = normalize_rows(vectors[:50] + 0.3 / np.sqrt(vectors.shape[1]) * rng.normal(size=vectors[:50].shape))
+
+        assert _recall_at_k(index, vectors, queries) >= min_recall
+        # Resident codes once the float32 vectors are only needed for rescoring
+        codes = sum(array.nbytes for array in (index.codes, index.scales) if array is not None) if mode != "float32" else vectors.nbytes
+        assert codes <= vectors.nbytes / ratio + 4 * len(vectors)
+
+    def test_binary_codes_recentered_as_index_grows(self):
+        index = QuantizedVectorIndex("binary")
+        index.add(["a", "b"], [[1.0, 0.2], [1.0, -0.2]])
+        index.add(["c"], [[0.9, 0.1]])
+
+        assert index.centered_rows == 2
+        index.add(["d"], [[0.8, 0.3]])
+
+        assert index.centered_rows == 4
+        assert index.center == pytest.approx(normalize_rows([[1.0, 0.2], [1.0, -0.2], [0.9, 0.1], [0.8, 0.3]]).mean(axis=0))
+        # Centered signs separate vectors that all point the same way
+        assert len({code.tobytes() for code in index.codes}) > 1
+
+    def test_similarities_are_exact_cosines(self):
+        index = QuantizedVectorIndex("binary")
+        index.add(["a", "b", "c"], [[1.0, 0.0], [0.6, 0.8], [0.0, -1.0]])
+
+        assert index.search([1.0, 0.0], k=2) == [("a", 1.0), ("b", pytest.approx(0.6))]
+        assert [doc_id for doc_id, _ in index.search([1.0, 0.0], k=2, exclude=["a"])] == ["b", "c"]
+
+    def test_replace_and_remove_with_children(self):
+        index = QuantizedVectorIndex("int8")
+        index.add(["o/r/issues/1", "o/r/issues/1#chunk0", "o/r/issues/2"], [[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]], [{"n": 1}, {"n": 1}, {"n": 2}])
+        index.add(["o/r/issues/2"], [[1.0, 0.0]], [{"n": 2, "edited": True}])
+
+        assert len(index) == 3
+        assert index.metadata("o/r/issues/2") == {"n": 2, "edited": True}
+        assert index.remove_many(["o/r/issues/1"]) == 2
+        assert list(index.positions) == ["o/r/issues/2"]
+        assert index.search([1.0, 0.0], k=5) == [("o/r/issues/2", pytest.approx(1.0))]
+
+    def test_pending_rows_and_tombstones_merge_once_large(self):
+        vectors, _ = _clustered_vectors(n=MIN_MERGE_ROWS + 2, dim=8)
+        index = QuantizedVectorIndex("int8")
+        index.add(["doc0"], vectors[:1])
+        index.add(["doc1"], vectors[1:2])
+        index.remove("doc0")
+
+        assert (index.main_rows, len(index.pending_vectors), len(index)) == (1, 1, 1)
+        assert index.search(vectors[0], k=2) == [("doc1", pytest.approx(float(vectors[0] @ vectors[1])))]
+
+        index.add([f"doc{i}" for i in range(2, len(vectors))], vectors[2:])
+
+        assert index.pending_vectors is None and index.main_rows == len(index) == MIN_MERGE_ROWS + 1
+        assert "doc0" not in index.ids
+        assert index.search(vectors[5], k=1)[0][0] == "doc5"
+
+    def test_dimension_mismatch_rejected(self):
+        index = QuantizedVectorIndex("int8")
+        index.add(["a"], [[1.0, 0.0]])
+        with pytest.raises(ValueError):
+            index.add(["b"], [[1.0, 0.0, 0.0]])
+
+    def test_unknown_mode_rejected(self):
+        with pytest.raises(ValueError):
+            QuantizedVectorIndex("int4")
+
+
+class TestVectorStore:
+    def test_save_and_load_memory_maps_vectors(self, tmp_path):
+        store = VectorStore(str(tmp_path), "int8")
+        store.add("Acme", "API", ["a", "b"], [[1.0, 0.0], [0.0, 1.0]], [{"n": "1"}, {"n": "2"}])
+        store.save("Acme", "API")
+
+        loaded = VectorStore(str(tmp_path), "int8").get("acme", "api")
+
+        assert isinstance(loaded.vectors, np.memmap)
+        assert loaded.codes.dtype == np.int8
+        assert loaded.metadata("b") == {"n": "2"}
+        assert loaded.search([0.0, 1.0], k=1)[0][0] == "b"
+        assert loaded.resident_bytes == loaded.codes.nbytes + loaded.scales.nbytes
+
+    def test_other_mode_is_requantized_on_load(self, tmp_path):
+        store = VectorStore(str(tmp_path), "float32")
+        store.add("acme", "api", ["a", "b"], [[1.0, 0.0], [0.0, 1.0]], [{}, {}])
+        store.save("acme", "api")
+
+        loaded = VectorStore(str(tmp_path), "binary").get("acme", "api")
+
+        assert loaded.mode == "binary"
+        assert loaded.center == pytest.approx([0.5, 0.5])
+        assert loaded.codes.dtype == np.uint8
+        assert loaded.dirty
+        assert loaded.search([1.0, 0.0], k=1)[0][0] == "a"
+
+    def test_binary_center_persisted(self, tmp_path):
+        store = VectorStore(str(tmp_path), "binary")
+        store.add("acme", "api", ["a", "b"], [[1.0, 0.2], [1.0, -0.2]], [{}, {}])
+        store.save("acme", "api")
+
+        loaded = VectorStore(str(tmp_path), "binary").get("acme", "api")
+
+        assert not loaded.dirty
+        assert loaded.centered_rows == 2
+        assert loaded.center == pytest.approx(store.get("acme", "api").center)
+        assert loaded.search([1.0, -0.3], k=1)[0][0] == "b"
+
+    def test_updates_leave_the_memory_mapped_vectors_alone(self, tmp_path):
+        store = VectorStore(str(tmp_path), "int8")
+        store.add("acme", "api", ["a", "b"], [[1.0, 0.0], [0.0, 1.0]], [{"n": 1}, {"n": 2}])
+        store.save("acme", "api")
+        index = store.get("acme", "api")
+        main = index.vectors
+
+        store.add("acme", "api", ["c"], [[0.6, 0.8]], [{"n": 3}])
+        store.remove("acme", "api", ["a"])
+        with patch.object(store, "_write_array", wraps=store._write_array) as write:
+            store.save("acme", "api")
+
+        assert index.vectors is main and isinstance(main, np.memmap)
+        assert {call.args[0].rsplit(".", 2)[-2] for call in write.call_args_list} == {"pending_vectors", "pending_codes", "pending_scales"}
+        loaded = VectorStore(str(tmp_path), "int8")
+        assert loaded.contents("acme", "api")[0] == ["b", "c"]
+        assert loaded.search("acme", "api", [1.0, 0.0], k=2) == [("c", pytest.approx(0.6), {"n": 3}), ("b", pytest.approx(0.0, abs=1e-6), {"n": 2})]
+
+    def test_search_is_safe_during_concurrent_adds(self, tmp_path):
+        vectors, _ = _clustered_vectors(n=3001, dim=16)
+        store = VectorStore(str(tmp_path), "binary")
+        store.add("acme", "api", ["doc0"], vectors[:1], [{"n": 0}])
+        errors = []
+        
+        def write():
+            for start in range(1, 3000, 10):
+                store.add("acme", "api", [f"doc{i}" for i in range(start, start + 10)], vectors[start:start + 10], [{"n": i} for i in range(start, start + 10)])
+        
+        writer = threading.Thread(target=write)
+        writer.start()
+        while writer.is_alive():
+            try:
+                hits = store.search("acme", "api", vectors[0], k=5)
+            except (ValueError, IndexError) as e:
+                errors.append(e)
+                break
+            assert all(metadata is not None for _, _, metadata in hits)
+        writer.join()
+        
+        assert errors == []
+        assert store.search("acme", "api", vectors[3000], k=1)[0][0] == "doc3000"
+    
+    def test_rebuild_replaces_index(self, tmp_path):
+        store = VectorStore(str(tmp_path), "int8")
+        store.add("acme", "api", ["old"], [[1.0, 0.0]], [{}])
+        
+        stats = store.rebuild("acme", "api", ["a", "b"], [[1.0, 0.0], [0.0, 1.0]], [{"n": 1}, {"n": 2}])
+        
+        assert stats == {"vectors": 2, "dimension": 2, "quantization": "int8", "resident_bytes": 12, "float32_bytes": 16}
+        loaded = VectorStore(str(tmp_path), "int8")
+        assert loaded.contents("acme", "api")[0] == ["a", "b"]
+        assert loaded.search("acme", "api", [0.0, 1.0], k=1) == [("b", pytest.approx(1.0), {"n": 2})]
+    
+    def test_clear(self, tmp_path):
+        store = VectorStore(str(tmp_path), "int8")
+        store.add("acme", "api", ["a"], [[1.0, 0.0]], [{}])
+        store.save("acme", "api")
+
+        store.clear()
+
+        assert len(VectorStore(str(tmp_path), "int8").get("acme", "api")) == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
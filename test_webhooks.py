@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import hmac
+import hashlib
+import importlib
+import json
+import os
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, patch
+
+from github_similarity_service import SimilarityService
+from webhooks import IndexUpdateBatcher, handle_webhook_event, verify_signature
+
+
+def make_issue_payload(action, number=1, title="Crash on save", labels=None):
+    return {
+        "action": action,
+        "repository": {"name": "repo", "owner": {"login": "owner"}},
+        "issue": {
+            "number": number,
+            "title": title,
+            "body": "Steps to reproduce",
+            "state": "open",
+            "created_at": "2024-01-01T00:00:00Z",
+            "updated_at": "2024-01-02T00:00:00Z",
+            "html_url": f"https://github.com/owner/repo/issues/{number}",
+            "labels": [{"name": label} for label in (labels or [])]
+        }
+    }
+
+
+class TestSignatureVerification:
+    def test_valid_signature(self):
+        body = b'{"action": "opened"}'
+        signature = "sha256=" + hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+        
+        assert verify_signature("secret", body, signature)
+    
+    def test_invalid_signature(self):
+        body = b'{"action": "opened"}'
+        signature = "sha256=" + hmac.new(b"other", body, hashlib.sha256).hexdigest()
+        
+        assert not verify_signature("secret", body, signature)
+        assert not verify_signature("secret", body, None)
+        assert not verify_signature("", body, signature)
+
+
+class TestIndexUpdateBatcher:
+    def setup_method(self):
+        self.service = Mock()
+        self.service._doc_id = SimilarityService._doc_id.__get__(self.service)
+        self.service._issue_from_api = SimilarityService._issue_from_api.__get__(self.service)
+        self.service.upsert_items.side_effect = lambda owner, repo, items: len(items)
+        self.service.delete_items.side_effect = lambda ids: len(ids)
+        self.batcher = IndexUpdateBatcher(self.service, max_delay=60)
+    
+    def teardown_method(self):
+        self.batcher.flush()
+    
+    def test_burst_of_edits_coalesces_into_one_upsert(self):
+        handle_webhook_event(self.batcher, "issues", make_issue_payload("opened"))
+        handle_webhook_event(self.batcher, "issues", make_issue_payload("edited", title="Crash on save (v2)"))
+        handle_webhook_event(self.batcher, "issues", make_issue_payload("labeled", title="Crash on save (v2)", labels=["bug"]))
+        
+        assert self.batcher.pending_count() == 1
+        result = self.batcher.flush()
+        
+        assert result == {"upserted": 1, "deleted": 0}
+        self.service.upsert_items.assert_called_once()
+        items = self.service.upsert_items.call_args.args[2]
+        assert items[0].title == "Crash on save (v2)"
+        assert items[0].labels == ["bug"]
+    
+    def test_delete_supersedes_pending_upsert(self):
+        handle_webhook_event(self.batcher, "issues", make_issue_payload("edited"))
+        response = handle_webhook_event(self.batcher, "issues", make_issue_payload("deleted"))
+        
+        assert response["operation"] == "delete"
+        result = self.batcher.flush()
+        
+        assert result == {"upserted": 0, "deleted": 1}
+        self.service.delete_items.assert_called_once_with(["owner/repo/issues/1"])
+    
+    def test_max_batch_triggers_flush(self):
+        self.batcher.max_batch = 2
+        handle_webhook_event(self.batcher, "issues", make_issue_payload("opened", number=1))
+        handle_webhook_event(self.batcher, "issues", make_issue_payload("opened", number=2))
+        
+        assert self.batcher.pending_count() == 0
+        self.service.upsert_items.assert_called_once()
+    
+    def test_unsupported_event_ignored(self):
+        response = handle_webhook_event(self.batcher, "push", {"action": "opened"})
+        
+        assert response["status"] == "ignored"
+        assert self.batcher.pending_count() == 0
+
+
+class TestWebhookEndpoint:
+    @patch.dict(os.environ, {'CHROMA_API_KEY': 'test-key', 'CHROMA_TENANT': 'test-tenant', 'GITHUB_TOKEN': 'test-token'})
+    @patch('github_similarity_service.chromadb.CloudClient')
+    def setup_method(self, method, mock_chroma_client):
+        import api
+        self.api = importlib.reload(api)
+        service = Mock()
+        service._doc_id = SimilarityService._doc_id.__get__(service)
+        service._issue_from_api = SimilarityService._issue_from_api.__get__(service)
+        self.api.webhook_batcher = IndexUpdateBatcher(service, max_delay=60)
+        self.client = TestClient(self.api.app)
+    
+    def _post(self, body, event="issues", secret="secret"):
+        signature = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        with patch.dict(os.environ, {'GITHUB_WEBHOOK_SECRET': 'secret'}):
+            return self.client.post("/webhook", content=body, headers={
+                "X-GitHub-Event": event, "X-Hub-Signature-256": signature, "Content-Type": "application/json"
+            })
+    
+    def test_event_is_queued(self):
+        response = self._post(json.dumps(make_issue_payload("opened")).encode())
+        
+        assert response.status_code == 202
+        assert response.json()["operation"] == "upsert"
+        assert self.api.webhook_batcher.pending_count() == 1
+    
+    def test_bad_signature_rejected(self):
+        response = self._post(json.dumps(make_issue_payload("opened")).encode(), secret="other")
+        
+        assert response.status_code == 401
+        assert self.api.webhook_batcher.pending_count() == 0
+    
+    def test_malformed_payload_rejected(self):
+        assert self._post(b"not json").status_code == 400
+        assert self._post(json.dumps({"action": "opened", "issue": {}}).encode()).status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
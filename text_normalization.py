@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Text Normalization
+Cleans issue bodies before they are embedded. Issue templates, checklists,
+HTML comments, images and long pasted logs use up the document size budget
+and embedding tokens, and make unrelated issues look alike:
+- html_comments: drops <!-- ... --> template instructions
+- images: drops markdown and HTML images (badges, screenshots)
+- template: drops template headings, empty or "No response" sections and
+  task-list checkboxes
+- log_lines: collapses runs of lines that differ only in numbers, such as
+  timestamps, counters and addresses
+- code_fences: keeps the head and tail of long fenced blocks
+- whitespace: trims lines and collapses blank runs
+
+Steps run in a fixed order; `parse_steps` reads a comma-separated
+selection (e.g. from DEJA_VIEW_NORMALIZE).
+"""
+
+import hashlib
+import re
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+HTML_COMMENT_RE = re.compile(r"<!--.*?(?:-->|$)", re.DOTALL)
+MARKDOWN_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+HTML_IMAGE_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+TASK_ITEM_RE = re.compile(r"^\s*[-*+]\s+\[[ xX]\]\s")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+LOG_VALUE_RE = re.compile(r"0x[0-9a-fA-F]+|\d+")
+
+# Section headings of common issue templates and GitHub issue forms
+TEMPLATE_HEADINGS = {
+    "additional context", "additional information", "actual behavior", "actual behaviour",
+    "bug description", "checklist", "current behavior", "current behaviour", "describe the bug",
+    "description", "environment", "expected behavior", "expected behaviour", "how to reproduce",
+    "is your feature request related to a problem", "logs", "operating system", "os",
+    "relevant log output", "reproduction", "screenshots", "steps to reproduce",
+    "steps to reproduce the behavior", "system info", "to reproduce", "version", "versions",
+    "what happened", "what did you expect to happen", "describe the solution you'd like",
+    "describe alternatives you've considered", "proposed solution", "motivation",
+}
+
+# Bodies GitHub issue forms write for fields left empty
+PLACEHOLDER_SECTIONS = {"", "_no response_", "no response", "n/a", "na", "none", "-"}
+
+MAX_FENCE_LINES = 30
+FENCE_HEAD_LINES = 10
+FENCE_TAIL_LINES = 10
+
+
+def strip_html_comments(text: str) -> str:
+    return HTML_COMMENT_RE.sub("", text)
+
+
+def drop_images(text: str) -> str:
+    return HTML_IMAGE_RE.sub("", MARKDOWN_IMAGE_RE.sub("", text))
+
+
+def _heading_key(heading: str) -> str:
+    return re.sub(r"[^a-z0-9' ]+", "", heading.lower()).strip().rstrip("?")
+
+
+def strip_template(text: str) -> str:
+    """Drop template headings, sections left empty and task-list checkboxes"""
+    sections = []  # [heading line or None, body lines]
+    current = [None, []]
+    for line in text.split("\n"):
+        if TASK_ITEM_RE.match(line):
+            continue
+        if HEADING_RE.match(line):
+            sections.append(current)
+            current = [line, []]
+        else:
+            current[1].append(line)
+    sections.append(current)
+
+    kept = []
+    for heading, lines in sections:
+        if heading is not None and "\n".join(lines).strip().lower() in PLACEHOLDER_SECTIONS:
+            continue
+        if heading is not None and _heading_key(HEADING_RE.match(heading).group(1)) not in TEMPLATE_HEADINGS:
+            kept.append(heading)
+        kept.extend(lines)
+    return "\n".join(kept)
+
+
+def collapse_code_fences(text: str, max_lines: int = MAX_FENCE_LINES, head: int = FENCE_HEAD_LINES, tail: int = FENCE_TAIL_LINES) -> str:
+    """Keep the first `head` and last `tail` lines of fenced blocks longer than `max_lines`"""
+    output = []
+    block = None  # lines inside the open fence
+    for line in text.split("\n"):
+        if block is None:
+            output.append(line)
+            if FENCE_RE.match(line):
+                block = []
+            continue
+        if FENCE_RE.match(line):
+            if len(block) > max_lines:
+                block = block[:head] + [f"... {len(block) - head - tail} lines omitted ..."] + block[-tail:]
+            output.extend(block)
+            output.append(line)
+            block = None
+        else:
+            block.append(line)
+    if block is not None:
+        # Unclosed fence: keep the text as written
+        output.extend(block)
+    return "\n".join(output)
+
+
+def dedupe_log_lines(text: str) -> str:
+    """Collapse runs of consecutive lines that only differ in numbers"""
+    output = []
+    previous_key = None
+    repeats = 0
+
+    def flush():
+        if repeats:
+            output.append(f"... repeated {repeats} more times")
+
+    for line in text.split("\n"):
+        key = LOG_VALUE_RE.sub("0", line.strip())
+        if key and key == previous_key:
+            repeats += 1
+            continue
+        flush()
+        repeats = 0
+        previous_key = key
+        output.append(line)
+    flush()
+    return "\n".join(output)
+
+
+def collapse_whitespace(text: str) -> str:
+    lines = [line.rstrip() for line in text.strip().split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+NORMALIZERS: Dict[str, Callable[[str], str]] = {
+    "html_comments": strip_html_comments,
+    "images": drop_images,
+    "template": strip_template,
+    "log_lines": dedupe_log_lines,
+    "code_fences": collapse_code_fences,
+    "whitespace": collapse_whitespace,
+}
+DEFAULT_STEPS: Tuple[str, ...] = tuple(NORMALIZERS)
+
+
+def parse_steps(value: Optional[str]) -> Tuple[str, ...]:
+    """Steps from a comma-separated list; unset or "default" is every step, "none" disables"""
+    if value is None or value.strip().lower() in ("", "default", "all"):
+        return DEFAULT_STEPS
+    if value.strip().lower() in ("none", "off", "0"):
+        return ()
+    steps = [step.strip().lower() for step in value.split(",") if step.strip()]
+    unknown = [step for step in steps if step not in NORMALIZERS]
+    if unknown:
+        raise ValueError(f"Unknown normalization step(s) {', '.join(unknown)} (expected: {', '.join(NORMALIZERS)})")
+    # Always applied in pipeline order
+    return tuple(step for step in NORMALIZERS if step in steps)
+
+
+def normalize_text(text: Optional[str], steps: Sequence[str] = DEFAULT_STEPS) -> str:
+    """Run the selected normalization steps over a body"""
+    text = (text or "").replace("\r\n", "\n")
+    for step in steps:
+        text = NORMALIZERS[step](text)
+    return text
+
+
+def content_hash(text: str) -> str:
+    """Short stable hash of document text, stored to detect unchanged items"""
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Bounded Top-K Selection
+Keeps the k best items of a stream in a min-heap, so ranking N items costs
+O(N log k) time and O(k) memory instead of sorting a full result list.
+"""
+
+import heapq
+import itertools
+from typing import Any, Callable, Generic, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class TopK(Generic[T]):
+    """Highest-keyed `k` items pushed so far (k=None keeps everything).
+
+    Ties keep insertion order, matching a stable `sort(reverse=True)` over
+    the same stream.
+    """
+
+    def __init__(self, k: Optional[int], key: Callable[[T], Any] = lambda item: item):
+        self.k = k
+        self.key = key
+        self._heap: List = []
+        self._counter = itertools.count()
+        self.seen = 0
+
+    def push(self, item: T) -> bool:
+        """Offer an item; returns whether it is (for now) in the top k"""
+        self.seen += 1
+        if self.k is not None and self.k <= 0:
+            return False
+
+        # Later items lose ties, so they are evicted first
+        entry = (self.key(item), -next(self._counter), item)
+        if self.k is None or len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def extend(self, items: Iterable[T]) -> "TopK[T]":
+        for item in items:
+            self.push(item)
+        return self
+
+    def threshold(self) -> Optional[Any]:
+        """Key an item must beat to enter a full heap (None while not full)"""
+        if self.k is None or len(self._heap) < self.k:
+            return None
+        return self._heap[0][0]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def items(self) -> List[T]:
+        """Kept items, best first"""
+        return [entry[2] for entry in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
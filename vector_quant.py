@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Quantized Local Vectors
+A per-repository copy of the item embeddings that similarity queries can be
+answered from without a vector-store round trip. Embeddings are held in one
+of three forms:
+- float32: the full vectors (4 bytes per dimension)
+- int8: scalar quantization with one scale per vector (1 byte per dimension)
+- binary: sign bits compared by Hamming distance (1 bit per dimension)
+
+The quantized codes are scanned in memory to pick candidates, and the top
+candidates are rescored exactly against the float32 vectors, which stay on
+disk and are read through a memory map. Resident memory drops 4x (int8) or
+32x (binary) while top-k results stay close to an exact search.
+
+Incremental updates leave the memory-mapped rows alone: added vectors go to
+a small in-memory pending segment and removed rows are tombstoned. Both are
+folded into the main segment once they make up a share of the index.
+"""
+
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from local_index import LocalIndexStore
+
+VECTOR_FORMAT_VERSION = 1
+QUANTIZATION_MODES = ("float32", "int8", "binary")
+
+# Candidates rescored with float32 vectors per requested result; coarser
+# codes need a wider candidate set to keep recall
+RESCORE_FACTORS = {"float32": 1, "int8": 4, "binary": 10}
+
+# Rows scanned per step; small enough that the temporary float32 copy of
+# a block of codes stays in CPU cache
+SCAN_BLOCK_ROWS = 1024
+
+# Merge pending rows into the main segment past this share of the index,
+# and tombstoned rows once they outnumber the live ones
+MERGE_FRACTION = 0.05
+MIN_MERGE_ROWS = 1024
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """float32 rows scaled to unit length (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 codes and the per-row scale that maps them back (code * scale)"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits of each row, packed 8 per byte"""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _popcount64(words: np.ndarray) -> np.ndarray:
+    """Set bits in each uint64 (SWAR bit counting; numpy < 2 has no popcount)"""
+    words = words - ((words >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    words = (words & np.uint64(0x3333333333333333)) + ((words >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    words = (words + (words >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (words * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def hamming_distances(query_bits: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """Bits differing between one packed query and each packed row"""
+    if codes.shape[1] % 8 == 0 and codes.flags.c_contiguous:
+        # Common embedding sizes pack into whole 64-bit words
+        differing = np.bitwise_xor(codes.view(np.uint64), np.ascontiguousarray(query_bits).view(np.uint64))
+        return _popcount64(differing).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1, dtype=np.int32)
+
+
+def _append(segment: Optional[np.ndarray], rows: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    if rows is None:
+        return segment
+    return rows if segment is None else np.concatenate([segment, rows])
+
+
+class QuantizedVectorIndex:
+    """Unit-normalized vectors with quantized codes for scanning and float32 rescoring.
+
+    Rows are the main segment (float32 vectors memory-mapped once saved)
+    followed by the pending rows added since the last merge. Removed rows
+    keep their place, with a None id, until the next merge.
+    """
+
+    def __init__(self, mode: str = "int8"):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization '{mode}' (expected one of: {', '.join(QUANTIZATION_MODES)})")
+        self.mode = mode
+        self.ids: List[Optional[str]] = []  # by row; None once removed
+        self.metadatas: List[Optional[Dict]] = []
+        self.positions: Dict[str, int] = {}
+        self.children: Dict[str, List[str]] = {}  # parent id -> "<parent>#..." ids
+        self.deleted = np.zeros(0, dtype=bool)  # by row
+        self.vectors: Optional[np.ndarray] = None  # main segment, float32, memory-mapped once loaded from disk
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.pending_vectors: Optional[np.ndarray] = None
+        self.pending_codes: Optional[np.ndarray] = None
+        self.pending_scales: Optional[np.ndarray] = None
+        # Binary codes hold the signs of (vector - center): embeddings share
+        # a common direction, so raw signs barely vary between documents
+        self.center: Optional[np.ndarray] = None
+        self.centered_rows = 0
+        self.dirty = False
+        self.main_dirty = False  # the main segment must be rewritten on save
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @property
+    def main_rows(self) -> int:
+        return 0 if self.vectors is None else len(self.vectors)
+
+    @property
+    def dimension(self) -> int:
+        return 0 if self.vectors is None else self.vectors.shape[1]
+
+    @property
+    def resident_bytes(self) -> int:
+        """Memory held for scanning (main float32 vectors count only in float32 mode or until saved)"""
+        if self.vectors is None:
+            return 0
+        arrays = (self.codes, self.scales, self.pending_vectors, self.pending_codes, self.pending_scales)
+        total = sum(array.nbytes for array in arrays if array is not None)
+        if self.mode == "float32" or not isinstance(self.vectors, np.memmap):
+            total += self.vectors.nbytes
+        return total
+
+    def _quantize(self, vectors: np.ndarray):
+        if self.mode == "int8":
+            return quantize_int8(vectors)
+        if self.mode == "binary":
+            return quantize_binary(vectors - self.center), None
+        return None, None
+
+    def _set_vectors(self, vectors: np.ndarray):
+        """Use `vectors` (all rows) as the main segment and quantize them from scratch"""
+        self.vectors = vectors
+        if self.mode == "binary":
+            self.center = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+            self.centered_rows = len(vectors)
+        self.codes, self.scales = self._quantize(np.asarray(vectors))
+        self.pending_vectors = self.pending_codes = self.pending_scales = None
+        self.main_dirty = True
+
+    def add(self, ids: List[str], vectors, metadatas: Optional[List[Dict]] = None):
+        """Index vectors, replacing any previous versions of the same ids"""
+        if not ids:
+            return
+        vectors = normalize_rows(vectors)
+        if self.dimension and vectors.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match the index ({self.dimension})")
+        self.remove_many(ids, include_children=False)
+
+        if self.vectors is None:
+            self._set_vectors(vectors)
+        else:
+            codes, scales = self._quantize(vectors)
+            self.pending_vectors = _append(self.pending_vectors, vectors)
+            self.pending_codes = _append(self.pending_codes, codes)
+            self.pending_scales = _append(self.pending_scales, scales)
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(ids), dtype=bool)])
+
+        for doc_id, metadata in zip(ids, metadatas or [{}] * len(ids)):
+            self.positions[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+            self.metadatas.append(metadata)
+            if "#" in doc_id:
+                self.children.setdefault(doc_id.split("#", 1)[0], []).append(doc_id)
+        self.dirty = True
+
+        pending_rows = len(self.ids) - self.main_rows
+        # Binary codes are also recentered once the index has doubled since the center was computed
+        if pending_rows > max(MIN_MERGE_ROWS, MERGE_FRACTION * self.main_rows) or (
+            self.mode == "binary" and len(self) >= 2 * self.centered_rows
+        ):
+            self.merge()
+
+    def remove(self, doc_id: str) -> bool:
+        return self.remove_many([doc_id]) > 0
+
+    def remove_many(self, doc_ids: Iterable[str], include_children: bool = True) -> int:
+        """Drop ids (and, by default, their "<id>#..." chunk and comment children); returns rows removed"""
+        doc_ids = list(doc_ids)
+        if include_children:
+            doc_ids += [child for doc_id in doc_ids for child in self.children.pop(doc_id, [])]
+        removed = 0
+        for doc_id in doc_ids:
+            row = self.positions.pop(doc_id, None)
+            if row is not None:
+                self.ids[row] = None
+                self.metadatas[row] = None
+                self.deleted[row] = True
+                removed += 1
+        if not removed:
+            return 0
+
+        self.dirty = True
+        if len(self.ids) - len(self) > max(MIN_MERGE_ROWS, len(self)):
+            self.merge()
+        return removed
+
+    def merge(self):
+        """Fold the pending rows into the main segment and drop removed rows (copies every live vector)"""
+        if self.vectors is None:
+            return
+        live = np.flatnonzero(~self.deleted)
+        if not len(live):
+            self.__init__(self.mode)
+            self.dirty = True
+            return
+
+        vectors = self._rows(live)
+        if self.mode == "binary" and len(live) >= 2 * self.centered_rows:
+            self._set_vectors(vectors)
+        else:
+            if self.codes is not None:
+                self.codes = np.concatenate([self.codes, self.pending_codes] if self.pending_codes is not None else [self.codes])[live]
+            if self.scales is not None:
+                self.scales = np.concatenate([self.scales, self.pending_scales] if self.pending_scales is not None else [self.scales])[live]
+            self.vectors = vectors
+            self.pending_vectors = self.pending_codes = self.pending_scales = None
+            self.main_dirty = True
+
+        self.ids = [self.ids[row] for row in live]
+        self.metadatas = [self.metadatas[row] for row in live]
+        self.positions = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.deleted = np.zeros(len(self.ids), dtype=bool)
+        self.dirty = True
+
+    def metadata(self, doc_id: str) -> Optional[Dict]:
+        position = self.positions.get(doc_id)
+        return None if position is None else self.metadatas[position]
+
+    def set_metadata(self, doc_id: str, metadata: Dict):
+        position = self.positions.get(doc_id)
+        if position is not None and self.metadatas[position] != metadata:
+            self.metadatas[position] = metadata
+            self.dirty = True
+
+    def _rows(self, rows: np.ndarray) -> np.ndarray:
+        """float32 vectors of the given rows (ascending), read from the main segment's memory map or the pending rows"""
+        main = rows[rows < self.main_rows]
+        vectors = np.asarray(self.vectors[main], dtype=np.float32)
+        if len(main) == len(rows):
+            return vectors
+        return np.concatenate([vectors, self.pending_vectors[rows[len(main):] - self.main_rows]])
+
+    def live(self) -> Tuple[List[str], np.ndarray, List[Dict]]:
+        """(ids, float32 vectors, metadatas) of the indexed rows"""
+        rows = np.flatnonzero(~self.deleted)
+        return [self.ids[row] for row in rows], self._rows(rows), [self.metadatas[row] for row in rows]
+
+    def _segment_scores(self, query: np.ndarray, vectors: np.ndarray, codes: Optional[np.ndarray], scales: Optional[np.ndarray]) -> np.ndarray:
+        if self.mode == "binary":
+            # Fewer differing sign bits means a smaller angle
+            return -hamming_distances(self._quantize(query[None, :])[0][0], codes).astype(np.float32)
+
+        n = len(vectors)
+        scores = np.empty(n, dtype=np.float32)
+        matrix = vectors if self.mode == "float32" else codes
+        for start in range(0, n, SCAN_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        if self.mode == "int8":
+            scores *= scales
+        return scores
+
+    def _coarse_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate similarity of every row to the query (higher is closer; removed rows -inf)"""
+        scores = self._segment_scores(query, self.vectors, self.codes, self.scales)
+        if self.pending_vectors is not None:
+            pending = self._segment_scores(query, self.pending_vectors, self.pending_codes, self.pending_scales)
+            scores = np.concatenate([scores, pending])
+        scores[self.deleted] = -np.inf
+        return scores
+
+    def search(self, query, k: int = 10, exclude: Iterable[str] = (), rescore_factor: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Top `k` (doc_id, cosine similarity) pairs, best first"""
+        if not self.positions or k <= 0:
+            return []
+        query = normalize_rows(query)[0]
+        exclude = [self.positions[doc_id] for doc_id in exclude if doc_id in self.positions]
+
+        scores = self._coarse_scores(query)
+        if exclude:
+            scores[exclude] = -np.inf
+
+        factor = rescore_factor if rescore_factor is not None else RESCORE_FACTORS[self.mode]
+        n_candidates = min(len(self.ids), max(k, k * factor))
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        candidates = candidates[np.isfinite(scores[candidates])]
+
+        # Exact rescoring reads only the candidate rows from the memory map
+        candidates.sort()
+        similarities = self._rows(candidates) @ query
+        order = np.argsort(-similarities, kind="stable")[:k]
+        return [(self.ids[candidates[i]], float(similarities[i])) for i in order]
+
+
+class VectorStore(LocalIndexStore):
+    """Per-repository quantized vectors under `<data_dir>/vectors/`.
+
+    Each repository has a JSON file (ids, metadata, mode) plus .npy files
+    for the main segment's float32 vectors (memory-mapped on load), codes and
+    scales or binary center, and the pending rows. Saves rewrite the main
+    segment's files only after a merge. An index saved in another mode is
+    requantized from its float32 vectors on load.
+    """
+
+    subdir = "vectors"
+    format_version = VECTOR_FORMAT_VERSION
+    index_class = QuantizedVectorIndex
+
+    def __init__(self, data_dir: str, mode: str = "int8"):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization '{mode}' (expected one of: {', '.join(QUANTIZATION_MODES)})")
+        super().__init__(data_dir)
+        self.mode = mode
+
+    def _array_path(self, owner: str, repo: str, name: str) -> str:
+        return self.path_for(owner, repo)[:-len(".json")] + f".{name}.npy"
+
+    def _load(self, owner: str, repo: str) -> QuantizedVectorIndex:
+        index = QuantizedVectorIndex(self.mode)
+        path = self.path_for(owner, repo)
+        if not os.path.exists(path):
+            return index
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get("format") != self.format_version or not data["ids"]:
+                return index
+            main_rows = data.get("main_rows", len(data["ids"]))
+            vectors = np.load(self._array_path(owner, repo, "vectors"), mmap_mode="r")
+            if vectors.shape[0] != main_rows:
+                raise ValueError(f"{main_rows} main rows but {vectors.shape[0]} vectors")
+            has_pending = main_rows < len(data["ids"])
+            pending = np.load(self._array_path(owner, repo, "pending_vectors")) if has_pending else None
+            if has_pending and main_rows + len(pending) != len(data["ids"]):
+                raise ValueError(f"{len(data['ids'])} ids but {main_rows + len(pending)} vectors")
+
+            index.ids = data["ids"]
+            index.metadatas = data["metadatas"]
+            index.positions = {doc_id: i for i, doc_id in enumerate(index.ids) if doc_id is not None}
+            index.deleted = np.asarray([doc_id is None for doc_id in index.ids], dtype=bool)
+            for doc_id in index.positions:
+                if "#" in doc_id:
+                    index.children.setdefault(doc_id.split("#", 1)[0], []).append(doc_id)
+            if data.get("mode") == self.mode:
+                index.vectors = vectors
+                index.pending_vectors = pending
+                if self.mode != "float32":
+                    index.codes = np.load(self._array_path(owner, repo, "codes"))
+                    if has_pending:
+                        index.pending_codes = np.load(self._array_path(owner, repo, "pending_codes"))
+                if self.mode == "int8":
+                    index.scales = np.load(self._array_path(owner, repo, "scales"))
+                    if has_pending:
+                        index.pending_scales = np.load(self._array_path(owner, repo, "pending_scales"))
+                if self.mode == "binary":
+                    index.center = np.load(self._array_path(owner, repo, "center"))
+                    index.centered_rows = data["centered_rows"]
+            else:
+                index._set_vectors(vectors if pending is None else np.concatenate([vectors, pending]))
+                index.dirty = True
+            return index
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Ignoring unreadable {self.subdir} index {path}: {e}")
+            return QuantizedVectorIndex(self.mode)
+
+    def add(self, owner: str, repo: str, ids: List[str], vectors, metadatas: List[Dict]):
+        with self._lock:
+            self.get(owner, repo).add(ids, vectors, metadatas)
+
+    def remove(self, owner: str, repo: str, ids: Iterable[str]):
+        with self._lock:
+            self.get(owner, repo).remove_many(ids)
+
+    def set_metadatas(self, owner: str, repo: str, ids: List[str], metadatas: List[Dict]):
+        with self._lock:
+            index = self.get(owner, repo)
+            for doc_id, metadata in zip(ids, metadatas):
+                index.set_metadata(doc_id, metadata)
+
+    def search(self, owner: str, repo: str, query, k: int = 10, exclude: Iterable[str] = ()) -> List[Tuple[str, float, Optional[Dict]]]:
+        """(doc_id, similarity, metadata) hits, read under the lock writers hold (an add
+        replaces several arrays, which a concurrent scan must not see half done)"""
+        with self._lock:
+            index = self.get(owner, repo)
+            return [(doc_id, similarity, index.metadata(doc_id)) for doc_id, similarity in index.search(query, k, exclude)]
+
+    def contents(self, owner: str, repo: str) -> Tuple[List[str], np.ndarray, List[Dict]]:
+        """A consistent (ids, float32 vectors, metadatas) view of the repository's index"""
+        with self._lock:
+            return self.get(owner, repo).live()
+
+    def rebuild(self, owner: str, repo: str, ids: List[str], vectors, metadatas: List[Dict]) -> Dict[str, Union[int, str]]:
+        """Replace the repository's vectors with ones quantized from scratch; returns their stats"""
+        # One add for the whole repository instead of growing the arrays page by page
+        index = QuantizedVectorIndex(self.mode)
+        index.add(ids, vectors, metadatas)
+        index.dirty = True
+        with self._lock:
+            self._indexes[(owner.lower(), repo.lower())] = index
+            self.save(owner, repo)
+        return {
+            "vectors": len(index),
+            "dimension": index.dimension,
+            "quantization": index.mode,
+            "resident_bytes": index.resident_bytes,
+            "float32_bytes": len(index) * index.dimension * 4
+        }
+
+    def _write_array(self, path: str, array: np.ndarray):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(array))
+        os.replace(tmp_path, path)
+
+    def save(self, owner: str, repo: str) -> Optional[str]:
+        """Atomically write the repository's vectors if they changed; returns the JSON path written"""
+        with self._lock:
+            index = self.get(owner, repo)
+            if not index.dirty:
+                return None
+            path = self.path_for(owner, repo)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # The (large) main segment only changes on a merge
+            arrays = {"pending_vectors": index.pending_vectors, "pending_codes": index.pending_codes, "pending_scales": index.pending_scales}
+            if index.main_dirty:
+                arrays.update({"vectors": index.vectors, "codes": index.codes, "scales": index.scales, "center": index.center})
+            for name, array in arrays.items():
+                if array is not None:
+                    self._write_array(self._array_path(owner, repo, name), array)
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    "format": self.format_version,
+                    "mode": index.mode,
+                    "centered_rows": index.centered_rows,
+                    "main_rows": index.main_rows,
+                    "ids": index.ids,
+                    "metadatas": index.metadatas
+                }, f)
+            os.replace(tmp_path, path)
+
+            # Serve from the written file so the float32 vectors leave memory
+            if index.main_dirty and index.vectors is not None:
+                index.vectors = np.load(self._array_path(owner, repo, "vectors"), mmap_mode="r")
+            index.dirty = index.main_dirty = False
+            return path
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+GitHub Webhook Handling
+Keeps the index fresh from `issues` and `discussion` webhook events:
+- HMAC signature verification (X-Hub-Signature-256)
+- Translation of events into single-document upserts/deletes
+- A micro-batcher that coalesces bursts of events into one upsert
+"""
+
+import hmac
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+from github_similarity_service import SimilarityService, Issue, Discussion
+
+
+UPSERT_ACTIONS = {
+    "issues": {"opened", "edited", "closed", "reopened", "labeled", "unlabeled"},
+    "discussion": {"created", "edited", "closed", "reopened", "labeled", "unlabeled",
+                   "answered", "unanswered", "category_changed"},
+}
+
+DELETE_ACTIONS = {
+    "issues": {"deleted", "transferred"},
+    "discussion": {"deleted", "transferred"},
+}
+
+
+def verify_signature(secret: str, body: bytes, signature_header: Optional[str]) -> bool:
+    """Check a payload against its `X-Hub-Signature-256` header"""
+    if not secret or not signature_header or not signature_header.startswith("sha256="):
+        return False
+
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(f"sha256={expected}", signature_header)
+
+
+class IndexUpdateBatcher:
+    """Coalesces index updates and flushes them as one upsert/delete per repository.
+
+    Updates for the same document within a window collapse to the latest one,
+    so a burst of edits to an issue costs a single embedding.
+    """
+
+    def __init__(self, service: SimilarityService, max_delay: float = 2.0, max_batch: int = 100):
+        self.service = service
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._pending: Dict[str, Tuple[str, str, str, Optional[Union[Issue, Discussion]]]] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def add_upsert(self, owner: str, repo: str, item: Union[Issue, Discussion]) -> str:
+        doc_id = self.service._doc_id(owner, repo, item)
+        self._add(doc_id, (owner, repo, "upsert", item))
+        return doc_id
+
+    def add_delete(self, owner: str, repo: str, doc_id: str) -> str:
+        self._add(doc_id, (owner, repo, "delete", None))
+        return doc_id
+
+    def _add(self, doc_id: str, update: Tuple):
+        with self._lock:
+            self._pending[doc_id] = update
+            if len(self._pending) >= self.max_batch:
+                flush_now = True
+            else:
+                flush_now = False
+                if self._timer is None:
+                    self._timer = threading.Timer(self.max_delay, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        if flush_now:
+            self.flush()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> Dict[str, int]:
+        """Apply all pending updates now"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        upserts: Dict[Tuple[str, str], List[Union[Issue, Discussion]]] = {}
+        deletes: List[str] = []
+        for doc_id, (owner, repo, operation, item) in pending.items():
+            if operation == "upsert":
+                upserts.setdefault((owner, repo), []).append(item)
+            else:
+                deletes.append(doc_id)
+
+        upserted = 0
+        for (owner, repo), items in upserts.items():
+            try:
+                upserted += self.service.upsert_items(owner, repo, items)
+            except Exception as e:
+                print(f"Failed to upsert {len(items)} webhook updates for {owner}/{repo}: {e}")
+
+        deleted = 0
+        try:
+            deleted = self.service.delete_items(deletes)
+        except Exception as e:
+            print(f"Failed to delete {len(deletes)} documents: {e}")
+
+        return {"upserted": upserted, "deleted": deleted}
+
+
+def handle_webhook_event(batcher: IndexUpdateBatcher, event: str, payload: Dict) -> Dict[str, str]:
+    """Queue the index update for an `issues` or `discussion` event"""
+    action = payload.get("action", "")
+    if event not in UPSERT_ACTIONS:
+        return {"status": "ignored", "reason": f"Unsupported event '{event}'"}
+
+    owner = payload["repository"]["owner"]["login"]
+    repo = payload["repository"]["name"]
+    service = batcher.service
+
+    if event == "issues":
+        item = service._issue_from_api(payload["issue"])
+    else:
+        item = service._discussion_from_webhook(payload["discussion"])
+
+    if action in UPSERT_ACTIONS[event]:
+        doc_id = batcher.add_upsert(owner, repo, item)
+        return {"status": "queued", "operation": "upsert", "id": doc_id}
+
+    if action in DELETE_ACTIONS[event]:
+        doc_id = batcher.add_delete(owner, repo, service._doc_id(owner, repo, item))
+        return {"status": "queued", "operation": "delete", "id": doc_id}
+
+    return {"status": "ignored", "reason": f"Unsupported action '{action}' for '{event}'"}